@@ -0,0 +1,93 @@
+"""
+Compares the chunk modes of streamed chat completions: the chunks
+converted per second, alone and with their text read, and the memory
+blocks and bytes held by each converted chunk, measured with tracemalloc,
+for decoded chunks shaped like those of Modelfarm.
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_chunks.py [--chunks N]
+        [--repeat N]
+"""
+import argparse
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+from replit.ai.modelfarm.chunks import chunk_converter
+from replit.ai.modelfarm.structs.chat import ChatCompletionStreamChunkResponse
+
+MODES = ("model", "construct", "dict", "view")
+
+
+def make_chunks(count: int) -> List[Dict[str, Any]]:
+    return [{
+        "id":
+        "chatcmpl-0",
+        "object":
+        "chat.completion.chunk",
+        "created":
+        1700000000,
+        "model":
+        "chat-bison",
+        "choices": [{
+            "index": 0,
+            "delta": {
+                "role": "assistant",
+                "content": f"word{i} "
+            },
+            "finish_reason": None,
+        }],
+    } for i in range(count)]
+
+
+def read(chunk: Any, mode: str) -> str:
+    if mode == "dict":
+        return chunk["choices"][0]["delta"]["content"]
+    return chunk.choices[0].delta.content
+
+
+def rate(chunks: List[Dict[str, Any]], mode: str, repeat: int,
+         reads: bool) -> float:
+    convert = chunk_converter(ChatCompletionStreamChunkResponse,
+                              mode)  # type: ignore[arg-type]
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        if reads:
+            for chunk in chunks:
+                read(convert(chunk), mode)
+        else:
+            for chunk in chunks:
+                convert(chunk)
+        best = min(best, time.perf_counter() - start)
+    return len(chunks) / best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    chunks = make_chunks(args.chunks)
+    print(f"{args.chunks} chunks")
+    for mode in MODES:
+        converted = rate(chunks, mode, args.repeat, reads=False)
+        read_rate = rate(chunks, mode, args.repeat, reads=True)
+        convert = chunk_converter(ChatCompletionStreamChunkResponse,
+                                  mode)  # type: ignore[arg-type]
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        kept = [convert(chunk) for chunk in chunks]
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        held = after.compare_to(before, "filename")
+        blocks = sum(stat.count_diff for stat in held) / len(kept)
+        size = sum(stat.size_diff for stat in held) / len(kept)
+        print(f"  {mode:10} {converted:10.0f} chunks/s   "
+              f"{read_rate:10.0f} chunks/s read   "
+              f"{blocks:5.1f} blocks/chunk   {size:6.0f} B/chunk")
+
+
+if __name__ == "__main__":
+    main()
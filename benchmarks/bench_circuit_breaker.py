@@ -0,0 +1,73 @@
+"""
+Measures how long worker threads are tied up by calls to a degraded endpoint
+that answers every request with a slow 503, with and without a circuit
+breaker.
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_circuit_breaker.py [--calls N]
+        [--latency S]
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from replit.ai.modelfarm import Modelfarm
+from replit.ai.modelfarm.circuit_breaker import CircuitBreakerPolicy
+from replit.ai.modelfarm.exceptions import (
+    CircuitOpenException,
+    InvalidResponseException,
+)
+from replit.tests.ai.modelfarm.stand_in_server import (
+    Fault,
+    StandInServer,
+    patched_identity_environ,
+)
+
+THREADS = 8
+
+
+def run(server: StandInServer, calls: int, latency: float,
+        policy: Optional[CircuitBreakerPolicy]) -> None:
+    server.faults.clear()
+    server.faults.extend([Fault(503, delay=latency)] * calls)
+    rejected = 0
+
+    with Modelfarm(base_url=server.url,
+                   circuit_breaker_policy=policy) as client:
+
+        def call(_: int) -> bool:
+            try:
+                client.embeddings.create(input=["x"],
+                                         model="textembedding-gecko")
+            except CircuitOpenException:
+                return True
+            except InvalidResponseException:
+                pass
+            return False
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(THREADS) as pool:
+            rejected = sum(pool.map(call, range(calls)))
+        elapsed = time.perf_counter() - start
+
+    name = "breaker" if policy else "no breaker"
+    print(f"  {name:10} {elapsed:6.2f} s, {elapsed / calls * 1000:7.1f} ms "
+          f"per call, {calls - rejected} sent, {rejected} rejected")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--latency", type=float, default=0.1)
+    args = parser.parse_args()
+
+    print(f"{args.calls} calls from {THREADS} threads, each failing after "
+          f"{args.latency * 1000:.0f} ms")
+    with patched_identity_environ(), StandInServer() as server:
+        run(server, args.calls, args.latency, None)
+        run(server, args.calls, args.latency, CircuitBreakerPolicy())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Compares the standard library codec with the orjson codec on the payloads the
+clients encode and decode: chat histories, embedding requests, embedding
+responses and chat streams.
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_codec.py [--repeat N]
+"""
+import argparse
+import functools
+import time
+from typing import Any, Callable, List, Tuple
+
+from replit.ai.modelfarm.codec import JSONCodec, OrjsonCodec
+from replit.tests.ai.modelfarm.stand_in_server import EMBEDDING_DIMENSIONS
+
+CODECS: List[JSONCodec] = [JSONCodec(), OrjsonCodec()]
+
+
+def chat_payload(messages: int) -> Any:
+    return {
+        "model":
+        "chat-bison",
+        "messages": [{
+            "role":
+            "user" if i % 2 else "assistant",
+            "content":
+            f"Message {i}: " + "lorem ipsum dolor sit amet " * 8,
+        } for i in range(messages)],
+        "temperature":
+        0.2,
+        "max_tokens":
+        256,
+    }
+
+
+def embedding_payload(inputs: int) -> Any:
+    return {
+        "model": "textembedding-gecko",
+        "input":
+        [f"document {i} " + "lorem ipsum " * 20 for i in range(inputs)],
+    }
+
+
+def embedding_response(inputs: int) -> Any:
+    return {
+        "object":
+        "list",
+        "model":
+        "textembedding-gecko",
+        "data": [{
+            "object":
+            "embedding",
+            "index":
+            i,
+            "embedding":
+            [0.123456789 * j for j in range(EMBEDDING_DIMENSIONS)],
+            "metadata":
+            None,
+        } for i in range(inputs)],
+        "usage":
+        None,
+        "metadata":
+        None,
+    }
+
+
+def chat_stream(chunks: int) -> bytes:
+    return b"".join(JSONCodec().dumps({
+        "id":
+        "chat-stand-in",
+        "model":
+        "chat-bison",
+        "created":
+        0,
+        "object":
+        "chat.completion.chunk",
+        "choices": [{
+            "index": 0,
+            "finish_reason": None,
+            "delta": {
+                "role": "assistant",
+                "content": f"word{i} "
+            },
+        }],
+    }) for i in range(chunks))
+
+
+def timed(fn: Callable[[], Any], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def dumps(codec: JSONCodec, payload: Any) -> None:
+    codec.dumps(payload)
+
+
+def loads(codec: JSONCodec, body: bytes) -> None:
+    codec.loads(body)
+
+
+def frame(codec: JSONCodec, stream: bytes) -> None:
+    framer = codec.stream_framer()
+    for i in range(0, len(stream), 512):
+        framer.feed(stream[i:i + 512])
+    framer.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    cases: List[Tuple[str, Callable[[JSONCodec], None]]] = [
+        (f"dumps chat, {n} messages",
+         functools.partial(dumps, payload=chat_payload(n)))
+        for n in (10, 100, 1000)
+    ]
+    cases.append(("dumps embeddings, 2000 inputs",
+                  functools.partial(dumps, payload=embedding_payload(2000))))
+    body = JSONCodec().dumps(embedding_response(2000))
+    cases.append((f"loads embeddings, 2000 x {EMBEDDING_DIMENSIONS}",
+                  functools.partial(loads, body=body)))
+    cases.append(("frame chat stream, 2000 chunks",
+                  functools.partial(frame, stream=chat_stream(2000))))
+
+    print(f"{'':40}" + "".join(f"{c.name:>12}" for c in CODECS))
+    for name, fn in cases:
+        times = [timed(functools.partial(fn, c), args.repeat) for c in CODECS]
+        print(f"{name:40}" + "".join(f"{t:9.2f} ms" for t in times))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Compares fixed semaphores with the adaptive concurrency limiter while the
+capacity of a stand-in server changes under a steady fan-out of embedding
+requests. Requests that queue on the server for longer than its queue
+timeout are rejected with a 503, like an overloaded upstream.
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_concurrency.py [--phase SECONDS]
+        [--workers N]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List, Optional
+
+from replit.ai.modelfarm import AsyncModelfarm
+from replit.ai.modelfarm.concurrency import AdaptiveConcurrencyLimiter
+from replit.ai.modelfarm.exceptions import InvalidResponseException
+from replit.tests.ai.modelfarm.stand_in_server import (
+    StandInServer,
+    patched_identity_environ,
+)
+
+CAPACITIES = [16, 4, 32]
+SERVICE_TIME = 0.02
+QUEUE_TIMEOUT = 0.05
+
+
+async def run(server: StandInServer, workers: int, phase: float,
+              semaphore_size: Optional[int],
+              limiter: Optional[AdaptiveConcurrencyLimiter]) -> None:
+    latencies: List[float] = []
+    failures = 0
+    semaphore = asyncio.Semaphore(semaphore_size or workers)
+    deadline = time.monotonic() + phase * len(CAPACITIES)
+
+    async with AsyncModelfarm(base_url=server.url,
+                              concurrency_limiter=limiter) as client:
+
+        async def worker() -> None:
+            nonlocal failures
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    async with semaphore:
+                        await client.embeddings.create(
+                            input=["x"], model="textembedding-gecko")
+                except InvalidResponseException:
+                    failures += 1
+                else:
+                    latencies.append(time.perf_counter() - start)
+
+        async def vary_capacity() -> None:
+            for capacity in CAPACITIES:
+                server.capacity = capacity
+                await asyncio.sleep(phase)
+
+        await asyncio.gather(vary_capacity(),
+                             *(worker() for _ in range(workers)))
+
+    name = "adaptive" if limiter is not None else f"semaphore({semaphore_size})"
+    elapsed = phase * len(CAPACITIES)
+    p99 = statistics.quantiles(latencies, n=100)[98] * 1000
+    print(f"  {name:16} {len(latencies) / elapsed:7.1f} ok/s   "
+          f"{failures / elapsed:7.1f} 503/s   p99 {p99:7.1f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--phase", type=float, default=3.0)
+    parser.add_argument("--workers", type=int, default=64)
+    args = parser.parse_args()
+
+    print(f"{args.workers} workers; server capacity "
+          f"{' -> '.join(map(str, CAPACITIES))}, {args.phase:.0f} s each, "
+          f"{SERVICE_TIME * 1000:.0f} ms per request")
+    with patched_identity_environ(), StandInServer() as server:
+        server.latency = lambda: SERVICE_TIME
+        server.queue_timeout = QUEUE_TIMEOUT
+        for size in (4, args.workers):
+            asyncio.run(run(server, args.workers, args.phase, size, None))
+        asyncio.run(
+            run(server, args.workers, args.phase, None,
+                AdaptiveConcurrencyLimiter()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Compares the time and memory it takes to turn an embeddings response body
+into a float32 NumPy array through EmbeddingModelResponse, as callers do
+today, and with output="numpy".
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_embedding_array.py [--inputs N]
+        [--repeat N]
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from typing import Any, Callable, Dict
+
+import numpy
+from replit.ai.modelfarm.codec import default_codec
+from replit.ai.modelfarm.embedding_array import to_array_response
+from replit.ai.modelfarm.structs.embeddings import EmbeddingModelResponse
+from replit.tests.ai.modelfarm.stand_in_server import EMBEDDING_DIMENSIONS
+
+
+def response_body(inputs: int) -> bytes:
+    return default_codec().dumps({
+        "object":
+        "list",
+        "model":
+        "textembedding-gecko",
+        "data": [{
+            "object":
+            "embedding",
+            "index":
+            i,
+            "embedding":
+            [0.123456789 * (i + j) for j in range(EMBEDDING_DIMENSIONS)],
+            "metadata": {
+                "truncated": False
+            },
+        } for i in range(inputs)],
+        "usage": {
+            "prompt_tokens": inputs,
+            "completion_tokens": 0,
+            "total_tokens": inputs,
+        },
+        "metadata":
+        None,
+    })
+
+
+def via_model(rjson: Dict[str, Any]) -> Any:
+    response = EmbeddingModelResponse(**rjson)
+    return response, numpy.array([item.embedding for item in response.data],
+                                 dtype=numpy.float32)
+
+
+def via_numpy(rjson: Dict[str, Any]) -> Any:
+    return to_array_response(rjson)
+
+
+def measure(body: bytes, build: Callable[[Dict[str, Any]], Any],
+            repeat: int) -> None:
+    codec = default_codec()
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        build(codec.loads(body))
+        best = min(best, time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    result = build(codec.loads(body))
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    print(f"  {build.__name__:10} {best * 1000:8.1f} ms   "
+          f"peak {peak / 2**20:7.1f} MiB   retained {retained / 2**20:7.1f} "
+          "MiB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--inputs", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    body = response_body(args.inputs)
+    print(f"{args.inputs} x {EMBEDDING_DIMENSIONS} embeddings, "
+          f"{len(body) / 2**20:.1f} MiB body, {default_codec().name} codec")
+    measure(body, via_model, args.repeat)
+    measure(body, via_numpy, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
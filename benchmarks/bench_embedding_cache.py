@@ -0,0 +1,70 @@
+"""
+Measures the throughput of Modelfarm embedding calls over a corpus of which
+most inputs are already embedded, with and without the on-disk embedding
+cache.
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_embedding_cache.py [--inputs N]
+        [--batch-size B] [--cached-rate R] [--latency S]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from typing import List, Optional
+
+from replit.ai.modelfarm import Modelfarm
+from replit.ai.modelfarm.cache import CacheStats
+from replit.ai.modelfarm.embedding_cache import SQLiteEmbeddingCache
+from replit.tests.ai.modelfarm.stand_in_server import (
+    StandInServer,
+    patched_identity_environ,
+)
+
+MODEL = "textembedding-gecko"
+
+
+def embed(server: StandInServer, corpus: List[str], batch_size: int,
+          cache: Optional[SQLiteEmbeddingCache]) -> float:
+    with Modelfarm(base_url=server.url, embedding_cache=cache) as client:
+        start = time.perf_counter()
+        for i in range(0, len(corpus), batch_size):
+            client.embeddings.create(input=corpus[i:i + batch_size],
+                                     model=MODEL)
+        return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--inputs", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--cached-rate", type=float, default=0.9)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    corpus = [f"document {i}" for i in range(args.inputs)]
+    cached = random.sample(corpus, int(args.inputs * args.cached_rate))
+
+    with patched_identity_environ(), StandInServer(
+    ) as server, tempfile.TemporaryDirectory() as directory:
+        cache = SQLiteEmbeddingCache(os.path.join(directory, "cache.db"))
+        embed(server, cached, args.batch_size, cache)
+        cache.stats = CacheStats()
+        server.latency = lambda: args.latency
+        print(f"{args.inputs} inputs in batches of {args.batch_size}, "
+              f"{args.cached_rate:.0%} cached, "
+              f"{args.latency * 1000:.0f} ms per request")
+
+        for name, store in (("no cache", None), ("cache", cache)):
+            requests = len(server.requests)
+            elapsed = embed(server, corpus, args.batch_size, store)
+            print(f"  {name:10} {args.inputs / elapsed:9.0f} inputs/s   "
+                  f"{len(server.requests) - requests:4} requests")
+        print(f"  hit rate {cache.stats.hit_rate:.1%}, "
+              f"{cache.bytes / 2**20:.1f} MiB on disk")
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Compares the bytes on the wire and the time of Modelfarm embedding calls
+against a stand-in server, with embeddings sent as JSON numbers and as
+base64 encoded float32 values, decoded to lists and to NumPy arrays.
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_embedding_encoding.py
+        [--inputs N] [--repeat N]
+"""
+import argparse
+import time
+from typing import Any, Dict
+
+from replit.ai.modelfarm import Modelfarm
+from replit.tests.ai.modelfarm.stand_in_server import (
+    EMBEDDING_DIMENSIONS,
+    StandInServer,
+    patched_identity_environ,
+)
+
+MODEL = "textembedding-gecko"
+
+VARIANTS: Dict[str, Dict[str, Any]] = {
+    "float/model": {},
+    "float/numpy": {
+        "output": "numpy"
+    },
+    "base64/model": {
+        "encoding_format": "base64"
+    },
+    "base64/numpy": {
+        "encoding_format": "base64",
+        "output": "numpy"
+    },
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--inputs", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    inputs = [f"document {i}" for i in range(args.inputs)]
+    print(f"{args.inputs} x {EMBEDDING_DIMENSIONS} embeddings per call")
+    with patched_identity_environ(), StandInServer() as server, Modelfarm(
+            base_url=server.url) as client:
+        for name, options in VARIANTS.items():
+            best = float("inf")
+            sent = server.bytes_sent
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                client.embeddings.create(input=inputs, model=MODEL, **options)
+                best = min(best, time.perf_counter() - start)
+            size = (server.bytes_sent - sent) / args.repeat
+            print(f"  {name:13} {size / 2**20:7.2f} MiB   "
+                  f"{best * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
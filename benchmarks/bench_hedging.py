@@ -0,0 +1,74 @@
+"""
+Measures the latency of AsyncModelfarm embedding calls against a stand-in
+server where a few requests hit a slow replica, with and without hedging.
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_hedging.py [--requests N]
+        [--slow-rate R] [--slow-latency S]
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from typing import List, Optional
+
+from replit.ai.modelfarm import AsyncModelfarm
+from replit.ai.modelfarm.hedging import HedgingPolicy
+from replit.tests.ai.modelfarm.stand_in_server import (
+    StandInServer,
+    patched_identity_environ,
+)
+
+CONCURRENCY = 8
+
+
+async def run(server: StandInServer, requests: int,
+              policy: Optional[HedgingPolicy]) -> List[float]:
+    latencies: List[float] = []
+    queue: "asyncio.Queue[int]" = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(i)
+
+    async with AsyncModelfarm(base_url=server.url,
+                              hedging_policy=policy) as client:
+
+        async def worker() -> None:
+            while not queue.empty():
+                queue.get_nowait()
+                start = time.perf_counter()
+                await client.embeddings.create(input=["x"],
+                                               model="textembedding-gecko")
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+    return latencies
+
+
+def report(name: str, latencies: List[float]) -> None:
+    cuts = statistics.quantiles(latencies, n=100)
+    print(f"  {name:10} p50 {cuts[49] * 1000:7.1f} ms   "
+          f"p95 {cuts[94] * 1000:7.1f} ms   p99 {cuts[98] * 1000:7.1f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--slow-rate", type=float, default=0.03)
+    parser.add_argument("--slow-latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    with patched_identity_environ(), StandInServer() as server:
+        server.latency = lambda: (args.slow_latency if random.random() < args.
+                                  slow_rate else 0.005)
+        print(f"{args.requests} requests, {args.slow_rate:.0%} of them "
+              f"take {args.slow_latency * 1000:.0f} ms")
+        report("no hedging", asyncio.run(run(server, args.requests, None)))
+        policy = HedgingPolicy(max_hedge_rate=0.1)
+        report("hedging", asyncio.run(run(server, args.requests, policy)))
+        print(f"  hedges fired {policy.stats.hedges_fired}, "
+              f"won {policy.stats.hedges_won}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Measures the overhead of request hooks: streamed chat completions per second
+of the synchronous client without hooks, with hooks but no callback, with a
+callback on completion only and with a callback on every phase, against the
+local stand-in server, and the phase timings the callbacks report.
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_hooks.py [--requests N]
+        [--tokens N] [--repeat N]
+"""
+import argparse
+import statistics
+import time
+from typing import List, Optional
+
+from replit.ai.modelfarm import Modelfarm
+from replit.ai.modelfarm.hooks import RequestEvent, RequestHooks
+from replit.tests.ai.modelfarm.stand_in_server import (
+    StandInServer,
+    patched_identity_environ,
+)
+
+MESSAGES = [{"role": "user", "content": "Hi"}]
+
+
+def run(server: StandInServer, hooks: Optional[RequestHooks], count: int,
+        tokens: int, repeat: int) -> float:
+    best = float("inf")
+    with Modelfarm(base_url=server.url, hooks=hooks) as client:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(count):
+                stream = client.chat.completions.create(messages=MESSAGES,
+                                                        model="chat-bison",
+                                                        stream=True,
+                                                        max_tokens=tokens)
+                for _ in stream:
+                    pass
+            best = min(best, time.perf_counter() - start)
+    return count / best
+
+
+def ms(values: List[float]) -> str:
+    return f"{statistics.median(values) * 1000:7.3f} ms"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--tokens", type=int, default=32)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    completed: List[RequestEvent] = []
+    empty = RequestHooks()
+    on_complete = RequestHooks()
+    on_complete.add(completed.append, ["complete"])
+    on_every_phase = RequestHooks()
+    on_every_phase.add([].append)
+    with patched_identity_environ(), StandInServer() as server:
+        # The first requests to a new server are slower.
+        run(server, None, args.requests, args.tokens, 1)
+        for name, hooks in (("no hooks", None), ("no callback", empty),
+                            ("complete", on_complete), ("every phase",
+                                                        on_every_phase)):
+            rate = run(server, hooks, args.requests, args.tokens, args.repeat)
+            print(f"{name:>12}: {rate:8.1f} streams/s")
+
+    print("median per stream, from the start of the attempt:")
+    print(f"  first byte  {ms([e.time_to_first_byte for e in completed])}")
+    print(f"  first token {ms([e.time_to_first_token for e in completed])}")
+    print(f"  complete    {ms([e.elapsed for e in completed])}")
+    print(f"  parsing     {ms([e.parse_time for e in completed])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Measures requests/sec of the synchronous client with and without connection
+pooling, against the local stand-in server.
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_http_pool.py [--requests N]
+"""
+import argparse
+import time
+from typing import Any, Dict, Optional
+
+import requests
+from replit.ai.modelfarm import Modelfarm
+from replit.ai.modelfarm.hooks import RequestTrace
+from replit.ai.modelfarm.timeouts import CallTimeout
+from replit.tests.ai.modelfarm.stand_in_server import (
+    StandInServer,
+    patched_identity_environ,
+)
+from requests import Response
+
+
+class UnpooledModelfarm(Modelfarm):
+    """The client as it behaved before pooling: one connection per call."""
+
+    def _post(
+        self,
+        path: str,
+        payload: Optional[Dict[str, Any]] = None,
+        stream: Optional[bool] = None,
+        call: Optional[CallTimeout] = None,
+        trace: Optional[RequestTrace] = None,  # noqa: ARG002
+        **kwargs,
+    ) -> Response:
+        if call is None:
+            call = self.timeout.start()
+        return requests.post(
+            url=self.base_url + path,
+            headers=self._get_auth_headers(),
+            json=payload,
+            stream=stream,
+            timeout=(call.connect, call.first_byte),
+            **kwargs,
+        )
+
+
+def run(client: Modelfarm, count: int) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        client.completions.create(prompt="1 + 1 = ",
+                                  model="text-bison",
+                                  max_tokens=4)
+    return count / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    with patched_identity_environ():
+        for name, cls in (("unpooled", UnpooledModelfarm), ("pooled",
+                                                            Modelfarm)):
+            with StandInServer() as server, cls(base_url=server.url) as client:
+                rate = run(client, args.requests)
+                print(f"{name:>10}: {rate:8.1f} req/s, "
+                      f"{server.connections} connections")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Measures the query latency of EmbeddingIndex on a synthetic clustered
+corpus, searching exactly and with IVF partitions at several nprobe, and
+the recall@k of the IVF searches against the exact ones.
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_index.py [--rows N]
+        [--dimensions D] [--queries Q] [--k K] [--partitions P]
+        [--noise S]
+"""
+import argparse
+import time
+
+import numpy
+from replit.ai.modelfarm.index import EmbeddingIndex
+
+
+def clustered(rows: int, centers: numpy.ndarray, noise_scale: float,
+              rng: numpy.random.Generator) -> numpy.ndarray:
+    noise = rng.normal(size=(rows, centers.shape[1])).astype(numpy.float32)
+    return centers[rng.integers(len(centers), size=rows)] + noise_scale * noise
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--partitions", type=int, default=None)
+    parser.add_argument("--noise", type=float, default=2.0)
+    args = parser.parse_args()
+
+    rng = numpy.random.default_rng(0)
+    centers = rng.normal(size=(1000, args.dimensions)).astype(numpy.float32)
+    index = EmbeddingIndex()
+    for start in range(0, args.rows, 10000):
+        index.add(
+            clustered(min(10000, args.rows - start), centers, args.noise, rng))
+    queries = clustered(args.queries, centers, args.noise, rng)
+    print(f"{args.rows} x {args.dimensions} rows, {args.queries} queries, "
+          f"k={args.k}")
+
+    start = time.perf_counter()
+    _, exact = index.search(queries, k=args.k)
+    elapsed = time.perf_counter() - start
+    print(f"  exact         {elapsed / args.queries * 1000:8.3f} ms/query "
+          "(batched)")
+    start = time.perf_counter()
+    for query in queries[:20]:
+        index.search(query, k=args.k)
+    print(f"  exact         {(time.perf_counter() - start) / 20 * 1000:8.3f}"
+          " ms/query (one at a time)")
+
+    partitions = args.partitions or int(numpy.sqrt(args.rows))
+    start = time.perf_counter()
+    index.build_ivf(partitions)
+    print(f"  build_ivf({partitions}) {time.perf_counter() - start:6.2f} s")
+    for nprobe in (1, 4, 16, 64):
+        start = time.perf_counter()
+        _, approximate = index.search(queries, k=args.k, nprobe=nprobe)
+        elapsed = time.perf_counter() - start
+        recall = numpy.mean([
+            len(set(exact[i]) & set(approximate[i])) / args.k
+            for i in range(args.queries)
+        ])
+        print(f"  nprobe={nprobe:<6} {elapsed / args.queries * 1000:8.3f} "
+              f"ms/query   recall@{args.k} {recall:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Compares the memory and the recall@k of embeddings compressed with each
+quantizer against float32 on a synthetic corpus, whose embeddings lie
+mostly in a subspace of their dimensions as model embeddings do. Searches
+score the queries against the codes, by cosine similarity.
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_quantization.py [--rows N]
+        [--dimensions D] [--rank R] [--queries Q] [--k K] [--sample S]
+"""
+import argparse
+import time
+from typing import Dict
+
+import numpy
+from replit.ai.modelfarm.quantization import (
+    Float16Quantizer,
+    Int8Quantizer,
+    PCAQuantizer,
+    Quantizer,
+)
+
+
+def corpus(rows: int, basis: numpy.ndarray,
+           rng: numpy.random.Generator) -> numpy.ndarray:
+    values = rng.normal(size=(rows, len(basis))) @ basis
+    noise = rng.normal(scale=0.05, size=(rows, basis.shape[1]))
+    return (values + noise).astype(numpy.float32)
+
+
+def top_k(scores: numpy.ndarray, k: int) -> numpy.ndarray:
+    return numpy.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--rank", type=int, default=128)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--sample", type=int, default=10000)
+    args = parser.parse_args()
+
+    rng = numpy.random.default_rng(0)
+    basis = rng.normal(size=(args.rank, args.dimensions)) * numpy.linspace(
+        1, 0.1, args.rank)[:, None]
+    vectors = corpus(args.rows, basis, rng)
+    queries = corpus(args.queries, basis, rng)
+    queries /= numpy.linalg.norm(queries, axis=1, keepdims=True)
+    normalized = vectors / numpy.linalg.norm(vectors, axis=1, keepdims=True)
+    exact = top_k(queries @ normalized.T, args.k)
+    size = vectors.nbytes
+
+    quantizers: Dict[str, Quantizer] = {
+        "float16": Float16Quantizer(),
+        "int8": Int8Quantizer(),
+        "pca/4": PCAQuantizer(args.dimensions // 4),
+        "pca/8": PCAQuantizer(args.dimensions // 8),
+        "pca/4+int8": PCAQuantizer(args.dimensions // 4, Int8Quantizer()),
+        "pca/8+float16": PCAQuantizer(args.dimensions // 8,
+                                      Float16Quantizer()),
+    }
+    print(f"{args.rows} x {args.dimensions} float32 ({size / 2**20:.0f} MiB),"
+          f" {args.queries} queries, k={args.k}")
+    for name, quantizer in quantizers.items():
+        start = time.perf_counter()
+        quantizer.fit(vectors[rng.choice(args.rows,
+                                         min(args.sample, args.rows),
+                                         replace=False)])
+        codes = quantizer.encode(vectors)
+        elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        scores = quantizer.dot(queries, codes) / quantizer.norms(codes)
+        searched = time.perf_counter() - start
+        found = top_k(scores, args.k)
+        recall = numpy.mean([
+            len(set(exact[i]) & set(found[i])) / args.k
+            for i in range(args.queries)
+        ])
+        print(f"  {name:14} {codes.nbytes / 2**20:8.1f} MiB "
+              f"({1 - codes.nbytes / size:6.1%} saved)   "
+              f"recall@{args.k} {recall:.3f}   "
+              f"encode {elapsed:6.2f} s   search {searched:6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Measures decoding a large EmbeddingModelResponse body when the status check
+and the model construction each decode it (the previous behavior) against a
+single decode.
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_response_parse.py [--inputs N]
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Callable, Dict, Optional
+
+from replit.ai.modelfarm import AsyncModelfarm, Modelfarm
+from replit.ai.modelfarm.structs.embeddings import EmbeddingModelResponse
+from replit.tests.ai.modelfarm.stand_in_server import (
+    EMBEDDING_DIMENSIONS,
+    StandInServer,
+    patched_identity_environ,
+)
+from requests import Response
+
+REPEAT = 10
+
+
+def embedding_body(inputs: int) -> bytes:
+    return json.dumps({
+        "object":
+        "list",
+        "model":
+        "textembedding-gecko",
+        "data": [{
+            "object":
+            "embedding",
+            "index":
+            i,
+            "embedding":
+            [0.123456789 * j for j in range(EMBEDDING_DIMENSIONS)],
+            "metadata":
+            None,
+        } for i in range(inputs)],
+        "usage":
+        None,
+        "metadata":
+        None,
+    }).encode()
+
+
+def make_response(body: bytes) -> Response:
+    response = Response()
+    response.status_code = 200
+    response._content = body
+    return response
+
+
+def timed(fn: Callable[[], Any]) -> float:
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        fn()
+    return (time.perf_counter() - start) / REPEAT * 1000
+
+
+def bench_sync(client: Modelfarm, body: bytes) -> None:
+
+    def double_decode() -> EmbeddingModelResponse:
+        response = make_response(body)
+        response.json()
+        return EmbeddingModelResponse(**response.json())
+
+    def single_decode() -> EmbeddingModelResponse:
+        response = make_response(body)
+        client._check_response(response)
+        return EmbeddingModelResponse(**client._decode_response(response))
+
+    print(f"  Modelfarm double decode: {timed(double_decode):8.1f} ms")
+    print(f"  Modelfarm single decode: {timed(single_decode):8.1f} ms")
+
+
+class DoubleDecodeAsyncModelfarm(AsyncModelfarm):
+    """Decodes successful bodies twice, as the client previously did."""
+
+    async def _post_json(self,
+                         path: str,
+                         payload: Optional[Dict[str, Any]] = None,
+                         deadline: Optional[float] = None,
+                         **kwargs) -> Any:
+        async with self._post(path,
+                              payload=payload,
+                              call=self.timeout.start(deadline),
+                              **kwargs) as response:
+            await response.json()
+            return await response.json()
+
+
+async def bench_async(server: StandInServer, inputs: int) -> None:
+    for name, cls in (("double", DoubleDecodeAsyncModelfarm),
+                      ("single", AsyncModelfarm)):
+        async with cls(base_url=server.url) as client:
+            start = time.perf_counter()
+            for _ in range(REPEAT):
+                await client.embeddings.create(input=["x"] * inputs,
+                                               model="textembedding-gecko")
+            elapsed = (time.perf_counter() - start) / REPEAT * 1000
+        print(f"  AsyncModelfarm {name} decode, end to end: "
+              f"{elapsed:8.1f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--inputs", type=int, default=1000)
+    args = parser.parse_args()
+
+    body = embedding_body(args.inputs)
+    print(f"{args.inputs} x {EMBEDDING_DIMENSIONS} embeddings, "
+          f"{len(body) / 2**20:.1f} MB body")
+    with patched_identity_environ(), StandInServer() as server:
+        with Modelfarm(base_url=server.url) as client:
+            bench_sync(client, body)
+        asyncio.run(bench_async(server, args.inputs))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Measures EmbeddingStore on a synthetic corpus: the rate of crash-safe
+appends, the time to open the store, the latency of searches scanning the
+mapped file, and the time to compact it after deleting a tenth of the ids.
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_store.py [--rows N]
+        [--dimensions D] [--batch B] [--queries Q] [--directory PATH]
+"""
+import argparse
+import tempfile
+import time
+
+import numpy
+from replit.ai.modelfarm.store import EmbeddingStore
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--directory", default=None)
+    args = parser.parse_args()
+
+    rng = numpy.random.default_rng(0)
+    with tempfile.TemporaryDirectory(dir=args.directory) as directory:
+        store = EmbeddingStore(directory)
+        start = time.perf_counter()
+        for offset in range(0, args.rows, args.batch):
+            size = min(args.batch, args.rows - offset)
+            store.add([str(i) for i in range(offset, offset + size)],
+                      rng.normal(size=(size,
+                                       args.dimensions)).astype(numpy.float32))
+        elapsed = time.perf_counter() - start
+        size = args.rows * args.dimensions * 4 / 2**20
+        print(f"{args.rows} x {args.dimensions} rows ({size:.0f} MiB)")
+        print(f"  append   {args.rows / elapsed:10.0f} rows/s "
+              f"({size / elapsed:.0f} MiB/s)")
+
+        start = time.perf_counter()
+        store = EmbeddingStore(directory)
+        print(f"  open     {(time.perf_counter() - start) * 1000:10.1f} ms")
+
+        queries = rng.normal(size=(args.queries,
+                                   args.dimensions)).astype(numpy.float32)
+        start = time.perf_counter()
+        store.search(queries, k=10)
+        elapsed = time.perf_counter() - start
+        print(f"  search   {elapsed / args.queries * 1000:10.3f} ms/query "
+              "(batched)")
+
+        store.delete([str(i) for i in range(0, args.rows, 10)])
+        start = time.perf_counter()
+        store.compact()
+        print(f"  compact  {time.perf_counter() - start:10.2f} s")
+
+
+if __name__ == "__main__":
+    main()
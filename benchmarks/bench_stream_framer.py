@@ -0,0 +1,154 @@
+"""
+Compares the previous re-decoding stream parser with JSONStreamFramer, first
+on in-memory streams and then end to end through both clients against the
+local stand-in server.
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_stream_framer.py [--megabytes N]
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Iterable, Iterator
+
+from replit.ai.modelfarm import AsyncModelfarm, Modelfarm
+from replit.ai.modelfarm.streaming import JSONStreamFramer
+from replit.tests.ai.modelfarm.stand_in_server import (
+    StandInServer,
+    patched_identity_environ,
+)
+
+READ_SIZE = 128
+
+
+def legacy_parse(chunks: Iterable[bytes]) -> Iterator[Any]:
+    """The parser previously used by _parse_streaming_response."""
+    buffer = b""
+    decoder = json.JSONDecoder()
+    for chunk in chunks:
+        buffer += chunk
+        buffer_str = buffer.decode("utf-8")
+
+        start_idx = 0
+        while start_idx < len(buffer_str):
+            try:
+                json_obj, end_idx = decoder.raw_decode(buffer_str, start_idx)
+                yield json_obj
+                start_idx = end_idx
+            except json.JSONDecodeError:
+                break
+        buffer = buffer[start_idx:]
+
+
+def framer_parse(chunks: Iterable[bytes]) -> Iterator[Any]:
+    framer = JSONStreamFramer()
+    for chunk in chunks:
+        yield from framer.feed(chunk)
+    framer.close()
+
+
+def make_stream(total_bytes: int, object_bytes: int) -> bytes:
+    obj = json.dumps({"choices": [{"text": "x" * object_bytes}]}).encode()
+    return obj * max(1, total_bytes // len(obj))
+
+
+def split(stream: bytes, size: int) -> Iterator[bytes]:
+    for i in range(0, len(stream), size):
+        yield stream[i:i + size]
+
+
+def bench_in_memory(megabytes: int) -> None:
+    print(f"In-memory, {megabytes} MB, {READ_SIZE}-byte reads")
+    for object_bytes in (200, 16 * 1024, 256 * 1024):
+        stream = make_stream(megabytes * 2**20, object_bytes)
+        for name, parse in (("legacy", legacy_parse), ("framer",
+                                                       framer_parse)):
+            start = time.perf_counter()
+            count = sum(1 for _ in parse(split(stream, READ_SIZE)))
+            elapsed = time.perf_counter() - start
+            print(
+                f"  {object_bytes:>7}-byte objects {name}: "
+                f"{len(stream) / 2**20 / elapsed:8.1f} MB/s ({count} objects)")
+
+
+class LegacyModelfarm(Modelfarm):
+
+    def _parse_streaming_response(self, response) -> Iterator[Any]:
+        return legacy_parse(
+            response.iter_content(chunk_size=self.stream_chunk_size))
+
+
+class LegacyAsyncModelfarm(AsyncModelfarm):
+
+    async def _parse_streaming_response(self, response):
+        buffer = b""
+        decoder = json.JSONDecoder()
+        while True:
+            chunk = await response.content.read(self.stream_chunk_size)
+            if not chunk:
+                break
+            buffer += chunk
+            buffer_str = buffer.decode("utf-8")
+
+            start_idx = 0
+            while start_idx < len(buffer_str):
+                try:
+                    json_obj, end_idx = decoder.raw_decode(
+                        buffer_str, start_idx)
+                    yield json_obj
+                    start_idx = end_idx
+                except json.JSONDecodeError:
+                    break
+            buffer = buffer[start_idx:]
+
+
+def bench_clients(megabytes: int) -> None:
+    word_size = 16 * 1024
+    max_tokens = megabytes * 2**20 // word_size
+    print(f"End to end, {megabytes} MB stream of {word_size}-byte chunks")
+    with patched_identity_environ(), StandInServer() as server:
+        server.word_size = word_size
+        for name, cls in (("legacy", LegacyModelfarm), ("framer", Modelfarm)):
+            with cls(base_url=server.url) as client:
+                start = time.perf_counter()
+                count = sum(
+                    1
+                    for _ in client.completions.create(prompt="",
+                                                       model="text-bison",
+                                                       stream=True,
+                                                       max_tokens=max_tokens))
+                elapsed = time.perf_counter() - start
+            print(f"  Modelfarm {name}: {megabytes / elapsed:8.1f} MB/s "
+                  f"({count} chunks)")
+
+        async def run(name: str, cls) -> None:
+            async with cls(base_url=server.url,
+                           stream_chunk_size=READ_SIZE) as client:
+                start = time.perf_counter()
+                count = 0
+                async for _ in await client.completions.create(
+                        prompt="",
+                        model="text-bison",
+                        stream=True,
+                        max_tokens=max_tokens):
+                    count += 1
+                elapsed = time.perf_counter() - start
+            print(f"  AsyncModelfarm {name}: {megabytes / elapsed:8.1f} MB/s "
+                  f"({count} chunks)")
+
+        for name, cls in (("legacy", LegacyAsyncModelfarm), ("framer",
+                                                             AsyncModelfarm)):
+            asyncio.run(run(name, cls))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--megabytes", type=int, default=4)
+    args = parser.parse_args()
+    bench_in_memory(args.megabytes)
+    bench_clients(args.megabytes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    TypeVar,
+)
+
+from replit.ai.modelfarm.chunks import ChunkView
+from replit.ai.modelfarm.structs.chat import (
+    ChatCompletionResponse,
+    Choice,
+    ChoiceMessage,
+    FunctionCall,
+    ToolCall,
+)
+
+ChunkT = TypeVar("ChunkT")
+
+
+@dataclass
+class _ToolCallParts:
+    id: Optional[str] = None
+    type: Optional[str] = None
+    name: List[str] = field(default_factory=list)
+    arguments: List[str] = field(default_factory=list)
+
+    def build(self) -> ToolCall:
+        return ToolCall(id=self.id or "",
+                        type=self.type or "function",
+                        function=FunctionCall(
+                            name="".join(self.name),
+                            arguments="".join(self.arguments),
+                        ))
+
+
+@dataclass
+class _ChoiceParts:
+    role: Optional[str] = None
+    content: List[str] = field(default_factory=list)
+    finish_reason: Optional[str] = None
+    metadata: Optional[Dict[str, Any]] = None
+    tool_calls: Dict[int, _ToolCallParts] = field(default_factory=dict)
+
+    def build(self, index: int) -> Choice:
+        tool_calls = [
+            call.build() for _, call in sorted(self.tool_calls.items())
+        ]
+        # A reply made only of tool calls has no content, as without
+        # streaming.
+        content = None
+        if self.content or not tool_calls:
+            content = "".join(self.content)
+        return Choice(index=index,
+                      finish_reason=self.finish_reason,
+                      metadata=self.metadata,
+                      message=ChoiceMessage(role=self.role or "assistant",
+                                            content=content,
+                                            tool_calls=tool_calls or None))
+
+
+class ChatCompletionAccumulator:
+    """
+    Merges the chunks of a chat completion stream into the response the
+    same request would have returned without streaming.
+
+    The text of each choice is kept as a list of the fragments of its
+    deltas, joined once when read, and tool calls are assembled from their
+    fragments by index, or by id for complete tool calls without one.
+    Chunks are accepted in every chunk mode: models, dicts and views.
+
+    wrap() and awrap() add the chunks of an iterator as they are passed
+    through, so that they can still be shown as they arrive.
+    """
+
+    def __init__(self) -> None:
+        self.id: Optional[str] = None
+        self.model: Optional[str] = None
+        self.created: Optional[int] = None
+        self.usage: Optional[Any] = None
+        self.metadata: Optional[Any] = None
+        self.chunks = 0
+        self._choices: Dict[int, _ChoiceParts] = {}
+
+    def add(self, chunk: Any) -> None:
+        """
+        Merges a chunk into the response.
+
+        Args:
+            chunk (Any): A chunk of the stream, as a
+                ChatCompletionStreamChunkResponse, a dict or a ChunkView.
+        """
+        if isinstance(chunk, ChunkView):
+            chunk = chunk.to_dict()
+        self.chunks += 1
+        if self.id is None:
+            self.id = _get(chunk, "id")
+            self.model = _get(chunk, "model")
+            self.created = _get(chunk, "created")
+        usage = _get(chunk, "usage")
+        if usage is not None:
+            self.usage = usage
+        metadata = _get(chunk, "metadata")
+        if metadata is not None:
+            self.metadata = metadata
+        for choice in _get(chunk, "choices") or ():
+            index = _get(choice, "index") or 0
+            parts = self._choices.get(index)
+            if parts is None:
+                parts = self._choices[index] = _ChoiceParts()
+            finish_reason = _get(choice, "finish_reason")
+            if finish_reason is not None:
+                parts.finish_reason = finish_reason
+            metadata = _get(choice, "metadata")
+            if metadata is not None:
+                parts.metadata = metadata
+            delta = _get(choice, "delta")
+            if delta is None:
+                continue
+            if parts.role is None:
+                parts.role = _get(delta, "role")
+            content = _get(delta, "content")
+            if content:
+                parts.content.append(content)
+            for tool_call in _get(delta, "tool_calls") or ():
+                _add_tool_call(parts.tool_calls, tool_call)
+
+    def wrap(self, chunks: Iterable[ChunkT]) -> Iterator[ChunkT]:
+        """
+        Adds the chunks of a stream as they are read.
+
+        Args:
+            chunks (Iterable[ChunkT]): The stream.
+
+        Returns:
+            Iterator[ChunkT]: The chunks of the stream, unchanged.
+        """
+        for chunk in chunks:
+            self.add(chunk)
+            yield chunk
+
+    async def awrap(self,
+                    chunks: AsyncIterable[ChunkT]) -> AsyncIterator[ChunkT]:
+        """
+        Adds the chunks of an asynchronous stream as they are read.
+
+        Args:
+            chunks (AsyncIterable[ChunkT]): The stream.
+
+        Returns:
+            AsyncIterator[ChunkT]: The chunks of the stream, unchanged.
+        """
+        async for chunk in chunks:
+            self.add(chunk)
+            yield chunk
+
+    def text(self, index: int = 0) -> str:
+        """
+        Gets the text of a choice so far. Each call joins its fragments.
+
+        Args:
+            index (int): The index of the choice. Defaults to 0.
+
+        Returns:
+            str: The text, empty for an unknown choice.
+        """
+        parts = self._choices.get(index)
+        return "".join(parts.content) if parts is not None else ""
+
+    def response(self) -> ChatCompletionResponse:
+        """
+        Builds the response from the chunks added.
+
+        Returns:
+            ChatCompletionResponse: The response.
+        """
+        choices = [
+            self._choices[index].build(index)
+            for index in sorted(self._choices)
+        ]
+        return ChatCompletionResponse(id=self.id or "",
+                                      choices=choices,
+                                      model=self.model or "",
+                                      created=self.created,
+                                      usage=self.usage,
+                                      metadata=self.metadata)
+
+
+def _get(value: Any, name: str) -> Any:
+    if isinstance(value, dict):
+        return value.get(name)
+    return getattr(value, name, None)
+
+
+def _add_tool_call(tool_calls: Dict[int, _ToolCallParts],
+                   tool_call: Any) -> None:
+    # Fragments of a tool call share its index. Complete tool calls may come
+    # without one, and are told apart by their id.
+    index = _get(tool_call, "index")
+    id = _get(tool_call, "id")
+    if index is None:
+        index = next((i for i, call in tool_calls.items()
+                      if id is not None and call.id == id),
+                     max(tool_calls, default=-1) + 1)
+    call = tool_calls.get(index)
+    if call is None:
+        call = tool_calls[index] = _ToolCallParts()
+    if id:
+        call.id = id
+    type = _get(tool_call, "type")
+    if type:
+        call.type = type
+    function = _get(tool_call, "function")
+    if function is not None:
+        name = _get(function, "name")
+        if name:
+            call.name.append(name)
+        arguments = _get(function, "arguments")
+        if arguments:
+            call.arguments.append(arguments)
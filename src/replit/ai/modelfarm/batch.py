@@ -0,0 +1,287 @@
+import asyncio
+import concurrent.futures
+from dataclasses import dataclass, field
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+    Set,
+    Tuple,
+)
+
+if TYPE_CHECKING:
+    from replit.ai.modelfarm import AsyncModelfarm, Modelfarm
+
+# The resources a batch request may target, mapped to the attribute path of
+# their create method on a client.
+RESOURCES: Dict[str, Tuple[str, ...]] = {
+    "chat": ("chat", "completions"),
+    "completions": ("completions", ),
+    "embeddings": ("embeddings", ),
+}
+
+# In ordered mode, the number of requests in flight or held back is limited
+# to this many times the concurrency, so that a slow request does not let
+# the results after it pile up.
+ORDERED_BUFFER = 4
+
+
+@dataclass
+class BatchRequest:
+    """
+    One request of a batch.
+
+    Attributes:
+        resource (str): "chat", "completions" or "embeddings".
+        params (Dict[str, Any]): The keyword arguments of the resource's
+            create method. Streaming is not supported.
+    """
+
+    resource: str
+    params: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def chat(cls, **params: Any) -> "BatchRequest":
+        return cls("chat", params)
+
+    @classmethod
+    def completion(cls, **params: Any) -> "BatchRequest":
+        return cls("completions", params)
+
+    @classmethod
+    def embedding(cls, **params: Any) -> "BatchRequest":
+        return cls("embeddings", params)
+
+
+@dataclass
+class BatchResult:
+    """
+    The outcome of one request of a batch.
+
+    Attributes:
+        index (int): The position of the request in the batch.
+        request (BatchRequest): The request.
+        response (Any): The response, or None if the request failed.
+        error (Optional[Exception]): The exception raised by the request, or
+            None if it succeeded.
+    """
+
+    index: int
+    request: BatchRequest
+    response: Any = None
+    error: Optional[Exception] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class BatchProgress:
+    """
+    The progress of a batch, passed to its progress callback after each
+    request finishes.
+
+    Attributes:
+        completed (int): The number of requests finished, failed or not.
+        failed (int): The number of requests that failed.
+        total (Optional[int]): The number of requests in the batch, if the
+            requests were given as a sized collection.
+    """
+
+    completed: int = 0
+    failed: int = 0
+    total: Optional[int] = None
+
+
+ProgressCallback = Callable[[BatchProgress], None]
+
+
+def _create_method(client: Any, request: BatchRequest) -> Callable[..., Any]:
+    """
+    Gets the create method a request is sent with.
+
+    Raises:
+        ValueError: If the resource is unknown or the request is streamed.
+    """
+    path = RESOURCES.get(request.resource)
+    if path is None:
+        raise ValueError(f"Unknown batch resource: {request.resource!r}")
+    if request.params.get("stream"):
+        raise ValueError("Streaming requests cannot be batched")
+    target = client
+    for name in path:
+        target = getattr(target, name)
+    return target.create
+
+
+def _total(requests: Iterable[BatchRequest]) -> Optional[int]:
+    try:
+        return len(requests)  # type: ignore[arg-type]
+    except TypeError:
+        return None
+
+
+def _record(progress: BatchProgress, result: BatchResult,
+            on_progress: Optional[ProgressCallback]) -> None:
+    progress.completed += 1
+    if result.error is not None:
+        progress.failed += 1
+    if on_progress is not None:
+        on_progress(progress)
+
+
+def run_batch(
+    client: "Modelfarm",
+    requests: Iterable[BatchRequest],
+    concurrency: int = 8,
+    ordered: bool = True,
+    on_progress: Optional[ProgressCallback] = None,
+) -> Iterator[BatchResult]:
+    """
+    Sends a batch of requests from a pool of threads.
+
+    Requests are read from the iterable as slots free up, so a batch may be
+    a generator of any length. An exception raised by a request is captured
+    in its result and does not affect the rest of the batch.
+
+    Args:
+        client (Modelfarm): The client to send the requests with.
+        requests (Iterable[BatchRequest]): The requests to send.
+        concurrency (int): The number of requests in flight at once.
+            Defaults to 8.
+        ordered (bool): Whether to yield results in the order of the
+            requests, holding back those that finish early, up to
+            ORDERED_BUFFER times the concurrency, after which no request is
+            sent until the oldest one finishes. Otherwise results are
+            yielded as they finish. Defaults to True.
+        on_progress (Optional[ProgressCallback]): Called with the progress
+            of the batch after each request finishes.
+
+    Yields:
+        BatchResult: The result of each request.
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+    progress = BatchProgress(total=_total(requests))
+    items = enumerate(requests)
+    pending: Dict[concurrent.futures.Future, int] = {}
+    done: Dict[int, BatchResult] = {}
+    next_index = 0
+    limit = concurrency * ORDERED_BUFFER if ordered else concurrency
+
+    def call(index: int, request: BatchRequest) -> BatchResult:
+        try:
+            response = _create_method(client, request)(**request.params)
+        except Exception as e:
+            return BatchResult(index, request, error=e)
+        return BatchResult(index, request, response)
+
+    with concurrent.futures.ThreadPoolExecutor(concurrency) as executor:
+        try:
+            while True:
+                if len(pending) + len(done) < limit:
+                    for index, request in items:
+                        pending[executor.submit(call, index, request)] = index
+                        if (len(pending) >= concurrency
+                                or len(pending) + len(done) >= limit):
+                            break
+                if not pending:
+                    break
+                finished, _ = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    del pending[future]
+                    result = future.result()
+                    _record(progress, result, on_progress)
+                    if not ordered:
+                        yield result
+                    else:
+                        done[result.index] = result
+                while next_index in done:
+                    yield done.pop(next_index)
+                    next_index += 1
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+async def run_batch_async(
+    client: "AsyncModelfarm",
+    requests: Iterable[BatchRequest],
+    concurrency: int = 16,
+    ordered: bool = True,
+    on_progress: Optional[ProgressCallback] = None,
+) -> AsyncIterator[BatchResult]:
+    """
+    Sends a batch of requests concurrently on the running event loop.
+
+    Requests are read from the iterable as slots free up, so a batch may be
+    a generator of any length. An exception raised by a request is captured
+    in its result and does not affect the rest of the batch. Requests still
+    in flight are cancelled if the caller stops iterating early.
+
+    Args:
+        client (AsyncModelfarm): The client to send the requests with.
+        requests (Iterable[BatchRequest]): The requests to send.
+        concurrency (int): The number of requests in flight at once.
+            Defaults to 16.
+        ordered (bool): Whether to yield results in the order of the
+            requests, holding back those that finish early, up to
+            ORDERED_BUFFER times the concurrency, after which no request is
+            sent until the oldest one finishes. Otherwise results are
+            yielded as they finish. Defaults to True.
+        on_progress (Optional[ProgressCallback]): Called with the progress
+            of the batch after each request finishes.
+
+    Yields:
+        BatchResult: The result of each request.
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+    progress = BatchProgress(total=_total(requests))
+    items = enumerate(requests)
+    pending: Set["asyncio.Task[BatchResult]"] = set()
+    done: Dict[int, BatchResult] = {}
+    next_index = 0
+    limit = concurrency * ORDERED_BUFFER if ordered else concurrency
+
+    async def call(index: int, request: BatchRequest) -> BatchResult:
+        try:
+            response = await _create_method(client, request)(**request.params)
+        except Exception as e:
+            return BatchResult(index, request, error=e)
+        return BatchResult(index, request, response)
+
+    try:
+        while True:
+            if len(pending) + len(done) < limit:
+                for index, request in items:
+                    pending.add(asyncio.ensure_future(call(index, request)))
+                    if (len(pending) >= concurrency
+                            or len(pending) + len(done) >= limit):
+                        break
+            if not pending:
+                break
+            finished, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                result = task.result()
+                _record(progress, result, on_progress)
+                if not ordered:
+                    yield result
+                else:
+                    done[result.index] = result
+            while next_index in done:
+                yield done.pop(next_index)
+                next_index += 1
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
@@ -0,0 +1,191 @@
+import abc
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+
+def request_key(url: str, payload: Optional[Dict[str, Any]]) -> str:
+    """
+    Hashes a request.
+
+    The payload is serialized with sorted keys, so payloads that only differ
+    in the order of their keys hash the same.
+
+    Args:
+        url (str): The URL the request is posted to.
+        payload (Optional[Dict[str, Any]]): The request payload.
+
+    Returns:
+        str: The hex SHA-256 digest of the URL and payload.
+    """
+    body = json.dumps(payload,
+                      sort_keys=True,
+                      separators=(",", ":"),
+                      ensure_ascii=False,
+                      default=str)
+    digest = hashlib.sha256(url.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(body.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def is_deterministic(payload: Optional[Dict[str, Any]]) -> bool:
+    """
+    Checks whether a request is expected to get the same response every
+    time: it is not sampled, or sampled with a temperature of 0.
+    """
+    return payload is not None and not payload.get("temperature")
+
+
+@dataclass
+class CacheStats:
+    """
+    Counts the lookups made in a response cache.
+
+    Attributes:
+        hits (int): The number of lookups that found a response.
+        misses (int): The number of lookups that did not.
+        evictions (int): The number of responses dropped to make room or
+            because they expired.
+    """
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class ResponseCache(abc.ABC):
+    """
+    Stores the decoded responses of deterministic requests, so that repeated
+    requests are answered without calling Modelfarm.
+
+    Non-streaming requests store their decoded body and streaming requests
+    the list of their decoded chunks, which are replayed on a hit. A stream
+    is only stored once it has been read to the end.
+
+    Subclasses implement get() and set(), and may override cacheable() to
+    choose which requests are cached. Cached values are shared between
+    callers and must not be modified.
+    """
+
+    def __init__(self) -> None:
+        self.stats = CacheStats()
+
+    def cacheable(self, payload: Optional[Dict[str, Any]]) -> bool:
+        """
+        Checks whether the response to a request may be cached.
+
+        Args:
+            payload (Optional[Dict[str, Any]]): The request payload.
+
+        Returns:
+            bool: Whether the request is deterministic.
+        """
+        return is_deterministic(payload)
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Looks up a response.
+
+        Args:
+            key (str): The hash of the request.
+
+        Returns:
+            Optional[Any]: The cached response, or None.
+        """
+
+    @abc.abstractmethod
+    def set(self, key: str, value: Any, size: int) -> None:
+        """
+        Stores a response.
+
+        Args:
+            key (str): The hash of the request.
+            value (Any): The decoded response.
+            size (int): The size of the encoded response in bytes.
+        """
+
+
+class InMemoryCache(ResponseCache):
+    """
+    A thread-safe response cache held in memory, bounded by its number of
+    entries and their total size, evicting the least recently used entries
+    first. Entries may also expire after a fixed time.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 64 * 2**20,
+        ttl: Optional[float] = None,
+    ) -> None:
+        """
+        Initializes a new instance of the InMemoryCache class.
+
+        Args:
+            max_entries (int): The maximum number of responses stored.
+                Defaults to 1024.
+            max_bytes (int): The maximum total size of the responses stored,
+                as encoded JSON. Larger responses are not stored. Defaults
+                to 64 MiB.
+            ttl (Optional[float]): Seconds a response is used for. None keeps
+                responses until they are evicted. Defaults to None.
+        """
+        super().__init__()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes = 0
+        # key -> (value, size, expiry), least recently used first.
+        self._entries: "OrderedDict[str, Tuple[Any, int, Optional[float]]]" = (
+            OrderedDict())
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is not None and entry[
+                    2] <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return entry[0]
+
+    def set(self, key: str, value: Any, size: int) -> None:
+        if size > self.max_bytes:
+            return
+        expiry = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size, expiry)
+            self.bytes += size
+            while (len(self._entries) > self.max_entries
+                   or self.bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def _remove(self, key: str) -> None:
+        self.bytes -= self._entries.pop(key)[1]
+        self.stats.evictions += 1
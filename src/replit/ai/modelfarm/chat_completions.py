@@ -2,6 +2,7 @@ from typing import (
     TYPE_CHECKING,
     Any,
     AsyncIterator,
+    Callable,
     Dict,
     Iterator,
     List,
@@ -11,6 +12,7 @@ from typing import (
     overload,
 )
 
+from replit.ai.modelfarm.chunks import ChunkMode, ChunkView, chunk_converter
 from replit.ai.modelfarm.structs.chat import (
     ChatCompletionMessageRequestParam,
     ChatCompletionResponse,
@@ -40,10 +42,44 @@ class Completions:
         max_tokens: Optional[int] = 1024,
         temperature: float = 0.2,
         provider_extra_parameters: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        chunks: Literal["model", "construct"] = "model",
         **kwargs: Any,
     ) -> Iterator[ChatCompletionStreamChunkResponse]:
         ...
 
+    @overload
+    def create(
+        self,
+        *,
+        messages: List[ChatCompletionMessageRequestParam],
+        model: str,
+        stream: Literal[True],
+        max_tokens: Optional[int] = 1024,
+        temperature: float = 0.2,
+        provider_extra_parameters: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        chunks: Literal["dict"],
+        **kwargs: Any,
+    ) -> Iterator[Dict[str, Any]]:
+        ...
+
+    @overload
+    def create(
+        self,
+        *,
+        messages: List[ChatCompletionMessageRequestParam],
+        model: str,
+        stream: Literal[True],
+        max_tokens: Optional[int] = 1024,
+        temperature: float = 0.2,
+        provider_extra_parameters: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        chunks: Literal["view"],
+        **kwargs: Any,
+    ) -> Iterator[ChunkView]:
+        ...
+
     @overload
     def create(
         self,
@@ -54,6 +90,8 @@ class Completions:
         max_tokens: Optional[int] = 1024,
         temperature: float = 0.2,
         provider_extra_parameters: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        chunks: ChunkMode = "model",
         **kwargs: Any,
     ) -> ChatCompletionResponse:
         ...
@@ -67,9 +105,12 @@ class Completions:
         max_tokens: Optional[int] = 1024,
         temperature: float = 0.2,
         provider_extra_parameters: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        chunks: ChunkMode = "model",
         **kwargs: Any,
     ) -> Union[ChatCompletionResponse,
-               Iterator[ChatCompletionStreamChunkResponse]]:
+               Iterator[ChatCompletionStreamChunkResponse], Iterator[Dict[
+                   str, Any]], Iterator[ChunkView]]:
         """
         Makes a generation based on the messages and parameters.
 
@@ -83,9 +124,18 @@ class Completions:
             temperature (float): The temperature of the generation. Defaults to 0.2.
             provider_extra_parameters (Optional[Dict[str, Any]]): Extra parameters
                 of the speficic provider. Defaults to None.
+            deadline (Optional[float]): Seconds the whole call may take,
+                including retries and reading a stream. Defaults to the
+                deadline of the client's timeout.
+            chunks (ChunkMode): How the chunks of a stream are returned.
+                "model" validates each chunk, "construct" builds its model
+                without validation, "dict" returns the decoded chunks and
+                "view" a ChunkView of each, validated only when asked.
+                Defaults to "model".
 
         Returns:
-          If stream is True, returns an iterator of ChatCompletionStreamChunkResponse.
+          If stream is True, returns an iterator of ChatCompletionStreamChunkResponse,
+          or of the chunks in the form chosen by chunks.
           Otherwise, returns a ChatCompletionResponse.
 
         """
@@ -96,6 +146,9 @@ class Completions:
                 max_tokens=max_tokens,
                 temperature=temperature,
                 provider_extra_parameters=provider_extra_parameters,
+                deadline=deadline,
+                convert=chunk_converter(ChatCompletionStreamChunkResponse,
+                                        chunks),
                 **kwargs,
             )
         return self.__chat(
@@ -104,6 +157,7 @@ class Completions:
             max_tokens=max_tokens,
             temperature=temperature,
             provider_extra_parameters=provider_extra_parameters,
+            deadline=deadline,
             **kwargs,
         )
 
@@ -114,9 +168,10 @@ class Completions:
         max_tokens: Optional[int],
         temperature: float,
         provider_extra_parameters: Optional[Dict[str, Any]],
+        deadline: Optional[float],
         **kwargs: Any,
     ) -> ChatCompletionResponse:
-        response = self._client._post(
+        rjson = self._client._post_json(
             "/v1beta2/chat/completions",
             payload=_build_request_payload(
                 messages=messages,
@@ -127,9 +182,9 @@ class Completions:
                 provider_extra_parameters=provider_extra_parameters,
                 **kwargs,
             ),
+            deadline=deadline,
         )
-        self._client._check_response(response)
-        return ChatCompletionResponse(**response.json())
+        return ChatCompletionResponse(**rjson)
 
     def __chat_stream(
         self,
@@ -138,27 +193,27 @@ class Completions:
         max_tokens: Optional[int],
         temperature: float,
         provider_extra_parameters: Optional[Dict[str, Any]],
+        deadline: Optional[float],
+        convert: Callable[[Dict[str, Any]], Any],
         **kwargs: Any,
-    ) -> Iterator[ChatCompletionStreamChunkResponse]:
+    ) -> Iterator[Any]:
         """
         Create a stream of ChatCompletionStreamChunkResponse
         """
-        response = self._client._post(
-            "/v1beta2/chat/completions",
-            payload=_build_request_payload(
-                messages=messages,
-                model=model,
-                max_tokens=max_tokens,
-                temperature=temperature,
-                stream=True,
-                provider_extra_parameters=provider_extra_parameters,
-                **kwargs,
-            ),
-            stream=True,
-        )
-        self._client._check_streaming_response(response)
-        for chunk in self._client._parse_streaming_response(response):
-            yield ChatCompletionStreamChunkResponse(**chunk)
+        for chunk in self._client._post_stream(
+                "/v1beta2/chat/completions",
+                payload=_build_request_payload(
+                    messages=messages,
+                    model=model,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    stream=True,
+                    provider_extra_parameters=provider_extra_parameters,
+                    **kwargs,
+                ),
+                deadline=deadline,
+        ):
+            yield convert(chunk)
 
 
 class AsyncCompletions:
@@ -179,10 +234,44 @@ class AsyncCompletions:
         max_tokens: Optional[int] = 1024,
         temperature: float = 0.2,
         provider_extra_parameters: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        chunks: Literal["model", "construct"] = "model",
         **kwargs: Any,
     ) -> AsyncIterator[ChatCompletionStreamChunkResponse]:
         ...
 
+    @overload
+    async def create(
+        self,
+        messages: List[ChatCompletionMessageRequestParam],
+        model: str,
+        stream: Literal[True],
+        max_tokens: Optional[int] = 1024,
+        temperature: float = 0.2,
+        provider_extra_parameters: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        *,
+        chunks: Literal["dict"],
+        **kwargs: Any,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        ...
+
+    @overload
+    async def create(
+        self,
+        messages: List[ChatCompletionMessageRequestParam],
+        model: str,
+        stream: Literal[True],
+        max_tokens: Optional[int] = 1024,
+        temperature: float = 0.2,
+        provider_extra_parameters: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        *,
+        chunks: Literal["view"],
+        **kwargs: Any,
+    ) -> AsyncIterator[ChunkView]:
+        ...
+
     @overload
     async def create(
         self,
@@ -192,6 +281,8 @@ class AsyncCompletions:
         max_tokens: Optional[int] = 1024,
         temperature: float = 0.2,
         provider_extra_parameters: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        chunks: ChunkMode = "model",
         **kwargs: Any,
     ) -> ChatCompletionResponse:
         ...
@@ -204,9 +295,12 @@ class AsyncCompletions:
         max_tokens: Optional[int] = 1024,
         temperature: float = 0.2,
         provider_extra_parameters: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        chunks: ChunkMode = "model",
         **kwargs: Any,
     ) -> Union[ChatCompletionResponse,
-               AsyncIterator[ChatCompletionStreamChunkResponse]]:
+               AsyncIterator[ChatCompletionStreamChunkResponse],
+               AsyncIterator[Dict[str, Any]], AsyncIterator[ChunkView]]:
         """
         Makes a generation based on the messages and parameters.
 
@@ -220,9 +314,18 @@ class AsyncCompletions:
             temperature (float): The temperature of the generation. Defaults to 0.2.
             provider_extra_parameters (Optional[Dict[str, Any]]): Extra parameters
                 of the speficic provider. Defaults to None.
+            deadline (Optional[float]): Seconds the whole call may take,
+                including retries and reading a stream. Defaults to the
+                deadline of the client's timeout.
+            chunks (ChunkMode): How the chunks of a stream are returned.
+                "model" validates each chunk, "construct" builds its model
+                without validation, "dict" returns the decoded chunks and
+                "view" a ChunkView of each, validated only when asked.
+                Defaults to "model".
 
         Returns:
-          If stream is True, returns an iterator of ChatCompletionStreamChunkResponse.
+          If stream is True, returns an iterator of ChatCompletionStreamChunkResponse,
+          or of the chunks in the form chosen by chunks.
           Otherwise, returns a ChatCompletionResponse.
 
         """
@@ -233,6 +336,9 @@ class AsyncCompletions:
                 max_tokens=max_tokens,
                 temperature=temperature,
                 provider_extra_parameters=provider_extra_parameters,
+                deadline=deadline,
+                convert=chunk_converter(ChatCompletionStreamChunkResponse,
+                                        chunks),
                 **kwargs,
             )
         return await self.__chat(
@@ -241,6 +347,7 @@ class AsyncCompletions:
             max_tokens=max_tokens,
             temperature=temperature,
             provider_extra_parameters=provider_extra_parameters,
+            deadline=deadline,
             **kwargs,
         )
 
@@ -251,22 +358,23 @@ class AsyncCompletions:
         max_tokens: Optional[int],
         temperature: float,
         provider_extra_parameters: Optional[Dict[str, Any]],
+        deadline: Optional[float],
         **kwargs: Any,
     ) -> ChatCompletionResponse:
-        async with self._client._post(
-                "/v1beta2/chat/completions",
-                payload=_build_request_payload(
-                    messages=messages,
-                    model=model,
-                    max_tokens=max_tokens,
-                    temperature=temperature,
-                    stream=False,
-                    provider_extra_parameters=provider_extra_parameters,
-                    **kwargs,
-                ),
-        ) as response:
-            await self._client._check_response(response)
-            return ChatCompletionResponse(**await response.json())
+        rjson = await self._client._post_json(
+            "/v1beta2/chat/completions",
+            payload=_build_request_payload(
+                messages=messages,
+                model=model,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                stream=False,
+                provider_extra_parameters=provider_extra_parameters,
+                **kwargs,
+            ),
+            deadline=deadline,
+        )
+        return ChatCompletionResponse(**rjson)
 
     async def __chat_stream(
         self,
@@ -275,12 +383,14 @@ class AsyncCompletions:
         max_tokens: Optional[int],
         temperature: float,
         provider_extra_parameters: Optional[Dict[str, Any]],
+        deadline: Optional[float],
+        convert: Callable[[Dict[str, Any]], Any],
         **kwargs: Any,
-    ) -> AsyncIterator[ChatCompletionStreamChunkResponse]:
+    ) -> AsyncIterator[Any]:
         """
         Create a stream of ChatCompletionStreamChunkResponse
         """
-        async with self._client._post(
+        async for chunk in self._client._post_stream(
                 "/v1beta2/chat/completions",
                 payload=_build_request_payload(
                     messages=messages,
@@ -291,11 +401,9 @@ class AsyncCompletions:
                     provider_extra_parameters=provider_extra_parameters,
                     **kwargs,
                 ),
-        ) as response:
-            await self._client._check_streaming_response(response)
-            async for chunk in self._client._parse_streaming_response(
-                    response):
-                yield ChatCompletionStreamChunkResponse(**chunk)
+                deadline=deadline,
+        ):
+            yield convert(chunk)
 
 
 class Chat:
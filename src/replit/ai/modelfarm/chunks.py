@@ -0,0 +1,160 @@
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Literal,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+    get_args,
+)
+
+from pydantic import BaseModel
+
+ChunkMode = Literal["model", "construct", "dict", "view"]
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+# The default and the model of the nested values of each field, by model.
+_FIELDS: Dict[Type[BaseModel], Dict[str, Tuple[Any, Any]]] = {}
+
+# The default of the fields without one.
+_REQUIRED = object()
+
+
+class ChunkView:
+    """
+    A read-only view of a decoded chunk, whose fields are read as the
+    attributes of its model would be, without validating the chunk.
+
+    Nested objects are viewed when they are read, and missing fields take
+    the defaults of the model. to_model() validates the chunk, for the rare
+    chunks that need a model.
+    """
+
+    __slots__ = ("_data", "_model")
+
+    def __init__(self, data: Dict[str, Any], model: Type[BaseModel]) -> None:
+        self._data = data
+        self._model = model
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            default, nested = _FIELDS[self._model][name]
+        except KeyError:
+            if name not in _fields(self._model):
+                raise AttributeError(
+                    f"{self._model.__name__!r} object has no attribute "
+                    f"{name!r}") from None
+            default, nested = _FIELDS[self._model][name]
+        value = self._data.get(name, default)
+        if value is _REQUIRED:
+            raise AttributeError(f"The chunk has no {name!r}")
+        if nested is None or value is None:
+            return value
+        if isinstance(value, list):
+            return [ChunkView(item, nested) for item in value]
+        return ChunkView(value, nested)
+
+    def __repr__(self) -> str:
+        return f"ChunkView[{self._model.__name__}]({self._data!r})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Gets the decoded chunk.
+
+        Returns:
+            Dict[str, Any]: The chunk, which must not be modified.
+        """
+        return self._data
+
+    def to_model(self) -> BaseModel:
+        """
+        Validates the chunk.
+
+        Returns:
+            BaseModel: The chunk as its model.
+
+        Raises:
+            pydantic.ValidationError: If the chunk is not valid.
+        """
+        return self._model.model_validate(self._data)
+
+
+def construct(model: Type[ModelT], data: Dict[str, Any]) -> ModelT:
+    """
+    Builds a model and its nested models from a decoded chunk without
+    validating them.
+
+    Args:
+        model (Type[ModelT]): The model.
+        data (Dict[str, Any]): The decoded chunk.
+
+    Returns:
+        ModelT: The model.
+    """
+    fields = _fields(model)
+    values = {}
+    for name, value in data.items():
+        nested = fields[name][1] if name in fields else None
+        if nested is not None and value is not None:
+            if isinstance(value, list):
+                value = [construct(nested, item) for item in value]
+            else:
+                value = construct(nested, value)
+        values[name] = value
+    return model.model_construct(**values)
+
+
+def chunk_converter(model: Type[BaseModel],
+                    mode: ChunkMode) -> Callable[[Dict[str, Any]], Any]:
+    """
+    Gets the function converting each decoded chunk of a stream.
+
+    Args:
+        model (Type[BaseModel]): The model of the chunks.
+        mode (ChunkMode): "model" validates each chunk into its model,
+            "construct" builds the model without validation, "dict" returns
+            the decoded chunks, which must not be modified, and "view"
+            returns a ChunkView of each chunk.
+
+    Returns:
+        Callable[[Dict[str, Any]], Any]: The conversion.
+
+    Raises:
+        ValueError: If the mode is unknown.
+    """
+    if mode == "model":
+        return lambda chunk: model(**chunk)
+    if mode == "construct":
+        return lambda chunk: construct(model, chunk)
+    if mode == "dict":
+        return lambda chunk: chunk
+    if mode == "view":
+        return lambda chunk: ChunkView(chunk, model)
+    raise ValueError(f"Unknown chunk mode {mode!r}")
+
+
+def _fields(model: Type[BaseModel]) -> Dict[str, Tuple[Any, Any]]:
+    fields = _FIELDS.get(model)
+    if fields is None:
+        fields = {
+            name: (_REQUIRED if field.is_required() else field.get_default(
+                call_default_factory=True), _nested_model(field.annotation))
+            for name, field in model.model_fields.items()
+        }
+        _FIELDS[model] = fields
+    return fields
+
+
+def _nested_model(annotation: Any) -> Optional[Type[BaseModel]]:
+    args = get_args(annotation)
+    if not args and isinstance(annotation, type) and issubclass(
+            annotation, BaseModel):
+        return annotation
+    for arg in args:
+        model = _nested_model(arg)
+        if model is not None:
+            return model
+    return None
@@ -0,0 +1,224 @@
+import enum
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, FrozenSet, Tuple
+
+from .exceptions import CircuitOpenException
+from .retry import DEFAULT_RETRY_STATUSES
+
+
+class CircuitState(enum.Enum):
+    """
+    The states of a circuit breaker.
+
+    CLOSED lets every request through. OPEN rejects every request until
+    open_duration has passed. HALF_OPEN lets a few probe requests through,
+    and closes the circuit if they succeed or opens it again if any fails.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+@dataclass
+class CircuitBreakerPolicy:
+    """
+    Configures the circuit breakers of a client, one per base URL and path.
+
+    Attributes:
+        failure_rate_threshold (float): Opens the circuit when at least this
+            fraction of recent calls failed.
+        slow_call_duration (float): Calls taking at least this many seconds
+            to return their headers count as slow.
+        slow_call_rate_threshold (float): Opens the circuit when at least
+            this fraction of recent calls were slow.
+        minimum_calls (int): The number of calls recorded before the rates
+            are evaluated.
+        window_size (int): The number of recent calls the rates cover.
+        open_duration (float): Seconds the circuit stays open before probe
+            calls are let through.
+        half_open_max_calls (int): The number of probe calls that must
+            succeed to close the circuit again.
+        failure_statuses (FrozenSet[int]): The HTTP statuses counted as
+            failures, besides connection errors and timeouts.
+    """
+
+    failure_rate_threshold: float = 0.5
+    slow_call_duration: float = 30.0
+    slow_call_rate_threshold: float = 0.8
+    minimum_calls: int = 20
+    window_size: int = 100
+    open_duration: float = 30.0
+    half_open_max_calls: int = 3
+    failure_statuses: FrozenSet[int] = DEFAULT_RETRY_STATUSES
+    breakers: Dict[Tuple[str, str],
+                   "CircuitBreaker"] = field(default_factory=dict,
+                                             init=False,
+                                             repr=False)
+
+    def __post_init__(self) -> None:
+        self._lock = threading.Lock()
+
+    def get(self, base_url: str, path: str) -> "CircuitBreaker":
+        """
+        Gets the breaker of an endpoint, creating it on first use.
+
+        Args:
+            base_url (str): The root URL of the Modelfarm API.
+            path (str): The API path.
+
+        Returns:
+            CircuitBreaker: The breaker guarding requests to the endpoint.
+        """
+        key = (base_url, path)
+        breaker = self.breakers.get(key)
+        if breaker is None:
+            with self._lock:
+                breaker = self.breakers.setdefault(
+                    key, CircuitBreaker(self, base_url + path))
+        return breaker
+
+    def states(self) -> Dict[Tuple[str, str], CircuitState]:
+        """
+        Gets the state of every breaker.
+
+        Returns:
+            Dict[Tuple[str, str], CircuitState]: The states, keyed by base
+                URL and path.
+        """
+        return {key: breaker.state for key, breaker in self.breakers.items()}
+
+
+class CircuitBreaker:
+    """
+    Tracks the outcome of recent calls to one endpoint and rejects calls
+    while the endpoint is failing.
+
+    Callers call acquire() before sending a request, then exactly one of
+    record() once the outcome is known, or release() if the request ended
+    without one (e.g. it was cancelled).
+    """
+
+    def __init__(self, policy: CircuitBreakerPolicy, name: str) -> None:
+        """
+        Initializes a new instance of the CircuitBreaker class.
+
+        Args:
+            policy (CircuitBreakerPolicy): The thresholds to apply.
+            name (str): The endpoint, used in error messages.
+        """
+        self.policy = policy
+        self.name = name
+        self._state = CircuitState.CLOSED
+        self._opened_at = 0.0
+        self._calls: Deque[Tuple[bool, bool]] = deque()
+        self._failures = 0
+        self._slow_calls = 0
+        self._probes = 0
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> CircuitState:
+        with self._lock:
+            return self._refresh()
+
+    @property
+    def failure_rate(self) -> float:
+        """The fraction of recent calls that failed."""
+        with self._lock:
+            return self._failures / len(self._calls) if self._calls else 0.0
+
+    @property
+    def slow_call_rate(self) -> float:
+        """The fraction of recent calls that were slow."""
+        with self._lock:
+            return self._slow_calls / len(self._calls) if self._calls else 0.0
+
+    def acquire(self) -> None:
+        """
+        Lets a call through, or rejects it if the circuit is open.
+
+        Raises:
+            CircuitOpenException: If the circuit is open, or half-open with
+                all of its probe calls in flight.
+        """
+        with self._lock:
+            state = self._refresh()
+            if state is CircuitState.CLOSED:
+                return
+            if (state is CircuitState.HALF_OPEN
+                    and self._probes < self.policy.half_open_max_calls):
+                self._probes += 1
+                return
+            retry_after = max(
+                0.0,
+                self._opened_at + self.policy.open_duration - time.monotonic())
+        raise CircuitOpenException(self.name, retry_after)
+
+    def record(self, failed: bool, duration: float) -> None:
+        """
+        Records the outcome of a call let through by acquire().
+
+        Args:
+            failed (bool): Whether the call failed.
+            duration (float): Seconds the call took.
+        """
+        policy = self.policy
+        slow = duration >= policy.slow_call_duration
+        with self._lock:
+            if self._state is CircuitState.HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                if failed or slow:
+                    self._open()
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= policy.half_open_max_calls:
+                        self._close()
+                return
+            if self._state is CircuitState.OPEN:
+                # The call started before the circuit opened.
+                return
+            calls = self._calls
+            if len(calls) >= policy.window_size:
+                old_failed, old_slow = calls.popleft()
+                self._failures -= old_failed
+                self._slow_calls -= old_slow
+            calls.append((failed, slow))
+            self._failures += failed
+            self._slow_calls += slow
+            if len(calls) < policy.minimum_calls:
+                return
+            if (self._failures >= policy.failure_rate_threshold * len(calls)
+                    or self._slow_calls
+                    >= policy.slow_call_rate_threshold * len(calls)):
+                self._open()
+
+    def release(self) -> None:
+        """
+        Ends a call let through by acquire() without recording an outcome.
+        """
+        with self._lock:
+            if self._state is CircuitState.HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+
+    def _refresh(self) -> CircuitState:
+        if (self._state is CircuitState.OPEN and time.monotonic()
+                >= self._opened_at + self.policy.open_duration):
+            self._state = CircuitState.HALF_OPEN
+            self._probes = 0
+            self._probe_successes = 0
+        return self._state
+
+    def _open(self) -> None:
+        self._state = CircuitState.OPEN
+        self._opened_at = time.monotonic()
+
+    def _close(self) -> None:
+        self._state = CircuitState.CLOSED
+        self._calls.clear()
+        self._failures = 0
+        self._slow_calls = 0
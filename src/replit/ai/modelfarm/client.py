@@ -1,29 +1,116 @@
-import json
+import asyncio
+import time
+import weakref
 from contextlib import asynccontextmanager
-from typing import Any, AsyncGenerator, AsyncIterator, Dict, Iterator, Optional
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    Iterator,
+    MutableMapping,
+    Optional,
+    Tuple,
+)
 
 import aiohttp
 import requests
+import urllib3
 from aiohttp import ClientResponse
-from requests import JSONDecodeError, Response
+from requests import Response
+from requests.adapters import DEFAULT_POOLSIZE, HTTPAdapter
 
+from .batch import (
+    BatchRequest,
+    BatchResult,
+    ProgressCallback,
+    run_batch,
+    run_batch_async,
+)
+from .cache import ResponseCache, request_key
 from .chat_completions import AsyncChat, Chat
+from .circuit_breaker import CircuitBreaker, CircuitBreakerPolicy
+from .codec import JSONCodec, default_codec
 from .completions import AsyncCompletions, Completions
+from .concurrency import AdaptiveConcurrencyLimiter, ConcurrencyLimit
 from .config import get_config
+from .embedding_batcher import EmbeddingMicroBatcher
+from .embedding_cache import SQLiteEmbeddingCache
+from .embedding_split import EmbeddingSplitPolicy
 from .embeddings import AsyncEmbeddings, Embeddings
-from .exceptions import BadRequestException, InvalidResponseException
+from .exceptions import (
+    BadRequestException,
+    InvalidResponseException,
+    StreamTimeoutException,
+)
+from .hedging import HedgingPolicy
+from .hooks import (
+    RequestHooks,
+    RequestTrace,
+    TracingHTTPAdapter,
+    aiohttp_trace_config,
+    set_sending,
+)
+from .rate_limit import RateLimiter
 from .replit_identity_token_manager import ReplitIdentityTokenManager
+from .retry import RetryPolicy, RetryState
+from .singleflight import SingleFlight
+from .timeouts import CallTimeout, Timeout
+
+# Failures that happen before a response arrives, which are retried when a
+# retry policy is set. Streams are also retried after errors reading the body
+# as long as no chunk has been received yet.
+_RETRYABLE_ERRORS = (requests.ConnectionError, requests.Timeout,
+                     requests.exceptions.ChunkedEncodingError,
+                     StreamTimeoutException)
+_ASYNC_RETRYABLE_ERRORS = (aiohttp.ClientConnectionError,
+                           aiohttp.ClientPayloadError, asyncio.TimeoutError,
+                           StreamTimeoutException)
 
 
 class BaseModelfarm:
 
-    def __init__(self, base_url: Optional[str] = None) -> None:
+    def __init__(self,
+                 base_url: Optional[str] = None,
+                 codec: Optional[JSONCodec] = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 circuit_breaker_policy: Optional[CircuitBreakerPolicy] = None,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 timeout: Optional[Timeout] = None,
+                 single_flight: Optional[SingleFlight] = None,
+                 cache: Optional[ResponseCache] = None,
+                 embedding_cache: Optional[SQLiteEmbeddingCache] = None,
+                 embedding_split: Optional[EmbeddingSplitPolicy] = None,
+                 hooks: Optional[RequestHooks] = None) -> None:
         """
         Initializes a new instance of the BaseModelfarm class.
         """
         self.base_url = base_url or get_config().rootUrl
+        self.timeout = timeout or Timeout()
+        self.codec = codec or default_codec()
+        self.retry_policy = retry_policy
+        self.circuit_breaker_policy = circuit_breaker_policy
+        self.rate_limiter = rate_limiter
+        self.single_flight = single_flight
+        self.cache = cache
+        self.embedding_cache = embedding_cache
+        self.embedding_split = embedding_split or EmbeddingSplitPolicy()
+        self.hooks = hooks
         self.auth = ReplitIdentityTokenManager()
 
+    def _get_headers(self) -> Dict[str, str]:
+        """
+        Gets the headers sent with every API request.
+
+        Returns:
+            dict: The authentication and content type headers.
+        """
+        return {
+            **self._get_auth_headers(),
+            "Content-Type": "application/json",
+        }
+
     def _get_auth_headers(self) -> Dict[str, str]:
         """
         Gets authentication headers required for API requests.
@@ -34,6 +121,123 @@ class BaseModelfarm:
         token = self.auth.get_token()
         return {"Authorization": f"Bearer {token}"}
 
+    def _trace(self, path: str,
+               payload: Optional[Dict[str, Any]]) -> Optional[RequestTrace]:
+        """
+        Starts tracing a call for the client's hooks.
+
+        Parameters:
+            path: The API path.
+            payload: The JSON request payload.
+
+        Returns:
+            The trace, or None if no hook is registered.
+        """
+        hooks = self.hooks
+        return None if hooks is None else hooks.trace(path, payload)
+
+    def _get_circuit_breaker(self, path: str) -> Optional[CircuitBreaker]:
+        """
+        Gets the circuit breaker guarding an API path.
+
+        Parameters:
+            path: The API path.
+
+        Returns:
+            The breaker, or None if the client has no circuit breaker policy.
+        """
+        policy = self.circuit_breaker_policy
+        return None if policy is None else policy.get(self.base_url, path)
+
+    def _share_request(
+        self, path: str, payload: Optional[Dict[str, Any]]
+    ) -> Tuple[Optional[ResponseCache], Optional[SingleFlight], Optional[str]]:
+        """
+        Gets the cache and the single-flight group that apply to a
+        non-streaming request.
+
+        Parameters:
+            path: The API path.
+            payload: The JSON request payload.
+
+        Returns:
+            The cache, or None if the request is not cached; the group, or
+            None if the request is not coalesced; and the hash of the
+            request, or None if neither applies.
+        """
+        cache = self.cache
+        if cache is not None and not cache.cacheable(payload):
+            cache = None
+        flight = self.single_flight
+        if flight is not None and not flight.coalesces(payload):
+            flight = None
+        if cache is None and flight is None:
+            return None, None, None
+        return cache, flight, request_key(self.base_url + path, payload)
+
+    def _get_stream_cache(
+        self, path: str, payload: Optional[Dict[str, Any]]
+    ) -> Tuple[Optional[ResponseCache], Optional[str]]:
+        """
+        Gets the cache that applies to a streaming request.
+
+        Parameters:
+            path: The API path.
+            payload: The JSON request payload.
+
+        Returns:
+            The cache and the hash of the request, or None for both if the
+            request is not cached.
+        """
+        cache = self.cache
+        if cache is None or not cache.cacheable(payload):
+            return None, None
+        return cache, request_key(self.base_url + path, payload)
+
+    def _cache_response(self, cache: ResponseCache, key: str,
+                        value: Any) -> None:
+        """
+        Stores a decoded response, sized as encoded by the client's codec.
+
+        Parameters:
+            cache: The cache to store the response in.
+            key: The hash of the request.
+            value: The decoded body, or the list of decoded stream chunks.
+        """
+        cache.set(key, value, len(self.codec.dumps(value)))
+
+    def _reconcile_usage(self, payload: Optional[Dict[str, Any]],
+                         rjson: Any) -> None:
+        """
+        Replaces the token estimate of a request with its reported usage.
+
+        Parameters:
+            payload: The JSON request payload.
+            rjson: The decoded body of the successful response, or the
+                chunk of a stream that reports its usage.
+        """
+        limiter = self.rate_limiter
+        if limiter is not None and isinstance(rjson, dict):
+            limiter.reconcile(limiter.estimate(payload), rjson.get("usage"))
+
+    def _raise_for_error_response(self, status: int, rjson: Any) -> None:
+        """
+        Raises the exception matching an unsuccessful response.
+
+        Parameters:
+            status: The HTTP status code of the response.
+            rjson: The decoded body of the response.
+
+        Raises:
+            BadRequestException: If the status code is 400.
+            InvalidResponseException: For any other status code.
+        """
+        if status == 400:
+            raise BadRequestException(rjson["detail"])
+        if "detail" in rjson:
+            raise InvalidResponseException(rjson["detail"])
+        raise InvalidResponseException(rjson)
+
 
 class Modelfarm(BaseModelfarm):
     chat: Chat
@@ -43,35 +247,428 @@ class Modelfarm(BaseModelfarm):
     def __init__(
         self,
         base_url: Optional[str] = None,
+        pool_connections: int = DEFAULT_POOLSIZE,
+        pool_maxsize: int = DEFAULT_POOLSIZE,
+        stream_chunk_size: int = 128,
+        codec: Optional[JSONCodec] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker_policy: Optional[CircuitBreakerPolicy] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        timeout: Optional[Timeout] = None,
+        single_flight: Optional[SingleFlight] = None,
+        cache: Optional[ResponseCache] = None,
+        embedding_cache: Optional[SQLiteEmbeddingCache] = None,
+        embedding_split: Optional[EmbeddingSplitPolicy] = None,
+        hooks: Optional[RequestHooks] = None,
     ) -> None:
         """
         Initializes a new instance of the Modelfarm class.
+
+        The client keeps its connections to Modelfarm alive between requests.
+        Call close() or use the client as a context manager to release them.
+
+        Args:
+            base_url (Optional[str]): The root URL of the Modelfarm API.
+                Defaults to the configured rootUrl.
+            pool_connections (int): The number of connection pools to cache,
+                one per host. Defaults to 10.
+            pool_maxsize (int): The maximum number of connections kept alive
+                per pool. Should be at least the number of threads sharing
+                the client. Defaults to 10.
+            stream_chunk_size (int): The number of bytes read at a time from
+                streaming responses. Unless the response is chunked, a read
+                waits for this many bytes to arrive, so larger values trade
+                latency for throughput. Defaults to 128.
+            codec (Optional[JSONCodec]): Encodes requests and decodes
+                responses. Defaults to orjson when it is installed and the
+                standard library otherwise.
+            retry_policy (Optional[RetryPolicy]): Retries requests that fail
+                with a connection error, a timeout or a transient status such
+                as 429 or 503. Defaults to None, which never retries.
+            circuit_breaker_policy (Optional[CircuitBreakerPolicy]): Rejects
+                requests to an endpoint with CircuitOpenException while most
+                recent requests to it failed or were slow, instead of waiting
+                for them to time out. Defaults to None.
+            rate_limiter (Optional[RateLimiter]): Delays requests to stay
+                under a request rate and an estimated token rate. Defaults
+                to None.
+            timeout (Optional[Timeout]): The connect, first byte and stream
+                idle timeouts, and the default deadline of a whole call.
+                Defaults to Timeout().
+            single_flight (Optional[SingleFlight]): Shares one request
+                between identical non-streaming calls made at the same time.
+                Defaults to None, which sends every call.
+            cache (Optional[ResponseCache]): Answers repeated deterministic
+                requests, such as chat completions with temperature 0, from
+                earlier responses. Defaults to None.
+            embedding_cache (Optional[SQLiteEmbeddingCache]): Stores the
+                embedding of each input persistently, so that embeddings
+                requests only send the inputs not embedded before. Defaults
+                to None.
+            embedding_split (Optional[EmbeddingSplitPolicy]): How embeddings
+                requests with many inputs are split into concurrent
+                requests. Defaults to EmbeddingSplitPolicy().
+            hooks (Optional[RequestHooks]): Callbacks notified as each
+                request starts, gets its token and its connection, receives
+                its first byte and its chunks, and completes, with the times
+                and sizes of each step. Defaults to None.
         """
-        super().__init__(base_url)
+        super().__init__(base_url,
+                         codec=codec,
+                         retry_policy=retry_policy,
+                         circuit_breaker_policy=circuit_breaker_policy,
+                         rate_limiter=rate_limiter,
+                         timeout=timeout,
+                         single_flight=single_flight,
+                         cache=cache,
+                         embedding_cache=embedding_cache,
+                         embedding_split=embedding_split,
+                         hooks=hooks)
+        self.stream_chunk_size = stream_chunk_size
+        self._session = requests.Session()
+        adapter_class = HTTPAdapter if hooks is None else TracingHTTPAdapter
+        adapter = adapter_class(pool_connections=pool_connections,
+                                pool_maxsize=pool_maxsize)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
 
         self.chat = Chat(self)
         self.embeddings = Embeddings(self)
         self.completions = Completions(self)
 
+    def close(self) -> None:
+        """
+        Closes the pooled connections held by the client.
+        """
+        self._session.close()
+
+    def __enter__(self) -> "Modelfarm":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def batch(
+        self,
+        requests: Iterable[BatchRequest],
+        concurrency: int = 8,
+        ordered: bool = True,
+        on_progress: Optional[ProgressCallback] = None,
+    ) -> Iterator[BatchResult]:
+        """
+        Sends a batch of independent requests from a pool of threads.
+
+        A failed request is reported in its result instead of stopping the
+        batch. pool_maxsize should be at least concurrency, or connections
+        are opened and closed for every request.
+
+        Args:
+            requests (Iterable[BatchRequest]): The requests to send, read
+                lazily as slots free up.
+            concurrency (int): The number of requests in flight at once.
+                Defaults to 8.
+            ordered (bool): Whether to yield results in the order of the
+                requests rather than as they finish. Defaults to True.
+            on_progress (Optional[ProgressCallback]): Called with a
+                BatchProgress after each request finishes.
+
+        Returns:
+            Iterator[BatchResult]: The result of each request.
+        """
+        return run_batch(self, requests, concurrency, ordered, on_progress)
+
     def _post(
         self,
         path: str,
         payload: Optional[Dict[str, Any]] = None,
         stream: Optional[bool] = None,
+        call: Optional[CallTimeout] = None,
+        trace: Optional[RequestTrace] = None,
+        charged: bool = False,
         **kwargs,
     ) -> Response:
-        return requests.post(
-            url=self.base_url + path,
-            headers=self._get_auth_headers(),
-            json=payload,
-            stream=stream,
-            **kwargs,
-        )
+        if call is None:
+            call = self.timeout.start()
+        limiter = self.rate_limiter
+        if limiter is not None:
+            # The tokens of a call are taken once, by its first attempt.
+            limiter.acquire(0 if charged else limiter.estimate(payload))
+        # The deadline may have passed while waiting for the limiter.
+        connect, first_byte, _ = call.request_timeouts()
+        breaker = self._get_circuit_breaker(path)
+        if breaker is not None:
+            breaker.acquire()
+        start = time.monotonic()
+        try:
+            data = None if payload is None else self.codec.dumps(payload)
+            if trace is not None:
+                trace.start(data)
+            headers = self._get_headers()
+            if trace is not None:
+                trace.emit("auth")
+                kwargs["hooks"] = trace.requests_hooks
+                set_sending(trace)
+            response = self._session.post(
+                url=self.base_url + path,
+                headers=headers,
+                data=data,
+                stream=stream,
+                timeout=(connect, first_byte),
+                **kwargs,
+            )
+        except requests.RequestException:
+            if breaker is not None:
+                breaker.record(True, time.monotonic() - start)
+            raise
+        except BaseException:
+            if breaker is not None:
+                breaker.release()
+            raise
+        finally:
+            if trace is not None:
+                set_sending(None)
+        if breaker is not None:
+            breaker.record(
+                response.status_code in breaker.policy.failure_statuses,
+                time.monotonic() - start)
+        return response
+
+    def _post_json(
+        self,
+        path: str,
+        payload: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        **kwargs,
+    ) -> Any:
+        """
+        Makes a non-streaming request and decodes its response, answering it
+        from the client's cache or sharing it with identical calls in flight
+        as configured.
+
+        Parameters:
+            path: The API path to post to.
+            payload: The JSON request payload.
+            deadline: Seconds the call may take, including retries. Defaults
+                to the deadline of the client's timeout.
+
+        Returns:
+            The decoded JSON body of a successful response.
+        """
+        cache, flight, key = self._share_request(path, payload)
+        if key is None:
+            return self._request_json(path, payload, deadline, **kwargs)
+        if cache is not None:
+            rjson = cache.get(key)
+            if rjson is not None:
+                return rjson
+
+        def send() -> Any:
+            rjson = self._request_json(path, payload, deadline, **kwargs)
+            if cache is not None:
+                self._cache_response(cache, key, rjson)
+            return rjson
+
+        return send() if flight is None else flight.do(key, send)
+
+    def _request_json(
+        self,
+        path: str,
+        payload: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        **kwargs,
+    ) -> Any:
+        """
+        Makes a non-streaming request and decodes its response.
+
+        The body is decoded once and the result is shared by the status check
+        and the caller.
+
+        Parameters:
+            path: The API path to post to.
+            payload: The JSON request payload.
+            deadline: Seconds the call may take, including retries.
+
+        Returns:
+            The decoded JSON body of a successful response.
+        """
+        retry = RetryState(self.retry_policy)
+        call = self.timeout.start(deadline)
+        trace = self._trace(path, payload)
+        try:
+            response = self._send(retry,
+                                  call,
+                                  path,
+                                  payload=payload,
+                                  trace=trace,
+                                  **kwargs)
+            self._check_response(response)
+            rjson = self._decode_response(response, trace)
+        except BaseException as e:
+            if trace is not None:
+                trace.complete(e)
+            raise
+        self._reconcile_usage(payload, rjson)
+        if trace is not None:
+            trace.complete()
+        return rjson
+
+    def _post_stream(
+        self,
+        path: str,
+        payload: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        **kwargs,
+    ) -> Iterator[Any]:
+        """
+        Makes a streaming request and decodes its chunks, replaying them from
+        the client's cache if the request is cached.
+
+        Parameters:
+            path: The API path to post to.
+            payload: The JSON request payload.
+            deadline: Seconds the call may take, including retries and
+                reading the whole stream. Defaults to the deadline of the
+                client's timeout.
+
+        Returns:
+            An iterator of the decoded JSON chunks.
+        """
+        cache, key = self._get_stream_cache(path, payload)
+        if cache is None:
+            return self._stream(path, payload, deadline, **kwargs)
+        chunks = cache.get(key)
+        if chunks is not None:
+            return iter(chunks)
+        return self._cache_stream(
+            cache, key, self._stream(path, payload, deadline, **kwargs))
+
+    def _cache_stream(self, cache: ResponseCache, key: str,
+                      stream: Iterator[Any]) -> Iterator[Any]:
+        """
+        Passes a stream through, storing its chunks once it has been read to
+        the end.
+        """
+        chunks = []
+        for obj in stream:
+            chunks.append(obj)
+            yield obj
+        self._cache_response(cache, key, chunks)
+
+    def _stream(
+        self,
+        path: str,
+        payload: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        **kwargs,
+    ) -> Iterator[Any]:
+        """
+        Makes a streaming request and decodes its chunks.
+
+        Failures are retried until the first chunk has been received; after
+        that they are raised, since the request cannot be resumed.
+
+        Parameters:
+            path: The API path to post to.
+            payload: The JSON request payload.
+            deadline: Seconds the call may take, including retries and
+                reading the whole stream. Defaults to the deadline of the
+                client's timeout.
+
+        Yields:
+            The decoded JSON chunks of a successful response.
+
+        Raises:
+            StreamTimeoutException: If no chunk arrives within the idle
+                timeout or the deadline passes.
+        """
+        retry = RetryState(self.retry_policy)
+        call = self.timeout.start(deadline)
+        trace = self._trace(path, payload)
+        # The last chunk reporting usage, usually the final one.
+        usage_chunk = None
+        try:
+            while True:
+                started = False
+                response = self._send(retry,
+                                      call,
+                                      path,
+                                      payload=payload,
+                                      stream=True,
+                                      trace=trace,
+                                      **kwargs)
+                try:
+                    self._check_streaming_response(response)
+                    for obj in self._parse_streaming_response(
+                            response, call, trace):
+                        started = True
+                        if isinstance(obj, dict) and obj.get("usage"):
+                            usage_chunk = obj
+                        yield obj
+                    break
+                except _RETRYABLE_ERRORS:
+                    delay = None if started else retry.delay()
+                    if delay is None or not call.allows(delay):
+                        raise
+                finally:
+                    response.close()
+                time.sleep(delay)
+        except BaseException as e:
+            if trace is not None:
+                trace.complete(e)
+            raise
+        self._reconcile_usage(payload, usage_chunk)
+        if trace is not None:
+            trace.complete()
+
+    def _send(
+        self,
+        retry: RetryState,
+        call: CallTimeout,
+        path: str,
+        payload: Optional[Dict[str, Any]] = None,
+        trace: Optional[RequestTrace] = None,
+        **kwargs,
+    ) -> Response:
+        """
+        Posts a request, retrying it as allowed by the retry policy and the
+        deadline of the call.
+
+        Parameters:
+            retry: The attempts made so far for this request.
+            call: The timeouts of the call.
+            path: The API path to post to.
+            payload: The JSON request payload.
+            trace: The trace of the call, if it is traced.
+
+        Returns:
+            The first response that is not retried.
+        """
+        while True:
+            try:
+                response = self._post(path,
+                                      payload=payload,
+                                      call=call,
+                                      trace=trace,
+                                      charged=retry.attempt > 1,
+                                      **kwargs)
+            except _RETRYABLE_ERRORS:
+                delay = retry.delay()
+                if delay is None or not call.allows(delay):
+                    raise
+            else:
+                delay = retry.delay_for(response.status_code,
+                                        response.headers.get("Retry-After"))
+                if delay is None or not call.allows(delay):
+                    return response
+                response.close()
+            time.sleep(delay)
 
     def _check_response(self, response: Response) -> None:
         """
         Validates a response from the server.
 
+        The body is only decoded when the response is an error.
+
         Parameters:
             response: The server response to check.
 
@@ -79,19 +676,32 @@ class Modelfarm(BaseModelfarm):
             InvalidResponseException: If the response is not valid JSON.
             BadRequestException: If the response contains a 400 status code.
         """
+        if response.status_code == 200:
+            return
+        rjson = self._decode_response(response)
+        self._raise_for_error_response(response.status_code, rjson)
+
+    def _decode_response(self,
+                         response: Response,
+                         trace: Optional[RequestTrace] = None) -> Any:
+        """
+        Decodes the JSON body of a response.
+
+        Parameters:
+            response: The server response to decode.
+            trace: The trace of the call, if it is traced.
+
+        Raises:
+            InvalidResponseException: If the response is not valid JSON.
+        """
         try:
-            rjson = response.json()
-        except JSONDecodeError as e:
+            if trace is None:
+                return self.codec.loads(response.content)
+            return trace.decode(self.codec.loads, response.content)
+        except ValueError as e:
             raise InvalidResponseException(
                 f"Invalid response: {response.text}") from e
 
-        if response.status_code == 400:
-            raise BadRequestException(rjson["detail"])
-        if response.status_code != 200:
-            if "detail" in rjson:
-                raise InvalidResponseException(rjson["detail"])
-            raise InvalidResponseException(rjson)
-
     def _check_streaming_response(self, response: Response) -> None:
         """
         Validates a streaming response from the server.
@@ -103,36 +713,60 @@ class Modelfarm(BaseModelfarm):
             return
         self._check_response(response)
 
-    def _parse_streaming_response(self, response) -> Iterator[Any]:
+    def _parse_streaming_response(
+            self,
+            response: Response,
+            call: Optional[CallTimeout] = None,
+            trace: Optional[RequestTrace] = None) -> Iterator[Any]:
         """
         Parses a streaming response from the server.
 
+        The socket read timeout, which covered the wait for the headers, is
+        switched to the idle timeout, shortened before each read so that the
+        stream ends by the deadline.
+
         Parameters:
             response: The server's streaming response to parse.
+            call: The timeouts of the call.
+            trace: The trace of the call, if it is traced.
 
         Yields:
             JSON objects extracted from the streaming response.
-        """
-        buffer = b""
-        decoder = json.JSONDecoder()
-        for chunk in response.iter_content(chunk_size=128):
-            buffer += chunk
-            buffer_str = buffer.decode("utf-8")
 
-            start_idx = 0
-            # Iteratively parse JSON objects
-            while start_idx < len(buffer_str):
-                try:
-                    # Load JSON object
-                    result = decoder.raw_decode(buffer_str, start_idx)
-                    json_obj, end_idx = result
-
-                    yield json_obj
-                    # Update start index for next iteration
-                    start_idx = end_idx
-                except json.JSONDecodeError:
-                    break
-            buffer = buffer[start_idx:]
+        Raises:
+            StreamTimeoutException: If a read times out or the deadline
+                passes.
+        """
+        if call is None:
+            call = self.timeout.start()
+        sock = getattr(getattr(response.raw, "connection", None), "sock", None)
+        if sock is not None:
+            sock.settimeout(call.idle)
+        framer = self.codec.stream_framer()
+        chunks = 0
+        received = 0
+        try:
+            for chunk in response.iter_content(
+                    chunk_size=self.stream_chunk_size):
+                received += len(chunk)
+                objs = (framer.feed(chunk) if trace is None else trace.feed(
+                    framer, chunk))
+                for obj in objs:
+                    chunks += 1
+                    if trace is not None:
+                        trace.chunk(obj)
+                    yield obj
+                if call.expires_at is not None:
+                    if call.expired():
+                        raise _stream_timeout(call, chunks, received)
+                    if sock is not None:
+                        sock.settimeout(call.idle)
+        except requests.ConnectionError as e:
+            if not isinstance(e.__context__,
+                              urllib3.exceptions.ReadTimeoutError):
+                raise
+            raise _stream_timeout(call, chunks, received) from e
+        framer.close()
 
 
 class AsyncModelfarm(BaseModelfarm):
@@ -143,36 +777,521 @@ class AsyncModelfarm(BaseModelfarm):
     def __init__(
         self,
         base_url: Optional[str] = None,
+        limit: int = 100,
+        limit_per_host: int = 0,
+        keepalive_timeout: float = 15,
+        ttl_dns_cache: Optional[int] = 10,
+        stream_chunk_size: int = 2**16,
+        codec: Optional[JSONCodec] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker_policy: Optional[CircuitBreakerPolicy] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        hedging_policy: Optional[HedgingPolicy] = None,
+        concurrency_limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+        timeout: Optional[Timeout] = None,
+        single_flight: Optional[SingleFlight] = None,
+        cache: Optional[ResponseCache] = None,
+        embedding_cache: Optional[SQLiteEmbeddingCache] = None,
+        embedding_split: Optional[EmbeddingSplitPolicy] = None,
+        embedding_batcher: Optional[EmbeddingMicroBatcher] = None,
+        hooks: Optional[RequestHooks] = None,
     ) -> None:
         """
         Initializes a new instance of the AsyncModelfarm class.
+
+        The client lazily opens one aiohttp session per event loop it is used
+        from, so the connection pool, DNS cache and TLS sessions are shared by
+        every request made on that loop. Call aclose() or use the client as an
+        async context manager to release them.
+
+        Args:
+            base_url (Optional[str]): The root URL of the Modelfarm API.
+                Defaults to the configured rootUrl.
+            limit (int): The maximum number of simultaneous connections.
+                0 means no limit. Defaults to 100.
+            limit_per_host (int): The maximum number of simultaneous
+                connections to a single host. 0 means no limit. Defaults to 0.
+            keepalive_timeout (float): Seconds an idle connection is kept
+                open for reuse. Defaults to 15.
+            ttl_dns_cache (Optional[int]): Seconds resolved addresses are
+                cached. None caches them forever. Defaults to 10.
+            stream_chunk_size (int): The maximum number of bytes read at a
+                time from streaming responses. Reads return whatever has
+                arrived, so this does not delay chunks. Defaults to 65536.
+            codec (Optional[JSONCodec]): Encodes requests and decodes
+                responses. Defaults to orjson when it is installed and the
+                standard library otherwise.
+            retry_policy (Optional[RetryPolicy]): Retries requests that fail
+                with a connection error, a timeout or a transient status such
+                as 429 or 503. Defaults to None, which never retries.
+            circuit_breaker_policy (Optional[CircuitBreakerPolicy]): Rejects
+                requests to an endpoint with CircuitOpenException while most
+                recent requests to it failed or were slow, instead of waiting
+                for them to time out. Defaults to None.
+            rate_limiter (Optional[RateLimiter]): Delays requests to stay
+                under a request rate and an estimated token rate. Defaults
+                to None.
+            hedging_policy (Optional[HedgingPolicy]): Sends a duplicate of
+                non-streaming requests that are slower than usual and uses
+                the first response. Defaults to None, which never hedges.
+            concurrency_limiter (Optional[AdaptiveConcurrencyLimiter]):
+                Queues requests beyond a per-endpoint limit on requests in
+                flight that adapts to the latency and errors observed.
+                Defaults to None, which does not limit concurrency.
+            timeout (Optional[Timeout]): The connect, first byte and stream
+                idle timeouts, and the default deadline of a whole call.
+                Defaults to Timeout().
+            single_flight (Optional[SingleFlight]): Shares one request
+                between identical non-streaming calls made at the same time.
+                Defaults to None, which sends every call.
+            cache (Optional[ResponseCache]): Answers repeated deterministic
+                requests, such as chat completions with temperature 0, from
+                earlier responses. Defaults to None.
+            embedding_cache (Optional[SQLiteEmbeddingCache]): Stores the
+                embedding of each input persistently, so that embeddings
+                requests only send the inputs not embedded before. Defaults
+                to None.
+            embedding_split (Optional[EmbeddingSplitPolicy]): How embeddings
+                requests with many inputs are split into concurrent
+                requests. Defaults to EmbeddingSplitPolicy().
+            embedding_batcher (Optional[EmbeddingMicroBatcher]): Collects
+                small embeddings calls made at the same time into one
+                request. Defaults to None, which sends every call.
+            hooks (Optional[RequestHooks]): Callbacks notified as each
+                request starts, gets its token and its connection, receives
+                its first byte and its chunks, and completes, with the times
+                and sizes of each step. Defaults to None.
         """
-        super().__init__(base_url)
+        super().__init__(base_url,
+                         codec=codec,
+                         retry_policy=retry_policy,
+                         circuit_breaker_policy=circuit_breaker_policy,
+                         rate_limiter=rate_limiter,
+                         timeout=timeout,
+                         single_flight=single_flight,
+                         cache=cache,
+                         embedding_cache=embedding_cache,
+                         embedding_split=embedding_split,
+                         hooks=hooks)
+        self.stream_chunk_size = stream_chunk_size
+        self.hedging_policy = hedging_policy
+        self.concurrency_limiter = concurrency_limiter
+        self.embedding_batcher = embedding_batcher
+        self._connector_options: Dict[str, Any] = {
+            "limit": limit,
+            "limit_per_host": limit_per_host,
+            "keepalive_timeout": keepalive_timeout,
+            "ttl_dns_cache": ttl_dns_cache,
+        }
+        self._sessions: MutableMapping[asyncio.AbstractEventLoop,
+                                       aiohttp.ClientSession] = (
+                                           weakref.WeakKeyDictionary())
 
         self.chat = AsyncChat(self)
         self.embeddings = AsyncEmbeddings(self)
         self.completions = AsyncCompletions(self)
 
+    def _get_session(self) -> aiohttp.ClientSession:
+        """
+        Gets the session bound to the running event loop, creating it on
+        first use.
+
+        aiohttp sessions cannot be shared between event loops, so a client
+        used from a new loop (e.g. successive asyncio.run calls) gets a
+        session of its own instead of failing inside aiohttp.
+
+        Returns:
+            aiohttp.ClientSession: The session for the running loop.
+        """
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            closed_loops = [x for x in self._sessions if x.is_closed()]
+            for closed_loop in closed_loops:
+                del self._sessions[closed_loop]
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(**self._connector_options),
+                trace_configs=None
+                if self.hooks is None else [aiohttp_trace_config()])
+            self._sessions[loop] = session
+        return session
+
+    def _get_concurrency_limit(self, path: str) -> Optional[ConcurrencyLimit]:
+        """
+        Gets the adaptive concurrency limit of an API path.
+
+        Parameters:
+            path: The API path.
+
+        Returns:
+            The limit, or None if the client has no concurrency limiter.
+        """
+        limiter = self.concurrency_limiter
+        return None if limiter is None else limiter.get(self.base_url, path)
+
+    async def aclose(self) -> None:
+        """
+        Closes the sessions and pooled connections held by the client.
+
+        Sessions opened on other event loops that are still running are
+        closed on their own loop.
+        """
+        current_loop = asyncio.get_running_loop()
+        sessions = list(self._sessions.items())
+        self._sessions.clear()
+        for loop, session in sessions:
+            if loop is current_loop:
+                await session.close()
+            elif loop.is_running():
+                await asyncio.wrap_future(
+                    asyncio.run_coroutine_threadsafe(session.close(), loop))
+
+    async def __aenter__(self) -> "AsyncModelfarm":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.aclose()
+
+    def batch(
+        self,
+        requests: Iterable[BatchRequest],
+        concurrency: int = 16,
+        ordered: bool = True,
+        on_progress: Optional[ProgressCallback] = None,
+    ) -> AsyncIterator[BatchResult]:
+        """
+        Sends a batch of independent requests concurrently.
+
+        A failed request is reported in its result instead of stopping the
+        batch. Requests still in flight are cancelled if iteration stops
+        early.
+
+        Args:
+            requests (Iterable[BatchRequest]): The requests to send, read
+                lazily as slots free up.
+            concurrency (int): The number of requests in flight at once.
+                Defaults to 16.
+            ordered (bool): Whether to yield results in the order of the
+                requests rather than as they finish. Defaults to True.
+            on_progress (Optional[ProgressCallback]): Called with a
+                BatchProgress after each request finishes.
+
+        Returns:
+            AsyncIterator[BatchResult]: The result of each request.
+        """
+        return run_batch_async(self, requests, concurrency, ordered,
+                               on_progress)
+
     @asynccontextmanager
     async def _post(
         self,
         path: str,
         payload: Optional[Dict[str, Any]] = None,
-        timeout: float = 15,
+        call: Optional[CallTimeout] = None,
+        trace: Optional[RequestTrace] = None,
+        charged: bool = False,
         **kwargs,
     ) -> AsyncGenerator[ClientResponse, None]:
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(
-                total=timeout)) as session, session.post(
-                    url=self.base_url + path,
-                    headers=self._get_auth_headers(),
-                    json=payload,
-                    **kwargs) as response:
-            yield response
+        if call is None:
+            call = self.timeout.start()
+        limiter = self.rate_limiter
+        if limiter is not None:
+            # The tokens of a call are taken once, by its first attempt or by
+            # the caller before hedging it.
+            await limiter.acquire_async(
+                0 if charged else limiter.estimate(payload))
+        concurrency = self._get_concurrency_limit(path)
+        if concurrency is not None:
+            await concurrency.acquire()
+        latency: Optional[float] = None
+        dropped = False
+        try:
+            # The deadline may have passed while waiting for the limiters.
+            connect, first_byte, total = call.request_timeouts()
+            breaker = self._get_circuit_breaker(path)
+            if breaker is not None:
+                breaker.acquire()
+            start = time.monotonic()
+            try:
+                data = None if payload is None else self.codec.dumps(payload)
+                if trace is not None:
+                    trace.start(data)
+                headers = self._get_headers()
+                if trace is not None:
+                    trace.emit("auth")
+                    kwargs["trace_request_ctx"] = trace
+                # sock_read bounds the wait for the headers and, as it also
+                # applies between reads, caps the idle timeout of streams.
+                async with self._get_session().post(
+                        url=self.base_url + path,
+                        headers=headers,
+                        data=data,
+                        timeout=aiohttp.ClientTimeout(total=total,
+                                                      sock_connect=connect,
+                                                      sock_read=first_byte),
+                        **kwargs) as response:
+                    latency = time.monotonic() - start
+                    if trace is not None:
+                        trace.first_byte()
+                    if breaker is not None:
+                        breaker.record(
+                            response.status in breaker.policy.failure_statuses,
+                            latency)
+                    if concurrency is not None:
+                        dropped = (response.status
+                                   in concurrency.limiter.drop_statuses)
+                    yield response
+            except _ASYNC_RETRYABLE_ERRORS:
+                if latency is None:
+                    latency = time.monotonic() - start
+                    dropped = True
+                    if breaker is not None:
+                        breaker.record(True, latency)
+                raise
+            finally:
+                if breaker is not None and latency is None:
+                    breaker.release()
+        finally:
+            if concurrency is not None:
+                concurrency.release(latency, dropped)
+
+    async def _post_json(
+        self,
+        path: str,
+        payload: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        **kwargs,
+    ) -> Any:
+        """
+        Makes a non-streaming request and decodes its response, answering it
+        from the client's cache, hedging it and sharing it with identical
+        calls in flight as configured.
+
+        Parameters:
+            path: The API path to post to.
+            payload: The JSON request payload.
+            deadline: Seconds the call may take, including retries and
+                hedges. Defaults to the deadline of the client's timeout.
+
+        Returns:
+            The decoded JSON body of a successful response.
+        """
+        cache, flight, key = self._share_request(path, payload)
+        if cache is not None:
+            rjson = cache.get(key)
+            if rjson is not None:
+                return rjson
+        call = self.timeout.start(deadline)
+
+        async def send() -> Any:
+            if self.hedging_policy is None:
+                rjson = await self._request_json(call,
+                                                 path,
+                                                 payload=payload,
+                                                 **kwargs)
+            else:
+                limiter = self.rate_limiter
+                if limiter is not None:
+                    # Hedges are duplicates of one call, which takes its
+                    # tokens once, whichever attempt wins.
+                    await limiter.acquire_async(limiter.estimate(payload),
+                                                requests=0)
+                rjson = await self.hedging_policy.run(
+                    lambda: self._request_json(call,
+                                               path,
+                                               payload=payload,
+                                               charged=limiter is not None,
+                                               **kwargs))
+            if cache is not None:
+                self._cache_response(cache, key, rjson)
+            return rjson
+
+        if flight is None:
+            return await send()
+        return await flight.do_async(key, send)
+
+    async def _request_json(
+        self,
+        call: CallTimeout,
+        path: str,
+        payload: Optional[Dict[str, Any]] = None,
+        charged: bool = False,
+        **kwargs,
+    ) -> Any:
+        """
+        Makes one non-streaming request, retrying it as allowed by the retry
+        policy and the deadline of the call.
+
+        The body is decoded once and the result is shared by the status check
+        and the caller.
+
+        Parameters:
+            call: The timeouts of the call.
+            path: The API path to post to.
+            payload: The JSON request payload.
+            charged: Whether the tokens of the call were already taken, by
+                the caller rather than by the first attempt.
+
+        Returns:
+            The decoded JSON body of a successful response.
+        """
+        retry = RetryState(self.retry_policy)
+        trace = self._trace(path, payload)
+        try:
+            while True:
+                try:
+                    async with self._post(path,
+                                          payload=payload,
+                                          call=call,
+                                          trace=trace,
+                                          charged=charged or retry.attempt > 1,
+                                          **kwargs) as response:
+                        delay = retry.delay_for(
+                            response.status,
+                            response.headers.get("Retry-After"))
+                        if delay is None or not call.allows(delay):
+                            await self._check_response(response)
+                            rjson = await self._decode_response(
+                                response, trace)
+                            break
+                except _ASYNC_RETRYABLE_ERRORS:
+                    delay = retry.delay()
+                    if delay is None or not call.allows(delay):
+                        raise
+                await asyncio.sleep(delay)
+        except BaseException as e:
+            if trace is not None:
+                trace.complete(e)
+            raise
+        self._reconcile_usage(payload, rjson)
+        if trace is not None:
+            trace.complete()
+        return rjson
+
+    def _post_stream(
+        self,
+        path: str,
+        payload: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        **kwargs,
+    ) -> AsyncIterator[Any]:
+        """
+        Makes a streaming request and decodes its chunks, replaying them from
+        the client's cache if the request is cached.
+
+        Parameters:
+            path: The API path to post to.
+            payload: The JSON request payload.
+            deadline: Seconds the call may take, including retries and
+                reading the whole stream. Defaults to the deadline of the
+                client's timeout.
+
+        Returns:
+            An asynchronous iterator of the decoded JSON chunks.
+        """
+        cache, key = self._get_stream_cache(path, payload)
+        if cache is None:
+            return self._stream(path, payload, deadline, **kwargs)
+        return self._cache_stream(cache, key, path, payload, deadline,
+                                  **kwargs)
+
+    async def _cache_stream(
+        self,
+        cache: ResponseCache,
+        key: str,
+        path: str,
+        payload: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        **kwargs,
+    ) -> AsyncIterator[Any]:
+        """
+        Replays a cached stream, or makes the request and stores its chunks
+        once it has been read to the end.
+        """
+        chunks = cache.get(key)
+        if chunks is None:
+            chunks = []
+            async for obj in self._stream(path, payload, deadline, **kwargs):
+                chunks.append(obj)
+                yield obj
+            self._cache_response(cache, key, chunks)
+            return
+        for obj in chunks:
+            yield obj
+
+    async def _stream(
+        self,
+        path: str,
+        payload: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        **kwargs,
+    ) -> AsyncIterator[Any]:
+        """
+        Makes a streaming request and decodes its chunks.
+
+        Failures are retried until the first chunk has been received; after
+        that they are raised, since the request cannot be resumed.
+
+        Parameters:
+            path: The API path to post to.
+            payload: The JSON request payload.
+            deadline: Seconds the call may take, including retries and
+                reading the whole stream. Defaults to the deadline of the
+                client's timeout.
+
+        Yields:
+            The decoded JSON chunks of a successful response.
+
+        Raises:
+            StreamTimeoutException: If no chunk arrives within the idle
+                timeout or the deadline passes.
+        """
+        retry = RetryState(self.retry_policy)
+        call = self.timeout.start(deadline)
+        trace = self._trace(path, payload)
+        # The last chunk reporting usage, usually the final one.
+        usage_chunk = None
+        try:
+            while True:
+                started = False
+                try:
+                    async with self._post(path,
+                                          payload=payload,
+                                          call=call,
+                                          trace=trace,
+                                          charged=retry.attempt > 1,
+                                          **kwargs) as response:
+                        delay = retry.delay_for(
+                            response.status,
+                            response.headers.get("Retry-After"))
+                        if delay is None or not call.allows(delay):
+                            await self._check_streaming_response(response)
+                            async for obj in self._parse_streaming_response(
+                                    response, call, trace):
+                                started = True
+                                if isinstance(obj, dict) and obj.get("usage"):
+                                    usage_chunk = obj
+                                yield obj
+                            break
+                except _ASYNC_RETRYABLE_ERRORS:
+                    delay = None if started else retry.delay()
+                    if delay is None or not call.allows(delay):
+                        raise
+                await asyncio.sleep(delay)
+        except BaseException as e:
+            if trace is not None:
+                trace.complete(e)
+            raise
+        self._reconcile_usage(payload, usage_chunk)
+        if trace is not None:
+            trace.complete()
 
     async def _check_response(self, response: ClientResponse) -> None:
         """
         Validates an asynchronous response from the server.
 
+        The body is only decoded when the response is an error.
+
         Parameters:
             response: The asynchronous server response to check.
 
@@ -180,18 +1299,32 @@ class AsyncModelfarm(BaseModelfarm):
             InvalidResponseException: If the response is not valid JSON.
             BadRequestException: If the response contains a 400 status code.
         """
+        if response.status == 200:
+            return
+        rjson = await self._decode_response(response)
+        self._raise_for_error_response(response.status, rjson)
+
+    async def _decode_response(self,
+                               response: ClientResponse,
+                               trace: Optional[RequestTrace] = None) -> Any:
+        """
+        Decodes the JSON body of an asynchronous response.
+
+        Parameters:
+            response: The asynchronous server response to decode.
+            trace: The trace of the call, if it is traced.
+
+        Raises:
+            InvalidResponseException: If the response is not valid JSON.
+        """
+        body = await response.read()
         try:
-            rjson = await response.json()
-        except JSONDecodeError as e:
+            if trace is None:
+                return self.codec.loads(body)
+            return trace.decode(self.codec.loads, body)
+        except ValueError as e:
             raise InvalidResponseException(
-                f"Invalid response: {response.text}") from e
-
-        if response.status == 400:
-            raise BadRequestException(rjson["detail"])
-        if response.status != 200:
-            if "detail" in rjson:
-                raise InvalidResponseException(rjson["detail"])
-            raise InvalidResponseException(rjson)
+                f"Invalid response: {body.decode('utf-8', 'replace')}") from e
 
     async def _check_streaming_response(self,
                                         response: ClientResponse) -> None:
@@ -206,37 +1339,72 @@ class AsyncModelfarm(BaseModelfarm):
         await self._check_response(response)
 
     async def _parse_streaming_response(
-            self, response: ClientResponse) -> AsyncIterator[Any]:
+            self,
+            response: ClientResponse,
+            call: Optional[CallTimeout] = None,
+            trace: Optional[RequestTrace] = None) -> AsyncIterator[Any]:
         """
         Asynchronously parses a streaming response from the server.
 
+        Data that has already arrived is read without waiting; only reads that
+        have to wait are bounded by the idle timeout.
+
         Parameters:
             response: The server's asynchronous streaming response to parse.
+            call: The timeouts of the call.
+            trace: The trace of the call, if it is traced.
 
         Yields:
             JSON objects extracted from the streaming response.
-        """
-        buffer = b""
-        decoder = json.JSONDecoder()
-        while True:
-            chunk = await response.content.read(128)
-            if not chunk:
-                break
-            buffer += chunk
-            buffer_str = buffer.decode("utf-8")
-
-            start_idx = 0
-            # Iteratively parse JSON objects
-            while start_idx < len(buffer_str):
-                try:
-                    # Load JSON object
-                    result = decoder.raw_decode(buffer_str, start_idx)
-                    json_obj, end_idx = result
 
+        Raises:
+            StreamTimeoutException: If a read times out or the deadline
+                passes.
+        """
+        if call is None:
+            call = self.timeout.start()
+        content = response.content
+        framer = self.codec.stream_framer()
+        chunks = 0
+        received = 0
+        try:
+            while True:
+                chunk = content.read_nowait(self.stream_chunk_size)
+                if not chunk:
+                    if content.at_eof():
+                        break
+                    chunk = await asyncio.wait_for(
+                        content.read(self.stream_chunk_size), call.idle)
+                    if not chunk:
+                        break
+                received += len(chunk)
+                objs = (framer.feed(chunk) if trace is None else trace.feed(
+                    framer, chunk))
+                for json_obj in objs:
+                    chunks += 1
+                    if trace is not None:
+                        trace.chunk(json_obj)
                     yield json_obj
+        except asyncio.TimeoutError as e:
+            raise _stream_timeout(call, chunks, received) from e
+        framer.close()
 
-                    # Update start index for next iteration
-                    start_idx = end_idx
-                except json.JSONDecodeError:
-                    break
-            buffer = buffer[start_idx:]
+
+def _stream_timeout(call: CallTimeout, chunks: int,
+                    received: int) -> StreamTimeoutException:
+    """
+    Describes a stream that stopped before it was complete.
+
+    Parameters:
+        call: The timeouts of the call.
+        chunks: The number of chunks yielded.
+        received: The number of bytes received.
+
+    Returns:
+        The exception to raise.
+    """
+    phase = "idle" if chunks else "first_chunk"
+    if call.expired():
+        phase = "deadline"
+    return StreamTimeoutException(phase, chunks, received,
+                                  time.monotonic() - call.started)
@@ -0,0 +1,99 @@
+import json
+from typing import Any, Union
+
+from .streaming import JSONStreamFramer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+class JSONCodec:
+    """
+    Encodes request bodies and decodes responses with the standard library.
+    """
+
+    name = "json"
+
+    def dumps(self, obj: Any) -> bytes:
+        """
+        Encodes a request payload.
+
+        NaN and infinite floats are written as NaN, Infinity and -Infinity,
+        as by json.dumps() by default.
+
+        Args:
+            obj (Any): The payload to encode.
+
+        Returns:
+            bytes: The UTF-8 encoded JSON document.
+        """
+        return json.dumps(obj, ensure_ascii=False,
+                          separators=(",", ":")).encode("utf-8")
+
+    def loads(self, data: Union[bytes, bytearray, str]) -> Any:
+        """
+        Decodes a JSON document.
+
+        Args:
+            data (Union[bytes, bytearray, str]): The document to decode.
+
+        Returns:
+            Any: The decoded value.
+
+        Raises:
+            ValueError: If the document is not valid JSON.
+        """
+        return json.loads(data)
+
+    def stream_framer(self) -> JSONStreamFramer:
+        """
+        Creates a framer that decodes streaming responses with this codec.
+
+        Returns:
+            JSONStreamFramer: A new framer.
+        """
+        return JSONStreamFramer()
+
+
+class OrjsonCodec(JSONCodec):
+    """
+    Encodes request bodies and decodes responses with orjson.
+    """
+
+    name = "orjson"
+
+    def __init__(self) -> None:
+        """
+        Initializes a new instance of the OrjsonCodec class.
+
+        Raises:
+            ImportError: If orjson is not installed.
+        """
+        if orjson is None:
+            raise ImportError("OrjsonCodec requires orjson. Install it with "
+                              "`pip install replit.ai[orjson]`.")
+
+    def dumps(self, obj: Any) -> bytes:
+        # orjson writes NaN and infinite floats as null.
+        return orjson.dumps(obj)
+
+    def loads(self, data: Union[bytes, bytearray, str]) -> Any:
+        return orjson.loads(data)
+
+    def stream_framer(self) -> JSONStreamFramer:
+        return JSONStreamFramer(loads=orjson.loads)
+
+
+def default_codec() -> JSONCodec:
+    """
+    Returns the fastest codec available.
+
+    Returns:
+        JSONCodec: An OrjsonCodec if orjson is installed, otherwise a
+            JSONCodec.
+    """
+    if orjson is not None:
+        return OrjsonCodec()
+    return JSONCodec()
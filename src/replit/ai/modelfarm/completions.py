@@ -2,6 +2,7 @@ from typing import (
     TYPE_CHECKING,
     Any,
     AsyncIterator,
+    Callable,
     Dict,
     Iterator,
     Literal,
@@ -10,6 +11,7 @@ from typing import (
     overload,
 )
 
+from replit.ai.modelfarm.chunks import ChunkMode, ChunkView, chunk_converter
 from replit.ai.modelfarm.structs.completions import (
     CompletionModelResponse,
     PromptParameter,
@@ -35,10 +37,44 @@ class Completions:
         max_tokens: Optional[int] = 1024,
         temperature: float = 0.2,
         provider_extra_parameters: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        chunks: Literal["model", "construct"] = "model",
         **kwargs: Any,
     ) -> Iterator[CompletionModelResponse]:
         ...
 
+    @overload
+    def create(
+        self,
+        *,
+        model: str,
+        prompt: PromptParameter,
+        stream: Literal[True],
+        max_tokens: Optional[int] = 1024,
+        temperature: float = 0.2,
+        provider_extra_parameters: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        chunks: Literal["dict"],
+        **kwargs: Any,
+    ) -> Iterator[Dict[str, Any]]:
+        ...
+
+    @overload
+    def create(
+        self,
+        *,
+        model: str,
+        prompt: PromptParameter,
+        stream: Literal[True],
+        max_tokens: Optional[int] = 1024,
+        temperature: float = 0.2,
+        provider_extra_parameters: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        chunks: Literal["view"],
+        **kwargs: Any,
+    ) -> Iterator[ChunkView]:
+        ...
+
     @overload
     def create(
         self,
@@ -49,6 +85,8 @@ class Completions:
         max_tokens: Optional[int] = 1024,
         temperature: float = 0.2,
         provider_extra_parameters: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        chunks: ChunkMode = "model",
         **kwargs: Any,
     ) -> CompletionModelResponse:
         ...
@@ -62,8 +100,11 @@ class Completions:
         max_tokens: Optional[int] = 1024,
         temperature: float = 0.2,
         provider_extra_parameters: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        chunks: ChunkMode = "model",
         **kwargs: Any,
-    ) -> Union[CompletionModelResponse, Iterator[CompletionModelResponse]]:
+    ) -> Union[CompletionModelResponse, Iterator[CompletionModelResponse],
+               Iterator[Dict[str, Any]], Iterator[ChunkView]]:
         """
         Makes a generation based on the messages and parameters.
 
@@ -76,9 +117,18 @@ class Completions:
             temperature (float): The temperature of the generation. Defaults to 0.2.
             provider_extra_parameters (Optional[Dict[str, Any]]): Extra parameters
                 of the speficic provider. Defaults to None.
+            deadline (Optional[float]): Seconds the whole call may take,
+                including retries and reading a stream. Defaults to the
+                deadline of the client's timeout.
+            chunks (ChunkMode): How the chunks of a stream are returned.
+                "model" validates each chunk, "construct" builds its model
+                without validation, "dict" returns the decoded chunks and
+                "view" a ChunkView of each, validated only when asked.
+                Defaults to "model".
 
         Returns:
-          If stream is True, returns an iterator of CompletionModelResponse.
+          If stream is True, returns an iterator of CompletionModelResponse,
+          or of the chunks in the form chosen by chunks.
           Otherwise, returns a CompletionModelResponse.
 
         """
@@ -89,6 +139,8 @@ class Completions:
                 max_tokens=max_tokens,
                 temperature=temperature,
                 provider_extra_parameters=provider_extra_parameters,
+                deadline=deadline,
+                convert=chunk_converter(CompletionModelResponse, chunks),
                 **kwargs,
             )
         return self.__completion(
@@ -97,6 +149,7 @@ class Completions:
             max_tokens=max_tokens,
             temperature=temperature,
             provider_extra_parameters=provider_extra_parameters,
+            deadline=deadline,
             **kwargs,
         )
 
@@ -107,12 +160,13 @@ class Completions:
         max_tokens: Optional[int],
         temperature: float,
         provider_extra_parameters: Optional[Dict[str, Any]],
+        deadline: Optional[float],
         **kwargs: Any,
     ) -> CompletionModelResponse:
         """
         Makes a generation based on prompt(s) and parameters.
         """
-        response = self._client._post(
+        rjson = self._client._post_json(
             "/v1beta2/completions",
             payload=_build_request_payload(
                 model=model,
@@ -123,9 +177,9 @@ class Completions:
                 provider_extra_parameters=provider_extra_parameters,
                 **kwargs,
             ),
+            deadline=deadline,
         )
-        self._client._check_response(response)
-        return CompletionModelResponse(**response.json())
+        return CompletionModelResponse(**rjson)
 
     def __completion_stream(
         self,
@@ -134,27 +188,27 @@ class Completions:
         max_tokens: Optional[int],
         temperature: float,
         provider_extra_parameters: Optional[Dict[str, Any]],
+        deadline: Optional[float],
+        convert: Callable[[Dict[str, Any]], Any],
         **kwargs: Any,
-    ) -> Iterator[CompletionModelResponse]:
+    ) -> Iterator[Any]:
         """
         Create a stream of CompletionModelResponse
         """
-        response = self._client._post(
-            "/v1beta2/completions",
-            payload=_build_request_payload(
-                model=model,
-                prompt=prompt,
-                max_tokens=max_tokens,
-                temperature=temperature,
-                stream=True,
-                provider_extra_parameters=provider_extra_parameters,
-                **kwargs,
-            ),
-            stream=True,
-        )
-        self._client._check_streaming_response(response)
-        for chunk in self._client._parse_streaming_response(response):
-            yield CompletionModelResponse(**chunk)
+        for chunk in self._client._post_stream(
+                "/v1beta2/completions",
+                payload=_build_request_payload(
+                    model=model,
+                    prompt=prompt,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    stream=True,
+                    provider_extra_parameters=provider_extra_parameters,
+                    **kwargs,
+                ),
+                deadline=deadline,
+        ):
+            yield convert(chunk)
 
 
 class AsyncCompletions:
@@ -173,10 +227,44 @@ class AsyncCompletions:
         max_tokens: Optional[int] = 1024,
         temperature: float = 0.2,
         provider_extra_parameters: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        chunks: Literal["model", "construct"] = "model",
         **kwargs: Any,
     ) -> AsyncIterator[CompletionModelResponse]:
         ...
 
+    @overload
+    async def create(
+        self,
+        *,
+        model: str,
+        prompt: PromptParameter,
+        stream: Literal[True],
+        max_tokens: Optional[int] = 1024,
+        temperature: float = 0.2,
+        provider_extra_parameters: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        chunks: Literal["dict"],
+        **kwargs: Any,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        ...
+
+    @overload
+    async def create(
+        self,
+        *,
+        model: str,
+        prompt: PromptParameter,
+        stream: Literal[True],
+        max_tokens: Optional[int] = 1024,
+        temperature: float = 0.2,
+        provider_extra_parameters: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        chunks: Literal["view"],
+        **kwargs: Any,
+    ) -> AsyncIterator[ChunkView]:
+        ...
+
     @overload
     async def create(
         self,
@@ -187,6 +275,8 @@ class AsyncCompletions:
         max_tokens: Optional[int] = 1024,
         temperature: float = 0.2,
         provider_extra_parameters: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        chunks: ChunkMode = "model",
         **kwargs: Any,
     ) -> CompletionModelResponse:
         ...
@@ -200,9 +290,11 @@ class AsyncCompletions:
         max_tokens: Optional[int] = 1024,
         temperature: float = 0.2,
         provider_extra_parameters: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        chunks: ChunkMode = "model",
         **kwargs: Any,
-    ) -> Union[CompletionModelResponse,
-               AsyncIterator[CompletionModelResponse]]:
+    ) -> Union[CompletionModelResponse, AsyncIterator[CompletionModelResponse],
+               AsyncIterator[Dict[str, Any]], AsyncIterator[ChunkView]]:
         """
         Makes a generation based on the messages and parameters.
 
@@ -215,9 +307,18 @@ class AsyncCompletions:
             temperature (float): The temperature of the generation. Defaults to 0.2.
             provider_extra_parameters (Optional[Dict[str, Any]]): Extra parameters
                 of the speficic provider. Defaults to None.
+            deadline (Optional[float]): Seconds the whole call may take,
+                including retries and reading a stream. Defaults to the
+                deadline of the client's timeout.
+            chunks (ChunkMode): How the chunks of a stream are returned.
+                "model" validates each chunk, "construct" builds its model
+                without validation, "dict" returns the decoded chunks and
+                "view" a ChunkView of each, validated only when asked.
+                Defaults to "model".
 
         Returns:
-          If stream is True, returns an iterator of CompletionModelResponse.
+          If stream is True, returns an iterator of CompletionModelResponse,
+          or of the chunks in the form chosen by chunks.
           Otherwise, returns a CompletionModelResponse.
 
         """
@@ -228,6 +329,8 @@ class AsyncCompletions:
                 max_tokens=max_tokens,
                 temperature=temperature,
                 provider_extra_parameters=provider_extra_parameters,
+                deadline=deadline,
+                convert=chunk_converter(CompletionModelResponse, chunks),
                 **kwargs,
             )
         return await self.__completion(
@@ -236,6 +339,7 @@ class AsyncCompletions:
             max_tokens=max_tokens,
             temperature=temperature,
             provider_extra_parameters=provider_extra_parameters,
+            deadline=deadline,
             **kwargs,
         )
 
@@ -246,25 +350,26 @@ class AsyncCompletions:
         max_tokens: Optional[int],
         temperature: float,
         provider_extra_parameters: Optional[Dict[str, Any]],
+        deadline: Optional[float],
         **kwargs: Any,
     ) -> CompletionModelResponse:
         """
         Makes a generation based on the prompt(s) and parameters.
         """
-        async with self._client._post(
-                "/v1beta2/completions",
-                payload=_build_request_payload(
-                    model=model,
-                    prompt=prompt,
-                    max_tokens=max_tokens,
-                    temperature=temperature,
-                    stream=False,
-                    provider_extra_parameters=provider_extra_parameters,
-                    **kwargs,
-                ),
-        ) as response:
-            await self._client._check_response(response)
-            return CompletionModelResponse(**await response.json())
+        rjson = await self._client._post_json(
+            "/v1beta2/completions",
+            payload=_build_request_payload(
+                model=model,
+                prompt=prompt,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                stream=False,
+                provider_extra_parameters=provider_extra_parameters,
+                **kwargs,
+            ),
+            deadline=deadline,
+        )
+        return CompletionModelResponse(**rjson)
 
     async def __completion_stream(
         self,
@@ -273,12 +378,14 @@ class AsyncCompletions:
         max_tokens: Optional[int],
         temperature: float,
         provider_extra_parameters: Optional[Dict[str, Any]],
+        deadline: Optional[float],
+        convert: Callable[[Dict[str, Any]], Any],
         **kwargs: Any,
-    ) -> AsyncIterator[CompletionModelResponse]:
+    ) -> AsyncIterator[Any]:
         """
         Create a stream of CompletionModelResponse
         """
-        async with self._client._post(
+        async for chunk in self._client._post_stream(
                 "/v1beta2/completions",
                 payload=_build_request_payload(
                     model=model,
@@ -289,11 +396,9 @@ class AsyncCompletions:
                     provider_extra_parameters=provider_extra_parameters,
                     **kwargs,
                 ),
-        ) as response:
-            await self._client._check_streaming_response(response)
-            async for chunk in self._client._parse_streaming_response(
-                    response):
-                yield CompletionModelResponse(**chunk)
+                deadline=deadline,
+        ):
+            yield convert(chunk)
 
 
 def _build_request_payload(
@@ -0,0 +1,172 @@
+import asyncio
+import threading
+from collections import deque
+from typing import Deque, Dict, FrozenSet, Optional, Tuple
+
+from .retry import DEFAULT_RETRY_STATUSES
+
+# How fast the latency baseline may rise, per sample, when every sample is
+# slower than it. Lets the baseline follow a permanent change in latency.
+_BASELINE_DRIFT = 0.01
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limits the requests in flight to each endpoint, adjusting the limit with
+    an AIMD (additive increase, multiplicative decrease) controller.
+
+    Every request that succeeds while at least half of the limit is in use
+    raises the limit by one. Every request that fails, is rejected with a
+    retryable status such as 429 or 503, or takes more than
+    latency_tolerance times the usual latency multiplies the limit by
+    backoff_ratio. Requests over the limit wait in a FIFO queue.
+
+    A limiter keeps one limit per base URL and path and may be shared by
+    several clients.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 20,
+        min_limit: int = 1,
+        max_limit: int = 200,
+        backoff_ratio: float = 0.9,
+        latency_tolerance: float = 2.0,
+        drop_statuses: FrozenSet[int] = DEFAULT_RETRY_STATUSES,
+    ) -> None:
+        """
+        Initializes a new instance of the AdaptiveConcurrencyLimiter class.
+
+        Args:
+            initial_limit (int): The limit of a new endpoint. Defaults to 20.
+            min_limit (int): The lowest limit. Defaults to 1.
+            max_limit (int): The highest limit. Defaults to 200.
+            backoff_ratio (float): The factor applied to the limit when a
+                request signals congestion. Defaults to 0.9.
+            latency_tolerance (float): Requests slower than this multiple of
+                the lowest recent latency signal congestion. Defaults to 2.
+            drop_statuses (FrozenSet[int]): The HTTP statuses that signal
+                congestion. Defaults to 408, 429 and 5xx.
+        """
+        self.initial_limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_ratio = backoff_ratio
+        self.latency_tolerance = latency_tolerance
+        self.drop_statuses = drop_statuses
+        self.limits: Dict[Tuple[str, str], ConcurrencyLimit] = {}
+        self._lock = threading.Lock()
+
+    def get(self, base_url: str, path: str) -> "ConcurrencyLimit":
+        """
+        Gets the limit of an endpoint, creating it on first use.
+
+        Args:
+            base_url (str): The root URL of the Modelfarm API.
+            path (str): The API path.
+
+        Returns:
+            ConcurrencyLimit: The limit applied to requests to the endpoint.
+        """
+        key = (base_url, path)
+        limit = self.limits.get(key)
+        if limit is None:
+            with self._lock:
+                limit = self.limits.setdefault(key, ConcurrencyLimit(self))
+        return limit
+
+
+class ConcurrencyLimit:
+    """
+    The adaptive concurrency limit of one endpoint.
+
+    Callers await acquire() before sending a request and call release() once
+    it is done, with its latency and whether it signalled congestion.
+    """
+
+    def __init__(self, limiter: AdaptiveConcurrencyLimiter) -> None:
+        """
+        Initializes a new instance of the ConcurrencyLimit class.
+
+        Args:
+            limiter (AdaptiveConcurrencyLimiter): The settings to apply.
+        """
+        self.limiter = limiter
+        self.in_flight = 0
+        self._limit = float(limiter.initial_limit)
+        self._baseline: Optional[float] = None
+        self._waiters: Deque["asyncio.Future[None]"] = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self) -> int:
+        """The number of requests allowed in flight."""
+        return int(self._limit)
+
+    @property
+    def queue_depth(self) -> int:
+        """The number of requests waiting for a slot."""
+        return len(self._waiters)
+
+    async def acquire(self) -> None:
+        """
+        Waits until a request may be sent, in FIFO order.
+        """
+        with self._lock:
+            if not self._waiters and self.in_flight < self.limit:
+                self.in_flight += 1
+                return
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    raise
+            # The slot was handed over just before the cancellation. If the
+            # waiter itself was cancelled, _hand_over gives the slot back.
+            if not waiter.cancelled():
+                self.release(None, False)
+            raise
+
+    def release(self, latency: Optional[float], dropped: bool) -> None:
+        """
+        Frees the slot of a request and adjusts the limit.
+
+        Args:
+            latency (Optional[float]): Seconds the request took, or None if
+                it ended without a meaningful latency (e.g. it was
+                cancelled).
+            dropped (bool): Whether the request failed in a way that signals
+                congestion.
+        """
+        limiter = self.limiter
+        with self._lock:
+            if dropped or self._is_slow(latency):
+                self._limit = max(limiter.min_limit,
+                                  self._limit * limiter.backoff_ratio)
+            elif latency is not None and self.in_flight * 2 >= self.limit:
+                self._limit = min(limiter.max_limit, self._limit + 1)
+            self.in_flight -= 1
+            while self._waiters and self.in_flight < self.limit:
+                waiter = self._waiters.popleft()
+                self.in_flight += 1
+                waiter.get_loop().call_soon_threadsafe(self._hand_over, waiter)
+
+    def _is_slow(self, latency: Optional[float]) -> bool:
+        if latency is None:
+            return False
+        baseline = self._baseline
+        if baseline is None:
+            self._baseline = latency
+            return False
+        self._baseline = min(latency, baseline * (1 + _BASELINE_DRIFT))
+        return latency > baseline * self.limiter.latency_tolerance
+
+    def _hand_over(self, waiter: "asyncio.Future[None]") -> None:
+        if waiter.cancelled():
+            self.release(None, False)
+        else:
+            waiter.set_result(None)
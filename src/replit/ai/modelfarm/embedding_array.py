@@ -0,0 +1,88 @@
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from replit.ai.modelfarm.embedding_encoding import (
+    decode_base64,
+    decode_base64_rows,
+)
+from replit.ai.modelfarm.structs.google import GoogleEmbeddingMetadata
+from replit.ai.modelfarm.structs.shared import Usage
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - depends on the environment
+    numpy = None
+
+if TYPE_CHECKING:
+    import numpy.typing as npt
+
+
+@dataclass
+class EmbeddingArrayResponse:
+    """
+    An embeddings response holding the embeddings in one NumPy array.
+
+    Attributes:
+        embeddings (npt.NDArray[numpy.float32]): A C-contiguous array with
+            one row per input, in the order of the inputs.
+        model (str): The name of the model.
+        usage (Optional[Usage]): The tokens used by the request.
+        metadata (Optional[GoogleEmbeddingMetadata]): The metadata of the
+            response.
+        item_metadata (List[Optional[Dict[str, Any]]]): The metadata of each
+            embedding, such as whether its input was truncated.
+    """
+
+    embeddings: "npt.NDArray[numpy.float32]"
+    model: str
+    usage: Optional[Usage]
+    metadata: Optional[GoogleEmbeddingMetadata]
+    item_metadata: List[Optional[Dict[str, Any]]]
+
+    def __len__(self) -> int:
+        return len(self.embeddings)
+
+
+def to_array_response(rjson: Dict[str, Any]) -> EmbeddingArrayResponse:
+    """
+    Builds an EmbeddingArrayResponse from a decoded embeddings response,
+    without creating a model object per embedding. Base64 encoded
+    embeddings are decoded straight into the array.
+
+    Args:
+        rjson (Dict[str, Any]): The decoded response.
+
+    Returns:
+        EmbeddingArrayResponse: The response.
+
+    Raises:
+        ImportError: If NumPy is not installed.
+    """
+    if numpy is None:
+        raise ImportError("output='numpy' requires NumPy. Install it with "
+                          "`pip install replit.ai[numpy]`.")
+    data: List[Dict[str, Any]] = [{}] * len(rjson["data"])
+    for item in rjson["data"]:
+        data[item["index"]] = item
+    if data and all(isinstance(item["embedding"], str) for item in data):
+        buffer = decode_base64_rows([item["embedding"] for item in data])
+        embeddings = numpy.frombuffer(buffer, dtype="<f4").reshape(
+            len(data), -1).astype(numpy.float32, copy=False)
+    else:
+        dimensions = len(data[0]["embedding"]) if data else 0
+        embeddings = numpy.empty((len(data), dimensions), dtype=numpy.float32)
+        for i, item in enumerate(data):
+            embedding = item["embedding"]
+            embeddings[i] = (decode_base64(embedding) if isinstance(
+                embedding, str) else embedding)
+    item_metadata = [item.get("metadata") for item in data]
+    usage = rjson.get("usage")
+    metadata = rjson.get("metadata")
+    return EmbeddingArrayResponse(
+        embeddings=embeddings,
+        model=rjson.get("model", ""),
+        usage=None if usage is None else Usage(**usage),
+        metadata=None if metadata is None else GoogleEmbeddingMetadata(
+            **metadata),
+        item_metadata=item_metadata,
+    )
@@ -0,0 +1,168 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from .cache import request_key
+from .embedding_cache import split_inputs
+
+# Posts an embeddings payload and returns the decoded response.
+Send = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+
+@dataclass
+class MicroBatchStats:
+    """
+    Counts the calls made through an embedding micro-batcher.
+
+    Attributes:
+        calls (int): The number of calls made.
+        batches (int): The number of upstream requests sent.
+        sizes (Dict[int, int]): The number of requests sent, by number of
+            inputs.
+        callers (Dict[int, int]): The number of requests sent, by number of
+            calls sharing them.
+    """
+
+    calls: int = 0
+    batches: int = 0
+    sizes: Dict[int, int] = field(default_factory=dict)
+    callers: Dict[int, int] = field(default_factory=dict)
+
+    @property
+    def mean_size(self) -> float:
+        inputs = sum(size * count for size, count in self.sizes.items())
+        return inputs / self.batches if self.batches else 0.0
+
+    def record(self, size: int, callers: int) -> None:
+        self.batches += 1
+        self.sizes[size] = self.sizes.get(size, 0) + 1
+        self.callers[callers] = self.callers.get(callers, 0) + 1
+
+
+class _Batch:
+    """The inputs collected for one upstream request, and their callers."""
+
+    def __init__(self, params: Dict[str, Any], send: Send) -> None:
+        self.params = params
+        self.send = send
+        self.inputs: List[Any] = []
+        # (offset, count, future) of each caller.
+        self.waiters: List[Tuple[int, int, "asyncio.Future[Any]"]] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class EmbeddingMicroBatcher:
+    """
+    Collects small embeddings calls made concurrently on an event loop and
+    sends them as one upstream request.
+
+    The first call starts a batch, which is sent window seconds later or as
+    soon as it holds max_batch_size inputs. Calls with the same model and
+    parameters join the batch in the meantime, and each gets the embeddings
+    of its own inputs, indexed from 0. Calls without inputs, or with
+    max_batch_size inputs or more, are sent on their own.
+
+    Since the usage of a shared request cannot be attributed to its callers,
+    a response shared by several calls has no usage or metadata. Options
+    such as the deadline are those of the call that started the batch.
+    """
+
+    def __init__(self,
+                 window: float = 0.005,
+                 max_batch_size: int = 64) -> None:
+        """
+        Initializes a new instance of the EmbeddingMicroBatcher class.
+
+        Args:
+            window (float): Seconds to wait for other calls once a batch is
+                started. Defaults to 0.005.
+            max_batch_size (int): The maximum number of inputs of a batch.
+                Defaults to 64.
+        """
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.stats = MicroBatchStats()
+        self._batches: Dict[Tuple[asyncio.AbstractEventLoop, str], _Batch] = {}
+        self._tasks: Set["asyncio.Task[None]"] = set()
+
+    async def submit(self, payload: Dict[str, Any],
+                     send: Send) -> Dict[str, Any]:
+        """
+        Adds an embeddings request to a batch and waits for its response.
+
+        Args:
+            payload (Dict[str, Any]): The request payload.
+            send (Send): Posts a payload and returns the decoded response.
+
+        Returns:
+            Dict[str, Any]: The response to the request.
+        """
+        self.stats.calls += 1
+        inputs = split_inputs(payload.get("input"))
+        if not inputs or len(inputs) >= self.max_batch_size:
+            self.stats.record(len(inputs or ()), 1)
+            return await send(payload)
+
+        loop = asyncio.get_running_loop()
+        params = {k: v for k, v in payload.items() if k != "input"}
+        # Text and token ids cannot be mixed in one request.
+        kind = "text" if isinstance(inputs[0], str) else "tokens"
+        key = (loop, request_key(kind, params))
+        batch = self._batches.get(key)
+        if batch is not None and (len(batch.inputs) + len(inputs)
+                                  > self.max_batch_size):
+            self._flush(key, batch)
+            batch = None
+        if batch is None:
+            batch = self._batches[key] = _Batch(params, send)
+            batch.timer = loop.call_later(self.window, self._flush, key, batch)
+
+        future = loop.create_future()
+        batch.waiters.append((len(batch.inputs), len(inputs), future))
+        batch.inputs.extend(inputs)
+        if len(batch.inputs) >= self.max_batch_size:
+            self._flush(key, batch)
+        return await future
+
+    def _flush(self, key: Tuple[asyncio.AbstractEventLoop, str],
+               batch: _Batch) -> None:
+        if self._batches.get(key) is batch:
+            del self._batches[key]
+        if batch.timer is not None:
+            batch.timer.cancel()
+        # The event loop only keeps weak references to tasks.
+        task = asyncio.ensure_future(self._send(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: _Batch) -> None:
+        if all(future.done() for _, _, future in batch.waiters):
+            return
+        self.stats.record(len(batch.inputs), len(batch.waiters))
+        try:
+            rjson = await batch.send({**batch.params, "input": batch.inputs})
+        except asyncio.CancelledError:
+            for _, _, future in batch.waiters:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, _, future in batch.waiters:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        data = {item["index"]: item for item in rjson["data"]}
+        shared = len(batch.waiters) > 1
+        for offset, count, future in batch.waiters:
+            if future.done():
+                continue
+            future.set_result({
+                **rjson,
+                "data": [{
+                    **data[i], "index": i - offset
+                } for i in range(offset, offset + count) if i in data],
+                "usage":
+                None if shared else rjson.get("usage"),
+                "metadata":
+                None if shared else rjson.get("metadata"),
+            })
@@ -0,0 +1,374 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .cache import CacheStats
+
+# SQLite limits the number of parameters of a statement; lookups and
+# evictions are done in batches below that limit.
+_BATCH = 500
+
+# The access time of an entry is only refreshed when it is older than this,
+# so that reading a hot entry does not write to the database every time.
+_ACCESS_RESOLUTION = 60.0
+
+# Evicting stops once the cache is below this fraction of its maximum size,
+# so that a full cache is not trimmed on every write.
+_LOW_WATERMARK = 0.9
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    key TEXT PRIMARY KEY,
+    vector BLOB NOT NULL,
+    metadata TEXT,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS embeddings_accessed ON embeddings (accessed);
+CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY, bytes INTEGER);
+INSERT OR IGNORE INTO totals VALUES (0, 0);
+CREATE TRIGGER IF NOT EXISTS embeddings_insert AFTER INSERT ON embeddings
+BEGIN
+    UPDATE totals SET bytes = bytes + NEW.size WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS embeddings_delete AFTER DELETE ON embeddings
+BEGIN
+    UPDATE totals SET bytes = bytes - OLD.size WHERE id = 0;
+END;
+"""
+
+
+def split_inputs(value: Any) -> Optional[List[Any]]:
+    """
+    Splits the input of an embeddings request into the inputs embedded
+    separately.
+
+    Args:
+        value (Any): A string, a list of strings, a list of token ids or a
+            list of lists of token ids.
+
+    Returns:
+        Optional[List[Any]]: The inputs, or None if the value has another
+            shape.
+    """
+    if isinstance(value, str):
+        return [value]
+    if not isinstance(value, list):
+        return None
+    if all(isinstance(item, (str, list)) for item in value):
+        return value
+    if all(isinstance(item, int) for item in value):
+        return [value]
+    return None
+
+
+class SQLiteEmbeddingCache:
+    """
+    A persistent cache of embeddings stored in an SQLite database, shared
+    by every thread and process that opens the same file.
+
+    Each input is cached separately, keyed by a hash of the request
+    parameters (model, provider parameters and so on) and of the input, so
+    a request only sends the inputs that are not cached yet. Vectors are
+    stored as packed doubles.
+
+    The database uses write-ahead logging, so readers are not blocked by a
+    writer, and writers from several processes wait for each other for up to
+    timeout seconds. Once the stored vectors exceed max_bytes, the least
+    recently used ones are evicted.
+
+    Lookups and fills run on the calling thread, except from AsyncModelfarm,
+    which runs them in the event loop's default executor. The cache may be
+    used from any thread: it keeps one SQLite connection per process, opened
+    without the same-thread check, and serializes its use with a lock.
+    """
+
+    def __init__(self,
+                 path: str,
+                 max_bytes: int = 2**30,
+                 timeout: float = 30.0) -> None:
+        """
+        Initializes a new instance of the SQLiteEmbeddingCache class.
+
+        Args:
+            path (str): The database file, created if needed.
+            max_bytes (int): The maximum size of the stored vectors and
+                metadata. Defaults to 1 GiB.
+            timeout (float): Seconds to wait for another process holding a
+                lock on the database. Defaults to 30.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pid = 0
+
+    @property
+    def bytes(self) -> int:
+        """The size of the stored vectors and metadata."""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT bytes FROM totals WHERE id = 0").fetchone()
+        return row[0]
+
+    def __len__(self) -> int:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT COUNT(*) FROM embeddings").fetchone()
+        return row[0]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def lookup(self, payload: Dict[str,
+                                   Any]) -> Optional["EmbeddingCacheLookup"]:
+        """
+        Looks up the inputs of an embeddings request.
+
+        Args:
+            payload (Dict[str, Any]): The request payload.
+
+        Returns:
+            Optional[EmbeddingCacheLookup]: The hits and misses, or None if
+                the input cannot be split.
+        """
+        inputs = split_inputs(payload.get("input"))
+        if inputs is None:
+            return None
+        return EmbeddingCacheLookup(self, payload, inputs)
+
+    def keys(self, payload: Dict[str, Any], inputs: List[Any]) -> List[str]:
+        """
+        Gets the cache keys of the inputs of a request.
+
+        Args:
+            payload (Dict[str, Any]): The request payload.
+            inputs (List[Any]): The inputs, as split from the payload.
+
+        Returns:
+            List[str]: The hex SHA-256 digest of each input and the other
+                parameters of the request.
+        """
+        # Embeddings are stored decoded, whatever their encoding on the wire.
+        params = {
+            k: v
+            for k, v in payload.items()
+            if k not in ("input", "encoding_format")
+        }
+        prefix = hashlib.sha256(
+            json.dumps(params,
+                       sort_keys=True,
+                       separators=(",", ":"),
+                       ensure_ascii=False,
+                       default=str).encode("utf-8"))
+        prefix.update(b"\0")
+        keys = []
+        for item in inputs:
+            digest = prefix.copy()
+            if isinstance(item, str):
+                digest.update(item.encode("utf-8", "surrogatepass"))
+            else:
+                digest.update(json.dumps(item).encode("utf-8"))
+            keys.append(digest.hexdigest())
+        return keys
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Reads the cached embeddings of some keys.
+
+        Args:
+            keys (Sequence[str]): The keys to read.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: The embedding and metadata of every
+                key found.
+        """
+        found: Dict[str, Dict[str, Any]] = {}
+        stale: List[str] = []
+        now = time.time()
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            connection = self._connect()
+            for start in range(0, len(unique), _BATCH):
+                batch = unique[start:start + _BATCH]
+                rows = connection.execute(
+                    "SELECT key, vector, metadata, accessed FROM embeddings "
+                    f"WHERE key IN ({','.join('?' * len(batch))})", batch)
+                for key, vector, metadata, accessed in rows:
+                    values = array("d")
+                    values.frombytes(vector)
+                    found[key] = {
+                        "embedding":
+                        values.tolist(),
+                        "metadata":
+                        None if metadata is None else json.loads(metadata),
+                    }
+                    if accessed < now - _ACCESS_RESOLUTION:
+                        stale.append(key)
+            for start in range(0, len(stale), _BATCH):
+                batch = stale[start:start + _BATCH]
+                with connection:
+                    connection.execute(
+                        "UPDATE embeddings SET accessed = ? "
+                        f"WHERE key IN ({','.join('?' * len(batch))})",
+                        [now, *batch])
+            hits = sum(1 for key in keys if key in found)
+            self.stats.hits += hits
+            self.stats.misses += len(keys) - hits
+        return found
+
+    def set_many(self, items: Sequence[Tuple[str, Dict[str, Any]]]) -> None:
+        """
+        Stores embeddings, then evicts the least recently used ones if the
+        cache is over its maximum size.
+
+        Args:
+            items (Sequence[Tuple[str, Dict[str, Any]]]): The key of each
+                embedding, and a dict holding its embedding and metadata.
+        """
+        now = time.time()
+        rows = []
+        for key, item in items:
+            vector = array("d", item["embedding"]).tobytes()
+            metadata = item.get("metadata")
+            text = None if metadata is None else json.dumps(
+                metadata, separators=(",", ":"))
+            size = len(vector) + len(key) + (0 if text is None else len(text))
+            rows.append((key, vector, text, size, now))
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.executemany(
+                    "INSERT OR IGNORE INTO embeddings VALUES (?, ?, ?, ?, ?)",
+                    rows)
+                self._evict(connection)
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        (total, ) = connection.execute(
+            "SELECT bytes FROM totals WHERE id = 0").fetchone()
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * _LOW_WATERMARK
+        while total > target:
+            rows = connection.execute(
+                "SELECT key, size FROM embeddings ORDER BY accessed LIMIT ?",
+                (_BATCH, )).fetchall()
+            if not rows:
+                break
+            evicted = []
+            for key, size in rows:
+                evicted.append(key)
+                total -= size
+                if total <= target:
+                    break
+            connection.execute(
+                "DELETE FROM embeddings "
+                f"WHERE key IN ({','.join('?' * len(evicted))})", evicted)
+            self.stats.evictions += len(evicted)
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connections are not inherited across fork, so a child process
+        # opens its own.
+        if self._connection is None or self._pid != os.getpid():
+            connection = sqlite3.connect(self.path,
+                                         timeout=self.timeout,
+                                         check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            with connection:
+                connection.executescript(_SCHEMA)
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+
+class EmbeddingCacheLookup:
+    """
+    The cached and missing inputs of one embeddings request.
+
+    request() gives the payload that embeds the missing inputs, and merge()
+    stores their embeddings and assembles the response to the whole
+    request, in the original order.
+    """
+
+    def __init__(self, cache: SQLiteEmbeddingCache, payload: Dict[str, Any],
+                 inputs: List[Any]) -> None:
+        """
+        Initializes a new instance of the EmbeddingCacheLookup class.
+
+        Args:
+            cache (SQLiteEmbeddingCache): The cache to read and fill.
+            payload (Dict[str, Any]): The request payload.
+            inputs (List[Any]): The inputs, as split from the payload.
+        """
+        self.cache = cache
+        self.payload = payload
+        self.inputs = inputs
+        self.keys = cache.keys(payload, inputs)
+        self.hits = cache.get_many(self.keys)
+        self.misses = [
+            i for i, key in enumerate(self.keys) if key not in self.hits
+        ]
+
+    def request(self) -> Optional[Dict[str, Any]]:
+        """
+        Gets the payload embedding the missing inputs.
+
+        Returns:
+            Optional[Dict[str, Any]]: The payload, or None if every input is
+                cached.
+        """
+        if not self.misses:
+            return None
+        return {**self.payload, "input": [self.inputs[i] for i in self.misses]}
+
+    def merge(self, rjson: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Stores the embeddings of the missing inputs and assembles the
+        response to the whole request.
+
+        Args:
+            rjson (Optional[Dict[str, Any]]): The response to request(), or
+                None if every input was cached.
+
+        Returns:
+            Dict[str, Any]: The response, with one embedding per input and
+                the usage of the request actually sent, if any.
+        """
+        items: List[Optional[Dict[str, Any]]] = [
+            self.hits.get(key) for key in self.keys
+        ]
+        if rjson is not None:
+            fresh = []
+            for item in rjson["data"]:
+                i = self.misses[item["index"]]
+                items[i] = item
+                fresh.append((self.keys[i], item))
+            self.cache.set_many(fresh)
+        return {
+            "object":
+            "list",
+            "model":
+            self.payload.get("model", "")
+            if rjson is None else rjson.get("model"),
+            "data": [{
+                "object": "embedding",
+                "index": i,
+                "embedding": item["embedding"],
+                "metadata": item.get("metadata"),
+            } for i, item in enumerate(items) if item is not None],
+            "usage":
+            None if rjson is None else rjson.get("usage"),
+            "metadata":
+            None if rjson is None else rjson.get("metadata"),
+        }
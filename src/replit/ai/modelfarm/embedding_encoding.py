@@ -0,0 +1,80 @@
+import base64
+import sys
+from array import array
+from typing import Any, Dict, List, Sequence, Union
+
+
+def decode_base64(value: Union[str, bytes]) -> array:
+    """
+    Decodes a base64 encoded embedding.
+
+    Args:
+        value (Union[str, bytes]): The base64 encoding of little-endian
+            float32 values.
+
+    Returns:
+        array: The values, as an array of typecode "f".
+    """
+    values = array("f")
+    values.frombytes(base64.b64decode(value))
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def decode_base64_rows(values: Sequence[Union[str, bytes]]) -> bytearray:
+    """
+    Decodes base64 encoded embeddings into one buffer, one after the other,
+    without creating a Python float per value.
+
+    Args:
+        values (Sequence[Union[str, bytes]]): The encoded embeddings.
+
+    Returns:
+        bytearray: Their little-endian float32 values.
+    """
+    buffer = bytearray()
+    for value in values:
+        buffer += base64.b64decode(value)
+    return buffer
+
+
+def decode_embeddings(rjson: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Decodes the base64 encoded embeddings of a decoded embeddings response
+    into lists of floats. Embeddings already sent as lists, e.g. by an
+    upstream that does not support base64, are left as they are.
+
+    The response is not modified, since it may be shared with other callers.
+
+    Args:
+        rjson (Dict[str, Any]): The decoded response.
+
+    Returns:
+        Dict[str, Any]: The response with every embedding as a list.
+    """
+    if not any(isinstance(item["embedding"], str) for item in rjson["data"]):
+        return rjson
+    return {
+        **rjson,
+        "data": [{
+            **item, "embedding": decode_base64(item["embedding"]).tolist()
+        } if isinstance(item["embedding"], str) else item
+                 for item in rjson["data"]],
+    }
+
+
+def encode_base64(values: List[float]) -> str:
+    """
+    Encodes an embedding as base64, the way upstream does.
+
+    Args:
+        values (List[float]): The embedding.
+
+    Returns:
+        str: The base64 encoding of its little-endian float32 values.
+    """
+    packed = array("f", values)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return base64.b64encode(packed.tobytes()).decode("ascii")
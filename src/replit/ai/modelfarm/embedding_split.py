@@ -0,0 +1,136 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .embedding_cache import split_inputs
+
+# Characters per token assumed when estimating the tokens of a string.
+_CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(item: Any) -> int:
+    """
+    Estimates the number of tokens of an input.
+
+    Args:
+        item (Any): A string, or a list of token ids.
+
+    Returns:
+        int: The number of token ids, or about one token per four characters
+            of a string.
+    """
+    if isinstance(item, str):
+        return -(-len(item) // _CHARS_PER_TOKEN)
+    return len(item)
+
+
+@dataclass(frozen=True)
+class EmbeddingSplitPolicy:
+    """
+    How an embeddings request with many inputs is split into several
+    requests, sent concurrently and merged into one response. None disables
+    a limit.
+
+    Attributes:
+        max_items (Optional[int]): The maximum number of inputs of a request.
+        max_tokens (Optional[int]): The maximum estimated number of tokens
+            of a request. An input larger than this is sent on its own.
+        concurrency (int): The maximum number of requests in flight for one
+            call.
+    """
+
+    max_items: Optional[int] = 250
+    max_tokens: Optional[int] = 20000
+    concurrency: int = 4
+
+    def batches(self, inputs: Sequence[Any]) -> List[Tuple[int, int]]:
+        """
+        Splits inputs into consecutive batches within the limits.
+
+        Args:
+            inputs (Sequence[Any]): The inputs of a request.
+
+        Returns:
+            List[Tuple[int, int]]: The start and end index of each batch.
+        """
+        batches = []
+        start = tokens = 0
+        for i, item in enumerate(inputs):
+            size = 0 if self.max_tokens is None else estimate_tokens(item)
+            if i > start and (
+                (self.max_items is not None and i - start >= self.max_items) or
+                (self.max_tokens is not None
+                 and tokens + size > self.max_tokens)):
+                batches.append((start, i))
+                start, tokens = i, 0
+            tokens += size
+        if start < len(inputs):
+            batches.append((start, len(inputs)))
+        return batches
+
+    def split(
+            self,
+            payload: Dict[str,
+                          Any]) -> Optional[List[Tuple[int, Dict[str, Any]]]]:
+        """
+        Splits an embeddings request.
+
+        Args:
+            payload (Dict[str, Any]): The request payload.
+
+        Returns:
+            Optional[List[Tuple[int, Dict[str, Any]]]]: The index of the first
+                input of each request and its payload, or None if the request
+                is sent as is.
+        """
+        inputs = split_inputs(payload.get("input"))
+        if inputs is None:
+            return None
+        batches = self.batches(inputs)
+        if len(batches) < 2:
+            return None
+        return [(start, {
+            **payload, "input": inputs[start:end]
+        }) for start, end in batches]
+
+
+def merge_responses(
+        parts: Sequence[Tuple[int, Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Merges the responses to the requests of a split embeddings request.
+
+    Args:
+        parts (Sequence[Tuple[int, Dict[str, Any]]]): The index of the first
+            input of each request and its response, in order.
+
+    Returns:
+        Dict[str, Any]: The response to the whole request, with the indices
+            of the embeddings rebased and the usage summed.
+    """
+    data = []
+    usage: Optional[Dict[str, int]] = None
+    counts: Optional[Dict[str, int]] = None
+    for offset, rjson in parts:
+        data.extend({
+            **item, "index": item["index"] + offset
+        } for item in rjson["data"])
+        if rjson.get("usage") is not None:
+            usage = _add(usage, rjson["usage"])
+        metadata = rjson.get("metadata") or {}
+        if metadata.get("tokenCountMetadata") is not None:
+            counts = _add(counts, metadata["tokenCountMetadata"])
+    return {
+        **parts[0][1],
+        "data": data,
+        "usage": usage,
+        "metadata": None if counts is None else {
+            "tokenCountMetadata": counts
+        },
+    }
+
+
+def _add(total: Optional[Dict[str, int]], counts: Dict[str,
+                                                       int]) -> Dict[str, int]:
+    total = dict(total or {})
+    for key, value in counts.items():
+        total[key] = total.get(key, 0) + (value or 0)
+    return total
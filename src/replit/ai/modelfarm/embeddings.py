@@ -1,5 +1,21 @@
-from typing import TYPE_CHECKING, Any, Dict, Optional
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Literal,
+    Optional,
+    Union,
+    overload,
+)
 
+from replit.ai.modelfarm.embedding_array import (
+    EmbeddingArrayResponse,
+    to_array_response,
+)
+from replit.ai.modelfarm.embedding_encoding import decode_embeddings
+from replit.ai.modelfarm.embedding_split import merge_responses
 from replit.ai.modelfarm.structs.embeddings import (
     EmbeddingModelResponse,
     InputParameter,
@@ -8,6 +24,8 @@ from replit.ai.modelfarm.structs.embeddings import (
 if TYPE_CHECKING:
     from replit.ai.modelfarm import AsyncModelfarm, Modelfarm
 
+EMBEDDINGS_PATH = "/v1beta2/embeddings"
+
 
 class Embeddings:
     _client: "Modelfarm"
@@ -15,35 +33,122 @@ class Embeddings:
     def __init__(self, client: "Modelfarm") -> None:
         self._client = client
 
+    @overload
     def create(
         self,
         *,
         input: InputParameter,
         model: str,
         provider_extra_parameters: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        output: Literal["model"] = "model",
+        encoding_format: Optional[Literal["float", "base64"]] = None,
         **kwargs: Any,
     ) -> EmbeddingModelResponse:
+        ...
+
+    @overload
+    def create(
+        self,
+        *,
+        input: InputParameter,
+        model: str,
+        provider_extra_parameters: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        output: Literal["numpy"],
+        encoding_format: Optional[Literal["float", "base64"]] = None,
+        **kwargs: Any,
+    ) -> EmbeddingArrayResponse:
+        ...
+
+    def create(
+        self,
+        *,
+        input: InputParameter,
+        model: str,
+        provider_extra_parameters: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        output: Literal["model", "numpy"] = "model",
+        encoding_format: Optional[Literal["float", "base64"]] = None,
+        **kwargs: Any,
+    ) -> Union[EmbeddingModelResponse, EmbeddingArrayResponse]:
         """
         Makes a prediction based on the input and parameters.
 
         Args:
           input (InputParameter): The input(s) to embed.
           model (str): The name of the model.
+          deadline (Optional[float]): Seconds the call may take, including
+            retries. Defaults to the deadline of the client's timeout.
+          output (Literal["model", "numpy"]): "numpy" returns the embeddings
+            as one float32 array, which requires NumPy. Defaults to "model".
+          encoding_format (Optional[Literal["float", "base64"]]): "base64"
+            asks for the embeddings as base64 encoded float32 values, which
+            are about 3x smaller than JSON numbers and decoded straight into
+            the array with output="numpy". Embeddings are returned as floats
+            either way. Defaults to None, which sends JSON numbers.
 
         Returns:
-          EmbeddingModelResponse: The response from the model.
+          Union[EmbeddingModelResponse, EmbeddingArrayResponse]: The response
+            from the model.
         """
-        response = self._client._post(
-            "/v1beta2/embeddings",
-            payload=_build_request_payload(
-                input,
-                model,
-                provider_extra_parameters,
-                **kwargs,
-            ),
+        payload = _build_request_payload(
+            input,
+            model,
+            provider_extra_parameters,
+            encoding_format=encoding_format,
+            **kwargs,
         )
-        self._client._check_response(response)
-        return EmbeddingModelResponse(**response.json())
+        cache = self._client.embedding_cache
+        lookup = None if cache is None else cache.lookup(payload)
+        if lookup is None:
+            rjson = self._post(payload, deadline)
+        else:
+            missing = lookup.request()
+            fresh = None if missing is None else self._post(missing, deadline)
+            rjson = lookup.merge(None if fresh is
+                                 None else decode_embeddings(fresh))
+        if output == "numpy":
+            return to_array_response(rjson)
+        return EmbeddingModelResponse(**decode_embeddings(rjson))
+
+    def _post(self, payload: Dict[str, Any],
+              deadline: Optional[float]) -> Dict[str, Any]:
+        """
+        Posts an embeddings request, split into several requests sent from
+        a thread pool if it has too many inputs.
+
+        Parameters:
+            payload (Dict[str, Any]): The request payload.
+            deadline (Optional[float]): Seconds the call may take.
+
+        Returns:
+            Dict[str, Any]: The decoded response.
+        """
+        parts = self._client.embedding_split.split(payload)
+        if parts is None:
+            return self._client._post_json(EMBEDDINGS_PATH,
+                                           payload=payload,
+                                           deadline=deadline)
+        call = self._client.timeout.start(deadline)
+
+        def send(part: Dict[str, Any]) -> Dict[str, Any]:
+            # A deadline of 0 would be read as none by the HTTP client.
+            call.check()
+            return self._client._post_json(EMBEDDINGS_PATH,
+                                           payload=part,
+                                           deadline=call.remaining())
+
+        workers = min(self._client.embedding_split.concurrency, len(parts))
+        with ThreadPoolExecutor(workers) as pool:
+            futures = [pool.submit(send, part) for _, part in parts]
+            try:
+                responses = [future.result() for future in futures]
+            finally:
+                for future in futures:
+                    future.cancel()
+        return merge_responses([(parts[i][0], rjson)
+                                for i, rjson in enumerate(responses)])
 
 
 class AsyncEmbeddings:
@@ -52,14 +157,45 @@ class AsyncEmbeddings:
     def __init__(self, client: "AsyncModelfarm") -> None:
         self._client = client
 
+    @overload
     async def create(
         self,
         *,
         input: InputParameter,
         model: str,
         provider_extra_parameters: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        output: Literal["model"] = "model",
+        encoding_format: Optional[Literal["float", "base64"]] = None,
         **kwargs: Any,
     ) -> EmbeddingModelResponse:
+        ...
+
+    @overload
+    async def create(
+        self,
+        *,
+        input: InputParameter,
+        model: str,
+        provider_extra_parameters: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        output: Literal["numpy"],
+        encoding_format: Optional[Literal["float", "base64"]] = None,
+        **kwargs: Any,
+    ) -> EmbeddingArrayResponse:
+        ...
+
+    async def create(
+        self,
+        *,
+        input: InputParameter,
+        model: str,
+        provider_extra_parameters: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        output: Literal["model", "numpy"] = "model",
+        encoding_format: Optional[Literal["float", "base64"]] = None,
+        **kwargs: Any,
+    ) -> Union[EmbeddingModelResponse, EmbeddingArrayResponse]:
         """
             Makes an asynchronous embedding generation based on the input
             and parameters.
@@ -67,21 +203,105 @@ class AsyncEmbeddings:
             Args:
                 input (EmbeddingInput): The input(s) to embed.
                 model (str): The name of the model.
+                deadline (Optional[float]): Seconds the call may take,
+                    including retries. Defaults to the deadline of the
+                    client's timeout.
+                output (Literal["model", "numpy"]): "numpy" returns the
+                    embeddings as one float32 array, which requires NumPy.
+                    Defaults to "model".
+                encoding_format (Optional[Literal["float", "base64"]]):
+                    "base64" asks for the embeddings as base64 encoded
+                    float32 values, which are about 3x smaller than JSON
+                    numbers and decoded straight into the array with
+                    output="numpy". Embeddings are returned as floats either
+                    way. Defaults to None, which sends JSON numbers.
         
             Returns:
-                EmbeddingModelResponse: The response from the model.
+                Union[EmbeddingModelResponse, EmbeddingArrayResponse]: The
+                    response from the model.
             """
-        async with self._client._post(
-                "/v1beta2/embeddings",
-                payload=_build_request_payload(
-                    input,
-                    model,
-                    provider_extra_parameters,
-                    **kwargs,
-                ),
-        ) as response:
-            await self._client._check_response(response)
-            return EmbeddingModelResponse(**await response.json())
+        payload = _build_request_payload(
+            input,
+            model,
+            provider_extra_parameters,
+            encoding_format=encoding_format,
+            **kwargs,
+        )
+        cache = self._client.embedding_cache
+        # The cache blocks on sqlite, so it is read and filled from a thread
+        # of the default executor (asyncio.to_thread needs Python 3.9).
+        loop = asyncio.get_running_loop()
+        lookup = None if cache is None else await loop.run_in_executor(
+            None, cache.lookup, payload)
+        if lookup is None:
+            rjson = await self._post(payload, deadline)
+        else:
+            missing = lookup.request()
+            fresh = None if missing is None else await self._post(
+                missing, deadline)
+            rjson = await loop.run_in_executor(
+                None, lookup.merge,
+                None if fresh is None else decode_embeddings(fresh))
+        if output == "numpy":
+            return to_array_response(rjson)
+        return EmbeddingModelResponse(**decode_embeddings(rjson))
+
+    async def _post(self, payload: Dict[str, Any],
+                    deadline: Optional[float]) -> Dict[str, Any]:
+        """
+        Posts an embeddings request, through the client's micro-batcher if
+        it has one.
+
+        Parameters:
+            payload (Dict[str, Any]): The request payload.
+            deadline (Optional[float]): Seconds the call may take.
+
+        Returns:
+            Dict[str, Any]: The decoded response.
+        """
+        batcher = self._client.embedding_batcher
+        if batcher is None:
+            return await self._send(payload, deadline)
+        return await batcher.submit(payload,
+                                    lambda batch: self._send(batch, deadline))
+
+    async def _send(self, payload: Dict[str, Any],
+                    deadline: Optional[float]) -> Dict[str, Any]:
+        """
+        Posts an embeddings request, split into several requests sent from
+        concurrent tasks if it has too many inputs.
+
+        Parameters:
+            payload (Dict[str, Any]): The request payload.
+            deadline (Optional[float]): Seconds the call may take.
+
+        Returns:
+            Dict[str, Any]: The decoded response.
+        """
+        parts = self._client.embedding_split.split(payload)
+        if parts is None:
+            return await self._client._post_json(EMBEDDINGS_PATH,
+                                                 payload=payload,
+                                                 deadline=deadline)
+        call = self._client.timeout.start(deadline)
+        semaphore = asyncio.Semaphore(self._client.embedding_split.concurrency)
+
+        async def send(part: Dict[str, Any]) -> Dict[str, Any]:
+            async with semaphore:
+                # A deadline of 0 would be read as none by the HTTP client.
+                call.check()
+                return await self._client._post_json(EMBEDDINGS_PATH,
+                                                     payload=part,
+                                                     deadline=call.remaining())
+
+        tasks = [asyncio.ensure_future(send(part)) for _, part in parts]
+        try:
+            responses = await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        return merge_responses([(parts[i][0], rjson)
+                                for i, rjson in enumerate(responses)])
 
 
 def _build_request_payload(
@@ -8,3 +8,45 @@ class InvalidResponseException(ValueError):
     """Exception raised for an invalid response."""
 
     pass
+
+
+class CircuitOpenException(Exception):
+    """
+    Exception raised instead of sending a request to an endpoint whose
+    circuit breaker is open.
+
+    Attributes:
+        endpoint (str): The URL of the endpoint.
+        retry_after (float): Seconds until probe requests are let through.
+    """
+
+    def __init__(self, endpoint: str, retry_after: float) -> None:
+        super().__init__(f"Circuit open for {endpoint}, retry in "
+                         f"{retry_after:.1f}s")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class StreamTimeoutException(TimeoutError):
+    """
+    Exception raised when a streaming response stops arriving in time, or
+    when the deadline of a call passes before a request is sent.
+
+    Attributes:
+        phase (str): "first_chunk" if no chunk had arrived yet, "idle" if the
+            stream stalled between chunks, or "deadline" if the call ran out
+            of time.
+        chunks (int): The number of chunks received before the timeout.
+        bytes_received (int): The number of bytes received before the
+            timeout.
+        elapsed (float): Seconds since the call started.
+    """
+
+    def __init__(self, phase: str, chunks: int, bytes_received: int,
+                 elapsed: float) -> None:
+        super().__init__(f"Stream timed out ({phase}) after {chunks} chunks, "
+                         f"{bytes_received} bytes and {elapsed:.1f}s")
+        self.phase = phase
+        self.chunks = chunks
+        self.bytes_received = bytes_received
+        self.elapsed = elapsed
@@ -1,7 +1,8 @@
 from dataclasses import dataclass
-from typing import List
+from typing import List, Literal, Union, overload
 
 from replit.ai.modelfarm import AsyncModelfarm, Modelfarm
+from replit.ai.modelfarm.embedding_array import EmbeddingArrayResponse
 from replit.ai.modelfarm.structs.embeddings import Embedding, EmbeddingModelResponse
 
 
@@ -28,16 +29,55 @@ class TextEmbeddingModel:
     def from_pretrained(model_id: str) -> "TextEmbeddingModel":
         return TextEmbeddingModel(model_id)
 
+    @overload
+    def get_embeddings(
+            self,
+            content: List[str],
+            output: Literal["model"] = "model") -> List[TextEmbedding]:
+        ...
+
+    @overload
+    def get_embeddings(self, content: List[str],
+                       output: Literal["numpy"]) -> EmbeddingArrayResponse:
+        ...
+
     # this model only takes in the content parameter and nothing else
-    def get_embeddings(self, content: List[str]) -> List[TextEmbedding]:
+    def get_embeddings(
+        self,
+        content: List[str],
+        output: Literal["model", "numpy"] = "model",
+    ) -> Union[List[TextEmbedding], EmbeddingArrayResponse]:
         # since this model only takes the content param, we don't pass kwargs
+        if output == "numpy":
+            return self._client.embeddings.create(input=content,
+                                                  model=self.underlying_model,
+                                                  output="numpy")
         response = self._client.embeddings.create(input=content,
                                                   model=self.underlying_model)
         return self.__ready_response(response)
 
-    async def async_get_embeddings(self,
-                                   content: List[str]) -> List[TextEmbedding]:
+    @overload
+    async def async_get_embeddings(
+            self,
+            content: List[str],
+            output: Literal["model"] = "model") -> List[TextEmbedding]:
+        ...
+
+    @overload
+    async def async_get_embeddings(
+            self, content: List[str],
+            output: Literal["numpy"]) -> EmbeddingArrayResponse:
+        ...
+
+    async def async_get_embeddings(
+        self,
+        content: List[str],
+        output: Literal["model", "numpy"] = "model",
+    ) -> Union[List[TextEmbedding], EmbeddingArrayResponse]:
         # since this model only takes the content param, we don't pass kwargs
+        if output == "numpy":
+            return await self._async_client.embeddings.create(
+                input=content, model=self.underlying_model, output="numpy")
         response = await self._async_client.embeddings.create(
             input=content, model=self.underlying_model)
         return self.__ready_response(response)
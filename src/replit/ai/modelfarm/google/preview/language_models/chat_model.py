@@ -2,6 +2,7 @@ from dataclasses import dataclass
 from typing import Any, Dict, List, Optional, Union
 
 from replit.ai.modelfarm import AsyncModelfarm, Modelfarm
+from replit.ai.modelfarm.accumulator import ChatCompletionAccumulator
 from replit.ai.modelfarm.google.structs import TextGenerationResponse
 from replit.ai.modelfarm.google.utils import ready_parameters
 from replit.ai.modelfarm.structs.chat import (
@@ -98,12 +99,10 @@ class ChatSession:
             stream=True,
             **ready_parameters(predictParams),
         )
-        message = ""
-        for chunk in response:
-            transformedResponse = self.__ready_response(chunk)
-            message += transformedResponse.text
-            yield transformedResponse
-        self.add_model_message(message)
+        accumulator = ChatCompletionAccumulator()
+        for chunk in accumulator.wrap(response):
+            yield self.__ready_response(chunk)
+        self.add_model_message(accumulator.text())
 
     async def async_send_message_stream(self, message: str, **kwargs):
         self.add_user_message(message)
@@ -118,12 +117,10 @@ class ChatSession:
             stream=True,
             **ready_parameters(predictParams),
         )
-        message = ""
-        async for chunk in response:
-            transformedResponse = self.__ready_response(chunk)
-            message += transformedResponse.text
-            yield transformedResponse
-        self.add_model_message(message)
+        accumulator = ChatCompletionAccumulator()
+        async for chunk in accumulator.awrap(response):
+            yield self.__ready_response(chunk)
+        self.add_model_message(accumulator.text())
 
     def add_user_message(self, message: str):
         chatMessage = ChatMessage(content=message, author=USER_AUTHOR)
@@ -0,0 +1,162 @@
+import asyncio
+import math
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+
+@dataclass
+class HedgingStats:
+    """
+    Counts the requests made under a hedging policy.
+
+    Attributes:
+        requests (int): The number of calls made.
+        hedges_fired (int): The number of duplicate requests sent.
+        hedges_won (int): The number of calls answered by a duplicate.
+    """
+
+    requests: int = 0
+    hedges_fired: int = 0
+    hedges_won: int = 0
+
+
+class HedgingPolicy:
+    """
+    Sends a duplicate of a slow non-streaming request and uses whichever
+    response arrives first, cancelling the other one.
+
+    A duplicate is sent when no response has arrived after a fixed delay or,
+    by default, after the given percentile of recent latencies, so only the
+    slowest requests are hedged. max_hedge_rate caps the extra load: a hedge
+    is only sent while the hedges fired stay under that fraction of the
+    calls made.
+
+    A policy keeps its statistics across calls and may be shared by several
+    clients.
+    """
+
+    def __init__(
+        self,
+        delay: Optional[float] = None,
+        percentile: float = 95,
+        initial_delay: float = 1.0,
+        min_samples: int = 20,
+        window: int = 200,
+        max_hedge_rate: float = 0.05,
+        max_hedges: int = 1,
+    ) -> None:
+        """
+        Initializes a new instance of the HedgingPolicy class.
+
+        Args:
+            delay (Optional[float]): Seconds to wait before hedging. None
+                adapts the delay to recent latencies. Defaults to None.
+            percentile (float): The percentile of recent latencies used as
+                the adaptive delay. Defaults to 95.
+            initial_delay (float): The delay used until min_samples
+                latencies have been recorded. Defaults to 1.0.
+            min_samples (int): The number of latencies needed before the
+                adaptive delay is used. Defaults to 20.
+            window (int): The number of recent latencies kept. Defaults to
+                200.
+            max_hedge_rate (float): The maximum fraction of calls that may be
+                hedged. Defaults to 0.05.
+            max_hedges (int): The maximum number of duplicates sent for one
+                call. Defaults to 1.
+        """
+        self.delay = delay
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_samples = min_samples
+        self.max_hedge_rate = max_hedge_rate
+        self.max_hedges = max_hedges
+        self.stats = HedgingStats()
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def hedge_delay(self) -> float:
+        """
+        Gets the time to wait for a response before hedging.
+
+        Returns:
+            float: The delay in seconds.
+        """
+        if self.delay is not None:
+            return self.delay
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return self.initial_delay
+            latencies = sorted(self._latencies)
+        rank = math.ceil(self.percentile / 100 * len(latencies)) - 1
+        return latencies[max(0, rank)]
+
+    def record_latency(self, seconds: float) -> None:
+        """
+        Records how long a successful request took.
+
+        Args:
+            seconds (float): The latency of the request.
+        """
+        with self._lock:
+            self._latencies.append(seconds)
+
+    async def run(self, call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Awaits call(), hedging it with further calls if it is slow.
+
+        Args:
+            call (Callable[[], Awaitable[Any]]): Makes the request. It is
+                called once per attempt.
+
+        Returns:
+            Any: The result of the first attempt to succeed.
+
+        Raises:
+            Exception: The error of the last attempt, if all of them fail.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self.stats.requests += 1
+        started: Dict["asyncio.Future[Any]", float] = {}
+
+        def launch() -> "asyncio.Future[Any]":
+            future = asyncio.ensure_future(call())
+            started[future] = loop.time()
+            return future
+
+        primary = launch()
+        pending = {primary}
+        hedging = True
+        try:
+            while True:
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=self.hedge_delay() if hedging else None,
+                    return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        self.record_latency(loop.time() - started[future])
+                        if future is not primary:
+                            with self._lock:
+                                self.stats.hedges_won += 1
+                        return future.result()
+                if not done:
+                    if len(started) <= self.max_hedges and self._try_hedge():
+                        pending.add(launch())
+                    else:
+                        hedging = False
+                elif not pending:
+                    raise done.pop().exception()  # type: ignore[misc]
+        finally:
+            for future in started:
+                future.cancel()
+
+    def _try_hedge(self) -> bool:
+        with self._lock:
+            stats = self.stats
+            if stats.hedges_fired + 1 > self.max_hedge_rate * stats.requests:
+                return False
+            stats.hedges_fired += 1
+            return True
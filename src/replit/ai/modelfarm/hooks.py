@@ -0,0 +1,410 @@
+import contextlib
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Literal, Optional
+
+import aiohttp
+from pydantic import ValidationError
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from .streaming import JSONStreamFramer
+from .structs.shared import Usage
+
+RequestPhase = Literal["start", "auth", "connected", "first_byte",
+                       "first_token", "chunk", "complete"]
+
+PHASES: List[RequestPhase] = [
+    "start", "auth", "connected", "first_byte", "first_token", "chunk",
+    "complete"
+]
+
+
+@dataclass(frozen=True)
+class RequestEvent:
+    """
+    A step of a request made by a client.
+
+    Times are read from time.monotonic(), and durations are in seconds.
+
+    Attributes:
+        phase (RequestPhase): The step. "start" when an attempt is about to
+            be sent, after any wait for the rate limiter, the circuit
+            breaker or the concurrency limit; "auth" once the identity token
+            has been fetched; "connected" once a connection has been taken
+            from the pool, or opened; "first_byte" once the response headers
+            have arrived; "first_token" once the first chunk of a stream has
+            been decoded; "chunk" for each chunk of a stream, including the
+            first; and "complete" once the call has ended.
+        path (str): The API path.
+        model (Optional[str]): The model of the request.
+        time (float): When the step happened.
+        started (float): When the attempt started.
+        attempt (int): The number of attempts made, 1 for the first.
+        request_bytes (int): The size of the encoded request body.
+        response_bytes (int): The number of body bytes received so far.
+        chunks (int): The number of stream chunks decoded so far.
+        parse_time (float): The time spent decoding the body so far.
+        first_byte_at (Optional[float]): When the response headers arrived.
+        first_token_at (Optional[float]): When the first chunk of a stream
+            was decoded.
+        usage (Optional[Usage]): The usage reported by the response, once
+            it has been received.
+        reused (Optional[bool]): Whether the connection was kept alive from
+            an earlier request, for "connected".
+        error (Optional[BaseException]): The exception that ended the call,
+            for "complete". GeneratorExit means a stream was closed before
+            its end.
+    """
+
+    phase: RequestPhase
+    path: str
+    model: Optional[str]
+    time: float
+    started: float
+    attempt: int
+    request_bytes: int
+    response_bytes: int
+    chunks: int
+    parse_time: float
+    first_byte_at: Optional[float] = None
+    first_token_at: Optional[float] = None
+    usage: Optional[Usage] = None
+    reused: Optional[bool] = None
+    error: Optional[BaseException] = None
+
+    @property
+    def elapsed(self) -> float:
+        return self.time - self.started
+
+    @property
+    def time_to_first_byte(self) -> Optional[float]:
+        if self.first_byte_at is None:
+            return None
+        return self.first_byte_at - self.started
+
+    @property
+    def time_to_first_token(self) -> Optional[float]:
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started
+
+    @property
+    def tokens_per_second(self) -> Optional[float]:
+        """
+        The completion tokens generated per second after the first one, or
+        None without usage or a first token.
+        """
+        if self.usage is None or self.first_token_at is None:
+            return None
+        seconds = self.time - self.first_token_at
+        if seconds <= 0:
+            return None
+        return self.usage.completion_tokens / seconds
+
+
+RequestHook = Callable[[RequestEvent], None]
+
+
+class RequestHooks:
+    """
+    The callbacks notified of the steps of the requests made by the clients
+    sharing this object.
+
+    Callbacks run on the thread or the event loop making the request, in the
+    middle of it, so they should be quick, and an exception they raise fails
+    the request. When no callback is registered, requests are not traced at
+    all, and a phase without callbacks builds no events.
+
+    Example:
+        hooks = RequestHooks()
+        hooks.add(lambda event: print(event.time_to_first_token),
+                  phases=["complete"])
+        client = Modelfarm(hooks=hooks)
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # Replaced rather than modified, so requests read it without locking.
+        self._callbacks: Dict[str, List[RequestHook]] = {}
+
+    def add(self,
+            callback: RequestHook,
+            phases: Optional[Iterable[RequestPhase]] = None) -> None:
+        """
+        Registers a callback.
+
+        Args:
+            callback (RequestHook): Called with each event.
+            phases (Optional[Iterable[RequestPhase]]): The phases notified.
+                Defaults to all of them.
+
+        Raises:
+            ValueError: If a phase is unknown.
+        """
+        phases = PHASES if phases is None else list(phases)
+        for phase in phases:
+            if phase not in PHASES:
+                raise ValueError(f"Unknown request phase {phase!r}")
+        with self._lock:
+            callbacks = {
+                phase: list(hooks)
+                for phase, hooks in self._callbacks.items()
+            }
+            for phase in phases:
+                callbacks.setdefault(phase, []).append(callback)
+            self._callbacks = callbacks
+
+    def remove(self, callback: RequestHook) -> None:
+        """
+        Unregisters a callback from every phase.
+
+        Args:
+            callback (RequestHook): The callback.
+        """
+        with self._lock:
+            callbacks = {}
+            for phase, hooks in self._callbacks.items():
+                hooks = [hook for hook in hooks if hook != callback]
+                if hooks:
+                    callbacks[phase] = hooks
+            self._callbacks = callbacks
+
+    def trace(self, path: str,
+              payload: Optional[Dict[str, Any]]) -> Optional["RequestTrace"]:
+        """
+        Starts tracing a call.
+
+        Args:
+            path (str): The API path.
+            payload (Optional[Dict[str, Any]]): The JSON request payload.
+
+        Returns:
+            Optional[RequestTrace]: The trace, or None if no callback is
+                registered.
+        """
+        callbacks = self._callbacks
+        if not callbacks:
+            return None
+        model = payload.get("model") if payload is not None else None
+        return RequestTrace(callbacks, path, model)
+
+
+class RequestTrace:
+    """
+    The state of one traced call, which the client updates as the call
+    progresses and which notifies the callbacks of each step.
+    """
+
+    def __init__(self, callbacks: Dict[str, List[RequestHook]], path: str,
+                 model: Optional[str]) -> None:
+        self._callbacks = callbacks
+        self.path = path
+        self.model = model
+        self.started = time.monotonic()
+        self.attempt = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.chunks = 0
+        self.parse_time = 0.0
+        self.first_byte_at: Optional[float] = None
+        self.first_token_at: Optional[float] = None
+        self.usage: Optional[Usage] = None
+
+    def emit(self,
+             phase: RequestPhase,
+             reused: Optional[bool] = None,
+             error: Optional[BaseException] = None) -> None:
+        callbacks = self._callbacks.get(phase)
+        if not callbacks:
+            return
+        event = RequestEvent(phase=phase,
+                             path=self.path,
+                             model=self.model,
+                             time=time.monotonic(),
+                             started=self.started,
+                             attempt=self.attempt,
+                             request_bytes=self.request_bytes,
+                             response_bytes=self.response_bytes,
+                             chunks=self.chunks,
+                             parse_time=self.parse_time,
+                             first_byte_at=self.first_byte_at,
+                             first_token_at=self.first_token_at,
+                             usage=self.usage,
+                             reused=reused,
+                             error=error)
+        for callback in callbacks:
+            callback(event)
+
+    def start(self, body: Optional[bytes]) -> None:
+        """
+        Starts an attempt, forgetting what an earlier attempt received.
+        """
+        self.started = time.monotonic()
+        self.attempt += 1
+        self.request_bytes = 0 if body is None else len(body)
+        self.response_bytes = 0
+        self.chunks = 0
+        self.parse_time = 0.0
+        self.first_byte_at = None
+        self.first_token_at = None
+        self.emit("start")
+
+    def connected(self, reused: bool) -> None:
+        self.emit("connected", reused=reused)
+
+    def first_byte(self) -> None:
+        self.first_byte_at = time.monotonic()
+        self.emit("first_byte")
+
+    def decode(self, loads: Callable[[bytes], Any], body: bytes) -> Any:
+        """
+        Decodes a whole response body, timing it.
+        """
+        self.response_bytes += len(body)
+        began = time.perf_counter()
+        rjson = loads(body)
+        self.parse_time += time.perf_counter() - began
+        self._set_usage(rjson)
+        return rjson
+
+    def feed(self, framer: JSONStreamFramer, data: bytes) -> List[Any]:
+        """
+        Feeds a read of a stream to its framer, timing it.
+        """
+        self.response_bytes += len(data)
+        began = time.perf_counter()
+        objs = framer.feed(data)
+        self.parse_time += time.perf_counter() - began
+        return objs
+
+    def chunk(self, obj: Any) -> None:
+        """
+        Records a decoded chunk of a stream, before it is passed on.
+        """
+        self.chunks += 1
+        self._set_usage(obj)
+        if self.first_token_at is None:
+            self.first_token_at = time.monotonic()
+            self.emit("first_token")
+        self.emit("chunk")
+
+    def complete(self, error: Optional[BaseException] = None) -> None:
+        self.emit("complete", error=error)
+
+    def _set_usage(self, rjson: Any) -> None:
+        usage = rjson.get("usage") if isinstance(rjson, dict) else None
+        if usage is None:
+            return
+        with contextlib.suppress(ValidationError):
+            self.usage = Usage.model_validate(usage)
+
+    def _on_response(self, _response: Any, **_kwargs: Any) -> None:
+        # A requests response hook, which runs once the headers have
+        # arrived and before the body of a non-streaming response is read.
+        self.first_byte()
+
+    @property
+    def requests_hooks(self) -> Dict[str, Any]:
+        """
+        The hooks argument of a requests call, reporting its first byte.
+        """
+        return {"response": self._on_response}
+
+
+# The trace of the request being sent by each thread, for the connections
+# of the synchronous client, which requests gives no way to reach.
+_sending = threading.local()
+
+
+def set_sending(trace: Optional[RequestTrace]) -> None:
+    _sending.trace = trace
+
+
+class _TracingConnectionMixin:
+    """
+    Reports a new connection once it is open, and a kept-alive one when a
+    request is written to it.
+    """
+
+    # Whether the connection was opened for the request being written:
+    # HTTPS connections are opened by the pool before the request, plain
+    # HTTP ones while it is written.
+    _opened = False
+
+    def connect(self) -> None:
+        super().connect()  # type: ignore[misc]
+        self._opened = True
+        trace = getattr(_sending, "trace", None)
+        if trace is not None:
+            trace.connected(False)
+
+    def request(self, *args: Any, **kwargs: Any) -> Any:
+        trace = getattr(_sending, "trace", None)
+        sock = self.sock  # type: ignore[attr-defined]
+        if trace is not None and sock is not None and not self._opened:
+            trace.connected(True)
+        try:
+            return super().request(*args, **kwargs)  # type: ignore[misc]
+        finally:
+            self._opened = False
+
+
+class _TracingHTTPConnection(_TracingConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TracingHTTPSConnection(_TracingConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _TracingHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TracingHTTPConnection
+
+
+class _TracingHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TracingHTTPSConnection
+
+
+class TracingHTTPAdapter(HTTPAdapter):
+    """
+    An HTTPAdapter whose connections report when a request has got its
+    connection, to the trace set with set_sending().
+    """
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TracingHTTPConnectionPool,
+            "https": _TracingHTTPSConnectionPool,
+        }
+
+
+async def _on_connection_created(_session: aiohttp.ClientSession, context: Any,
+                                 _params: Any) -> None:
+    trace = context.trace_request_ctx
+    if trace is not None:
+        trace.connected(False)
+
+
+async def _on_connection_reused(_session: aiohttp.ClientSession, context: Any,
+                                _params: Any) -> None:
+    trace = context.trace_request_ctx
+    if trace is not None:
+        trace.connected(True)
+
+
+def aiohttp_trace_config() -> aiohttp.TraceConfig:
+    """
+    Creates the aiohttp tracing that reports when a request has got its
+    connection, to the RequestTrace passed as trace_request_ctx.
+
+    Returns:
+        aiohttp.TraceConfig: The tracing.
+    """
+    config = aiohttp.TraceConfig()
+    config.on_connection_create_end.append(_on_connection_created)
+    config.on_connection_reuseconn.append(_on_connection_reused)
+    return config
@@ -0,0 +1,346 @@
+import json
+import os
+from typing import TYPE_CHECKING, Any, Literal, Optional, Tuple, Union
+
+from replit.ai.modelfarm.embedding_array import EmbeddingArrayResponse
+from replit.ai.modelfarm.structs.embeddings import EmbeddingModelResponse
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - depends on the environment
+    numpy = None
+
+if TYPE_CHECKING:
+    import numpy.typing as npt
+
+Vectors = Union[EmbeddingModelResponse, EmbeddingArrayResponse,
+                "npt.ArrayLike"]
+
+# The largest score matrix, in floats, computed at once; larger query
+# batches and k-means assignments are processed in slices.
+_BLOCK = 2**24
+
+
+class EmbeddingIndex:
+    """
+    An in-memory nearest neighbour index over embeddings, stored as one
+    contiguous float32 matrix whose rows are numbered in the order they
+    were added.
+
+    Searches are exact by default: every query is scored against every row
+    with one matrix product, and the top k are selected with argpartition.
+    For large corpora, build_ivf() partitions the rows with k-means, and
+    searches then only score the rows of the nprobe partitions closest to
+    each query, trading some recall for speed.
+
+    With the cosine metric, rows and queries are normalized, so scores are
+    cosine similarities. With the dot metric, they are used as given.
+    """
+
+    def __init__(self,
+                 metric: Literal["cosine", "dot"] = "cosine",
+                 dimensions: Optional[int] = None) -> None:
+        """
+        Initializes a new instance of the EmbeddingIndex class.
+
+        Args:
+            metric (Literal["cosine", "dot"]): The similarity used to rank
+                rows. Defaults to "cosine".
+            dimensions (Optional[int]): The size of the embeddings. None
+                takes it from the first embeddings added. Defaults to None.
+
+        Raises:
+            ImportError: If NumPy is not installed.
+            ValueError: If the metric is unknown.
+        """
+        if numpy is None:
+            raise ImportError("EmbeddingIndex requires NumPy. Install it "
+                              "with `pip install replit.ai[numpy]`.")
+        if metric not in ("cosine", "dot"):
+            raise ValueError(f"Unknown metric {metric!r}")
+        self.metric = metric
+        self._vectors = numpy.zeros((0, dimensions or 0), dtype=numpy.float32)
+        self._size = 0
+        self._dimensions = dimensions
+        self.centroids: Optional["npt.NDArray[numpy.float32]"] = None
+        self._assignments: Optional["npt.NDArray[numpy.int64]"] = None
+        # Rows sorted by partition, and where each partition starts.
+        self._lists: Optional[Tuple["npt.NDArray[numpy.int64]",
+                                    "npt.NDArray[numpy.int64]"]] = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def vectors(self) -> "npt.NDArray[numpy.float32]":
+        """The stored embeddings, one row per embedding added."""
+        return self._vectors[:self._size]
+
+    def add(self, vectors: Vectors) -> range:
+        """
+        Adds embeddings to the index.
+
+        Args:
+            vectors (Vectors): An embeddings response, or an array with one
+                row per embedding.
+
+        Returns:
+            range: The row numbers of the embeddings added.
+
+        Raises:
+            ValueError: If the embeddings do not have the size of the index.
+        """
+        rows = self._as_matrix(vectors)
+        if self._dimensions is None:
+            self._dimensions = rows.shape[1]
+            self._vectors = self._vectors.reshape(0, self._dimensions)
+        start = self._size
+        end = start + len(rows)
+        if end > len(self._vectors):
+            grown = numpy.empty(
+                (max(end, 2 * len(self._vectors), 1024), self._dimensions),
+                dtype=numpy.float32)
+            grown[:start] = self._vectors[:start]
+            self._vectors = grown
+        self._vectors[start:end] = rows
+        self._size = end
+        if self.centroids is not None:
+            self._assignments = numpy.concatenate(
+                [self._assignments,
+                 self._assign(self._vectors[start:end])])
+            self._lists = None
+        return range(start, end)
+
+    def search(
+        self,
+        queries: Vectors,
+        k: int = 10,
+        nprobe: Optional[int] = None,
+    ) -> Tuple["npt.NDArray[numpy.float32]", "npt.NDArray[numpy.int64]"]:
+        """
+        Finds the rows most similar to each query.
+
+        Args:
+            queries (Vectors): An embeddings response, an array with one row
+                per query, or a single query.
+            k (int): The number of rows returned per query. Defaults to 10.
+            nprobe (Optional[int]): The number of partitions searched per
+                query once build_ivf() was called. None searches every row
+                exactly. Defaults to None.
+
+        Returns:
+            Tuple[npt.NDArray[numpy.float32], npt.NDArray[numpy.int64]]: The
+                scores and row numbers of the matches, one row per query,
+                best first. Rows are padded with -inf and -1 when the index
+                holds fewer than k candidates.
+        """
+        matrix = self._as_matrix(queries)
+        if nprobe is not None and self.centroids is not None:
+            return self._search_ivf(matrix, k, nprobe)
+
+        vectors = self.vectors
+        scores = numpy.full((len(matrix), k), -numpy.inf, dtype=numpy.float32)
+        indices = numpy.full((len(matrix), k), -1, dtype=numpy.int64)
+        if not len(vectors):
+            # The rows of an index created without dimensions have no size
+            # yet, so they cannot be multiplied with the queries.
+            return scores, indices
+        step = max(1, _BLOCK // len(vectors))
+        for start in range(0, len(matrix), step):
+            block = matrix[start:start + step] @ vectors.T
+            top_scores, top_indices = top_k(block, k)
+            scores[start:start + step, :top_scores.shape[1]] = top_scores
+            indices[start:start + step, :top_indices.shape[1]] = top_indices
+        return scores, indices
+
+    def build_ivf(self,
+                  partitions: int,
+                  iterations: int = 10,
+                  sample: Optional[int] = None,
+                  seed: int = 0) -> None:
+        """
+        Partitions the rows with k-means, so that searches with nprobe only
+        score the rows of a few partitions. Rows added later are assigned to
+        the nearest partition.
+
+        Args:
+            partitions (int): The number of partitions, typically about the
+                square root of the number of rows.
+            iterations (int): The number of k-means iterations. Defaults to
+                10.
+            sample (Optional[int]): The number of rows the partitions are
+                trained on. Defaults to None, which trains on 256 rows per
+                partition.
+            seed (int): Seeds the choice of rows. Defaults to 0.
+
+        Raises:
+            ValueError: If the index holds fewer rows than partitions.
+        """
+        vectors = self.vectors
+        if len(vectors) < partitions:
+            raise ValueError(f"Cannot build {partitions} partitions from "
+                             f"{len(vectors)} rows")
+        rng = numpy.random.default_rng(seed)
+        if sample is None:
+            sample = 256 * partitions
+        if len(vectors) > sample:
+            training = vectors[rng.choice(len(vectors), sample, replace=False)]
+        else:
+            training = vectors
+        centroids = training[rng.choice(len(training),
+                                        partitions,
+                                        replace=False)].copy()
+        for _ in range(iterations):
+            self.centroids = centroids
+            assignments = self._assign(training)
+            counts = numpy.bincount(assignments, minlength=partitions)
+            # Summed one column at a time, without a partition-by-row matrix.
+            columns = [
+                numpy.bincount(assignments, column, minlength=partitions)
+                for column in training.T
+            ]
+            sums = numpy.stack(columns, axis=1).astype(numpy.float32)
+            empty = counts == 0
+            # Empty partitions restart from random rows.
+            sums[empty] = training[rng.choice(len(training), empty.sum())]
+            counts[empty] = 1
+            centroids = sums / counts[:, None]
+            if self.metric == "cosine":
+                centroids = normalize(centroids)
+        self.centroids = centroids.astype(numpy.float32)
+        self._assignments = self._assign(vectors)
+        self._lists = None
+
+    def save(self, directory: str) -> None:
+        """
+        Saves the index as .npy files in a directory, which is created if
+        needed.
+
+        Args:
+            directory (str): The directory.
+        """
+        os.makedirs(directory, exist_ok=True)
+        numpy.save(os.path.join(directory, "vectors.npy"), self.vectors)
+        if self.centroids is not None:
+            numpy.save(os.path.join(directory, "centroids.npy"),
+                       self.centroids)
+            numpy.save(os.path.join(directory, "assignments.npy"),
+                       self._assignments)
+        with open(os.path.join(directory, "index.json"), "w") as f:
+            json.dump({"metric": self.metric}, f)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = False) -> "EmbeddingIndex":
+        """
+        Loads an index saved with save().
+
+        Args:
+            directory (str): The directory.
+            mmap (bool): Whether to map the vectors from the file instead of
+                reading them, so that large indexes load instantly and share
+                the page cache between processes. A mapped index is
+                read-only until add() copies it. Defaults to False.
+
+        Returns:
+            EmbeddingIndex: The index.
+        """
+        with open(os.path.join(directory, "index.json")) as f:
+            options = json.load(f)
+        vectors = numpy.load(os.path.join(directory, "vectors.npy"),
+                             mmap_mode="r" if mmap else None)
+        index = cls(options["metric"], vectors.shape[1])
+        index._vectors = vectors
+        index._size = len(vectors)
+        centroids = os.path.join(directory, "centroids.npy")
+        if os.path.exists(centroids):
+            index.centroids = numpy.load(centroids)
+            index._assignments = numpy.load(
+                os.path.join(directory, "assignments.npy"))
+        return index
+
+    def _as_matrix(self, vectors: Vectors) -> "npt.NDArray[numpy.float32]":
+        matrix = as_rows(vectors)
+        if self._dimensions is not None and matrix.shape[1] != self._dimensions:
+            raise ValueError(
+                f"Expected embeddings of size {self._dimensions}, "
+                f"got {matrix.shape[1]}")
+        if self.metric == "cosine":
+            return normalize(matrix)
+        return numpy.ascontiguousarray(matrix)
+
+    def _assign(
+            self, vectors: "npt.NDArray[numpy.float32]"
+    ) -> "npt.NDArray[numpy.int64]":
+        # The nearest centroid in Euclidean distance, which for normalized
+        # rows is also the most similar one.
+        norms = (self.centroids**2).sum(axis=1)
+        assignments = numpy.empty(len(vectors), dtype=numpy.int64)
+        step = max(1, _BLOCK // len(self.centroids))
+        for start in range(0, len(vectors), step):
+            distances = norms - 2 * (
+                vectors[start:start + step] @ self.centroids.T)
+            assignments[start:start + step] = distances.argmin(axis=1)
+        return assignments
+
+    def _search_ivf(
+        self, matrix: "npt.NDArray[numpy.float32]", k: int, nprobe: int
+    ) -> Tuple["npt.NDArray[numpy.float32]", "npt.NDArray[numpy.int64]"]:
+        if self._lists is None:
+            order = numpy.argsort(self._assignments, kind="stable")
+            starts = numpy.searchsorted(self._assignments[order],
+                                        numpy.arange(len(self.centroids) + 1))
+            self._lists = (order, starts)
+        order, starts = self._lists
+        _, probes = top_k(matrix @ self.centroids.T, max(1, nprobe))
+        scores = numpy.full((len(matrix), k), -numpy.inf, dtype=numpy.float32)
+        indices = numpy.full((len(matrix), k), -1, dtype=numpy.int64)
+        for i, query in enumerate(matrix):
+            rows = numpy.concatenate(
+                [order[starts[p]:starts[p + 1]] for p in probes[i]])
+            if not len(rows):
+                continue
+            top_scores, top = top_k((self._vectors[rows] @ query)[None, :], k)
+            scores[i, :top.shape[1]] = top_scores[0]
+            indices[i, :top.shape[1]] = rows[top[0]]
+        return scores, indices
+
+
+def as_rows(vectors: Vectors) -> "npt.NDArray[numpy.float32]":
+    """Converts embeddings to a float32 matrix with one row per embedding."""
+    if isinstance(vectors, EmbeddingArrayResponse):
+        matrix = vectors.embeddings
+    elif isinstance(vectors, EmbeddingModelResponse):
+        matrix = numpy.array([
+            item.embedding
+            for item in sorted(vectors.data, key=lambda item: item.index)
+        ],
+                             dtype=numpy.float32)
+    else:
+        matrix = numpy.asarray(vectors, dtype=numpy.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    return matrix
+
+
+def normalize(matrix: Any) -> "npt.NDArray[numpy.float32]":
+    """Scales each row of a matrix to unit length, leaving zero rows."""
+    norms = numpy.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return numpy.ascontiguousarray(matrix / norms, dtype=numpy.float32)
+
+
+def top_k(
+        scores: "npt.NDArray[numpy.float32]", k: int
+) -> Tuple["npt.NDArray[numpy.float32]", "npt.NDArray[numpy.int64]"]:
+    """Selects the k highest scores of each row, highest first."""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return scores[:, :0], numpy.zeros((len(scores), 0), dtype=numpy.int64)
+    if k < scores.shape[1]:
+        top = numpy.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        top = numpy.broadcast_to(numpy.arange(k), scores.shape).copy()
+    top_scores = numpy.take_along_axis(scores, top, axis=1)
+    order = numpy.argsort(-top_scores, axis=1, kind="stable")
+    return (numpy.take_along_axis(top_scores, order, axis=1),
+            numpy.take_along_axis(top, order, axis=1))
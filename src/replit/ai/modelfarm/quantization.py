@@ -0,0 +1,369 @@
+import abc
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from replit.ai.modelfarm.index import Vectors, as_rows
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - depends on the environment
+    numpy = None
+
+if TYPE_CHECKING:
+    import numpy.typing as npt
+
+
+class Quantizer(abc.ABC):
+    """
+    Compresses embeddings into fixed-size codes, stored as one row of bytes
+    per embedding, and scores queries against the codes without decoding
+    them whole.
+
+    Subclasses implement code_size(), encode(), decode() and dot(), and may
+    override fit() when they are fitted to a sample of the embeddings, and
+    norms() when the norms of the codes are cheaper to compute than to
+    decode. state() and from_state() persist a fitted quantizer.
+    """
+
+    name = ""
+
+    def __init__(self) -> None:
+        if numpy is None:
+            raise ImportError("Quantizers require NumPy. Install it with "
+                              "`pip install replit.ai[numpy]`.")
+
+    @property
+    def fitted(self) -> bool:
+        """Whether the quantizer is ready to encode embeddings."""
+        return True
+
+    def fit(self, sample: Vectors) -> None:  # noqa: B027
+        """
+        Fits the quantizer to a sample of the embeddings it will encode.
+
+        Args:
+            sample (Vectors): The sample, one row per embedding.
+        """
+
+    @abc.abstractmethod
+    def code_size(self, dimensions: int) -> int:
+        """
+        Gets the size of the code of an embedding.
+
+        Args:
+            dimensions (int): The size of the embeddings.
+
+        Returns:
+            int: The size of each code in bytes.
+        """
+
+    @abc.abstractmethod
+    def encode(self, vectors: Vectors) -> "npt.NDArray[numpy.uint8]":
+        """
+        Compresses embeddings.
+
+        Args:
+            vectors (Vectors): An embeddings response, or an array with one
+                row per embedding.
+
+        Returns:
+            npt.NDArray[numpy.uint8]: The codes, one row per embedding.
+        """
+
+    @abc.abstractmethod
+    def decode(
+            self,
+            codes: "npt.NDArray[numpy.uint8]") -> "npt.NDArray[numpy.float32]":
+        """
+        Approximates the embeddings of some codes.
+
+        Args:
+            codes (npt.NDArray[numpy.uint8]): The codes, one row per
+                embedding.
+
+        Returns:
+            npt.NDArray[numpy.float32]: The embeddings, one row per code.
+        """
+
+    @abc.abstractmethod
+    def dot(self, queries: "npt.NDArray[numpy.float32]",
+            codes: "npt.NDArray[numpy.uint8]") -> "npt.NDArray[numpy.float32]":
+        """
+        Computes the dot products of queries with the embeddings of some
+        codes.
+
+        Args:
+            queries (npt.NDArray[numpy.float32]): The queries, one row per
+                query.
+            codes (npt.NDArray[numpy.uint8]): The codes, one row per
+                embedding.
+
+        Returns:
+            npt.NDArray[numpy.float32]: The products, one row per query and
+                one column per code.
+        """
+
+    def norms(
+            self,
+            codes: "npt.NDArray[numpy.uint8]") -> "npt.NDArray[numpy.float32]":
+        """
+        Computes the norms of the embeddings of some codes.
+
+        Args:
+            codes (npt.NDArray[numpy.uint8]): The codes, one row per
+                embedding.
+
+        Returns:
+            npt.NDArray[numpy.float32]: The norm of each embedding.
+        """
+        return numpy.linalg.norm(self.decode(codes), axis=1)
+
+    def state(self) -> Dict[str, Any]:
+        """
+        Gets the arrays needed to recreate the quantizer with from_state().
+
+        Returns:
+            Dict[str, Any]: The arrays, by name.
+        """
+        return {"name": numpy.array(self.name)}
+
+    @classmethod
+    def from_state(cls, state: Any) -> "Quantizer":
+        """
+        Recreates a quantizer saved with state().
+
+        Args:
+            state (Any): The arrays, by name, such as a loaded npz file.
+
+        Returns:
+            Quantizer: The quantizer.
+
+        Raises:
+            ValueError: If the state is of an unknown quantizer.
+        """
+        name = str(state["name"])
+        if name == PCAQuantizer.name:
+            return PCAQuantizer._from_state(state)
+        if name not in _QUANTIZERS:
+            raise ValueError(f"Unknown quantizer {name!r}")
+        return _QUANTIZERS[name]()
+
+
+class Float16Quantizer(Quantizer):
+    """Stores embeddings as half-precision floats, halving their size."""
+
+    name = "float16"
+
+    def code_size(self, dimensions: int) -> int:
+        return 2 * dimensions
+
+    def encode(self, vectors: Vectors) -> "npt.NDArray[numpy.uint8]":
+        matrix = numpy.ascontiguousarray(as_rows(vectors), dtype="<f2")
+        return matrix.view(numpy.uint8)
+
+    def decode(
+            self,
+            codes: "npt.NDArray[numpy.uint8]") -> "npt.NDArray[numpy.float32]":
+        return numpy.ascontiguousarray(codes).view("<f2").astype(numpy.float32)
+
+    def dot(self, queries: "npt.NDArray[numpy.float32]",
+            codes: "npt.NDArray[numpy.uint8]") -> "npt.NDArray[numpy.float32]":
+        return queries @ self.decode(codes).T
+
+
+class Int8Quantizer(Quantizer):
+    """
+    Stores each embedding as signed bytes, scaled so that its largest value
+    is 127, followed by the scale as a float32: a quarter of the size of the
+    embedding, plus 4 bytes.
+    """
+
+    name = "int8"
+
+    def code_size(self, dimensions: int) -> int:
+        return dimensions + 4
+
+    def encode(self, vectors: Vectors) -> "npt.NDArray[numpy.uint8]":
+        matrix = as_rows(vectors)
+        scales = numpy.abs(matrix).max(axis=1, initial=0) / 127
+        scales[scales == 0] = 1
+        values = numpy.clip(numpy.rint(matrix / scales[:, None]), -127,
+                            127).astype(numpy.int8)
+        return numpy.concatenate([
+            values.view(numpy.uint8),
+            scales.astype("<f4").view(numpy.uint8).reshape(-1, 4)
+        ],
+                                 axis=1)
+
+    def decode(
+            self,
+            codes: "npt.NDArray[numpy.uint8]") -> "npt.NDArray[numpy.float32]":
+        values, scales = self._split(codes)
+        return values * scales[:, None]
+
+    def dot(self, queries: "npt.NDArray[numpy.float32]",
+            codes: "npt.NDArray[numpy.uint8]") -> "npt.NDArray[numpy.float32]":
+        # The scale of each embedding is applied to its products, rather
+        # than to each of its values.
+        values, scales = self._split(codes)
+        return (queries @ values.T) * scales
+
+    def norms(
+            self,
+            codes: "npt.NDArray[numpy.uint8]") -> "npt.NDArray[numpy.float32]":
+        values, scales = self._split(codes)
+        return numpy.linalg.norm(values, axis=1) * scales
+
+    def _split(self, codes: "npt.NDArray[numpy.uint8]") -> Any:
+        codes = numpy.ascontiguousarray(codes)
+        values = codes[:, :-4].view(numpy.int8).astype(numpy.float32)
+        scales = numpy.ascontiguousarray(codes[:, -4:]).view("<f4")[:, 0]
+        return values, scales.astype(numpy.float32)
+
+
+class PCAQuantizer(Quantizer):
+    """
+    Projects embeddings onto the principal components of a sample of them,
+    keeping only as many dimensions as components, and stores the
+    projections as float32 or with another quantizer.
+    """
+
+    name = "pca"
+
+    def __init__(self,
+                 components: int,
+                 quantizer: Optional[Quantizer] = None) -> None:
+        """
+        Creates an unfitted PCA quantizer.
+
+        Args:
+            components (int): The number of dimensions kept.
+            quantizer (Optional[Quantizer]): The quantizer of the projected
+                embeddings. None stores them as float32. Defaults to None.
+
+        Raises:
+            ImportError: If NumPy is not installed.
+        """
+        super().__init__()
+        self.components = components
+        self.quantizer = quantizer or _Float32Quantizer()
+        self.mean: Optional["npt.NDArray[numpy.float32]"] = None
+        self.basis: Optional["npt.NDArray[numpy.float32]"] = None
+        self.explained_variance = 0.0
+
+    @property
+    def fitted(self) -> bool:
+        return self.basis is not None
+
+    def fit(self, sample: Vectors) -> None:
+        """
+        Fits the components to a sample of the embeddings.
+
+        Args:
+            sample (Vectors): The sample, with at least as many rows as
+                components.
+
+        Raises:
+            ValueError: If the sample is too small.
+        """
+        matrix = as_rows(sample)
+        if len(matrix) < self.components or matrix.shape[1] < self.components:
+            raise ValueError(
+                f"Cannot fit {self.components} components to a sample of "
+                f"{matrix.shape[0]} x {matrix.shape[1]}")
+        mean = matrix.mean(axis=0)
+        _, singular, vt = numpy.linalg.svd(matrix - mean, full_matrices=False)
+        variance = singular**2
+        self.mean = mean.astype(numpy.float32)
+        self.basis = numpy.ascontiguousarray(vt[:self.components],
+                                             dtype=numpy.float32)
+        self.explained_variance = float(variance[:self.components].sum() /
+                                        max(variance.sum(), 1e-30))
+        self.quantizer.fit(self._project(matrix))
+
+    def code_size(self, dimensions: int) -> int:
+        return self.quantizer.code_size(min(self.components, dimensions))
+
+    def encode(self, vectors: Vectors) -> "npt.NDArray[numpy.uint8]":
+        if not self.fitted:
+            raise ValueError("PCAQuantizer must be fitted before encoding")
+        return self.quantizer.encode(self._project(as_rows(vectors)))
+
+    def decode(
+            self,
+            codes: "npt.NDArray[numpy.uint8]") -> "npt.NDArray[numpy.float32]":
+        return self.quantizer.decode(codes) @ self.basis + self.mean
+
+    def dot(self, queries: "npt.NDArray[numpy.float32]",
+            codes: "npt.NDArray[numpy.uint8]") -> "npt.NDArray[numpy.float32]":
+        # q . (mean + basis.T @ y) = q . mean + (basis @ q) . y
+        return (queries @ self.mean)[:, None] + self.quantizer.dot(
+            queries @ self.basis.T, codes)
+
+    def norms(
+            self,
+            codes: "npt.NDArray[numpy.uint8]") -> "npt.NDArray[numpy.float32]":
+        # The basis is orthonormal, so |mean + basis.T @ y|^2 is
+        # |mean|^2 + 2 (basis @ mean) . y + |y|^2.
+        squares = (self.mean @ self.mean + 2 * self.quantizer.dot(
+            (self.basis @ self.mean)[None, :], codes)[0] +
+                   self.quantizer.norms(codes)**2)
+        return numpy.sqrt(numpy.maximum(squares, 0))
+
+    def state(self) -> Dict[str, Any]:
+        if not self.fitted:
+            raise ValueError("PCAQuantizer must be fitted before saving")
+        state = super().state()
+        state.update(mean=self.mean,
+                     basis=self.basis,
+                     explained_variance=numpy.array(self.explained_variance))
+        state.update({
+            f"quantizer.{key}": value
+            for key, value in self.quantizer.state().items()
+        })
+        return state
+
+    @classmethod
+    def _from_state(cls, state: Any) -> "PCAQuantizer":
+        inner = {
+            key[len("quantizer."):]: state[key]
+            for key in state if key.startswith("quantizer.")
+        }
+        quantizer = cls(len(state["basis"]), Quantizer.from_state(inner))
+        quantizer.mean = numpy.asarray(state["mean"], dtype=numpy.float32)
+        quantizer.basis = numpy.asarray(state["basis"], dtype=numpy.float32)
+        quantizer.explained_variance = float(state["explained_variance"])
+        return quantizer
+
+    def _project(
+            self, matrix: "npt.NDArray[numpy.float32]"
+    ) -> "npt.NDArray[numpy.float32]":
+        return (matrix - self.mean) @ self.basis.T
+
+
+class _Float32Quantizer(Quantizer):
+    """Stores embeddings as they are, for quantizers built on others."""
+
+    name = "float32"
+
+    def code_size(self, dimensions: int) -> int:
+        return 4 * dimensions
+
+    def encode(self, vectors: Vectors) -> "npt.NDArray[numpy.uint8]":
+        matrix = numpy.ascontiguousarray(as_rows(vectors), dtype="<f4")
+        return matrix.view(numpy.uint8)
+
+    def decode(
+            self,
+            codes: "npt.NDArray[numpy.uint8]") -> "npt.NDArray[numpy.float32]":
+        return numpy.ascontiguousarray(codes).view("<f4").astype(numpy.float32)
+
+    def dot(self, queries: "npt.NDArray[numpy.float32]",
+            codes: "npt.NDArray[numpy.uint8]") -> "npt.NDArray[numpy.float32]":
+        return queries @ self.decode(codes).T
+
+
+# The quantizers without state, by name.
+_QUANTIZERS = {
+    quantizer.name: quantizer
+    for quantizer in (Float16Quantizer, Int8Quantizer, _Float32Quantizer)
+}
@@ -0,0 +1,235 @@
+import asyncio
+import math
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# A rough number of characters per token, used to estimate the size of a
+# prompt before sending it. Errors are corrected from the returned usage.
+CHARS_PER_TOKEN = 4
+
+# The max_tokens sent by the resources when the caller does not set one.
+DEFAULT_MAX_TOKENS = 1024
+
+
+class TokenBucket:
+    """
+    A bucket holding up to capacity tokens and refilled at rate tokens per
+    second.
+
+    The balance may go negative when usage turns out higher than estimated;
+    the debt is repaid by the refill before further tokens are taken. Not
+    thread-safe on its own; RateLimiter serializes access.
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        """
+        Initializes a new instance of the TokenBucket class.
+
+        Args:
+            rate (float): Tokens added per second.
+            capacity (float): The maximum number of tokens held.
+
+        Raises:
+            ValueError: If the rate or the capacity is not positive.
+        """
+        if rate <= 0 or capacity <= 0:
+            raise ValueError("rate and capacity must be positive")
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """
+        Gets the seconds until amount tokens are available.
+
+        Amounts larger than the capacity only wait for a full bucket, so
+        they cannot block forever.
+        """
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.rate)
+
+
+class RateLimiter:
+    """
+    Limits the requests per second and the estimated tokens per minute sent
+    to Modelfarm.
+
+    Before each request the client takes one token from the request bucket
+    and the estimated size of the request (its prompt plus max_tokens) from
+    the token bucket, waiting until both are available. Retries and hedges
+    only take a request. Once the response arrives, or the chunk of a stream reporting
+    usage, the estimate is replaced by the usage Modelfarm reports.
+
+    A limiter is thread-safe and may be shared by several clients, including
+    synchronous and asynchronous ones.
+    """
+
+    def __init__(
+        self,
+        requests_per_second: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        request_burst: Optional[float] = None,
+        token_burst: Optional[float] = None,
+    ) -> None:
+        """
+        Initializes a new instance of the RateLimiter class.
+
+        Args:
+            requests_per_second (Optional[float]): The sustained request
+                rate. None does not limit requests.
+            tokens_per_minute (Optional[float]): The sustained token rate.
+                None does not limit tokens.
+            request_burst (Optional[float]): The number of requests that may
+                be sent at once after a quiet period. Defaults to one
+                second's worth, and at least 1.
+            token_burst (Optional[float]): The number of tokens that may be
+                used at once after a quiet period. Defaults to one minute's
+                worth.
+
+        Raises:
+            ValueError: If a rate or a burst is not positive.
+        """
+        for name, value in (("requests_per_second", requests_per_second),
+                            ("tokens_per_minute", tokens_per_minute),
+                            ("request_burst", request_burst), ("token_burst",
+                                                               token_burst)):
+            if value is not None and value <= 0:
+                raise ValueError(f"{name} must be positive")
+        self._requests = None if requests_per_second is None else TokenBucket(
+            requests_per_second, request_burst
+            or max(1.0, requests_per_second))
+        self._tokens = None if tokens_per_minute is None else TokenBucket(
+            tokens_per_minute / 60, token_burst or tokens_per_minute)
+        self._lock = threading.Lock()
+
+    @property
+    def available_requests(self) -> Optional[float]:
+        return self._available(self._requests)
+
+    @property
+    def available_tokens(self) -> Optional[float]:
+        return self._available(self._tokens)
+
+    def acquire(self, tokens: float = 0, requests: int = 1) -> None:
+        """
+        Blocks the calling thread until a request of the given size may be
+        sent.
+
+        Args:
+            tokens (float): The estimated tokens used by the request.
+            requests (int): The requests taken, 0 to only take tokens.
+                Defaults to 1.
+        """
+        while True:
+            wait = self._try_acquire(tokens, requests)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self,
+                            tokens: float = 0,
+                            requests: int = 1) -> None:
+        """
+        Waits, without blocking the event loop, until a request of the given
+        size may be sent.
+
+        Args:
+            tokens (float): The estimated tokens used by the request.
+            requests (int): The requests taken, 0 to only take tokens.
+                Defaults to 1.
+        """
+        while True:
+            wait = self._try_acquire(tokens, requests)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def reconcile(self, estimated: float, usage: Optional[Dict[str,
+                                                               Any]]) -> None:
+        """
+        Corrects the token bucket once the real usage of a request is known.
+
+        Args:
+            estimated (float): The tokens taken when the request was sent.
+            usage (Optional[Dict[str, Any]]): The usage returned by
+                Modelfarm. Nothing is corrected if it is missing.
+        """
+        if self._tokens is None or not usage:
+            return
+        actual = usage.get("total_tokens")
+        if actual is None:
+            actual = ((usage.get("prompt_tokens") or 0) +
+                      (usage.get("completion_tokens") or 0))
+        with self._lock:
+            self._tokens.refill(time.monotonic())
+            self._tokens.tokens += estimated - actual
+
+    def estimate(self, payload: Optional[Dict[str, Any]]) -> int:
+        """
+        Estimates the tokens a request will use.
+
+        Args:
+            payload (Optional[Dict[str, Any]]): The request payload.
+
+        Returns:
+            int: The estimated prompt tokens plus max_tokens.
+        """
+        if self._tokens is None or not payload:
+            return 0
+        chars = 0
+        for key in ("messages", "prompt", "input"):
+            if key in payload:
+                chars += _count_chars(payload[key])
+        max_tokens = payload.get("max_tokens")
+        if max_tokens is None and "input" not in payload:
+            max_tokens = DEFAULT_MAX_TOKENS
+        return math.ceil(chars / CHARS_PER_TOKEN) + (max_tokens or 0)
+
+    def _try_acquire(self, tokens: float, requests: int) -> float:
+        """
+        Takes requests and tokens from the buckets if both are available.
+
+        Returns:
+            float: 0 if they were taken, otherwise the seconds to wait before
+                trying again.
+        """
+        request_bucket = self._requests if requests else None
+        with self._lock:
+            now = time.monotonic()
+            wait = 0.0
+            for bucket, amount in ((request_bucket, requests), (self._tokens,
+                                                                tokens)):
+                if bucket is not None:
+                    bucket.refill(now)
+                    wait = max(wait, bucket.wait_time(amount))
+            if wait:
+                return wait
+            if request_bucket is not None:
+                request_bucket.tokens -= requests
+            if self._tokens is not None:
+                self._tokens.tokens -= tokens
+            return 0.0
+
+    def _available(self, bucket: Optional[TokenBucket]) -> Optional[float]:
+        if bucket is None:
+            return None
+        with self._lock:
+            bucket.refill(time.monotonic())
+            return bucket.tokens
+
+
+def _count_chars(value: Any) -> int:
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(_count_chars(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_count_chars(v) for v in value)
+    return 0
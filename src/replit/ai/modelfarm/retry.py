@@ -0,0 +1,223 @@
+import math
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import FrozenSet, Optional
+
+# Statuses that mean the request may succeed if it is sent again: timeouts,
+# rate limiting and server-side failures.
+DEFAULT_RETRY_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+
+class RetryBudget:
+    """
+    Limits retries to a fraction of the traffic, so that retries cannot
+    multiply the load on Modelfarm while it is failing.
+
+    Every failed attempt withdraws a token and every success deposits
+    token_ratio tokens. Retries are only allowed while more than half of
+    max_tokens remain. With the defaults a client retries freely while most
+    requests succeed, and stops retrying after a handful of consecutive
+    failures until successes refill the budget.
+
+    A budget is thread-safe and may be shared by several clients.
+    """
+
+    def __init__(self,
+                 max_tokens: float = 10,
+                 token_ratio: float = 0.1) -> None:
+        """
+        Initializes a new instance of the RetryBudget class.
+
+        Args:
+            max_tokens (float): The size of the budget. Defaults to 10.
+            token_ratio (float): The tokens deposited by each success.
+                Defaults to 0.1, i.e. roughly one retry per ten successes
+                once the budget has been drained.
+        """
+        self.max_tokens = max_tokens
+        self.token_ratio = token_ratio
+        self._tokens = max_tokens
+        self._lock = threading.Lock()
+
+    @property
+    def tokens(self) -> float:
+        return self._tokens
+
+    def record_success(self) -> None:
+        """
+        Deposits tokens for a successful request.
+        """
+        with self._lock:
+            self._tokens = min(self.max_tokens,
+                               self._tokens + self.token_ratio)
+
+    def record_failure(self) -> bool:
+        """
+        Withdraws a token for a failed attempt.
+
+        Returns:
+            bool: Whether the failed attempt may be retried.
+        """
+        with self._lock:
+            self._tokens = max(0, self._tokens - 1)
+            return self._tokens > self.max_tokens / 2
+
+
+@dataclass
+class RetryPolicy:
+    """
+    Controls how failed requests are retried.
+
+    Requests are retried after connection errors, timeouts and responses
+    whose status is in retry_statuses. The wait before retry n is drawn from
+    [backoff - jitter * backoff, backoff], where backoff grows exponentially
+    from initial_backoff up to max_backoff. A Retry-After header replaces the
+    computed wait; if it asks for more than max_retry_after seconds the
+    error is raised instead.
+
+    Streams are only retried until their first chunk has been received, so
+    callers never see a chunk twice.
+
+    Attributes:
+        max_attempts (int): The maximum number of attempts, including the
+            first one.
+        initial_backoff (float): The wait in seconds before the first retry.
+        max_backoff (float): The maximum wait in seconds between attempts.
+        multiplier (float): The factor the wait grows by on every retry.
+        jitter (float): The fraction of the wait that is randomized; 1.0 is
+            "full jitter" and 0 disables it.
+        retry_statuses (FrozenSet[int]): The HTTP statuses that are retried.
+        max_retry_after (float): The longest Retry-After honored, in seconds.
+        budget (Optional[RetryBudget]): Limits the share of retried
+            requests. None disables the limit.
+    """
+
+    max_attempts: int = 3
+    initial_backoff: float = 0.5
+    max_backoff: float = 8.0
+    multiplier: float = 2.0
+    jitter: float = 1.0
+    retry_statuses: FrozenSet[int] = DEFAULT_RETRY_STATUSES
+    max_retry_after: float = 60.0
+    budget: Optional[RetryBudget] = field(default_factory=RetryBudget)
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Computes the wait after a failed attempt.
+
+        Args:
+            attempt (int): The number of the attempt that failed, from 1.
+
+        Returns:
+            float: The wait in seconds.
+        """
+        backoff = min(self.max_backoff,
+                      self.initial_backoff * self.multiplier**(attempt - 1))
+        return backoff - random.uniform(0, backoff * self.jitter)
+
+
+class RetryState:
+    """
+    Tracks the attempts made for one request.
+
+    Example:
+        retry = RetryState(policy)
+        while True:
+            response = send()
+            delay = retry.delay_for(response.status, retry_after)
+            if delay is None:
+                return response
+            time.sleep(delay)
+    """
+
+    def __init__(self, policy: Optional[RetryPolicy]) -> None:
+        """
+        Initializes a new instance of the RetryState class.
+
+        Args:
+            policy (Optional[RetryPolicy]): The policy to follow. None never
+                retries.
+        """
+        self.policy = policy
+        self.attempt = 1
+
+    def delay(self, retry_after: Optional[str] = None) -> Optional[float]:
+        """
+        Records a failed attempt and decides whether to retry it.
+
+        Args:
+            retry_after (Optional[str]): The Retry-After header of the
+                response, if any.
+
+        Returns:
+            Optional[float]: The seconds to wait before the next attempt, or
+                None if the failure should be surfaced.
+        """
+        policy = self.policy
+        if policy is None:
+            return None
+        allowed = policy.budget is None or policy.budget.record_failure()
+        if not allowed or self.attempt >= policy.max_attempts:
+            return None
+        delay = policy.backoff(self.attempt)
+        if retry_after is not None:
+            requested = parse_retry_after(retry_after)
+            if requested is not None:
+                if requested > policy.max_retry_after:
+                    return None
+                delay = requested
+        self.attempt += 1
+        return delay
+
+    def delay_for(self,
+                  status: int,
+                  retry_after: Optional[str] = None) -> Optional[float]:
+        """
+        Decides whether to retry a request after receiving its response.
+
+        Args:
+            status (int): The HTTP status of the response.
+            retry_after (Optional[str]): The Retry-After header of the
+                response, if any.
+
+        Returns:
+            Optional[float]: The seconds to wait before the next attempt, or
+                None if the response should be returned.
+        """
+        policy = self.policy
+        if policy is None:
+            return None
+        if status == 200:
+            if policy.budget is not None:
+                policy.budget.record_success()
+            return None
+        if status not in policy.retry_statuses:
+            return None
+        return self.delay(retry_after)
+
+
+def parse_retry_after(value: str) -> Optional[float]:
+    """
+    Parses a Retry-After header.
+
+    Args:
+        value (str): Either a number of seconds or an HTTP date.
+
+    Returns:
+        Optional[float]: The seconds to wait, or None if the header is
+            invalid.
+    """
+    try:
+        seconds = float(value)
+    except ValueError:
+        pass
+    else:
+        return max(0.0, seconds) if math.isfinite(seconds) else None
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
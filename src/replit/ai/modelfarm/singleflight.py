@@ -0,0 +1,171 @@
+import asyncio
+import threading
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .cache import is_deterministic
+
+
+@dataclass
+class SingleFlightStats:
+    """
+    Counts the calls made through a single-flight group.
+
+    Attributes:
+        calls (int): The number of calls made.
+        upstream_calls (int): The number of requests actually sent.
+        coalesced (int): The number of calls that shared the request of an
+            identical call already in flight, i.e. the requests saved.
+    """
+
+    calls: int = 0
+    upstream_calls: int = 0
+    coalesced: int = 0
+
+
+class _Call:
+    """An upstream request in flight and the callers waiting for it."""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class _AsyncCall:
+    """An upstream request in flight on an event loop."""
+
+    def __init__(self, task: "asyncio.Task[Any]") -> None:
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces identical non-streaming requests that are in flight at the
+    same time, so that they share one upstream request.
+
+    Requests are identical when they are sent to the same URL with the same
+    canonical payload. The first caller sends the request; callers arriving
+    before it completes wait for it and receive the same decoded response,
+    or the same exception. Nothing is kept once the request completes.
+
+    By default, chat and completion requests are only coalesced when their
+    temperature is 0, since callers of a sampled request expect independent
+    samples. Options such as the deadline are those of the first caller.
+
+    A group may be shared by several clients, including synchronous and
+    asynchronous ones.
+    """
+
+    def __init__(self, deterministic_only: bool = True) -> None:
+        """
+        Initializes a new instance of the SingleFlight class.
+
+        Args:
+            deterministic_only (bool): Whether to only coalesce requests
+                whose temperature, if any, is 0. Defaults to True.
+        """
+        self.deterministic_only = deterministic_only
+        self.stats = SingleFlightStats()
+        self._calls: Dict[str, _Call] = {}
+        self._async_calls: Dict[Tuple[asyncio.AbstractEventLoop, str],
+                                _AsyncCall] = {}
+        self._lock = threading.Lock()
+
+    def coalesces(self, payload: Optional[Dict[str, Any]]) -> bool:
+        """
+        Checks whether a request may share the response of another.
+
+        Args:
+            payload (Optional[Dict[str, Any]]): The request payload.
+
+        Returns:
+            bool: Whether the request may be coalesced.
+        """
+        if payload is None or payload.get("stream"):
+            return False
+        return not self.deterministic_only or is_deterministic(payload)
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """
+        Calls fn, unless a call with the same key is in flight, in which case
+        its outcome is shared.
+
+        Args:
+            key (str): The hash of the request.
+            fn (Callable[[], Any]): Sends the request.
+
+        Returns:
+            Any: The result of fn.
+        """
+        with self._lock:
+            self.stats.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.stats.upstream_calls += 1
+            else:
+                self.stats.coalesced += 1
+        if not leader:
+            call.done.wait()
+        else:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    async def do_async(self, key: str, fn: Callable[[],
+                                                    Awaitable[Any]]) -> Any:
+        """
+        Awaits fn, unless a call with the same key is in flight on the
+        running event loop, in which case its outcome is shared.
+
+        The request runs in a task of its own, so a caller that is cancelled
+        does not cancel it for the others. It is only cancelled once every
+        caller waiting for it has been cancelled.
+
+        Args:
+            key (str): The hash of the request.
+            fn (Callable[[], Awaitable[Any]]): Sends the request.
+
+        Returns:
+            Any: The result of fn.
+        """
+        flight_key = (asyncio.get_running_loop(), key)
+        with self._lock:
+            self.stats.calls += 1
+            call = self._async_calls.get(flight_key)
+            if call is None:
+                call = _AsyncCall(asyncio.ensure_future(fn()))
+                self._async_calls[flight_key] = call
+                call.task.add_done_callback(
+                    lambda _: self._forget(flight_key, call))
+                self.stats.upstream_calls += 1
+            else:
+                self.stats.coalesced += 1
+            call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.task.cancelled():
+                raise
+            call.waiters -= 1
+            if not call.waiters:
+                self._forget(flight_key, call)
+                call.task.cancel()
+            raise
+
+    def _forget(self, flight_key: Tuple[asyncio.AbstractEventLoop, str],
+                call: _AsyncCall) -> None:
+        with self._lock:
+            if self._async_calls.get(flight_key) is call:
+                del self._async_calls[flight_key]
@@ -0,0 +1,436 @@
+import contextlib
+import json
+import os
+import threading
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from replit.ai.modelfarm.index import Vectors, as_rows, normalize, top_k
+from replit.ai.modelfarm.quantization import Quantizer
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - depends on the environment
+    numpy = None
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+if TYPE_CHECKING:
+    import numpy.typing as npt
+
+# The number of rows scored, copied or read at once, so that searches and
+# compaction never hold more than a slice of the file in memory.
+_ROWS_PER_BLOCK = 65536
+
+_MANIFEST = "store.json"
+_QUANTIZER = "quantizer.npz"
+_LOCK = "store.lock"
+
+
+class EmbeddingStore:
+    """
+    A persistent, append-only store of embeddings keyed by id, for corpora
+    larger than memory.
+
+    Vectors are appended to a file of raw little-endian float32 rows, which
+    readers map into memory, so that every process opening the store
+    shares the same pages and only the pages used are read. A sidecar log
+    maps each id to its row. Adding an id again stores a new row for it;
+    deleting an id logs a tombstone. compact() rewrites the files without
+    the rows that are no longer used.
+
+    Appends are crash-safe: the rows are written and synced before the log
+    entries that refer to them, and anything past the last complete log
+    entry is ignored and overwritten by the next append. Writers in
+    different processes take a file lock, where the platform supports it.
+
+    A store opened by one process sees the appends and compactions of others
+    once refresh() is called.
+
+    A store created with a quantizer keeps the quantizer's codes instead of
+    float32 rows, and searches score queries against the codes.
+    """
+
+    def __init__(self,
+                 directory: str,
+                 dimensions: Optional[int] = None,
+                 quantizer: Optional[Quantizer] = None) -> None:
+        """
+        Opens a store, creating its directory if needed.
+
+        Args:
+            directory (str): The directory holding the store's files.
+            dimensions (Optional[int]): The size of the embeddings of a new
+                store. None takes it from the first embeddings added.
+                Defaults to None.
+            quantizer (Optional[Quantizer]): The compression of the
+                embeddings of a new store. An unfitted quantizer is fitted
+                to the first embeddings added. None stores float32 rows.
+                Defaults to None.
+
+        Raises:
+            ImportError: If NumPy is not installed.
+        """
+        if numpy is None:
+            raise ImportError("EmbeddingStore requires NumPy. Install it "
+                              "with `pip install replit.ai[numpy]`.")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.dimensions = dimensions
+        self.quantizer = quantizer
+        self.generation = -1
+        self._lock = threading.Lock()
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, id: object) -> bool:
+        return id in self._rows
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._rows)
+
+    @property
+    def vectors(self) -> "npt.NDArray[numpy.float32]":
+        """
+        A read-only, memory-mapped view of every row written, including the
+        rows of deleted or replaced ids. In a store with a quantizer, the
+        rows are the quantizer's codes.
+        """
+        if self._map is not None:
+            return self._map
+        if self.quantizer is not None:
+            return numpy.zeros((0, self._row_bytes), dtype=numpy.uint8)
+        return numpy.zeros((0, self.dimensions or 0), dtype=numpy.float32)
+
+    def row(self, id: str) -> int:
+        """
+        Gets the row of an id in vectors.
+
+        Args:
+            id (str): The id.
+
+        Returns:
+            int: The row.
+
+        Raises:
+            KeyError: If the id is not in the store.
+        """
+        return self._rows[id]
+
+    def get(self, ids: Sequence[str]) -> "npt.NDArray[numpy.float32]":
+        """
+        Reads the embeddings of some ids, decoded if the store has a
+        quantizer.
+
+        Args:
+            ids (Sequence[str]): The ids.
+
+        Returns:
+            npt.NDArray[numpy.float32]: A copy of their embeddings, one row
+                per id.
+
+        Raises:
+            KeyError: If an id is not in the store.
+        """
+        rows = numpy.array(self.vectors[[self._rows[id] for id in ids]])
+        if self.quantizer is not None:
+            return self.quantizer.decode(rows)
+        return rows
+
+    def add(self, ids: Sequence[str], vectors: Vectors) -> None:
+        """
+        Appends embeddings. An id already in the store is given the new
+        embedding.
+
+        Args:
+            ids (Sequence[str]): The id of each embedding.
+            vectors (Vectors): An embeddings response, or an array with one
+                row per embedding.
+
+        Raises:
+            ValueError: If the number of ids and embeddings differ, or the
+                embeddings do not have the size of the store.
+        """
+        rows = as_rows(vectors)
+        if len(ids) != len(rows):
+            raise ValueError(f"Got {len(ids)} ids for {len(rows)} embeddings")
+        with self._write_lock():
+            if self.dimensions is None:
+                self.dimensions = rows.shape[1]
+            if self.generation < 0:
+                self._create(rows)
+            if rows.shape[1] != self.dimensions:
+                raise ValueError(
+                    f"Expected embeddings of size {self.dimensions}, "
+                    f"got {rows.shape[1]}")
+            if self.quantizer is not None:
+                data = self.quantizer.encode(rows)
+            else:
+                data = numpy.ascontiguousarray(rows, dtype="<f4")
+            with open(self._path("vectors"), "r+b") as f:
+                f.truncate(self._count * self._row_bytes)
+                f.seek(0, os.SEEK_END)
+                f.write(data.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            self._append_log([[id, self._count + i]
+                              for i, id in enumerate(ids)])
+
+    def delete(self, ids: Sequence[str]) -> None:
+        """
+        Removes ids from the store. Their rows are kept until compact().
+
+        Args:
+            ids (Sequence[str]): The ids. Ids not in the store are ignored.
+        """
+        with self._write_lock():
+            entries = [[id, None] for id in ids if id in self._rows]
+            if entries:
+                self._append_log(entries)
+
+    def compact(self) -> None:
+        """
+        Rewrites the store with only the current row of each id, in a new
+        generation of files. Processes still reading the previous
+        generation keep their mapping until they call refresh().
+        """
+        with self._write_lock():
+            if self.generation < 0:
+                return
+            generation = self.generation + 1
+            items = sorted(self._rows.items(), key=lambda item: item[1])
+            with open(self._path("vectors", generation), "wb") as f:
+                for start in range(0, len(items), _ROWS_PER_BLOCK):
+                    block = [
+                        row for _, row in items[start:start + _ROWS_PER_BLOCK]
+                    ]
+                    f.write(
+                        numpy.ascontiguousarray(self.vectors[block]).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self._path("log", generation), "wb") as f:
+                f.write(b"".join(
+                    _encode([id, i]) for i, (id, _) in enumerate(items)))
+                f.flush()
+                os.fsync(f.fileno())
+            previous = self.generation
+            self._write_manifest(generation)
+            self._load()
+            for kind in ("vectors", "log"):
+                with contextlib.suppress(OSError):
+                    os.remove(self._path(kind, previous))
+
+    def refresh(self) -> None:
+        """
+        Picks up the appends, deletions and compactions made since the store
+        was opened or last refreshed, including by other processes.
+        """
+        with self._lock:
+            self._refresh()
+
+    def search(
+        self,
+        queries: Vectors,
+        k: int = 10,
+        metric: Literal["cosine", "dot"] = "cosine",
+    ) -> Tuple["npt.NDArray[numpy.float32]", List[List[str]]]:
+        """
+        Finds the ids whose embeddings are most similar to each query,
+        scanning the file in blocks so it is never loaded whole.
+
+        Args:
+            queries (Vectors): An embeddings response, an array with one row
+                per query, or a single query.
+            k (int): The number of ids returned per query. Defaults to 10.
+            metric (Literal["cosine", "dot"]): The similarity used to rank
+                embeddings. Defaults to "cosine".
+
+        Returns:
+            Tuple[npt.NDArray[numpy.float32], List[List[str]]]: The scores
+                and ids of the matches of each query, best first. When the
+                store has fewer than k ids, the ids are cut short and the
+                scores padded with -inf.
+        """
+        matrix = as_rows(queries)
+        if metric == "cosine":
+            matrix = normalize(matrix)
+        live = numpy.zeros(self._count, dtype=bool)
+        live[list(self._rows.values())] = True
+        best_scores = numpy.full((len(matrix), k), -numpy.inf, numpy.float32)
+        best_rows = numpy.zeros((len(matrix), k), dtype=numpy.int64)
+        for start in range(0, self._count, _ROWS_PER_BLOCK):
+            block = numpy.asarray(self.vectors[start:start + _ROWS_PER_BLOCK])
+            if self.quantizer is not None:
+                scores = self.quantizer.dot(matrix, block)
+                if metric == "cosine":
+                    norms = self.quantizer.norms(block)
+                    norms[norms == 0] = 1
+                    scores /= norms
+            else:
+                if metric == "cosine":
+                    block = normalize(block)
+                scores = matrix @ block.T
+            scores[:, ~live[start:start + len(block)]] = -numpy.inf
+            top_scores, top = top_k(scores, k)
+            best_scores, order = top_k(
+                numpy.concatenate([best_scores, top_scores], axis=1), k)
+            rows = numpy.concatenate([best_rows, top + start], axis=1)
+            best_rows = numpy.take_along_axis(rows, order, axis=1)
+        found = best_scores != -numpy.inf
+        ids = [[self._row_ids[row] for row in best_rows[i][found[i]]]
+               for i in range(len(matrix))]
+        return best_scores, ids
+
+    def _path(self, kind: str, generation: Optional[int] = None) -> str:
+        generation = self.generation if generation is None else generation
+        if kind == "log":
+            extension = "jsonl"
+        else:
+            extension = "f32" if self.quantizer is None else "bin"
+        return os.path.join(self.directory, f"{kind}-{generation}.{extension}")
+
+    @property
+    def _row_bytes(self) -> int:
+        if self.quantizer is not None:
+            return self.quantizer.code_size(self.dimensions or 0)
+        return 4 * (self.dimensions or 0)
+
+    def _create(self, rows: "npt.NDArray[numpy.float32]") -> None:
+        if self.quantizer is not None:
+            if not self.quantizer.fitted:
+                self.quantizer.fit(rows)
+            path = os.path.join(self.directory, _QUANTIZER)
+            with open(path + ".tmp", "wb") as f:
+                numpy.savez(f, **self.quantizer.state())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path + ".tmp", path)
+        self._write_manifest(0)
+        self._load()
+
+    def _write_manifest(self, generation: int) -> None:
+        for kind in ("vectors", "log"):
+            open(self._path(kind, generation), "ab").close()
+        path = os.path.join(self.directory, _MANIFEST)
+        with open(path + ".tmp", "w") as f:
+            json.dump(
+                {
+                    "dimensions": self.dimensions,
+                    "generation": generation,
+                    "quantizer": self.quantizer is not None
+                }, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    def _load(self) -> None:
+        self._rows: Dict[str, int] = {}
+        self._row_ids: List[Optional[str]] = []
+        self._count = 0
+        self._log_offset = 0
+        self._map: Optional["npt.NDArray[numpy.float32]"] = None
+        try:
+            with open(os.path.join(self.directory, _MANIFEST)) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return
+        self.dimensions = manifest["dimensions"]
+        self.generation = manifest["generation"]
+        self.quantizer = None
+        if manifest.get("quantizer"):
+            with numpy.load(os.path.join(self.directory, _QUANTIZER)) as state:
+                self.quantizer = Quantizer.from_state(state)
+        self._refresh()
+
+    def _refresh(self) -> None:
+        try:
+            with open(os.path.join(self.directory, _MANIFEST)) as f:
+                generation = json.load(f)["generation"]
+        except FileNotFoundError:
+            return
+        if generation != self.generation:
+            self._load()
+            return
+        with open(self._path("log"), "rb") as f:
+            f.seek(self._log_offset)
+            data = f.read()
+        # A line without its newline is an append that did not complete.
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            id, row = json.loads(line)
+            if row is None:
+                self._rows.pop(id, None)
+                continue
+            previous = self._rows.get(id)
+            if previous is not None:
+                self._row_ids[previous] = None
+            self._rows[id] = row
+            self._row_ids.append(id)
+            self._count = row + 1
+        self._log_offset += end
+        if self._count and (self._map is None
+                            or len(self._map) != self._count):
+            if self.quantizer is not None:
+                dtype, shape = "u1", (self._count, self._row_bytes)
+            else:
+                dtype, shape = "<f4", (self._count, self.dimensions)
+            self._map = numpy.memmap(self._path("vectors"),
+                                     dtype=dtype,
+                                     mode="r",
+                                     shape=shape)
+
+    def _append_log(self, entries: List[List[Any]]) -> None:
+        with open(self._path("log"), "r+b") as f:
+            f.truncate(self._log_offset)
+            f.seek(0, os.SEEK_END)
+            f.write(b"".join(_encode(entry) for entry in entries))
+            f.flush()
+            os.fsync(f.fileno())
+        self._refresh()
+
+    def _write_lock(self) -> "_WriteLock":
+        return _WriteLock(self)
+
+
+class _WriteLock:
+    """Serializes the writers of a store, across threads and processes."""
+
+    def __init__(self, store: EmbeddingStore) -> None:
+        self.store = store
+        self.file: Optional[Any] = None
+
+    def __enter__(self) -> None:
+        self.store._lock.acquire()
+        try:
+            if fcntl is not None:
+                self.file = open(os.path.join(self.store.directory, _LOCK),
+                                 "a")
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+            self.store._refresh()
+        except BaseException:
+            self.__exit__()
+            raise
+
+    def __exit__(self, *args: Any) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.store._lock.release()
+
+
+def _encode(entry: List[Any]) -> bytes:
+    return json.dumps(entry, separators=(",", ":")).encode("utf-8") + b"\n"
@@ -0,0 +1,186 @@
+import json
+import re
+from typing import Any, Callable, List, Optional, Tuple
+
+from .exceptions import InvalidResponseException
+
+# Skips everything up to the next bracket, including complete strings (so
+# brackets inside them are ignored). Stops at a bracket, at the opening quote
+# of a string that is not complete yet, or at the end of the buffer. Written
+# in the unrolled-loop form so a failed string match backtracks linearly.
+_SKIP_TO_BRACKET = re.compile(rb'(?:[^"{}\[\]]+|"[^"\\]*(?:\\.[^"\\]*)*")*',
+                              re.DOTALL)
+# Skips the rest of a string up to its closing quote, stopping early at a
+# trailing backslash whose escaped byte has not arrived yet.
+_SKIP_STRING = re.compile(rb'[^"\\]*(?:\\.[^"\\]*)*', re.DOTALL)
+_SKIP_WHITESPACE = re.compile(rb"[ \t\r\n]*")
+_CLOSER = re.compile(rb"[}\]]")
+
+_QUOTE = ord('"')
+_OPENERS = (ord("{"), ord("["))
+
+# Stream frames are usually small. Until a frame grows past this many bytes,
+# the framer retries decoding it in C on every chunk instead of scanning it,
+# which bounds the repeated work per frame and keeps the framer linear.
+_SPECULATIVE_DECODE_LIMIT = 4096
+
+
+class JSONStreamFramer:
+    """
+    Splits a byte stream of concatenated JSON objects into decoded objects.
+
+    feed() resumes where the previous call stopped and only the incomplete
+    trailing object is kept buffered, so the work done per byte is bounded no
+    matter how the stream is chunked. Frames are located on the raw bytes and
+    decoded only once they are complete, so a multi-byte UTF-8 character split
+    across two chunks is never decoded in halves.
+
+    Example:
+        framer = JSONStreamFramer()
+        for chunk in chunks:
+            for obj in framer.feed(chunk):
+                ...
+        framer.close()
+    """
+
+    def __init__(self,
+                 loads: Optional[Callable[[bytearray], Any]] = None) -> None:
+        """
+        Initializes a new instance of the JSONStreamFramer class.
+
+        Args:
+            loads (Optional[Callable[[bytearray], Any]]): Decodes one complete
+                frame once it has been scanned. Small ASCII frames are still
+                decoded speculatively by the standard library, which is
+                cheaper than scanning them. Defaults to json.loads.
+        """
+        self._loads = loads or json.loads
+        self._raw_decode = json.JSONDecoder().raw_decode
+        self._buffer = bytearray()
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        # How far a pending frame has been searched for closing brackets.
+        self._searched = 0
+
+    def feed(self, data: bytes) -> List[Any]:
+        """
+        Adds bytes to the stream.
+
+        Args:
+            data (bytes): The next chunk of the stream.
+
+        Returns:
+            List[Any]: The objects completed by this chunk, in stream order.
+
+        Raises:
+            InvalidResponseException: If the stream contains anything other
+                than whitespace between top-level objects or arrays.
+        """
+        buffer = self._buffer
+        buffer += data
+        end = len(buffer)
+        pos = self._pos
+        depth = self._depth
+        in_string = self._in_string
+        # Everything before the frame being scanned has already been dropped,
+        # so an unfinished frame always starts at offset 0.
+        frame_start = 0
+        objects = []
+
+        while pos < end:
+            if in_string:
+                pos = _SKIP_STRING.match(buffer, pos).end()
+                if pos == end or buffer[pos] != _QUOTE:
+                    break
+                in_string = False
+                pos += 1
+            elif depth == 0:
+                pos = _SKIP_WHITESPACE.match(buffer, pos).end()
+                if pos == end:
+                    break
+                if buffer[pos] not in _OPENERS:
+                    raise InvalidResponseException(
+                        "Invalid streaming response: unexpected "
+                        f"{bytes(buffer[pos:pos + 1])!r} between JSON objects")
+                obj, size = self._speculative_decode(buffer, pos)
+                if size:
+                    objects.append(obj)
+                    pos += size
+                    continue
+                if size is not None:
+                    # Wait for the rest of the frame.
+                    break
+                frame_start = pos
+                depth = 1
+                pos += 1
+            else:
+                pos = _SKIP_TO_BRACKET.match(buffer, pos).end()
+                if pos == end:
+                    break
+                byte = buffer[pos]
+                pos += 1
+                if byte == _QUOTE:
+                    in_string = True
+                elif byte in _OPENERS:
+                    depth += 1
+                else:
+                    depth -= 1
+                    if depth == 0:
+                        objects.append(self._decode(buffer[frame_start:pos]))
+
+        consumed = frame_start if depth else pos
+        del buffer[:consumed]
+        self._searched = max(0, self._searched - consumed)
+        self._pos = pos - consumed
+        self._depth = depth
+        self._in_string = in_string
+        return objects
+
+    def close(self) -> None:
+        """
+        Marks the end of the stream.
+
+        Raises:
+            InvalidResponseException: If the stream ended inside an object.
+        """
+        if self._depth or self._buffer.strip():
+            raise InvalidResponseException(
+                "Invalid streaming response: stream ended inside a JSON "
+                f"object: {bytes(self._buffer[:200])!r}")
+
+    def _speculative_decode(self, buffer: bytearray,
+                            pos: int) -> Tuple[Any, Optional[int]]:
+        """
+        Decodes the frame starting at pos if it is complete.
+
+        Returns:
+            Tuple[Any, Optional[int]]: The object and its size in bytes;
+                (None, 0) if the frame looks incomplete; or (None, None) if
+                the frame must be scanned instead because it is too large or
+                not pure ASCII (where character and byte offsets differ).
+        """
+        end = len(buffer)
+        if end - pos > _SPECULATIVE_DECODE_LIMIT:
+            return None, None
+        # A frame can only have completed if a closing bracket arrived.
+        if _CLOSER.search(buffer, max(pos, self._searched)) is None:
+            self._searched = end
+            return None, 0
+        text = buffer[pos:].decode("latin-1")
+        if not text.isascii():
+            return None, None
+        try:
+            obj, size = self._raw_decode(text)
+        except ValueError:
+            self._searched = end
+            return None, 0
+        self._searched = 0
+        return obj, size
+
+    def _decode(self, frame: bytearray) -> Any:
+        try:
+            return self._loads(frame)
+        except ValueError as e:
+            raise InvalidResponseException(
+                f"Invalid streaming response: {bytes(frame[:200])!r}") from e
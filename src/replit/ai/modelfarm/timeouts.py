@@ -0,0 +1,157 @@
+import time
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from .exceptions import StreamTimeoutException
+
+
+@dataclass(frozen=True)
+class Timeout:
+    """
+    The timeouts applied to each phase of a request, in seconds. None
+    disables a timeout.
+
+    Attributes:
+        connect (Optional[float]): Establishing the connection.
+        first_byte (Optional[float]): Waiting for the response headers after
+            the request was sent. For non-streaming calls this includes the
+            whole generation, so it should be generous.
+        idle (Optional[float]): Waiting for the next chunk of a streaming
+            response.
+        deadline (Optional[float]): The whole call, including retries and
+            reading the full stream. Can be overridden per call with the
+            deadline argument of create().
+    """
+
+    connect: Optional[float] = 10.0
+    first_byte: Optional[float] = 120.0
+    idle: Optional[float] = 60.0
+    deadline: Optional[float] = None
+
+    def start(self, deadline: Optional[float] = None) -> "CallTimeout":
+        """
+        Starts timing a call.
+
+        Args:
+            deadline (Optional[float]): Overrides the deadline of the call.
+
+        Returns:
+            CallTimeout: The timeouts of the call.
+        """
+        return CallTimeout(self,
+                           self.deadline if deadline is None else deadline)
+
+
+class CallTimeout:
+    """
+    The timeouts of one call, with its deadline counting down from the start
+    of the call.
+    """
+
+    def __init__(self, timeout: Timeout, deadline: Optional[float]) -> None:
+        """
+        Initializes a new instance of the CallTimeout class.
+
+        Args:
+            timeout (Timeout): The phase timeouts.
+            deadline (Optional[float]): Seconds the call may take in total.
+        """
+        self.timeout = timeout
+        self.started = time.monotonic()
+        self.expires_at = None if deadline is None else self.started + deadline
+
+    @property
+    def connect(self) -> Optional[float]:
+        return self.limit(self.timeout.connect)
+
+    @property
+    def first_byte(self) -> Optional[float]:
+        return self.limit(self.timeout.first_byte)
+
+    @property
+    def idle(self) -> Optional[float]:
+        return self.limit(self.timeout.idle)
+
+    def remaining(self) -> Optional[float]:
+        """
+        Gets the time left before the deadline.
+
+        Returns:
+            Optional[float]: The seconds left, at least 0, or None if the call
+                has no deadline.
+        """
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic(
+        ) >= self.expires_at
+
+    def check(self) -> None:
+        """
+        Stops a call whose deadline has passed.
+
+        Raises:
+            StreamTimeoutException: If the deadline has passed.
+        """
+        if self.expired():
+            raise self._deadline_exceeded()
+
+    def request_timeouts(
+            self) -> Tuple[Optional[float], Optional[float], Optional[float]]:
+        """
+        Gets the timeouts of a request about to be sent.
+
+        HTTP clients read a timeout of 0 as no timeout, so none is returned
+        once the deadline has passed.
+
+        Returns:
+            Tuple[Optional[float], Optional[float], Optional[float]]: The
+                connect and first byte timeouts, and the time left.
+
+        Raises:
+            StreamTimeoutException: If the deadline has passed.
+        """
+        connect = self.connect
+        first_byte = self.first_byte
+        # Read last: if time is left, the timeouts read before are not 0.
+        remaining = self.remaining()
+        if remaining == 0:
+            raise self._deadline_exceeded()
+        return connect, first_byte, remaining
+
+    def limit(self, seconds: Optional[float]) -> Optional[float]:
+        """
+        Shortens a phase timeout so that it ends by the deadline.
+
+        Args:
+            seconds (Optional[float]): The phase timeout.
+
+        Returns:
+            Optional[float]: The shorter of the phase timeout and the time
+                left, or None if neither applies.
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return seconds
+        if seconds is None:
+            return remaining
+        return min(seconds, remaining)
+
+    def allows(self, delay: float) -> bool:
+        """
+        Checks whether waiting before a retry leaves time before the deadline.
+
+        Args:
+            delay (float): The seconds to wait.
+
+        Returns:
+            bool: Whether the retry would start before the deadline.
+        """
+        remaining = self.remaining()
+        return remaining is None or delay < remaining
+
+    def _deadline_exceeded(self) -> StreamTimeoutException:
+        return StreamTimeoutException("deadline", 0, 0,
+                                      time.monotonic() - self.started)
@@ -1,6 +1,11 @@
+from typing import AsyncIterator, Iterator
+
 import pytest
+import pytest_asyncio
 from replit.ai.modelfarm import AsyncModelfarm, Modelfarm
 
+from .stand_in_server import StandInServer, patched_identity_environ
+
 
 @pytest.fixture
 def client() -> Modelfarm:
@@ -10,3 +15,30 @@ def client() -> Modelfarm:
 @pytest.fixture
 def async_client() -> AsyncModelfarm:
     return AsyncModelfarm()
+
+
+@pytest.fixture
+def stand_in_server() -> Iterator[StandInServer]:
+    with StandInServer() as server:
+        yield server
+
+
+@pytest.fixture
+def identity_environ() -> Iterator[None]:
+    with patched_identity_environ():
+        yield
+
+
+@pytest.fixture
+def stand_in_client(stand_in_server: StandInServer) -> Iterator[Modelfarm]:
+    with patched_identity_environ(), Modelfarm(
+            base_url=stand_in_server.url) as client:
+        yield client
+
+
+@pytest_asyncio.fixture
+async def stand_in_async_client(
+        stand_in_server: StandInServer) -> AsyncIterator[AsyncModelfarm]:
+    with patched_identity_environ():
+        async with AsyncModelfarm(base_url=stand_in_server.url) as client:
+            yield client
@@ -0,0 +1,445 @@
+"""
+A local stand-in for the Modelfarm API.
+
+The server speaks just enough of the ``/v1beta2`` protocol for the clients to
+round-trip chat, completion and embedding requests without network access or
+credentials. It is shared by the offline tests and the scripts in
+``benchmarks/``.
+"""
+import contextlib
+import itertools
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Union
+from unittest.mock import patch
+
+from replit.ai.modelfarm.embedding_encoding import encode_base64
+
+from .test_identity import IDENTITY_PRIVATE_KEY, IDENTITY_TOKEN, setup_pub_key
+
+EMBEDDING_DIMENSIONS = 768
+
+# Requests carrying this parameter are rejected with a 400, like upstream
+# rejects parameters it does not know.
+INVALID_PARAMETER = "invalid_parameter"
+
+
+def identity_environ() -> Dict[str, str]:
+    """Returns the environment variables needed to sign identity tokens."""
+    return {
+        "REPL_PUBKEYS": setup_pub_key(),
+        "REPL_IDENTITY": IDENTITY_TOKEN,
+        "REPL_IDENTITY_KEY": IDENTITY_PRIVATE_KEY,
+        "REPL_ID": "test",
+    }
+
+
+def patched_identity_environ():
+    """Patches os.environ so that clients can be created offline."""
+    return patch.dict(os.environ, identity_environ())
+
+
+@dataclass
+class Fault:
+    """
+    A canned response returned instead of the normal one.
+
+    Attributes:
+        status (int): The HTTP status code.
+        body (Any): The body; bytes are sent as-is, anything else as JSON.
+        headers (Dict[str, str]): Extra response headers.
+        delay (float): Seconds to wait before responding.
+        reset_after (Optional[int]): If set, the connection is reset instead
+            of responding normally: after this many chunks of a stream, or
+            before responding at all when 0 or the request is not streamed.
+    """
+
+    status: int = 500
+    body: Any = field(default_factory=lambda: {"detail": "Injected fault"})
+    headers: Dict[str, str] = field(default_factory=dict)
+    delay: float = 0.0
+    reset_after: Optional[int] = None
+
+
+class StandInServer:
+    """
+    A threaded HTTP/1.1 server that imitates the Modelfarm API.
+
+    Attributes:
+        requests (List[Dict[str, Any]]): The decoded payloads received, in
+            arrival order.
+        connections (int): The number of TCP connections accepted.
+        bytes_sent (int): The total size of the response bodies sent.
+        word_size (int): The length of each generated word; completions
+            generate max_tokens words.
+        faults (Deque[Fault]): Faults returned, in order, to the next
+            requests.
+        latency (Callable[[], float]): Returns the seconds to wait before
+            responding normally to each request.
+        chunk_delay (float): Seconds to wait between the chunks of a stream.
+        capacity (Optional[int]): The number of requests served at once;
+            the others queue. None serves every request at once.
+        queue_timeout (Optional[float]): Seconds a request may queue before
+            it is rejected with a 503. None queues requests indefinitely.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.requests: List[Dict[str, Any]] = []
+        self.connections = 0
+        self.bytes_sent = 0
+        self.word_size = 0
+        self.faults: Deque[Fault] = deque()
+        self.latency: Callable[[], float] = lambda: 0.0
+        self.chunk_delay = 0.0
+        self.queue_timeout: Optional[float] = None
+        self._capacity: Optional[int] = None
+        self._active = 0
+        self._lock = threading.Lock()
+        self._slots = threading.Condition(self._lock)
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.stand_in = self  # type: ignore[attr-defined]
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StandInServer":
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "StandInServer":
+        return self.start()
+
+    def __exit__(self, *args: Any) -> None:
+        self.stop()
+
+    def _record(self, payload: Dict[str, Any]) -> Optional[Fault]:
+        with self._lock:
+            self.requests.append(payload)
+            return self.faults.popleft() if self.faults else None
+
+    @property
+    def capacity(self) -> Optional[int]:
+        return self._capacity
+
+    @capacity.setter
+    def capacity(self, capacity: Optional[int]) -> None:
+        with self._slots:
+            self._capacity = capacity
+            self._slots.notify_all()
+
+    def _enter(self) -> bool:
+        deadline = (None if self.queue_timeout is None else time.monotonic() +
+                    self.queue_timeout)
+        with self._slots:
+            while self._capacity is not None and self._active >= self._capacity:
+                timeout = None if deadline is None else deadline - time.monotonic(
+                )
+                if timeout is not None and timeout <= 0:
+                    return False
+                self._slots.wait(timeout)
+            self._active += 1
+            return True
+
+    def _leave(self) -> None:
+        with self._slots:
+            self._active -= 1
+            self._slots.notify()
+
+    def _connected(self) -> None:
+        with self._lock:
+            self.connections += 1
+
+    def _sent(self, size: int) -> None:
+        with self._lock:
+            self.bytes_sent += size
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server: ThreadingHTTPServer
+
+    @property
+    def stand_in(self) -> StandInServer:
+        return self.server.stand_in  # type: ignore[attr-defined]
+
+    def setup(self) -> None:
+        super().setup()
+        self.stand_in._connected()
+
+    def handle(self) -> None:
+        # The client may give up on the request, e.g. a cancelled hedge.
+        with contextlib.suppress(BrokenPipeError, ConnectionResetError):
+            super().handle()
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            self._send_json(400, {"detail": "Request body is not valid JSON"})
+            return
+        fault = self.stand_in._record(payload)
+        if fault is not None:
+            time.sleep(fault.delay)
+            if fault.reset_after is None:
+                self._send_body(fault.status, fault.body, fault.headers)
+                return
+            if not fault.reset_after or not payload.get("stream"):
+                self._reset()
+                return
+
+        if not self.stand_in._enter():
+            self._send_json(503, {"detail": "Overloaded"})
+            return
+        try:
+            time.sleep(self.stand_in.latency())
+            self._respond(payload, fault)
+        finally:
+            self.stand_in._leave()
+
+    def _respond(self, payload: Dict[str, Any],
+                 fault: Optional[Fault]) -> None:
+        route = _ROUTES.get(self.path)
+        if route is None:
+            self._send_json(404, {"detail": f"Unknown path {self.path}"})
+            return
+        if INVALID_PARAMETER in payload:
+            self._send_json(400, {"detail": f"Unknown {INVALID_PARAMETER}"})
+            return
+        if payload.get("stream"):
+            chunks = route.stream(self.stand_in, payload)
+            if fault is not None:
+                self._send_stream(itertools.islice(chunks, fault.reset_after),
+                                  end=False)
+                self._reset()
+                return
+            self._send_stream(chunks)
+        else:
+            self._send_json(200, route.respond(self.stand_in, payload))
+
+    def _send_json(self, status: int, body: Any) -> None:
+        self._send_body(status, body, {})
+
+    def _send_body(self, status: int, body: Any, headers: Dict[str,
+                                                               str]) -> None:
+        data = body if isinstance(body,
+                                  bytes) else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        # Counted first, so the count is complete once the client has read
+        # the response.
+        self.stand_in._sent(len(data))
+        self.wfile.write(data)
+
+    def _send_stream(self, chunks: Iterator[Any], end: bool = True) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, chunk in enumerate(chunks):
+            if i and self.stand_in.chunk_delay:
+                time.sleep(self.stand_in.chunk_delay)
+            data = json.dumps(chunk).encode("utf-8")
+            self.stand_in._sent(len(data))
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+        if end:
+            self.wfile.write(b"0\r\n\r\n")
+
+    def _reset(self) -> None:
+        # Closing with a zero linger time sends a RST instead of a FIN.
+        self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER,
+                                   struct.pack("ii", 1, 0))
+        self.close_connection = True
+
+
+class _Route:
+
+    def __init__(
+        self,
+        respond: Callable[[StandInServer, Dict[str, Any]], Any],
+        stream: Optional[Callable[[StandInServer, Dict[str, Any]],
+                                  Iterator[Any]]] = None,
+    ) -> None:
+        self.respond = respond
+        self.stream = stream or (
+            lambda server, payload: iter([respond(server, payload)]))
+
+
+def _usage(prompt_tokens: int, completion_tokens: int) -> Dict[str, int]:
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def _stream_words(server: StandInServer, payload: Dict[str, Any]) -> List[str]:
+    count = payload.get("max_tokens") or 16
+    return [f"word{i} ".ljust(server.word_size, "x") for i in range(count)]
+
+
+def _chat_completion(server: StandInServer,
+                     payload: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id":
+        "chat-stand-in",
+        "model":
+        payload.get("model", ""),
+        "created":
+        0,
+        "object":
+        "chat.completion",
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {
+                "role": "assistant",
+                "content": "".join(_stream_words(server, payload)),
+            },
+        }],
+        "usage":
+        _usage(len(payload.get("messages", [])),
+               payload.get("max_tokens") or 16),
+    }
+
+
+def _chat_completion_stream(server: StandInServer,
+                            payload: Dict[str, Any]) -> Iterator[Any]:
+    words = _stream_words(server, payload)
+    for i, word in enumerate(words):
+        last = i == len(words) - 1
+        chunk = {
+            "id":
+            "chat-stand-in",
+            "model":
+            payload.get("model", ""),
+            "created":
+            0,
+            "object":
+            "chat.completion.chunk",
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop" if last else None,
+                "delta": {
+                    "role": "assistant",
+                    "content": word,
+                },
+            }],
+        }
+        if last:
+            # Like upstream, the final chunk reports the usage of the stream.
+            chunk["usage"] = _usage(len(payload.get("messages", [])),
+                                    len(words))
+        yield chunk
+
+
+def _completion(server: StandInServer, payload: Dict[str,
+                                                     Any]) -> Dict[str, Any]:
+    return {
+        "id":
+        "completion-stand-in",
+        "model":
+        payload.get("model", ""),
+        "created":
+        0,
+        "object":
+        "text_completion",
+        "choices": [{
+            "index": 0,
+            "text": "".join(_stream_words(server, payload)),
+            "finish_reason": "stop",
+        }],
+        "usage":
+        _usage(1,
+               payload.get("max_tokens") or 16),
+    }
+
+
+def _completion_stream(server: StandInServer,
+                       payload: Dict[str, Any]) -> Iterator[Any]:
+    for word in _stream_words(server, payload):
+        yield {
+            "id": "completion-stand-in",
+            "model": payload.get("model", ""),
+            "created": 0,
+            "choices": [{
+                "index": 0,
+                "text": word,
+                "finish_reason": "stop",
+            }],
+        }
+
+
+def _embedding_vector(text: Any) -> List[float]:
+    seed = sum(ord(c) for c in str(text)) % 997
+    return [((seed + i) % 101) / 101.0 for i in range(EMBEDDING_DIMENSIONS)]
+
+
+def _encode_embedding(vector: List[float],
+                      payload: Dict[str, Any]) -> Union[List[float], str]:
+    if payload.get("encoding_format") == "base64":
+        return encode_base64(vector)
+    return vector
+
+
+def _embeddings(_server: StandInServer, payload: Dict[str,
+                                                      Any]) -> Dict[str, Any]:
+    inputs = payload.get("input", [])
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    data = [{
+        "object": "embedding",
+        "index": i,
+        "embedding": _encode_embedding(_embedding_vector(text), payload),
+        "metadata": {
+            "truncated": False,
+            "tokenCountMetadata": {
+                "unbilledTokens": len(str(text).split()),
+            },
+        },
+    } for i, text in enumerate(inputs)]
+    tokens = sum(len(str(text).split()) for text in inputs)
+    return {
+        "object": "list",
+        "model": payload.get("model", ""),
+        "data": data,
+        "usage": _usage(tokens, 0),
+        "metadata": None,
+    }
+
+
+_ROUTES = {
+    "/v1beta2/chat/completions": _Route(_chat_completion,
+                                        _chat_completion_stream),
+    "/v1beta2/completions": _Route(_completion, _completion_stream),
+    "/v1beta2/embeddings": _Route(_embeddings),
+}
@@ -0,0 +1,153 @@
+from typing import Any, Dict, List
+
+import pytest
+from replit.ai.modelfarm import AsyncModelfarm, Modelfarm
+from replit.ai.modelfarm.accumulator import ChatCompletionAccumulator
+from replit.ai.modelfarm.structs.chat import ChatCompletionStreamChunkResponse
+
+MESSAGES: List[Any] = [{"role": "user", "content": "Hi"}]
+
+
+def chunk(choices: List[Dict[str, Any]], **fields: Any) -> Dict[str, Any]:
+    return {
+        "id": "chunk",
+        "model": "chat-bison",
+        "created": 0,
+        "choices": choices,
+        **fields
+    }
+
+
+@pytest.mark.usefixtures("identity_environ")
+@pytest.mark.parametrize("chunks", ["model", "dict", "view"])
+def test_rebuilds_the_response(stand_in_client: Modelfarm,
+                               chunks: Any) -> None:
+    expected = stand_in_client.chat.completions.create(messages=MESSAGES,
+                                                       model="chat-bison",
+                                                       max_tokens=20)
+    accumulator = ChatCompletionAccumulator()
+    stream = stand_in_client.chat.completions.create(messages=MESSAGES,
+                                                     model="chat-bison",
+                                                     stream=True,
+                                                     max_tokens=20,
+                                                     chunks=chunks)
+
+    passed = list(accumulator.wrap(stream))
+    assert len(passed) == accumulator.chunks == 20
+    response = accumulator.response()
+    assert response.choices == expected.choices
+    assert response.id == expected.id
+    assert accumulator.text() == expected.choices[0].message.content
+
+
+def test_assembles_tool_call_fragments() -> None:
+    accumulator = ChatCompletionAccumulator()
+    for choices in (
+        [{
+            "index": 0,
+            "delta": {
+                "role":
+                "assistant",
+                "tool_calls": [{
+                    "index": 0,
+                    "id": "call-a",
+                    "type": "function",
+                    "function": {
+                        "name": "get_weather",
+                        "arguments": '{"city": '
+                    },
+                }],
+            },
+        }],
+        [{
+            "index": 0,
+            "delta": {
+                "tool_calls": [
+                    {
+                        "index": 0,
+                        "function": {
+                            "arguments": '"Paris"}'
+                        }
+                    },
+                    {
+                        "index": 1,
+                        "id": "call-b",
+                        "function": {
+                            "name": "get_time",
+                            "arguments": "{}"
+                        },
+                    },
+                ],
+            },
+        }],
+        [{
+            "index": 0,
+            "finish_reason": "tool_calls",
+            "delta": {}
+        }],
+    ):
+        accumulator.add(chunk(choices))
+    accumulator.add(
+        chunk([],
+              usage={
+                  "completion_tokens": 3,
+                  "prompt_tokens": 2,
+                  "total_tokens": 5
+              }))
+
+    response = accumulator.response()
+    message = response.choices[0].message
+    assert message.content is None
+    assert [(call.id, call.function.name, call.function.arguments)
+            for call in message.tool_calls] == [
+                ("call-a", "get_weather", '{"city": "Paris"}'),
+                ("call-b", "get_time", "{}"),
+            ]
+    assert response.choices[0].finish_reason == "tool_calls"
+    assert response.usage.total_tokens == 5
+
+
+def test_merges_choices_of_models() -> None:
+    accumulator = ChatCompletionAccumulator()
+    for i in range(3):
+        for index in (1, 0):
+            tool_calls = [{
+                "id": f"call-{i}",
+                "type": "function",
+                "function": {
+                    "name": "f",
+                    "arguments": str(i)
+                },
+            }] if index == 1 else None
+            accumulator.add(
+                ChatCompletionStreamChunkResponse(**chunk([{
+                    "index": index,
+                    "delta": {
+                        "content": f"{index}:{i} ",
+                        "tool_calls": tool_calls
+                    },
+                }])))
+
+    response = accumulator.response()
+    assert [choice.index for choice in response.choices] == [0, 1]
+    assert response.choices[0].message.content == "0:0 0:1 0:2 "
+    assert accumulator.text(1) == "1:0 1:1 1:2 "
+    assert accumulator.text(2) == ""
+    assert [call.id for call in response.choices[1].message.tool_calls
+            ] == ["call-0", "call-1", "call-2"]
+
+
+@pytest.mark.usefixtures("identity_environ")
+@pytest.mark.asyncio
+async def test_async_pass_through(
+        stand_in_async_client: AsyncModelfarm) -> None:
+    accumulator = ChatCompletionAccumulator()
+    stream = await stand_in_async_client.chat.completions.create(
+        messages=MESSAGES, model="chat-bison", stream=True, max_tokens=5)
+    texts = [
+        chunk.choices[0].delta.content
+        async for chunk in accumulator.awrap(stream)
+    ]
+
+    assert "".join(texts) == accumulator.text()
+    assert accumulator.response().choices[0].finish_reason == "stop"
@@ -0,0 +1,201 @@
+import asyncio
+import time
+from types import SimpleNamespace
+from typing import Any, Iterator, List
+
+import pytest
+from replit.ai.modelfarm import (
+    AsyncModelfarm,
+    ChatCompletionResponse,
+    CompletionModelResponse,
+    EmbeddingModelResponse,
+    Modelfarm,
+)
+from replit.ai.modelfarm.batch import (
+    ORDERED_BUFFER,
+    BatchProgress,
+    BatchRequest,
+    run_batch,
+    run_batch_async,
+)
+from replit.ai.modelfarm.exceptions import BadRequestException
+
+from .stand_in_server import INVALID_PARAMETER, Fault, StandInServer
+
+MESSAGES = [{"role": "user", "content": "Hi"}]
+
+
+def embeddings(count: int) -> Iterator[BatchRequest]:
+    for i in range(count):
+        yield BatchRequest.embedding(input=[f"text {i}"],
+                                     model="textembedding-gecko")
+
+
+def test_mixed_batch(stand_in_client: Modelfarm) -> None:
+    requests = [
+        BatchRequest.chat(messages=MESSAGES, model="chat-bison"),
+        BatchRequest.completion(prompt="1 + 1 = ", model="text-bison"),
+        BatchRequest.embedding(input=["a"], model="textembedding-gecko"),
+    ]
+    results = list(stand_in_client.batch(requests))
+
+    assert [r.index for r in results] == [0, 1, 2]
+    assert all(r.ok for r in results)
+    assert isinstance(results[0].response, ChatCompletionResponse)
+    assert isinstance(results[1].response, CompletionModelResponse)
+    assert isinstance(results[2].response, EmbeddingModelResponse)
+
+
+def test_errors_are_captured(stand_in_client: Modelfarm) -> None:
+    requests = [
+        BatchRequest.embedding(input=["a"], model="textembedding-gecko"),
+        BatchRequest.embedding(input=["b"],
+                               model="textembedding-gecko",
+                               **{INVALID_PARAMETER: 1}),
+        BatchRequest.chat(messages=MESSAGES, model="chat-bison", stream=True),
+        BatchRequest("images"),
+        BatchRequest.embedding(input=["c"], model="textembedding-gecko"),
+    ]
+    results = list(stand_in_client.batch(requests))
+
+    assert [r.ok for r in results] == [True, False, False, False, True]
+    assert isinstance(results[1].error, BadRequestException)
+    assert isinstance(results[2].error, ValueError)
+    assert isinstance(results[3].error, ValueError)
+    assert results[1].response is None
+
+
+def test_concurrency_is_bounded(stand_in_server: StandInServer,
+                                stand_in_client: Modelfarm) -> None:
+    stand_in_server.latency = lambda: 0.05
+    start = time.monotonic()
+    results = list(stand_in_client.batch(embeddings(8), concurrency=2))
+    elapsed = time.monotonic() - start
+
+    assert len(results) == 8
+    assert 0.2 <= elapsed < 0.4
+
+
+def test_unordered_results(stand_in_server: StandInServer,
+                           stand_in_client: Modelfarm) -> None:
+    stand_in_server.faults.append(Fault(503, delay=0.2))
+    results = list(
+        stand_in_client.batch(embeddings(3), concurrency=3, ordered=False))
+
+    assert sorted(r.index for r in results) == [0, 1, 2]
+    assert [r.ok for r in results] == [True, True, False]
+
+
+def test_progress(stand_in_client: Modelfarm) -> None:
+    updates: List[BatchProgress] = []
+    requests = list(embeddings(3)) + [BatchRequest("images")]
+    for _ in stand_in_client.batch(
+            requests,
+            on_progress=lambda p: updates.append(BatchProgress(**vars(p)))):
+        pass
+
+    assert [u.completed for u in updates] == [1, 2, 3, 4]
+    assert updates[-1] == BatchProgress(completed=4, failed=1, total=4)
+
+
+def test_ordered_results_are_bounded() -> None:
+
+    def create(input: List[str], **_: Any) -> List[str]:
+        if input == ["text 0"]:
+            time.sleep(0.2)
+        return input
+
+    sent: List[BatchRequest] = []
+    requests = (sent.append(r) or r for r in embeddings(100))
+    client: Any = SimpleNamespace(embeddings=SimpleNamespace(create=create))
+    results = run_batch(client, requests, concurrency=2)
+    first = next(results)
+
+    assert first.index == 0
+    assert len(sent) == 2 * ORDERED_BUFFER
+    assert [r.index for r in results] == list(range(1, 100))
+
+
+def test_invalid_concurrency(stand_in_client: Modelfarm) -> None:
+    with pytest.raises(ValueError):
+        list(stand_in_client.batch(embeddings(1), concurrency=0))
+
+
+@pytest.mark.asyncio
+async def test_async_batch(stand_in_server: StandInServer,
+                           stand_in_async_client: AsyncModelfarm) -> None:
+    stand_in_server.latency = lambda: 0.05
+    updates: List[int] = []
+    start = time.monotonic()
+    results = [
+        r async for r in stand_in_async_client.batch(
+            embeddings(8),
+            concurrency=4,
+            on_progress=lambda p: updates.append(p.completed))
+    ]
+    elapsed = time.monotonic() - start
+
+    assert [r.index for r in results] == list(range(8))
+    assert all(r.ok for r in results)
+    assert updates == list(range(1, 9))
+    assert 0.1 <= elapsed < 0.2
+
+
+@pytest.mark.asyncio
+async def test_async_errors_are_captured(
+        stand_in_async_client: AsyncModelfarm) -> None:
+    requests = [
+        BatchRequest.embedding(input=["a"],
+                               model="textembedding-gecko",
+                               **{INVALID_PARAMETER: 1}),
+        BatchRequest.embedding(input=["b"], model="textembedding-gecko"),
+    ]
+    results = [r async for r in stand_in_async_client.batch(requests)]
+
+    assert isinstance(results[0].error, BadRequestException)
+    assert results[1].ok
+
+
+@pytest.mark.asyncio
+async def test_async_unordered_results(
+        stand_in_server: StandInServer,
+        stand_in_async_client: AsyncModelfarm) -> None:
+    stand_in_server.faults.append(Fault(503, delay=0.2))
+    results = [
+        r async for r in stand_in_async_client.batch(
+            embeddings(3), concurrency=3, ordered=False)
+    ]
+
+    assert [r.ok for r in results] == [True, True, False]
+
+
+@pytest.mark.asyncio
+async def test_async_stopping_early_cancels_requests(
+        stand_in_server: StandInServer,
+        stand_in_async_client: AsyncModelfarm) -> None:
+    stand_in_server.latency = lambda: 0.05
+    results = stand_in_async_client.batch(embeddings(1000), concurrency=4)
+    async for _ in results:
+        break
+    await results.aclose()
+
+    assert len(stand_in_server.requests) < 10
+
+
+@pytest.mark.asyncio
+async def test_async_ordered_results_are_bounded() -> None:
+
+    async def create(input: List[str], **_: Any) -> List[str]:
+        if input == ["text 0"]:
+            await asyncio.sleep(0.2)
+        return input
+
+    sent: List[BatchRequest] = []
+    requests = (sent.append(r) or r for r in embeddings(100))
+    client: Any = SimpleNamespace(embeddings=SimpleNamespace(create=create))
+    results = run_batch_async(client, requests, concurrency=2)
+    first = await results.__anext__()
+
+    assert first.index == 0
+    assert len(sent) == 2 * ORDERED_BUFFER
+    assert [r.index async for r in results] == list(range(1, 100))
@@ -0,0 +1,182 @@
+import time
+from typing import List
+
+import pytest
+from replit.ai.modelfarm import AsyncModelfarm, Modelfarm
+from replit.ai.modelfarm.cache import (
+    InMemoryCache,
+    ResponseCache,
+    is_deterministic,
+    request_key,
+)
+from replit.ai.modelfarm.exceptions import InvalidResponseException
+
+from .stand_in_server import Fault, StandInServer
+
+MESSAGES = [{"role": "user", "content": "Hi"}]
+
+
+def chat(client: Modelfarm, **kwargs) -> str:
+    response = client.chat.completions.create(messages=MESSAGES,
+                                              model="chat-bison",
+                                              max_tokens=3,
+                                              **kwargs)
+    return response.choices[0].message.content
+
+
+def chat_stream(client: Modelfarm) -> List[str]:
+    return [
+        chunk.choices[0].delta.content
+        for chunk in client.chat.completions.create(messages=MESSAGES,
+                                                    model="chat-bison",
+                                                    max_tokens=3,
+                                                    temperature=0,
+                                                    stream=True)
+    ]
+
+
+def test_key_is_canonical() -> None:
+    key = request_key("http://modelfarm/v1", {"a": 1, "b": [1, 2]})
+    assert key == request_key("http://modelfarm/v1", {"b": [1, 2], "a": 1})
+    assert key != request_key("http://modelfarm/v2", {"a": 1, "b": [1, 2]})
+    assert key != request_key("http://modelfarm/v1", {"a": 1, "b": [2, 1]})
+
+
+def test_response_cache_is_abstract() -> None:
+    with pytest.raises(TypeError):
+        ResponseCache()  # type: ignore[abstract]
+
+
+def test_is_deterministic() -> None:
+    assert is_deterministic({"input": ["a"]})
+    assert is_deterministic({"messages": MESSAGES, "temperature": 0})
+    assert not is_deterministic({"messages": MESSAGES, "temperature": 0.2})
+    assert not is_deterministic(None)
+
+
+def test_lru_eviction() -> None:
+    cache = InMemoryCache(max_entries=2)
+    cache.set("a", 1, 1)
+    cache.set("b", 2, 1)
+    assert cache.get("a") == 1
+    cache.set("c", 3, 1)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats.evictions == 1
+    assert (cache.stats.hits, cache.stats.misses) == (3, 1)
+
+
+def test_byte_bound() -> None:
+    cache = InMemoryCache(max_bytes=100)
+    cache.set("a", 1, 60)
+    cache.set("b", 2, 30)
+    cache.set("c", 3, 30)
+    assert cache.get("a") is None
+    assert cache.bytes == 60
+
+    cache.set("huge", 4, 101)
+    assert cache.get("huge") is None
+    assert len(cache) == 2
+
+    cache.set("b", 5, 10)
+    assert cache.bytes == 40
+    assert cache.get("b") == 5
+
+
+def test_ttl() -> None:
+    cache = InMemoryCache(ttl=0.05)
+    cache.set("a", 1, 1)
+    assert cache.get("a") == 1
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+    assert cache.bytes == 0
+
+
+def test_hit_rate() -> None:
+    cache = InMemoryCache()
+    assert cache.stats.hit_rate == 0
+    cache.set("a", 1, 1)
+    cache.get("a")
+    cache.get("b")
+    assert cache.stats.hit_rate == 0.5
+
+
+@pytest.mark.usefixtures("identity_environ")
+def test_client_caches_deterministic_requests(
+        stand_in_server: StandInServer) -> None:
+    cache = InMemoryCache()
+    with Modelfarm(base_url=stand_in_server.url, cache=cache) as client:
+        first = chat(client, temperature=0)
+        assert chat(client, temperature=0) == first
+        chat(client, temperature=0.5)
+        chat(client, temperature=0.5)
+        client.embeddings.create(input=["a"], model="textembedding-gecko")
+        client.embeddings.create(input=["a"], model="textembedding-gecko")
+
+    assert len(stand_in_server.requests) == 4
+    assert cache.stats.hits == 2
+    assert cache.stats.misses == 2
+
+
+@pytest.mark.usefixtures("identity_environ")
+def test_client_does_not_cache_errors(stand_in_server: StandInServer) -> None:
+    stand_in_server.faults.append(Fault(500))
+    with Modelfarm(base_url=stand_in_server.url,
+                   cache=InMemoryCache()) as client:
+        with pytest.raises(InvalidResponseException):
+            chat(client, temperature=0)
+        chat(client, temperature=0)
+        chat(client, temperature=0)
+
+    assert len(stand_in_server.requests) == 2
+
+
+@pytest.mark.usefixtures("identity_environ")
+def test_stream_is_replayed(stand_in_server: StandInServer) -> None:
+    cache = InMemoryCache()
+    with Modelfarm(base_url=stand_in_server.url, cache=cache) as client:
+        first = chat_stream(client)
+        assert chat_stream(client) == first
+
+    assert first == ["word0 ", "word1 ", "word2 "]
+    assert len(stand_in_server.requests) == 1
+
+
+@pytest.mark.usefixtures("identity_environ")
+def test_unfinished_stream_is_not_cached(
+        stand_in_server: StandInServer) -> None:
+    cache = InMemoryCache()
+    with Modelfarm(base_url=stand_in_server.url, cache=cache) as client:
+        stream = client.chat.completions.create(messages=MESSAGES,
+                                                model="chat-bison",
+                                                temperature=0,
+                                                stream=True)
+        next(stream)
+        stream.close()
+
+    assert len(cache) == 0
+
+
+@pytest.mark.usefixtures("identity_environ")
+@pytest.mark.asyncio
+async def test_async_client_caches(stand_in_server: StandInServer) -> None:
+    cache = InMemoryCache()
+    async with AsyncModelfarm(base_url=stand_in_server.url,
+                              cache=cache) as client:
+        for _ in range(2):
+            await client.completions.create(prompt="1 + 1 = ",
+                                            model="text-bison",
+                                            temperature=0)
+            chunks = await client.completions.create(prompt="1 + 1 = ",
+                                                     model="text-bison",
+                                                     max_tokens=3,
+                                                     temperature=0,
+                                                     stream=True)
+            assert [chunk.choices[0].text async for chunk in chunks
+                    ] == ["word0 ", "word1 ", "word2 "]
+
+    assert len(stand_in_server.requests) == 2
+    assert cache.stats.hits == 2
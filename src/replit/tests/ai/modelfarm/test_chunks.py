@@ -0,0 +1,112 @@
+from typing import Any, Dict, List
+
+import pytest
+from replit.ai.modelfarm import AsyncModelfarm, Modelfarm
+from replit.ai.modelfarm.chunks import ChunkView, chunk_converter, construct
+from replit.ai.modelfarm.structs.chat import (
+    ChatCompletionStreamChunkResponse,
+    ChoiceStream,
+)
+from replit.ai.modelfarm.structs.completions import CompletionModelResponse
+
+MESSAGES: List[Any] = [{"role": "user", "content": "Hi"}]
+
+TOOL_CALL: Dict[str, Any] = {
+    "id": "call-1",
+    "type": "function",
+    "function": {
+        "name": "f",
+        "arguments": "{}"
+    },
+}
+
+CHOICE: Dict[str, Any] = {
+    "index": 0,
+    "delta": {
+        "content": "Hello",
+        "tool_calls": [TOOL_CALL]
+    },
+}
+
+CHUNK: Dict[str, Any] = {
+    "id": "chunk-1",
+    "model": "chat-bison",
+    "created": 1,
+    "choices": [CHOICE],
+}
+
+
+def test_view_reads_like_the_model() -> None:
+    view = ChunkView(CHUNK, ChatCompletionStreamChunkResponse)
+    model = ChatCompletionStreamChunkResponse(**CHUNK)
+
+    assert view.id == model.id
+    assert view.object == model.object == "chat.completion.chunk"
+    assert view.usage is None
+    choice = view.choices[0]
+    assert choice.finish_reason is None
+    assert choice.delta.content == "Hello"
+    assert choice.delta.tool_calls[0].function.name == "f"
+    assert view.to_model() == model
+    assert view.to_dict() is CHUNK
+    with pytest.raises(AttributeError):
+        view.text  # noqa: B018
+    with pytest.raises(AttributeError):
+        ChunkView({}, ChatCompletionStreamChunkResponse).id  # noqa: B018
+
+
+def test_construct_builds_nested_models() -> None:
+    constructed = construct(ChatCompletionStreamChunkResponse, CHUNK)
+
+    assert isinstance(constructed.choices[0], ChoiceStream)
+    delta = constructed.choices[0].delta
+    assert delta.tool_calls[0].function.arguments == "{}"
+    assert constructed == ChatCompletionStreamChunkResponse(**CHUNK)
+
+
+def test_rejects_unknown_modes() -> None:
+    mode: Any = "raw"
+    with pytest.raises(ValueError):
+        chunk_converter(CompletionModelResponse, mode)
+
+
+@pytest.mark.usefixtures("identity_environ")
+@pytest.mark.parametrize("chunks", ["model", "construct", "dict", "view"])
+def test_chat_stream_modes(stand_in_client: Modelfarm, chunks: Any) -> None:
+    stream = list(
+        stand_in_client.chat.completions.create(messages=MESSAGES,
+                                                model="chat-bison",
+                                                stream=True,
+                                                max_tokens=5,
+                                                chunks=chunks))
+
+    if chunks == "dict":
+        texts = [chunk["choices"][0]["delta"]["content"] for chunk in stream]
+    else:
+        texts = [chunk.choices[0].delta.content for chunk in stream]
+    assert texts == [f"word{i} " for i in range(5)]
+    if chunks == "construct":
+        assert all(
+            isinstance(chunk, ChatCompletionStreamChunkResponse)
+            for chunk in stream)
+    if chunks == "view":
+        assert stream[0].to_model() == ChatCompletionStreamChunkResponse(
+            **stream[0].to_dict())
+
+
+@pytest.mark.usefixtures("identity_environ")
+@pytest.mark.asyncio
+async def test_async_completion_stream_views(
+        stand_in_async_client: AsyncModelfarm) -> None:
+    chunks = [
+        chunk async for chunk in await
+        stand_in_async_client.completions.create(prompt="1 + 1 = ",
+                                                 model="text-bison",
+                                                 stream=True,
+                                                 max_tokens=5,
+                                                 chunks="view")
+    ]
+
+    assert [chunk.choices[0].text
+            for chunk in chunks] == [f"word{i} " for i in range(5)]
+    assert isinstance(chunks[0].to_model(), CompletionModelResponse)
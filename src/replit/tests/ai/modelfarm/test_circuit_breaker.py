@@ -0,0 +1,210 @@
+import time
+from typing import Iterator
+
+import pytest
+import requests
+from replit.ai.modelfarm import AsyncModelfarm, Modelfarm
+from replit.ai.modelfarm.circuit_breaker import (
+    CircuitBreaker,
+    CircuitBreakerPolicy,
+    CircuitState,
+)
+from replit.ai.modelfarm.exceptions import (
+    CircuitOpenException,
+    InvalidResponseException,
+)
+from replit.ai.modelfarm.retry import RetryPolicy
+
+from .stand_in_server import Fault, StandInServer, patched_identity_environ
+
+CHAT_PATH = "/v1beta2/chat/completions"
+MESSAGES = [{"role": "user", "content": "Hi"}]
+
+
+def make_breaker(**kwargs) -> CircuitBreaker:
+    options = {"minimum_calls": 4, "open_duration": 0.05, **kwargs}
+    return CircuitBreakerPolicy(**options).get("http://modelfarm", CHAT_PATH)
+
+
+def trip(breaker: CircuitBreaker) -> None:
+    for _ in range(breaker.policy.minimum_calls):
+        breaker.acquire()
+        breaker.record(True, 0)
+
+
+@pytest.fixture
+def breaker_policy() -> CircuitBreakerPolicy:
+    return CircuitBreakerPolicy(minimum_calls=4, open_duration=60)
+
+
+@pytest.fixture
+def breaker_client(
+        stand_in_server: StandInServer,
+        breaker_policy: CircuitBreakerPolicy) -> Iterator[Modelfarm]:
+    with patched_identity_environ(), Modelfarm(
+            base_url=stand_in_server.url,
+            circuit_breaker_policy=breaker_policy) as client:
+        yield client
+
+
+def chat(client: Modelfarm) -> None:
+    client.chat.completions.create(messages=MESSAGES,
+                                   model="chat-bison",
+                                   max_tokens=1)
+
+
+def test_opens_on_failure_rate() -> None:
+    breaker = make_breaker()
+    for failed in (False, True, False):
+        breaker.acquire()
+        breaker.record(failed, 0)
+    assert breaker.state is CircuitState.CLOSED
+
+    breaker.acquire()
+    breaker.record(True, 0)
+    assert breaker.state is CircuitState.OPEN
+    assert breaker.failure_rate == 0.5
+    with pytest.raises(CircuitOpenException) as exc_info:
+        breaker.acquire()
+    assert 0 < exc_info.value.retry_after <= 0.05
+
+
+def test_opens_on_slow_call_rate() -> None:
+    breaker = make_breaker(slow_call_duration=1, slow_call_rate_threshold=0.75)
+    for duration in (2, 2, 0.1, 2):
+        breaker.acquire()
+        breaker.record(False, duration)
+    assert breaker.slow_call_rate == 0.75
+    assert breaker.state is CircuitState.OPEN
+
+
+def test_window_forgets_old_calls() -> None:
+    breaker = make_breaker(window_size=4)
+    for failed in (True, False, False, False, False):
+        breaker.acquire()
+        breaker.record(failed, 0)
+    assert breaker.failure_rate == 0
+    assert breaker.state is CircuitState.CLOSED
+
+
+def test_half_open_probes_close_the_circuit() -> None:
+    breaker = make_breaker(half_open_max_calls=2)
+    trip(breaker)
+    time.sleep(0.06)
+    assert breaker.state is CircuitState.HALF_OPEN
+
+    breaker.acquire()
+    breaker.acquire()
+    with pytest.raises(CircuitOpenException):
+        breaker.acquire()
+    breaker.record(False, 0)
+    breaker.record(False, 0)
+    assert breaker.state is CircuitState.CLOSED
+    assert breaker.failure_rate == 0
+
+
+def test_failed_probe_reopens_the_circuit() -> None:
+    breaker = make_breaker()
+    trip(breaker)
+    time.sleep(0.06)
+    breaker.acquire()
+    breaker.record(True, 0)
+    assert breaker.state is CircuitState.OPEN
+
+
+def test_released_probe_frees_its_slot() -> None:
+    breaker = make_breaker(half_open_max_calls=1)
+    trip(breaker)
+    time.sleep(0.06)
+    breaker.acquire()
+    breaker.release()
+    breaker.acquire()
+
+
+def test_breakers_are_per_endpoint() -> None:
+    policy = CircuitBreakerPolicy()
+    assert policy.get("a", CHAT_PATH) is policy.get("a", CHAT_PATH)
+    assert policy.get("a", CHAT_PATH) is not policy.get("b", CHAT_PATH)
+    assert policy.get("a", CHAT_PATH) is not policy.get("a", "/other")
+    assert set(policy.states().values()) == {CircuitState.CLOSED}
+
+
+def test_client_fails_fast_when_open(
+        stand_in_server: StandInServer, breaker_client: Modelfarm,
+        breaker_policy: CircuitBreakerPolicy) -> None:
+    stand_in_server.faults.extend([Fault(503)] * 4)
+    for _ in range(4):
+        with pytest.raises(InvalidResponseException):
+            chat(breaker_client)
+
+    with pytest.raises(CircuitOpenException):
+        chat(breaker_client)
+    assert len(stand_in_server.requests) == 4
+    assert breaker_policy.states() == {
+        (stand_in_server.url, CHAT_PATH): CircuitState.OPEN
+    }
+
+    response = breaker_client.embeddings.create(input=["a"],
+                                                model="textembedding-gecko")
+    assert len(response.data) == 1
+
+
+def test_client_counts_connection_errors(
+        stand_in_server: StandInServer, breaker_client: Modelfarm,
+        breaker_policy: CircuitBreakerPolicy) -> None:
+    stand_in_server.faults.extend([Fault(reset_after=0)] * 4)
+    for _ in range(4):
+        with pytest.raises(requests.ConnectionError):
+            chat(breaker_client)
+    breaker = breaker_policy.get(stand_in_server.url, CHAT_PATH)
+    assert breaker.state is CircuitState.OPEN
+
+
+def test_client_ignores_bad_requests(
+        stand_in_server: StandInServer, breaker_client: Modelfarm,
+        breaker_policy: CircuitBreakerPolicy) -> None:
+    stand_in_server.faults.extend([Fault(400)] * 4)
+    for _ in range(4):
+        with pytest.raises(ValueError):
+            chat(breaker_client)
+    breaker = breaker_policy.get(stand_in_server.url, CHAT_PATH)
+    assert breaker.state is CircuitState.CLOSED
+
+
+def test_open_circuit_is_not_retried(
+        stand_in_server: StandInServer,
+        breaker_policy: CircuitBreakerPolicy) -> None:
+    stand_in_server.faults.extend([Fault(503)] * 10)
+    with patched_identity_environ(), Modelfarm(
+            base_url=stand_in_server.url,
+            retry_policy=RetryPolicy(max_attempts=10,
+                                     initial_backoff=0.001,
+                                     budget=None),
+            circuit_breaker_policy=breaker_policy) as client, pytest.raises(
+                CircuitOpenException):
+        chat(client)
+    assert len(stand_in_server.requests) == 4
+
+
+@pytest.mark.usefixtures("identity_environ")
+@pytest.mark.asyncio
+async def test_async_client_fails_fast_when_open(
+        stand_in_server: StandInServer,
+        breaker_policy: CircuitBreakerPolicy) -> None:
+    stand_in_server.faults.extend([Fault(503)] * 4)
+    async with AsyncModelfarm(base_url=stand_in_server.url,
+                              circuit_breaker_policy=breaker_policy) as client:
+        for _ in range(4):
+            with pytest.raises(InvalidResponseException):
+                await client.embeddings.create(input=["a"],
+                                               model="textembedding-gecko")
+        with pytest.raises(CircuitOpenException):
+            await client.embeddings.create(input=["a"],
+                                           model="textembedding-gecko")
+        stream = await client.completions.create(prompt="1 + 1 = ",
+                                                 model="text-bison",
+                                                 stream=True,
+                                                 max_tokens=2)
+        assert len([chunk async for chunk in stream]) == 2
+
+    assert len(stand_in_server.requests) == 5
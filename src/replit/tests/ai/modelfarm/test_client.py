@@ -0,0 +1,92 @@
+import asyncio
+
+import aiohttp
+import pytest
+from replit.ai.modelfarm import AsyncModelfarm, Modelfarm
+
+from .stand_in_server import StandInServer
+
+MODEL = "textembedding-gecko"
+
+
+def test_client_reuses_connections(stand_in_server: StandInServer,
+                                   stand_in_client: Modelfarm) -> None:
+    for _ in range(5):
+        response = stand_in_client.embeddings.create(input=["1 + 1 = "],
+                                                     model=MODEL)
+        assert len(response.data) == 1
+
+    assert len(stand_in_server.requests) == 5
+    assert stand_in_server.connections == 1
+
+
+def test_client_reuses_connections_for_streams(
+        stand_in_server: StandInServer, stand_in_client: Modelfarm) -> None:
+    for _ in range(3):
+        chunks = list(
+            stand_in_client.completions.create(prompt="1 + 1 = ",
+                                               model="text-bison",
+                                               stream=True,
+                                               max_tokens=4))
+        assert len(chunks) == 4
+
+    assert stand_in_server.connections == 1
+
+
+@pytest.mark.usefixtures("identity_environ")
+def test_client_close(stand_in_server: StandInServer) -> None:
+    with Modelfarm(base_url=stand_in_server.url) as client:
+        client.embeddings.create(input=["a"], model=MODEL)
+    client.embeddings.create(input=["b"], model=MODEL)
+
+    assert stand_in_server.connections == 2
+
+
+@pytest.mark.asyncio
+async def test_async_client_reuses_connections(
+        stand_in_server: StandInServer,
+        stand_in_async_client: AsyncModelfarm) -> None:
+    responses = await asyncio.gather(*[
+        stand_in_async_client.embeddings.create(input=["1 + 1 = "],
+                                                model=MODEL) for _ in range(5)
+    ])
+    assert all(len(response.data) == 1 for response in responses)
+    for _ in range(5):
+        await stand_in_async_client.embeddings.create(input=["1 + 1 = "],
+                                                      model=MODEL)
+
+    assert len(stand_in_server.requests) == 10
+    assert stand_in_server.connections <= 5
+
+
+@pytest.mark.usefixtures("identity_environ")
+def test_async_client_used_from_several_loops(
+        stand_in_server: StandInServer) -> None:
+    client = AsyncModelfarm(base_url=stand_in_server.url, limit=1)
+
+    async def embed() -> aiohttp.ClientSession:
+        await client.embeddings.create(input=["a"], model=MODEL)
+        await client.embeddings.create(input=["b"], model=MODEL)
+        session = client._get_session()
+        await client.aclose()
+        return session
+
+    first = asyncio.run(embed())
+    second = asyncio.run(embed())
+
+    assert first is not second
+    assert stand_in_server.connections == 2
+    assert len(client._sessions) == 0
+
+
+@pytest.mark.usefixtures("identity_environ")
+@pytest.mark.asyncio
+async def test_async_client_aclose(stand_in_server: StandInServer) -> None:
+    async with AsyncModelfarm(base_url=stand_in_server.url) as client:
+        await client.embeddings.create(input=["a"], model=MODEL)
+        session = client._get_session()
+    assert session.closed
+
+    await client.embeddings.create(input=["b"], model=MODEL)
+    assert client._get_session() is not session
+    await client.aclose()
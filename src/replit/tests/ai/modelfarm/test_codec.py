@@ -0,0 +1,84 @@
+from typing import List
+
+import pytest
+from replit.ai.modelfarm import AsyncModelfarm, Modelfarm, codec
+from replit.ai.modelfarm.codec import JSONCodec, OrjsonCodec, default_codec
+
+from .stand_in_server import StandInServer
+
+CODECS: List[JSONCodec] = [JSONCodec(), OrjsonCodec()]
+
+MESSAGES = [{"role": "user", "content": "Quel café \U0001f642?"}]
+
+
+@pytest.mark.parametrize("json_codec", CODECS, ids=lambda c: c.name)
+def test_codec_round_trip(json_codec: JSONCodec) -> None:
+    payload = {"messages": MESSAGES, "temperature": 0.2, "n": None}
+    assert json_codec.loads(json_codec.dumps(payload)) == payload
+
+
+@pytest.mark.parametrize("json_codec", CODECS, ids=lambda c: c.name)
+def test_codec_stream_framer(json_codec: JSONCodec) -> None:
+    framer = json_codec.stream_framer()
+    data = json_codec.dumps({"a": "é"}) + json_codec.dumps({"b": [1]})
+    assert framer.feed(data[:5]) + framer.feed(data[5:]) == [{
+        "a": "é"
+    }, {
+        "b": [1]
+    }]
+
+
+def test_non_finite_floats() -> None:
+    payload = {"values": [float("nan"), float("inf"), -float("inf")]}
+    assert JSONCodec().dumps(payload) == b'{"values":[NaN,Infinity,-Infinity]}'
+    assert OrjsonCodec().dumps(payload) == b'{"values":[null,null,null]}'
+
+
+def test_default_codec(monkeypatch: pytest.MonkeyPatch) -> None:
+    assert isinstance(default_codec(), OrjsonCodec)
+
+    monkeypatch.setattr(codec, "orjson", None)
+    assert type(default_codec()) is JSONCodec
+    with pytest.raises(ImportError):
+        OrjsonCodec()
+
+
+@pytest.mark.usefixtures("identity_environ")
+@pytest.mark.parametrize("json_codec", CODECS, ids=lambda c: c.name)
+def test_client_codec(stand_in_server: StandInServer,
+                      json_codec: JSONCodec) -> None:
+    with Modelfarm(base_url=stand_in_server.url, codec=json_codec) as client:
+        response = client.chat.completions.create(messages=MESSAGES,
+                                                  model="chat-bison",
+                                                  max_tokens=3)
+        chunks = list(
+            client.chat.completions.create(messages=MESSAGES,
+                                           model="chat-bison",
+                                           stream=True,
+                                           max_tokens=3))
+
+    assert response.choices[0].message.content == "word0 word1 word2 "
+    assert len(chunks) == 3
+    assert stand_in_server.requests[0]["messages"] == MESSAGES
+
+
+@pytest.mark.usefixtures("identity_environ")
+@pytest.mark.asyncio
+@pytest.mark.parametrize("json_codec", CODECS, ids=lambda c: c.name)
+async def test_async_client_codec(stand_in_server: StandInServer,
+                                  json_codec: JSONCodec) -> None:
+    async with AsyncModelfarm(base_url=stand_in_server.url,
+                              codec=json_codec) as client:
+        response = await client.embeddings.create(input=["a", "b"],
+                                                  model="textembedding-gecko")
+        chunks = [
+            chunk async for chunk in await client.completions.create(
+                prompt="1 + 1 = ",
+                model="text-bison",
+                stream=True,
+                max_tokens=3)
+        ]
+
+    assert len(response.data) == 2
+    assert len(chunks) == 3
+    assert stand_in_server.requests[0]["input"] == ["a", "b"]
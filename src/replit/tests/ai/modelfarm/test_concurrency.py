@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+from replit.ai.modelfarm import AsyncModelfarm
+from replit.ai.modelfarm.concurrency import (
+    AdaptiveConcurrencyLimiter,
+    ConcurrencyLimit,
+)
+from replit.ai.modelfarm.exceptions import InvalidResponseException
+
+from .stand_in_server import StandInServer
+
+EMBEDDINGS_PATH = "/v1beta2/embeddings"
+
+
+def make_limit(**kwargs) -> ConcurrencyLimit:
+    return AdaptiveConcurrencyLimiter(**kwargs).get("http://modelfarm",
+                                                    EMBEDDINGS_PATH)
+
+
+@pytest.mark.asyncio
+async def test_limit_grows_while_in_use() -> None:
+    limit = make_limit(initial_limit=4)
+    await limit.acquire()
+    await limit.acquire()
+    limit.release(0.01, False)
+    assert limit.limit == 5
+
+    limit.release(0.01, False)
+    assert limit.limit == 5
+    assert limit.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_limit_backs_off_on_drops() -> None:
+    limit = make_limit(initial_limit=4, min_limit=3)
+    for _ in range(3):
+        await limit.acquire()
+        limit.release(0.01, True)
+    assert limit.limit == 3
+
+
+@pytest.mark.asyncio
+async def test_limit_backs_off_on_slow_requests() -> None:
+    limit = make_limit(initial_limit=10, latency_tolerance=2)
+    await limit.acquire()
+    limit.release(0.01, False)
+    await limit.acquire()
+    limit.release(0.015, False)
+    assert limit.limit == 10
+
+    await limit.acquire()
+    limit.release(0.05, False)
+    assert limit.limit == 9
+
+
+@pytest.mark.asyncio
+async def test_requests_over_the_limit_queue() -> None:
+    limit = make_limit(initial_limit=1, max_limit=1)
+    await limit.acquire()
+    waiter = asyncio.ensure_future(limit.acquire())
+    await asyncio.sleep(0)
+    assert limit.queue_depth == 1
+    assert not waiter.done()
+
+    limit.release(0.01, False)
+    await waiter
+    assert limit.queue_depth == 0
+    assert limit.in_flight == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_leak_a_slot() -> None:
+    limit = make_limit(initial_limit=1, max_limit=1)
+    await limit.acquire()
+    waiter = asyncio.ensure_future(limit.acquire())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    await asyncio.sleep(0)
+    assert limit.queue_depth == 0
+
+    limit.release(0.01, False)
+    assert limit.in_flight == 0
+    await limit.acquire()
+
+
+@pytest.mark.asyncio
+async def test_waiter_cancelled_during_hand_over() -> None:
+    limit = make_limit(initial_limit=1, max_limit=1)
+    await limit.acquire()
+    waiter = asyncio.ensure_future(limit.acquire())
+    await asyncio.sleep(0)
+    limit.release(0.01, False)
+    waiter.cancel()
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    assert limit.in_flight == 0
+
+
+@pytest.mark.usefixtures("identity_environ")
+@pytest.mark.asyncio
+async def test_client_adapts_to_server_capacity(
+        stand_in_server: StandInServer) -> None:
+    stand_in_server.capacity = 2
+    stand_in_server.queue_timeout = 0.01
+    stand_in_server.latency = lambda: 0.02
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=20)
+
+    async def embed() -> bool:
+        try:
+            await client.embeddings.create(input=["a"],
+                                           model="textembedding-gecko")
+        except InvalidResponseException:
+            return False
+        return True
+
+    async with AsyncModelfarm(base_url=stand_in_server.url,
+                              concurrency_limiter=limiter) as client:
+        await asyncio.gather(*(embed() for _ in range(40)))
+
+    limit = limiter.get(stand_in_server.url, EMBEDDINGS_PATH)
+    assert limit.limit < 20
+    assert limit.in_flight == 0
+    assert limit.queue_depth == 0
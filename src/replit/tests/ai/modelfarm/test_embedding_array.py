@@ -0,0 +1,78 @@
+import pytest
+from replit.ai.modelfarm import AsyncModelfarm, Modelfarm
+from replit.ai.modelfarm.config import get_config
+from replit.ai.modelfarm.embedding_array import to_array_response
+from replit.ai.modelfarm.google.language_models import TextEmbeddingModel
+
+from .stand_in_server import EMBEDDING_DIMENSIONS, StandInServer
+
+numpy = pytest.importorskip("numpy")
+
+MODEL = "textembedding-gecko"
+INPUTS = ["a", "bb", "ccc"]
+
+
+def test_rows_follow_the_indices() -> None:
+    response = to_array_response({
+        "model":
+        MODEL,
+        "data": [{
+            "index": 1,
+            "embedding": [1.0, 2.0],
+            "metadata": {
+                "truncated": True
+            }
+        }, {
+            "index": 0,
+            "embedding": [3.0, 4.0]
+        }],
+        "usage":
+        None,
+    })
+
+    assert response.embeddings.dtype == numpy.float32
+    assert response.embeddings.flags["C_CONTIGUOUS"]
+    assert response.embeddings.tolist() == [[3.0, 4.0], [1.0, 2.0]]
+    assert response.item_metadata == [None, {"truncated": True}]
+    assert response.usage is None
+    assert len(response) == 2
+
+
+def test_empty_response() -> None:
+    response = to_array_response({"model": MODEL, "data": []})
+    assert response.embeddings.shape == (0, 0)
+
+
+@pytest.mark.usefixtures("identity_environ")
+def test_client_returns_an_array(stand_in_client: Modelfarm) -> None:
+    expected = stand_in_client.embeddings.create(input=INPUTS, model=MODEL)
+    response = stand_in_client.embeddings.create(input=INPUTS,
+                                                 model=MODEL,
+                                                 output="numpy")
+
+    assert response.embeddings.shape == (3, EMBEDDING_DIMENSIONS)
+    assert numpy.allclose(response.embeddings,
+                          [item.embedding for item in expected.data])
+    assert response.usage == expected.usage
+    assert response.model == MODEL
+
+
+@pytest.mark.asyncio
+async def test_async_client_returns_an_array(
+        stand_in_async_client: AsyncModelfarm) -> None:
+    response = await stand_in_async_client.embeddings.create(input=INPUTS,
+                                                             model=MODEL,
+                                                             output="numpy")
+    assert response.embeddings.shape == (3, EMBEDDING_DIMENSIONS)
+
+
+@pytest.mark.usefixtures("identity_environ")
+def test_text_embedding_model(stand_in_server: StandInServer,
+                              monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(get_config(), "rootUrl", stand_in_server.url)
+    model = TextEmbeddingModel.from_pretrained(MODEL)
+    embeddings = model.get_embeddings(INPUTS)
+    response = model.get_embeddings(INPUTS, output="numpy")
+
+    assert numpy.allclose(response.embeddings,
+                          [embedding.values for embedding in embeddings])
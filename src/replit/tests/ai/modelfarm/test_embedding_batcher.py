@@ -0,0 +1,152 @@
+import asyncio
+from typing import Any, Dict, List
+
+import pytest
+from replit.ai.modelfarm import AsyncModelfarm
+from replit.ai.modelfarm.embedding_batcher import EmbeddingMicroBatcher
+from replit.ai.modelfarm.exceptions import InvalidResponseException
+
+from .stand_in_server import Fault, StandInServer
+
+MODEL = "textembedding-gecko"
+
+
+def echo(payloads: List[Dict[str, Any]]) -> Any:
+
+    async def send(payload: Dict[str, Any]) -> Dict[str, Any]:
+        payloads.append(payload)
+        return {
+            "model":
+            payload["model"],
+            "data": [{
+                "index": i,
+                "embedding": [float(len(text))]
+            } for i, text in enumerate(payload["input"])],
+            "usage": {
+                "prompt_tokens": len(payload["input"])
+            },
+        }
+
+    return send
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_a_request() -> None:
+    batcher = EmbeddingMicroBatcher(window=0.01)
+    payloads: List[Dict[str, Any]] = []
+    send = echo(payloads)
+    responses = await asyncio.gather(
+        batcher.submit({
+            "model": MODEL,
+            "input": "a"
+        }, send), batcher.submit({
+            "model": MODEL,
+            "input": ["bb", "ccc"]
+        }, send), batcher.submit({
+            "model": "other",
+            "input": ["dddd"]
+        }, send))
+
+    assert [p["input"] for p in payloads] == [["a", "bb", "ccc"], ["dddd"]]
+    assert responses[0]["data"] == [{"index": 0, "embedding": [1.0]}]
+    assert responses[1]["data"] == [{
+        "index": 0,
+        "embedding": [2.0]
+    }, {
+        "index": 1,
+        "embedding": [3.0]
+    }]
+    assert responses[0]["usage"] is None
+    assert responses[2]["usage"] == {"prompt_tokens": 1}
+    assert batcher.stats.calls == 3
+    assert batcher.stats.sizes == {3: 1, 1: 1}
+    assert batcher.stats.callers == {2: 1, 1: 1}
+    assert batcher.stats.mean_size == 2
+
+
+@pytest.mark.asyncio
+async def test_full_batch_is_sent_at_once() -> None:
+    batcher = EmbeddingMicroBatcher(window=10, max_batch_size=4)
+    payloads: List[Dict[str, Any]] = []
+    send = echo(payloads)
+    await asyncio.wait_for(
+        asyncio.gather(
+            *(batcher.submit({
+                "model": MODEL,
+                "input": [str(i), str(i)]
+            }, send) for i in range(4)),
+            batcher.submit({
+                "model": MODEL,
+                "input": list("abcd")
+            }, send)), 1)
+
+    assert sorted(len(p["input"]) for p in payloads) == [4, 4, 4]
+    assert batcher.stats.callers == {2: 2, 1: 1}
+
+
+@pytest.mark.asyncio
+async def test_empty_input_is_sent_on_its_own() -> None:
+    batcher = EmbeddingMicroBatcher(window=10)
+    payloads: List[Dict[str, Any]] = []
+    response = await asyncio.wait_for(
+        batcher.submit({
+            "model": MODEL,
+            "input": []
+        }, echo(payloads)), 1)
+
+    assert payloads == [{"model": MODEL, "input": []}]
+    assert response["data"] == []
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_affect_the_batch() -> None:
+    batcher = EmbeddingMicroBatcher(window=0.01)
+    send = echo([])
+    first = asyncio.ensure_future(
+        batcher.submit({
+            "model": MODEL,
+            "input": ["a"]
+        }, send))
+    second = asyncio.ensure_future(
+        batcher.submit({
+            "model": MODEL,
+            "input": ["bb"]
+        }, send))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert (await second)["data"] == [{"index": 0, "embedding": [2.0]}]
+    assert first.cancelled()
+
+
+@pytest.mark.usefixtures("identity_environ")
+@pytest.mark.asyncio
+async def test_client_batches_concurrent_calls(
+        stand_in_server: StandInServer) -> None:
+    batcher = EmbeddingMicroBatcher(window=0.02, max_batch_size=50)
+    async with AsyncModelfarm(base_url=stand_in_server.url,
+                              embedding_batcher=batcher) as client:
+        alone = await client.embeddings.create(input=["text 7"], model=MODEL)
+        responses = await asyncio.gather(
+            *(client.embeddings.create(input=[f"text {i}"], model=MODEL)
+              for i in range(100)))
+
+    assert len(stand_in_server.requests) == 3
+    assert all(len(r.data) == 1 and r.data[0].index == 0 for r in responses)
+    assert responses[7].data[0].embedding == alone.data[0].embedding
+    assert batcher.stats.sizes == {1: 1, 50: 2}
+
+
+@pytest.mark.usefixtures("identity_environ")
+@pytest.mark.asyncio
+async def test_client_shares_errors(stand_in_server: StandInServer) -> None:
+    stand_in_server.faults.append(Fault(500))
+    async with AsyncModelfarm(
+            base_url=stand_in_server.url,
+            embedding_batcher=EmbeddingMicroBatcher()) as client:
+        results = await asyncio.gather(*(client.embeddings.create(
+            input=[str(i)], model=MODEL) for i in range(3)),
+                                       return_exceptions=True)
+
+    assert len(stand_in_server.requests) == 1
+    assert all(isinstance(r, InvalidResponseException) for r in results)
@@ -0,0 +1,169 @@
+import multiprocessing
+import threading
+from pathlib import Path
+from typing import Any, List
+
+import pytest
+from replit.ai.modelfarm import AsyncModelfarm, Modelfarm
+from replit.ai.modelfarm.embedding_cache import (
+    SQLiteEmbeddingCache,
+    split_inputs,
+)
+
+from .stand_in_server import StandInServer
+
+MODEL = "textembedding-gecko"
+
+
+def _fill(path: str, start: int) -> None:
+    cache = SQLiteEmbeddingCache(path)
+    for i in range(start, start + 50):
+        lookup = cache.lookup({"model": MODEL, "input": [f"text {i}"]})
+        if lookup.request() is None:
+            continue
+        lookup.merge({
+            "model":
+            MODEL,
+            "data": [{
+                "object": "embedding",
+                "index": 0,
+                "embedding": [float(i)] * 4,
+            }],
+        })
+    cache.close()
+
+
+def test_split_inputs() -> None:
+    assert split_inputs("a") == ["a"]
+    assert split_inputs(["a", "b"]) == ["a", "b"]
+    assert split_inputs([1, 2]) == [[1, 2]]
+    assert split_inputs([[1], [2]]) == [[1], [2]]
+    assert split_inputs(None) is None
+    assert split_inputs(["a", 1]) is None
+
+
+def test_keys_depend_on_params_and_input(tmp_path: Path) -> None:
+    cache = SQLiteEmbeddingCache(str(tmp_path / "cache.db"))
+    a, b = cache.keys({"model": MODEL}, ["a", "b"])
+    assert a != b
+    assert cache.keys({"model": "other"}, ["a"]) != [a]
+    assert cache.keys({"model": MODEL, "input": ["x"]}, ["a"]) == [a]
+
+
+@pytest.mark.usefixtures("identity_environ")
+def test_only_misses_are_sent(stand_in_server: StandInServer,
+                              tmp_path: Path) -> None:
+    cache = SQLiteEmbeddingCache(str(tmp_path / "cache.db"))
+    with Modelfarm(base_url=stand_in_server.url) as plain, Modelfarm(
+            base_url=stand_in_server.url, embedding_cache=cache) as client:
+        expected = plain.embeddings.create(input=["a", "b", "c", "d"],
+                                           model=MODEL)
+        client.embeddings.create(input=["b", "d"], model=MODEL)
+        response = client.embeddings.create(input=["a", "b", "c", "d"],
+                                            model=MODEL)
+
+    assert stand_in_server.requests[-1]["input"] == ["a", "c"]
+    assert [item.index for item in response.data] == [0, 1, 2, 3]
+    assert [item.embedding for item in response.data
+            ] == [item.embedding for item in expected.data]
+    assert response.usage.prompt_tokens == 2
+    assert (cache.stats.hits, cache.stats.misses) == (2, 4)
+
+
+@pytest.mark.usefixtures("identity_environ")
+def test_full_hit_sends_nothing(stand_in_server: StandInServer,
+                                tmp_path: Path) -> None:
+    path = str(tmp_path / "cache.db")
+    with Modelfarm(base_url=stand_in_server.url,
+                   embedding_cache=SQLiteEmbeddingCache(path)) as client:
+        first = client.embeddings.create(input="a", model=MODEL)
+    with Modelfarm(base_url=stand_in_server.url,
+                   embedding_cache=SQLiteEmbeddingCache(path)) as client:
+        second = client.embeddings.create(input="a", model=MODEL)
+
+    assert len(stand_in_server.requests) == 1
+    assert second.data == first.data
+    assert second.usage is None
+
+
+def test_eviction(tmp_path: Path) -> None:
+    cache = SQLiteEmbeddingCache(str(tmp_path / "cache.db"), max_bytes=1000)
+    for i in range(20):
+        lookup = cache.lookup({"model": MODEL, "input": [str(i)]})
+        lookup.merge({
+            "model": MODEL,
+            "data": [{
+                "index": 0,
+                "embedding": [0.0] * 16
+            }],
+        })
+
+    assert cache.bytes <= 1000
+    assert 0 < len(cache) < 20
+    assert cache.stats.evictions == 20 - len(cache)
+    assert cache.lookup({"model": MODEL, "input": ["19"]}).misses == []
+    assert cache.lookup({"model": MODEL, "input": ["0"]}).misses == [0]
+
+
+def test_processes_share_the_cache(tmp_path: Path) -> None:
+    path = str(tmp_path / "cache.db")
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=_fill, args=(path, start))
+        for start in (0, 25, 50)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(30)
+        assert process.exitcode == 0
+
+    cache = SQLiteEmbeddingCache(path)
+    assert len(cache) == 100
+    lookup = cache.lookup({
+        "model": MODEL,
+        "input": [f"text {i}" for i in range(100)]
+    })
+    assert lookup.misses == []
+    assert lookup.merge(None)["data"][42]["embedding"] == [42.0] * 4
+
+
+@pytest.mark.usefixtures("identity_environ")
+@pytest.mark.asyncio
+async def test_async_client(stand_in_server: StandInServer,
+                            tmp_path: Path) -> None:
+    cache = SQLiteEmbeddingCache(str(tmp_path / "cache.db"))
+    async with AsyncModelfarm(base_url=stand_in_server.url,
+                              embedding_cache=cache) as client:
+        await client.embeddings.create(input=["a"], model=MODEL)
+        response = await client.embeddings.create(input=["b", "a"],
+                                                  model=MODEL)
+
+    assert stand_in_server.requests[-1]["input"] == ["b"]
+    assert [item.index for item in response.data] == [0, 1]
+    assert cache.stats.hits == 1
+
+
+@pytest.mark.usefixtures("identity_environ")
+@pytest.mark.asyncio
+async def test_async_client_uses_the_cache_off_the_loop(
+        stand_in_server: StandInServer, tmp_path: Path) -> None:
+    threads: List[int] = []
+
+    class RecordingCache(SQLiteEmbeddingCache):
+
+        def get_many(self, *args: Any) -> Any:
+            threads.append(threading.get_ident())
+            return super().get_many(*args)
+
+        def set_many(self, *args: Any) -> None:
+            threads.append(threading.get_ident())
+            super().set_many(*args)
+
+    cache = RecordingCache(str(tmp_path / "cache.db"))
+    async with AsyncModelfarm(base_url=stand_in_server.url,
+                              embedding_cache=cache) as client:
+        await client.embeddings.create(input=["a"], model=MODEL)
+
+    assert len(threads) == 2
+    assert threading.get_ident() not in threads
@@ -0,0 +1,86 @@
+from pathlib import Path
+
+import pytest
+from replit.ai.modelfarm import AsyncModelfarm, Modelfarm
+from replit.ai.modelfarm.embedding_cache import SQLiteEmbeddingCache
+from replit.ai.modelfarm.embedding_encoding import (
+    decode_base64,
+    decode_embeddings,
+    encode_base64,
+)
+
+from .stand_in_server import StandInServer
+
+MODEL = "textembedding-gecko"
+INPUTS = ["a", "bb", "ccc"]
+
+
+def test_round_trip() -> None:
+    encoded = encode_base64([0.5, -1.25, 3.0])
+    assert encoded == "AAAAPwAAoL8AAEBA"
+    assert decode_base64(encoded).tolist() == [0.5, -1.25, 3.0]
+
+
+def test_decode_embeddings_does_not_modify_the_response() -> None:
+    rjson = {
+        "data": [{
+            "index": 0,
+            "embedding": encode_base64([1.0])
+        }, {
+            "index": 1,
+            "embedding": [2.0]
+        }]
+    }
+    decoded = decode_embeddings(rjson)
+
+    assert [item["embedding"] for item in decoded["data"]] == [[1.0], [2.0]]
+    assert isinstance(rjson["data"][0]["embedding"], str)
+    assert decode_embeddings(decoded) is decoded
+
+
+@pytest.mark.usefixtures("identity_environ")
+def test_client_decodes_base64(stand_in_server: StandInServer) -> None:
+    with Modelfarm(base_url=stand_in_server.url) as client:
+        expected = client.embeddings.create(input=INPUTS, model=MODEL)
+        plain_bytes = stand_in_server.bytes_sent
+        response = client.embeddings.create(input=INPUTS,
+                                            model=MODEL,
+                                            encoding_format="base64")
+
+    assert stand_in_server.requests[-1]["encoding_format"] == "base64"
+    assert stand_in_server.bytes_sent - plain_bytes < plain_bytes / 2
+    for i, item in enumerate(response.data):
+        assert item.embedding == pytest.approx(expected.data[i].embedding,
+                                               rel=1e-6)
+
+
+@pytest.mark.usefixtures("identity_environ")
+@pytest.mark.asyncio
+async def test_async_client_decodes_base64_into_an_array(
+        stand_in_server: StandInServer) -> None:
+    numpy = pytest.importorskip("numpy")
+    async with AsyncModelfarm(base_url=stand_in_server.url) as client:
+        expected = await client.embeddings.create(input=INPUTS, model=MODEL)
+        response = await client.embeddings.create(input=INPUTS,
+                                                  model=MODEL,
+                                                  output="numpy",
+                                                  encoding_format="base64")
+
+    assert response.embeddings.dtype == numpy.float32
+    assert numpy.allclose(response.embeddings,
+                          [item.embedding for item in expected.data])
+
+
+@pytest.mark.usefixtures("identity_environ")
+def test_cache_is_shared_between_formats(stand_in_server: StandInServer,
+                                         tmp_path: Path) -> None:
+    cache = SQLiteEmbeddingCache(str(tmp_path / "cache.db"))
+    with Modelfarm(base_url=stand_in_server.url,
+                   embedding_cache=cache) as client:
+        client.embeddings.create(input=INPUTS,
+                                 model=MODEL,
+                                 encoding_format="base64")
+        response = client.embeddings.create(input=INPUTS, model=MODEL)
+
+    assert len(stand_in_server.requests) == 1
+    assert all(isinstance(item.embedding, list) for item in response.data)
@@ -0,0 +1,120 @@
+import pytest
+from replit.ai.modelfarm import AsyncModelfarm, Modelfarm
+from replit.ai.modelfarm.config import get_config
+from replit.ai.modelfarm.embedding_split import (
+    EmbeddingSplitPolicy,
+    merge_responses,
+)
+from replit.ai.modelfarm.exceptions import InvalidResponseException
+from replit.ai.modelfarm.google.language_models import TextEmbeddingModel
+
+from .stand_in_server import Fault, StandInServer
+
+MODEL = "textembedding-gecko"
+INPUTS = [f"text {i}" for i in range(10)]
+
+
+def test_batches_by_items() -> None:
+    policy = EmbeddingSplitPolicy(max_items=4, max_tokens=None)
+    assert policy.batches(INPUTS) == [(0, 4), (4, 8), (8, 10)]
+    assert policy.batches([]) == []
+
+
+def test_batches_by_tokens() -> None:
+    policy = EmbeddingSplitPolicy(max_items=None, max_tokens=10)
+    assert policy.batches(["a" * 20, "b" * 20, "c" * 60, "d"]) == [(0, 2),
+                                                                   (2, 3),
+                                                                   (3, 4)]
+    assert policy.batches([[1] * 6, [2] * 6]) == [(0, 1), (1, 2)]
+
+
+def test_small_requests_are_not_split() -> None:
+    policy = EmbeddingSplitPolicy(max_items=4)
+    assert policy.split({"input": INPUTS[:4]}) is None
+    assert policy.split({"input": "a"}) is None
+    assert policy.split({"input": list(range(100))}) is None
+    parts = policy.split({"model": MODEL, "input": INPUTS})
+    assert [offset for offset, _ in parts] == [0, 4, 8]
+    assert parts[2][1] == {"model": MODEL, "input": INPUTS[8:]}
+
+
+def test_merge_responses() -> None:
+
+    def response(count: int, tokens: int) -> dict:
+        return {
+            "object": "list",
+            "model": MODEL,
+            "data": [{
+                "index": i
+            } for i in range(count)],
+            "usage": {
+                "prompt_tokens": tokens,
+                "completion_tokens": 0,
+                "total_tokens": tokens
+            },
+            "metadata": {
+                "tokenCountMetadata": {
+                    "billableTokens": tokens
+                }
+            },
+        }
+
+    merged = merge_responses([(0, response(2, 3)), (2, response(1, 4))])
+    assert [item["index"] for item in merged["data"]] == [0, 1, 2]
+    assert merged["usage"]["total_tokens"] == 7
+    assert merged["metadata"]["tokenCountMetadata"]["billableTokens"] == 7
+    assert merged["model"] == MODEL
+
+
+@pytest.mark.usefixtures("identity_environ")
+def test_client_splits_large_inputs(stand_in_server: StandInServer) -> None:
+    with Modelfarm(base_url=stand_in_server.url) as plain:
+        expected = plain.embeddings.create(input=INPUTS, model=MODEL)
+    with Modelfarm(
+            base_url=stand_in_server.url,
+            embedding_split=EmbeddingSplitPolicy(max_items=3)) as client:
+        response = client.embeddings.create(input=INPUTS, model=MODEL)
+
+    assert sorted(len(r["input"])
+                  for r in stand_in_server.requests[1:]) == [1, 3, 3, 3]
+    assert response.data == expected.data
+    assert response.usage == expected.usage
+
+
+@pytest.mark.usefixtures("identity_environ")
+def test_client_raises_the_first_error(stand_in_server: StandInServer) -> None:
+    stand_in_server.faults.append(Fault(500))
+    client = Modelfarm(base_url=stand_in_server.url,
+                       embedding_split=EmbeddingSplitPolicy(max_items=3,
+                                                            concurrency=1))
+    with client, pytest.raises(InvalidResponseException):
+        client.embeddings.create(input=INPUTS, model=MODEL)
+
+    assert len(stand_in_server.requests) < 4
+
+
+@pytest.mark.usefixtures("identity_environ")
+@pytest.mark.asyncio
+async def test_async_client_splits_large_inputs(
+        stand_in_server: StandInServer) -> None:
+    stand_in_server.latency = lambda: 0.05
+    async with AsyncModelfarm(base_url=stand_in_server.url,
+                              embedding_split=EmbeddingSplitPolicy(
+                                  max_items=2, concurrency=5)) as client:
+        response = await client.embeddings.create(input=INPUTS, model=MODEL)
+
+    assert len(stand_in_server.requests) == 5
+    assert [item.index for item in response.data] == list(range(10))
+    assert response.usage.prompt_tokens == 20
+
+
+@pytest.mark.usefixtures("identity_environ")
+def test_text_embedding_model_splits(stand_in_server: StandInServer,
+                                     monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(get_config(), "rootUrl", stand_in_server.url)
+    model = TextEmbeddingModel.from_pretrained(MODEL)
+    embeddings = model.get_embeddings([f"text {i}" for i in range(300)])
+
+    assert len(embeddings) == 300
+    assert [len(r["input"])
+            for r in stand_in_server.requests] in ([250, 50], [50, 250])
@@ -0,0 +1,143 @@
+import asyncio
+import time
+from typing import Iterator
+
+import pytest
+from replit.ai.modelfarm import AsyncModelfarm
+from replit.ai.modelfarm.exceptions import BadRequestException
+from replit.ai.modelfarm.hedging import HedgingPolicy
+from replit.ai.modelfarm.rate_limit import RateLimiter
+
+from .stand_in_server import INVALID_PARAMETER, StandInServer
+
+MODEL = "textembedding-gecko"
+
+
+def slow_first(server: StandInServer, seconds: float) -> None:
+    latencies: Iterator[float] = iter([seconds])
+    server.latency = lambda: next(latencies, 0.0)
+
+
+def test_fixed_delay() -> None:
+    assert HedgingPolicy(delay=0.3).hedge_delay() == 0.3
+
+
+def test_adaptive_delay() -> None:
+    policy = HedgingPolicy(initial_delay=2, min_samples=10)
+    for i in range(9):
+        policy.record_latency(i / 100)
+    assert policy.hedge_delay() == 2
+
+    for i in range(9, 100):
+        policy.record_latency(i / 100)
+    assert policy.hedge_delay() == 0.94
+
+
+@pytest.mark.asyncio
+async def test_hedge_wins_over_slow_request() -> None:
+    policy = HedgingPolicy(delay=0.01, max_hedge_rate=1)
+    calls = []
+
+    async def call() -> int:
+        calls.append(len(calls))
+        await asyncio.sleep(10 if len(calls) == 1 else 0)
+        return len(calls)
+
+    assert await policy.run(call) == 2
+    assert policy.stats.requests == 1
+    assert policy.stats.hedges_fired == 1
+    assert policy.stats.hedges_won == 1
+
+
+@pytest.mark.asyncio
+async def test_fast_request_is_not_hedged() -> None:
+    policy = HedgingPolicy(delay=1, max_hedge_rate=1)
+
+    async def call() -> str:
+        return "ok"
+
+    assert await policy.run(call) == "ok"
+    assert policy.stats.hedges_fired == 0
+
+
+@pytest.mark.asyncio
+async def test_hedge_rate_cap() -> None:
+    policy = HedgingPolicy(delay=0, max_hedge_rate=0.5)
+
+    async def call() -> str:
+        await asyncio.sleep(0.01)
+        return "ok"
+
+    for _ in range(10):
+        await policy.run(call)
+    assert policy.stats.requests == 10
+    assert policy.stats.hedges_fired == 5
+
+
+@pytest.mark.asyncio
+async def test_error_waits_for_pending_hedge() -> None:
+    policy = HedgingPolicy(delay=0.01, max_hedge_rate=1)
+    calls = []
+
+    async def call() -> str:
+        calls.append(None)
+        if len(calls) == 1:
+            await asyncio.sleep(0.05)
+            raise ValueError("primary failed")
+        await asyncio.sleep(0.1)
+        return "hedge"
+
+    assert await policy.run(call) == "hedge"
+
+
+@pytest.mark.usefixtures("identity_environ")
+@pytest.mark.asyncio
+async def test_client_hedges_slow_embeddings(
+        stand_in_server: StandInServer) -> None:
+    slow_first(stand_in_server, 2)
+    policy = HedgingPolicy(delay=0.05, max_hedge_rate=1)
+    async with AsyncModelfarm(base_url=stand_in_server.url,
+                              hedging_policy=policy) as client:
+        start = time.perf_counter()
+        response = await client.embeddings.create(input=["a"], model=MODEL)
+        elapsed = time.perf_counter() - start
+
+    assert len(response.data) == 1
+    assert elapsed < 1
+    assert len(stand_in_server.requests) == 2
+    assert policy.stats.hedges_won == 1
+
+
+@pytest.mark.usefixtures("identity_environ")
+@pytest.mark.asyncio
+async def test_client_hedges_take_tokens_once(
+        stand_in_server: StandInServer) -> None:
+    slow_first(stand_in_server, 2)
+    policy = HedgingPolicy(delay=0.05, max_hedge_rate=1)
+    limiter = RateLimiter(tokens_per_minute=60, token_burst=10_000)
+    text = "word " * 2000
+    async with AsyncModelfarm(base_url=stand_in_server.url,
+                              hedging_policy=policy,
+                              rate_limiter=limiter) as client:
+        await client.embeddings.create(input=[text], model=MODEL)
+
+    # The cancelled request took no tokens: the bucket is only short of the
+    # 2000 tokens used, not of the 2500 estimated for the losing request.
+    assert limiter.estimate({"input": [text]}) == 2500
+    assert policy.stats.hedges_won == 1
+    assert 8000 <= limiter.available_tokens < 8010
+
+
+@pytest.mark.usefixtures("identity_environ")
+@pytest.mark.asyncio
+async def test_client_hedging_surfaces_errors(
+        stand_in_server: StandInServer) -> None:
+    policy = HedgingPolicy(delay=0.05, max_hedge_rate=1)
+    async with AsyncModelfarm(base_url=stand_in_server.url,
+                              hedging_policy=policy) as client:
+        with pytest.raises(BadRequestException):
+            await client.embeddings.create(input=["a"],
+                                           model=MODEL,
+                                           **{INVALID_PARAMETER: 1})
+
+    assert len(stand_in_server.requests) == 1
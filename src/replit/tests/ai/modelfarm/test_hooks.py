@@ -0,0 +1,132 @@
+from typing import Any, List, Tuple
+
+import pytest
+from replit.ai.modelfarm import AsyncModelfarm, Modelfarm
+from replit.ai.modelfarm.exceptions import BadRequestException
+from replit.ai.modelfarm.hooks import RequestEvent, RequestHooks
+from replit.ai.modelfarm.retry import RetryPolicy
+
+from .stand_in_server import Fault, StandInServer
+
+MESSAGES: List[Any] = [{"role": "user", "content": "Hi"}]
+
+
+def record(phases: Any = None) -> Tuple[RequestHooks, List[RequestEvent]]:
+    hooks = RequestHooks()
+    events: List[RequestEvent] = []
+    hooks.add(events.append, phases)
+    return hooks, events
+
+
+@pytest.mark.usefixtures("identity_environ")
+def test_json_request_phases(stand_in_server: StandInServer) -> None:
+    hooks, events = record()
+    with Modelfarm(base_url=stand_in_server.url, hooks=hooks) as client:
+        client.chat.completions.create(messages=MESSAGES, model="chat-bison")
+        first = [event.phase for event in events]
+        opened = [event for event in events if event.phase == "connected"]
+        events.clear()
+        client.chat.completions.create(messages=MESSAGES, model="chat-bison")
+
+    assert first == ["start", "auth", "connected", "first_byte", "complete"]
+    assert not opened[0].reused
+    connected = [event for event in events if event.phase == "connected"]
+    assert connected[0].reused
+    complete = events[-1]
+    assert complete.path == "/v1beta2/chat/completions"
+    assert complete.model == "chat-bison"
+    assert complete.attempt == 1
+    assert complete.request_bytes > 0
+    assert complete.response_bytes > 0
+    assert complete.parse_time > 0
+    assert complete.usage is not None and complete.usage.total_tokens > 0
+    assert complete.error is None
+    assert 0 < complete.time_to_first_byte <= complete.elapsed
+    assert [event.time for event in events] == sorted(event.time
+                                                      for event in events)
+
+
+@pytest.mark.usefixtures("identity_environ")
+def test_stream_phases(stand_in_server: StandInServer) -> None:
+    hooks, events = record()
+    with Modelfarm(base_url=stand_in_server.url, hooks=hooks) as client:
+        stream = client.chat.completions.create(messages=MESSAGES,
+                                                model="chat-bison",
+                                                stream=True,
+                                                max_tokens=3)
+        for i, _ in enumerate(stream, 1):
+            # Each chunk is reported before it is passed on.
+            assert events[-1].phase == "chunk"
+            assert events[-1].chunks == i
+
+    assert [event.phase for event in events] == [
+        "start", "auth", "connected", "first_byte", "first_token", "chunk",
+        "chunk", "chunk", "complete"
+    ]
+    complete = events[-1]
+    assert complete.chunks == 3
+    assert complete.response_bytes == stand_in_server.bytes_sent
+    assert (complete.time_to_first_byte <= complete.time_to_first_token <=
+            complete.elapsed)
+
+
+@pytest.mark.usefixtures("identity_environ")
+def test_retries_and_errors(stand_in_server: StandInServer) -> None:
+    hooks, events = record(["start", "complete"])
+    stand_in_server.faults.append(Fault(503))
+    with Modelfarm(base_url=stand_in_server.url,
+                   hooks=hooks,
+                   retry_policy=RetryPolicy(initial_backoff=0)) as client:
+        client.completions.create(prompt="1 + 1 = ", model="text-bison")
+        assert [(event.phase, event.attempt)
+                for event in events] == [("start", 1), ("start", 2),
+                                         ("complete", 2)]
+        events.clear()
+        stand_in_server.faults.append(Fault(400, body={"detail": "Bad"}))
+        with pytest.raises(BadRequestException):
+            client.completions.create(prompt="1 + 1 = ", model="text-bison")
+
+    assert isinstance(events[-1].error, BadRequestException)
+
+
+@pytest.mark.usefixtures("identity_environ")
+def test_no_trace_without_callbacks(stand_in_server: StandInServer) -> None:
+    hooks = RequestHooks()
+    events: List[RequestEvent] = []
+    with Modelfarm(base_url=stand_in_server.url, hooks=hooks) as client:
+        assert client._trace("/path", None) is None
+        hooks.add(events.append, ["complete"])
+        client.completions.create(prompt="1 + 1 = ", model="text-bison")
+        hooks.remove(events.append)
+        client.completions.create(prompt="1 + 1 = ", model="text-bison")
+
+    assert [event.phase for event in events] == ["complete"]
+    with pytest.raises(ValueError):
+        hooks.add(events.append, ["sent"])  # type: ignore[list-item]
+
+
+@pytest.mark.usefixtures("identity_environ")
+@pytest.mark.asyncio
+async def test_async_phases(stand_in_server: StandInServer) -> None:
+    hooks, events = record()
+    async with AsyncModelfarm(base_url=stand_in_server.url,
+                              hooks=hooks) as client:
+        await client.embeddings.create(input=["a", "b"],
+                                       model="textembedding-gecko")
+        phases = [event.phase for event in events]
+        events.clear()
+        stream = await client.completions.create(prompt="1 + 1 = ",
+                                                 model="text-bison",
+                                                 stream=True,
+                                                 max_tokens=2)
+        chunks = [chunk async for chunk in stream]
+
+    assert phases == ["start", "auth", "connected", "first_byte", "complete"]
+    assert len(chunks) == 2
+    assert [event.phase for event in events] == [
+        "start", "auth", "connected", "first_byte", "first_token", "chunk",
+        "chunk", "complete"
+    ]
+    assert events[2].reused
+    assert events[-1].time_to_first_token is not None
+    assert events[-1].parse_time > 0
@@ -0,0 +1,113 @@
+from pathlib import Path
+from typing import Optional
+
+import pytest
+from replit.ai.modelfarm import Modelfarm
+from replit.ai.modelfarm.index import EmbeddingIndex
+
+numpy = pytest.importorskip("numpy")
+
+MODEL = "textembedding-gecko"
+
+
+def clustered(rows: int, dimensions: int = 32, seed: int = 0):
+    rng = numpy.random.default_rng(seed)
+    centers = rng.normal(size=(20, dimensions))
+    return (centers[rng.integers(20, size=rows)] +
+            0.1 * rng.normal(size=(rows, dimensions))).astype(numpy.float32)
+
+
+def test_exact_search_matches_brute_force() -> None:
+    vectors = clustered(500)
+    index = EmbeddingIndex()
+    assert index.add(vectors[:200]) == range(0, 200)
+    assert index.add(vectors[200:]) == range(200, 500)
+
+    queries = clustered(7, seed=1)
+    scores, indices = index.search(queries, k=5)
+
+    normalized = vectors / numpy.linalg.norm(vectors, axis=1, keepdims=True)
+    expected = normalized @ (
+        queries / numpy.linalg.norm(queries, axis=1, keepdims=True)).T
+    for i in range(len(queries)):
+        assert list(indices[i]) == list(numpy.argsort(-expected[:, i])[:5])
+    assert numpy.all(numpy.diff(scores, axis=1) <= 0)
+    assert scores[0, 0] == pytest.approx(expected[indices[0, 0], 0], rel=1e-5)
+
+
+def test_dot_metric_and_padding() -> None:
+    index = EmbeddingIndex(metric="dot")
+    index.add([[1.0, 0.0], [2.0, 0.0], [0.0, 1.0]])
+    scores, indices = index.search([1.0, 0.0], k=5)
+
+    assert indices.tolist() == [[1, 0, 2, -1, -1]]
+    assert scores[0, :3].tolist() == [2.0, 1.0, 0.0]
+    assert numpy.isneginf(scores[0, 3:]).all()
+
+
+@pytest.mark.parametrize("dimensions", [None, 2])
+def test_empty_index(dimensions: Optional[int]) -> None:
+    scores, indices = EmbeddingIndex(dimensions=dimensions).search(
+        [[1.0, 0.0]], k=2)
+
+    assert indices.tolist() == [[-1, -1]]
+    assert numpy.isneginf(scores).all()
+
+
+def test_rejects_other_sizes() -> None:
+    index = EmbeddingIndex(dimensions=4)
+    with pytest.raises(ValueError):
+        index.add(numpy.zeros((2, 3)))
+    with pytest.raises(ValueError):
+        EmbeddingIndex(metric="l2")  # type: ignore[arg-type]
+
+
+def test_ivf_recall() -> None:
+    vectors = clustered(5000)
+    index = EmbeddingIndex()
+    index.add(vectors[:4000])
+    index.build_ivf(partitions=20)
+    index.add(vectors[4000:])
+
+    queries = clustered(50, seed=1)
+    _, exact = index.search(queries, k=10)
+    _, approximate = index.search(queries, k=10, nprobe=4)
+    recall = numpy.mean([
+        len(set(exact[i]) & set(approximate[i])) / 10
+        for i in range(len(queries))
+    ])
+    assert recall > 0.9
+    assert (approximate >= 0).all()
+
+
+def test_save_and_load(tmp_path: Path) -> None:
+    index = EmbeddingIndex(metric="dot")
+    index.add(clustered(300))
+    index.build_ivf(partitions=4)
+    index.save(str(tmp_path / "index"))
+
+    for mmap in (False, True):
+        loaded = EmbeddingIndex.load(str(tmp_path / "index"), mmap=mmap)
+        assert loaded.metric == "dot"
+        assert numpy.array_equal(loaded.vectors, index.vectors)
+        query = clustered(3, seed=2)
+        assert numpy.array_equal(
+            loaded.search(query, nprobe=2)[1],
+            index.search(query, nprobe=2)[1])
+        loaded.add(clustered(10, seed=3))
+        assert len(loaded) == 310
+
+
+@pytest.mark.usefixtures("identity_environ")
+def test_ingests_responses(stand_in_client: Modelfarm) -> None:
+    texts = ["alpha", "beta", "gamma"]
+    index = EmbeddingIndex()
+    index.add(stand_in_client.embeddings.create(input=texts, model=MODEL))
+    index.add(
+        stand_in_client.embeddings.create(input=texts,
+                                          model=MODEL,
+                                          output="numpy"))
+    query = stand_in_client.embeddings.create(input=["beta"], model=MODEL)
+
+    _, indices = index.search(query, k=2)
+    assert sorted(indices[0]) == [1, 4]
@@ -0,0 +1,146 @@
+import io
+from pathlib import Path
+
+import pytest
+from replit.ai.modelfarm.quantization import (
+    Float16Quantizer,
+    Int8Quantizer,
+    PCAQuantizer,
+    Quantizer,
+)
+from replit.ai.modelfarm.store import EmbeddingStore
+
+numpy = pytest.importorskip("numpy")
+
+
+def low_rank(rows: int, dimensions: int = 64, rank: int = 8, seed: int = 0):
+    rng = numpy.random.default_rng(seed)
+    basis = rng.normal(size=(rank, dimensions))
+    return (rng.normal(size=(rows, rank)) @ basis + 3).astype(numpy.float32)
+
+
+def reload(quantizer: Quantizer) -> Quantizer:
+    buffer = io.BytesIO()
+    numpy.savez(buffer, **quantizer.state())
+    buffer.seek(0)
+    with numpy.load(buffer) as state:
+        return Quantizer.from_state(state)
+
+
+@pytest.mark.parametrize("quantizer, size, tolerance", [
+    (Float16Quantizer(), 128, 1e-2),
+    (Int8Quantizer(), 68, 5e-2),
+])
+def test_scalar_quantizers(quantizer: Quantizer, size: int,
+                           tolerance: float) -> None:
+    vectors = low_rank(50)
+    codes = quantizer.encode(vectors)
+    assert codes.dtype == numpy.uint8
+    assert codes.shape == (50, size) == (50, quantizer.code_size(64))
+
+    decoded = quantizer.decode(codes)
+    error = numpy.abs(decoded - vectors).max() / numpy.abs(vectors).max()
+    assert error < tolerance
+
+    queries = low_rank(3, seed=1)
+    numpy.testing.assert_allclose(quantizer.dot(queries, codes),
+                                  queries @ decoded.T,
+                                  rtol=1e-4,
+                                  atol=1e-2)
+    numpy.testing.assert_allclose(quantizer.norms(codes),
+                                  numpy.linalg.norm(decoded, axis=1),
+                                  rtol=1e-5)
+    assert numpy.array_equal(reload(quantizer).decode(codes), decoded)
+
+
+def test_quantizer_is_abstract() -> None:
+    with pytest.raises(TypeError):
+        Quantizer()  # type: ignore[abstract]
+
+
+def test_int8_zero_vector() -> None:
+    codes = Int8Quantizer().encode(numpy.zeros((1, 4)))
+    assert Int8Quantizer().decode(codes).tolist() == [[0.0] * 4]
+
+
+def test_pca_recovers_low_rank_vectors() -> None:
+    vectors = low_rank(400)
+    quantizer = PCAQuantizer(8)
+    with pytest.raises(ValueError):
+        quantizer.encode(vectors)
+    quantizer.fit(vectors[:100])
+
+    assert quantizer.explained_variance == pytest.approx(1.0)
+    codes = quantizer.encode(vectors)
+    assert codes.shape == (400, 32)
+    decoded = quantizer.decode(codes)
+    numpy.testing.assert_allclose(decoded, vectors, atol=1e-2)
+
+    queries = low_rank(3, seed=1)
+    numpy.testing.assert_allclose(quantizer.dot(queries, codes),
+                                  queries @ decoded.T,
+                                  rtol=1e-3)
+    numpy.testing.assert_allclose(quantizer.norms(codes),
+                                  numpy.linalg.norm(decoded, axis=1),
+                                  rtol=1e-3)
+
+    with pytest.raises(ValueError):
+        PCAQuantizer(8).fit(vectors[:4])
+
+
+def test_pca_with_int8() -> None:
+    vectors = low_rank(200)
+    quantizer = PCAQuantizer(8, Int8Quantizer())
+    quantizer.fit(vectors)
+    codes = quantizer.encode(vectors)
+    assert codes.shape == (200, 12)
+
+    loaded = reload(quantizer)
+    assert isinstance(loaded, PCAQuantizer)
+    assert isinstance(loaded.quantizer, Int8Quantizer)
+    assert numpy.array_equal(loaded.decode(codes), quantizer.decode(codes))
+    numpy.testing.assert_allclose(loaded.decode(codes), vectors, atol=0.1)
+
+
+def test_store_searches_codes(tmp_path: Path) -> None:
+    vectors = low_rank(500, seed=2)
+    store = EmbeddingStore(str(tmp_path), quantizer=Int8Quantizer())
+    store.add([str(i) for i in range(500)], vectors)
+    assert store.vectors.shape == (500, 68)
+    assert (tmp_path / "vectors-0.bin").stat().st_size == 500 * 68
+
+    queries = vectors[:20]
+    _, ids = store.search(queries, k=1)
+    assert ids == [[str(i)] for i in range(20)]
+
+    store.delete(["0"])
+    store.compact()
+    reopened = EmbeddingStore(str(tmp_path))
+    assert isinstance(reopened.quantizer, Int8Quantizer)
+    numpy.testing.assert_allclose(reopened.get(["1"]),
+                                  vectors[1:2],
+                                  rtol=0.05,
+                                  atol=0.05)
+    assert reopened.search(queries[1:2], k=1)[1] == [["1"]]
+
+
+def test_store_fits_pca_to_first_embeddings(tmp_path: Path) -> None:
+    vectors = low_rank(300, seed=3)
+    store = EmbeddingStore(str(tmp_path), quantizer=PCAQuantizer(8))
+    store.add([str(i) for i in range(100)], vectors[:100])
+    store.add([str(i) for i in range(100, 300)], vectors[100:])
+
+    reopened = EmbeddingStore(str(tmp_path))
+    assert isinstance(reopened.quantizer, PCAQuantizer)
+    assert reopened.vectors.shape == (300, 32)
+    numpy.testing.assert_allclose(reopened.get(["250"]),
+                                  vectors[250:251],
+                                  atol=1e-2)
+    _, ids = reopened.search(vectors[250], k=3)
+    assert ids[0][0] == "250"
+    scores, ids = reopened.search(vectors[250], k=3, metric="dot")
+    expected = vectors @ vectors[250]
+    assert ids[0] == [str(i) for i in numpy.argsort(-expected)[:3]]
+    numpy.testing.assert_allclose(scores[0],
+                                  numpy.sort(expected)[::-1][:3],
+                                  rtol=1e-3)
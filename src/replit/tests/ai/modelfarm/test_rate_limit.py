@@ -0,0 +1,181 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+import pytest
+from replit.ai.modelfarm import AsyncModelfarm, Modelfarm
+from replit.ai.modelfarm.rate_limit import RateLimiter, TokenBucket
+from replit.ai.modelfarm.retry import RetryPolicy
+
+from .stand_in_server import Fault, StandInServer
+
+MESSAGES = [{"role": "user", "content": "x" * 40}]
+
+
+def test_estimate() -> None:
+    limiter = RateLimiter(tokens_per_minute=1000)
+    assert limiter.estimate({"messages": MESSAGES, "max_tokens": 100}) == 111
+    assert limiter.estimate({"prompt": ["abcd", "abcd"]}) == 2 + 1024
+    assert limiter.estimate({"input": ["abcdefgh"] * 3}) == 6
+    assert RateLimiter().estimate({"prompt": "abcd"}) == 0
+
+
+@pytest.mark.parametrize("kwargs", [
+    {
+        "requests_per_second": 0
+    },
+    {
+        "tokens_per_minute": -60
+    },
+    {
+        "requests_per_second": 1,
+        "request_burst": 0
+    },
+    {
+        "tokens_per_minute": 60,
+        "token_burst": -1
+    },
+])
+def test_rates_must_be_positive(kwargs: Dict[str, float]) -> None:
+    with pytest.raises(ValueError):
+        RateLimiter(**kwargs)
+
+
+def test_token_bucket_rate_must_be_positive() -> None:
+    with pytest.raises(ValueError):
+        TokenBucket(0, 10)
+    with pytest.raises(ValueError):
+        TokenBucket(1, 0)
+
+
+def test_request_rate() -> None:
+    limiter = RateLimiter(requests_per_second=50, request_burst=1)
+    start = time.monotonic()
+    for _ in range(6):
+        limiter.acquire()
+    assert time.monotonic() - start >= 0.09
+
+
+def test_token_rate() -> None:
+    limiter = RateLimiter(tokens_per_minute=600, token_burst=10)
+    start = time.monotonic()
+    limiter.acquire(10)
+    assert time.monotonic() - start < 0.05
+    limiter.acquire(2)
+    assert time.monotonic() - start >= 0.18
+
+
+def test_request_larger_than_burst_waits_for_a_full_bucket() -> None:
+    limiter = RateLimiter(tokens_per_minute=600, token_burst=10)
+    start = time.monotonic()
+    limiter.acquire(1000)
+    assert time.monotonic() - start < 0.05
+    assert limiter.available_tokens < -980
+
+
+def test_reconcile_returns_unused_tokens() -> None:
+    limiter = RateLimiter(tokens_per_minute=60, token_burst=100)
+    limiter.acquire(100)
+    limiter.reconcile(100, {"total_tokens": 40})
+    assert 60 <= limiter.available_tokens < 61
+
+    limiter.reconcile(0, {"prompt_tokens": 10, "completion_tokens": 20})
+    assert 30 <= limiter.available_tokens < 31
+
+    limiter.reconcile(100, None)
+    assert limiter.available_tokens < 31
+
+
+def test_thread_safety() -> None:
+    limiter = RateLimiter(requests_per_second=400, request_burst=1)
+    start = time.monotonic()
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda _: limiter.acquire(), range(80)))
+    assert time.monotonic() - start >= 79 / 400
+    assert limiter.available_requests < 1
+
+
+@pytest.mark.asyncio
+async def test_acquire_async_does_not_block_the_loop() -> None:
+    limiter = RateLimiter(requests_per_second=10, request_burst=1)
+    ticks = 0
+
+    async def tick() -> None:
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    ticker = asyncio.ensure_future(tick())
+    await limiter.acquire_async()
+    await limiter.acquire_async()
+    ticker.cancel()
+    assert ticks >= 5
+
+
+@pytest.mark.usefixtures("identity_environ")
+def test_client_reconciles_usage(stand_in_server: StandInServer) -> None:
+    limiter = RateLimiter(tokens_per_minute=6, token_burst=1000)
+    with Modelfarm(base_url=stand_in_server.url,
+                   rate_limiter=limiter) as client:
+        client.chat.completions.create(messages=MESSAGES,
+                                       model="chat-bison",
+                                       max_tokens=50)
+
+    # The stand-in reports one prompt token per message.
+    assert 1000 - 51 <= limiter.available_tokens < 1000 - 50
+
+
+@pytest.mark.usefixtures("identity_environ")
+def test_client_reconciles_stream_usage_once(
+        stand_in_server: StandInServer) -> None:
+    limiter = RateLimiter(tokens_per_minute=6, token_burst=1000)
+    stand_in_server.faults.append(Fault(503))
+    with Modelfarm(base_url=stand_in_server.url,
+                   rate_limiter=limiter,
+                   retry_policy=RetryPolicy(initial_backoff=0)) as client:
+        list(
+            client.chat.completions.create(messages=MESSAGES,
+                                           model="chat-bison",
+                                           stream=True,
+                                           max_tokens=50))
+
+    # The retry took no tokens, and the usage of the final chunk replaced
+    # the estimate.
+    assert len(stand_in_server.requests) == 2
+    assert 1000 - 51 <= limiter.available_tokens < 1000 - 50
+
+
+@pytest.mark.usefixtures("identity_environ")
+@pytest.mark.asyncio
+async def test_async_client_reconciles_stream_usage(
+        stand_in_server: StandInServer) -> None:
+    limiter = RateLimiter(tokens_per_minute=6, token_burst=1000)
+    async with AsyncModelfarm(base_url=stand_in_server.url,
+                              rate_limiter=limiter) as client:
+        stream = await client.chat.completions.create(messages=MESSAGES,
+                                                      model="chat-bison",
+                                                      stream=True,
+                                                      max_tokens=50)
+        async for _ in stream:
+            pass
+
+    assert 1000 - 51 <= limiter.available_tokens < 1000 - 50
+
+
+@pytest.mark.usefixtures("identity_environ")
+@pytest.mark.asyncio
+async def test_async_client_request_rate(
+        stand_in_server: StandInServer) -> None:
+    limiter = RateLimiter(requests_per_second=50, request_burst=1)
+    async with AsyncModelfarm(base_url=stand_in_server.url,
+                              rate_limiter=limiter) as client:
+        start = time.monotonic()
+        await asyncio.gather(*(
+            client.embeddings.create(input=["a"], model="textembedding-gecko")
+            for _ in range(6)))
+        elapsed = time.monotonic() - start
+
+    assert elapsed >= 0.09
+    assert len(stand_in_server.requests) == 6
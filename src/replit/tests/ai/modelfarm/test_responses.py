@@ -0,0 +1,81 @@
+from unittest.mock import patch
+
+import pytest
+from replit.ai.modelfarm import AsyncModelfarm, Modelfarm
+from replit.ai.modelfarm.exceptions import (
+    BadRequestException,
+    InvalidResponseException,
+)
+
+from .stand_in_server import INVALID_PARAMETER, Fault, StandInServer
+
+MODEL = "textembedding-gecko"
+INVALID_KWARGS = {INVALID_PARAMETER: 0.5}
+
+
+def test_success_is_decoded_once(stand_in_client: Modelfarm) -> None:
+    with patch.object(stand_in_client,
+                      "_decode_response",
+                      wraps=stand_in_client._decode_response) as decode:
+        response = stand_in_client.embeddings.create(input=["a", "b"],
+                                                     model=MODEL)
+
+    assert [embedding.index for embedding in response.data] == [0, 1]
+    assert decode.call_count == 1
+
+
+def test_bad_request(stand_in_client: Modelfarm) -> None:
+    with pytest.raises(BadRequestException, match=INVALID_PARAMETER):
+        stand_in_client.completions.create(prompt="1 + 1 = ",
+                                           model="text-bison",
+                                           **INVALID_KWARGS)
+
+
+def test_error_detail(stand_in_server: StandInServer,
+                      stand_in_client: Modelfarm) -> None:
+    stand_in_server.faults.append(Fault(503, {"detail": "Overloaded"}))
+    with pytest.raises(InvalidResponseException, match="Overloaded"):
+        stand_in_client.embeddings.create(input=["a"], model=MODEL)
+
+
+def test_invalid_json(stand_in_server: StandInServer,
+                      stand_in_client: Modelfarm) -> None:
+    stand_in_server.faults.append(Fault(200, b"<html>Gateway</html>"))
+    with pytest.raises(InvalidResponseException, match="Gateway"):
+        stand_in_client.embeddings.create(input=["a"], model=MODEL)
+
+
+@pytest.mark.asyncio
+async def test_async_success_is_decoded_once(
+        stand_in_async_client: AsyncModelfarm) -> None:
+    with patch.object(stand_in_async_client,
+                      "_decode_response",
+                      wraps=stand_in_async_client._decode_response) as decode:
+        response = await stand_in_async_client.embeddings.create(
+            input=["a", "b"], model=MODEL)
+
+    assert [embedding.index for embedding in response.data] == [0, 1]
+    assert decode.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_async_bad_request(
+        stand_in_async_client: AsyncModelfarm) -> None:
+    with pytest.raises(BadRequestException, match=INVALID_PARAMETER):
+        await stand_in_async_client.chat.completions.create(messages=[{
+            "role":
+            "user",
+            "content":
+            "Hi"
+        }],
+                                                            model="chat-bison",
+                                                            **INVALID_KWARGS)
+
+
+@pytest.mark.asyncio
+async def test_async_invalid_json(
+        stand_in_server: StandInServer,
+        stand_in_async_client: AsyncModelfarm) -> None:
+    stand_in_server.faults.append(Fault(502, b"<html>Gateway</html>"))
+    with pytest.raises(InvalidResponseException, match="Gateway"):
+        await stand_in_async_client.embeddings.create(input=["a"], model=MODEL)
@@ -0,0 +1,253 @@
+import time
+from email.utils import formatdate
+from typing import AsyncIterator, Iterator, List
+
+import pytest
+import pytest_asyncio
+import requests
+from aiohttp import ClientPayloadError
+from replit.ai.modelfarm import AsyncModelfarm, Modelfarm
+from replit.ai.modelfarm.exceptions import (
+    BadRequestException,
+    InvalidResponseException,
+)
+from replit.ai.modelfarm.retry import (
+    RetryBudget,
+    RetryPolicy,
+    RetryState,
+    parse_retry_after,
+)
+
+from .stand_in_server import (
+    INVALID_PARAMETER,
+    Fault,
+    StandInServer,
+    patched_identity_environ,
+)
+
+MODEL = "chat-bison"
+MESSAGES = [{"role": "user", "content": "Hi"}]
+
+FAST_POLICY = RetryPolicy(initial_backoff=0.001, budget=None)
+
+
+@pytest.fixture
+def retrying_client(stand_in_server: StandInServer) -> Iterator[Modelfarm]:
+    with patched_identity_environ(), Modelfarm(
+            base_url=stand_in_server.url, retry_policy=FAST_POLICY) as client:
+        yield client
+
+
+@pytest_asyncio.fixture
+async def retrying_async_client(
+        stand_in_server: StandInServer) -> AsyncIterator[AsyncModelfarm]:
+    with patched_identity_environ():
+        async with AsyncModelfarm(base_url=stand_in_server.url,
+                                  retry_policy=FAST_POLICY) as client:
+            yield client
+
+
+def chat(client: Modelfarm, **kwargs) -> str:
+    response = client.chat.completions.create(messages=MESSAGES,
+                                              model=MODEL,
+                                              max_tokens=3,
+                                              **kwargs)
+    return response.choices[0].message.content
+
+
+def chat_stream(client: Modelfarm) -> List[str]:
+    return [
+        chunk.choices[0].delta.content
+        for chunk in client.chat.completions.create(
+            messages=MESSAGES, model=MODEL, stream=True, max_tokens=3)
+    ]
+
+
+def test_backoff_grows_exponentially_up_to_the_cap() -> None:
+    policy = RetryPolicy(initial_backoff=1, max_backoff=5, jitter=0)
+    assert [policy.backoff(attempt) for attempt in range(1, 6)] == [
+        1,
+        2,
+        4,
+        5,
+        5,
+    ]
+
+
+def test_backoff_jitter() -> None:
+    policy = RetryPolicy(initial_backoff=1, jitter=0.5)
+    delays = [policy.backoff(2) for _ in range(100)]
+    assert all(1 <= delay <= 2 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_parse_retry_after() -> None:
+    assert parse_retry_after("3") == 3
+    assert parse_retry_after("-3") == 0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after("nan") is None
+    assert 50 < parse_retry_after(formatdate(time.time() + 60,
+                                             usegmt=True)) <= 60
+
+
+def test_retry_state_stops_after_max_attempts() -> None:
+    retry = RetryState(RetryPolicy(max_attempts=3, budget=None))
+    assert retry.delay_for(503) is not None
+    assert retry.delay_for(503) is not None
+    assert retry.delay_for(503) is None
+
+
+def test_retry_state_only_retries_transient_statuses() -> None:
+    retry = RetryState(RetryPolicy(budget=None))
+    assert retry.delay_for(200) is None
+    assert retry.delay_for(400) is None
+    assert retry.delay_for(429) is not None
+    assert RetryState(None).delay_for(503) is None
+
+
+def test_retry_after_replaces_backoff() -> None:
+    policy = RetryPolicy(initial_backoff=10, max_retry_after=5, budget=None)
+    assert RetryState(policy).delay_for(429, "2") == 2
+    assert RetryState(policy).delay_for(429, "30") is None
+
+
+def test_budget_stops_retries_during_an_outage() -> None:
+    budget = RetryBudget(max_tokens=10, token_ratio=1)
+    retry = RetryState(RetryPolicy(max_attempts=100, budget=budget))
+    retries = 0
+    while retry.delay_for(503) is not None:
+        retries += 1
+    assert retries == 4
+
+    for _ in range(2):
+        RetryState(retry.policy).delay_for(200)
+    assert RetryState(retry.policy).delay_for(503) is not None
+
+
+def test_retries_transient_status(stand_in_server: StandInServer,
+                                  retrying_client: Modelfarm) -> None:
+    stand_in_server.faults.extend([Fault(503), Fault(429)])
+    assert chat(retrying_client) == "word0 word1 word2 "
+    assert len(stand_in_server.requests) == 3
+
+
+def test_surfaces_error_when_attempts_run_out(
+        stand_in_server: StandInServer, retrying_client: Modelfarm) -> None:
+    stand_in_server.faults.extend([Fault(503)] * 3)
+    with pytest.raises(InvalidResponseException, match="Injected fault"):
+        chat(retrying_client)
+    assert len(stand_in_server.requests) == 3
+
+
+def test_does_not_retry_bad_request(stand_in_server: StandInServer,
+                                    retrying_client: Modelfarm) -> None:
+    with pytest.raises(BadRequestException):
+        chat(retrying_client, **{INVALID_PARAMETER: 1})
+    assert len(stand_in_server.requests) == 1
+
+
+def test_does_not_retry_without_policy(stand_in_server: StandInServer,
+                                       stand_in_client: Modelfarm) -> None:
+    stand_in_server.faults.append(Fault(503))
+    with pytest.raises(InvalidResponseException):
+        chat(stand_in_client)
+    assert len(stand_in_server.requests) == 1
+
+
+def test_honors_retry_after(stand_in_server: StandInServer) -> None:
+    stand_in_server.faults.append(Fault(429, headers={"Retry-After": "3600"}))
+    policy = RetryPolicy(initial_backoff=0.001, budget=None)
+    with patched_identity_environ(), Modelfarm(
+            base_url=stand_in_server.url,
+            retry_policy=policy) as client, pytest.raises(
+                InvalidResponseException):
+        chat(client)
+    assert len(stand_in_server.requests) == 1
+
+
+def test_retries_connection_reset(stand_in_server: StandInServer,
+                                  retrying_client: Modelfarm) -> None:
+    stand_in_server.faults.append(Fault(reset_after=0))
+    assert chat(retrying_client) == "word0 word1 word2 "
+    assert len(stand_in_server.requests) == 2
+
+
+def test_connection_reset_without_policy(stand_in_server: StandInServer,
+                                         stand_in_client: Modelfarm) -> None:
+    stand_in_server.faults.append(Fault(reset_after=0))
+    with pytest.raises(requests.ConnectionError):
+        chat(stand_in_client)
+
+
+def test_retries_stream_before_first_chunk(stand_in_server: StandInServer,
+                                           retrying_client: Modelfarm) -> None:
+    stand_in_server.faults.extend([Fault(503), Fault(reset_after=0)])
+    assert chat_stream(retrying_client) == ["word0 ", "word1 ", "word2 "]
+    assert len(stand_in_server.requests) == 3
+
+
+def test_does_not_retry_stream_after_first_chunk(
+        stand_in_server: StandInServer, retrying_client: Modelfarm) -> None:
+    stand_in_server.faults.append(Fault(reset_after=2))
+    chunks = []
+    with pytest.raises(requests.RequestException):
+        for chunk in retrying_client.chat.completions.create(messages=MESSAGES,
+                                                             model=MODEL,
+                                                             stream=True,
+                                                             max_tokens=3):
+            chunks.append(chunk)
+    assert len(chunks) == 2
+    assert len(stand_in_server.requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_async_retries_transient_status(
+        stand_in_server: StandInServer,
+        retrying_async_client: AsyncModelfarm) -> None:
+    stand_in_server.faults.extend([Fault(502), Fault(reset_after=0)])
+    response = await retrying_async_client.embeddings.create(
+        input=["a"], model="textembedding-gecko")
+    assert len(response.data) == 1
+    assert len(stand_in_server.requests) == 3
+
+
+@pytest.mark.asyncio
+async def test_async_surfaces_error_when_attempts_run_out(
+        stand_in_server: StandInServer,
+        retrying_async_client: AsyncModelfarm) -> None:
+    stand_in_server.faults.extend([Fault(503)] * 3)
+    with pytest.raises(InvalidResponseException):
+        await retrying_async_client.embeddings.create(
+            input=["a"], model="textembedding-gecko")
+    assert len(stand_in_server.requests) == 3
+
+
+@pytest.mark.asyncio
+async def test_async_retries_stream_before_first_chunk(
+        stand_in_server: StandInServer,
+        retrying_async_client: AsyncModelfarm) -> None:
+    stand_in_server.faults.extend([Fault(503), Fault(reset_after=0)])
+    stream = await retrying_async_client.completions.create(prompt="1 + 1 = ",
+                                                            model="text-bison",
+                                                            stream=True,
+                                                            max_tokens=3)
+    assert [chunk.choices[0].text
+            async for chunk in stream] == ["word0 ", "word1 ", "word2 "]
+    assert len(stand_in_server.requests) == 3
+
+
+@pytest.mark.asyncio
+async def test_async_does_not_retry_stream_after_first_chunk(
+        stand_in_server: StandInServer,
+        retrying_async_client: AsyncModelfarm) -> None:
+    stand_in_server.faults.append(Fault(reset_after=2))
+    stream = await retrying_async_client.completions.create(prompt="1 + 1 = ",
+                                                            model="text-bison",
+                                                            stream=True,
+                                                            max_tokens=3)
+    chunks = []
+    with pytest.raises(ClientPayloadError):
+        async for chunk in stream:
+            chunks.append(chunk)
+    assert len(chunks) == 2
+    assert len(stand_in_server.requests) == 1
@@ -0,0 +1,163 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from replit.ai.modelfarm import AsyncModelfarm, Modelfarm
+from replit.ai.modelfarm.exceptions import InvalidResponseException
+from replit.ai.modelfarm.singleflight import SingleFlight
+
+from .stand_in_server import Fault, StandInServer
+
+MESSAGES = [{"role": "user", "content": "Hi"}]
+
+
+def test_coalesces() -> None:
+    flight = SingleFlight()
+    assert flight.coalesces({"input": ["a"]})
+    assert flight.coalesces({"messages": MESSAGES, "temperature": 0})
+    assert not flight.coalesces({"messages": MESSAGES, "temperature": 0.2})
+    assert not flight.coalesces({"prompt": "a", "stream": True})
+    assert SingleFlight(deterministic_only=False).coalesces({
+        "messages": MESSAGES,
+        "temperature": 0.2
+    })
+
+
+def test_do_shares_the_result() -> None:
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = 0
+
+    def fn() -> object:
+        nonlocal calls
+        calls += 1
+        started.set()
+        release.wait()
+        return object()
+
+    with ThreadPoolExecutor(4) as pool:
+        leader = pool.submit(flight.do, "k", fn)
+        started.wait()
+        followers = [pool.submit(flight.do, "k", fn) for _ in range(3)]
+        while flight.stats.coalesced < 3:
+            time.sleep(0.001)
+        release.set()
+        results = [leader.result()] + [f.result() for f in followers]
+
+    assert calls == 1
+    assert all(r is results[0] for r in results)
+    assert flight.stats.calls == 4
+    assert flight.stats.upstream_calls == 1
+
+    flight.do("k", lambda: None)
+    assert flight.stats.upstream_calls == 2
+
+
+def test_do_shares_the_error() -> None:
+    flight = SingleFlight()
+
+    def fail() -> None:
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        flight.do("k", fail)
+    assert not flight._calls
+
+
+@pytest.mark.asyncio
+async def test_do_async_survives_a_cancelled_caller() -> None:
+    flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def fn() -> str:
+        await release.wait()
+        return "done"
+
+    first = asyncio.ensure_future(flight.do_async("k", fn))
+    second = asyncio.ensure_future(flight.do_async("k", fn))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await second == "done"
+    assert first.cancelled()
+
+
+@pytest.mark.asyncio
+async def test_do_async_cancels_when_every_caller_is_cancelled() -> None:
+    flight = SingleFlight()
+    cancelled = asyncio.Event()
+
+    async def fn() -> None:
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    caller = asyncio.ensure_future(flight.do_async("k", fn))
+    await asyncio.sleep(0)
+    caller.cancel()
+    await asyncio.wait_for(cancelled.wait(), 1)
+    assert not flight._async_calls
+
+
+@pytest.mark.usefixtures("identity_environ")
+def test_client_coalesces_identical_requests(
+        stand_in_server: StandInServer) -> None:
+    stand_in_server.latency = lambda: 0.2
+    flight = SingleFlight()
+    with Modelfarm(
+            base_url=stand_in_server.url,
+            single_flight=flight) as client, ThreadPoolExecutor(5) as pool:
+        futures = [
+            pool.submit(client.embeddings.create,
+                        input=["same"],
+                        model="textembedding-gecko") for _ in range(5)
+        ]
+        results = [f.result() for f in futures]
+
+    assert len(stand_in_server.requests) == 1
+    assert all(r == results[0] for r in results)
+    assert flight.stats.coalesced == 4
+
+
+@pytest.mark.usefixtures("identity_environ")
+@pytest.mark.asyncio
+async def test_async_client_coalesces_identical_requests(
+        stand_in_server: StandInServer) -> None:
+    stand_in_server.latency = lambda: 0.05
+    flight = SingleFlight()
+    async with AsyncModelfarm(base_url=stand_in_server.url,
+                              single_flight=flight) as client:
+        results = await asyncio.gather(
+            *(client.chat.completions.create(messages=MESSAGES,
+                                             model="chat-bison",
+                                             temperature=0) for _ in range(5)),
+            *(client.chat.completions.create(messages=MESSAGES,
+                                             model="chat-bison")
+              for _ in range(2)))
+
+    assert len(stand_in_server.requests) == 3
+    assert all(r == results[0] for r in results[:5])
+    assert flight.stats.upstream_calls == 1
+    assert flight.stats.coalesced == 4
+
+
+@pytest.mark.usefixtures("identity_environ")
+@pytest.mark.asyncio
+async def test_async_client_shares_errors(
+        stand_in_server: StandInServer) -> None:
+    stand_in_server.faults.append(Fault(500, delay=0.05))
+    async with AsyncModelfarm(base_url=stand_in_server.url,
+                              single_flight=SingleFlight()) as client:
+        results = await asyncio.gather(*(client.embeddings.create(
+            input=["same"], model="textembedding-gecko") for _ in range(3)),
+                                       return_exceptions=True)
+
+    assert len(stand_in_server.requests) == 1
+    assert all(isinstance(r, InvalidResponseException) for r in results)
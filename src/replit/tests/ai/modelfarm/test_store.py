@@ -0,0 +1,143 @@
+import multiprocessing
+import os
+from pathlib import Path
+
+import pytest
+from replit.ai.modelfarm import Modelfarm
+from replit.ai.modelfarm.store import EmbeddingStore
+
+numpy = pytest.importorskip("numpy")
+
+MODEL = "textembedding-gecko"
+
+
+def _append(directory: str, start: int) -> None:
+    store = EmbeddingStore(directory)
+    for i in range(start, start + 50, 10):
+        store.add([f"doc {j}" for j in range(i, i + 10)],
+                  [[float(j)] * 4 for j in range(i, i + 10)])
+
+
+def test_add_get_and_reopen(tmp_path: Path) -> None:
+    store = EmbeddingStore(str(tmp_path))
+    store.add(["a", "b"], [[1.0, 0.0], [0.0, 1.0]])
+    store.add(["c"], [3.0, 3.0])
+
+    assert len(store) == 3
+    assert store.get(["c", "a"]).tolist() == [[3.0, 3.0], [1.0, 0.0]]
+    assert isinstance(store.vectors, numpy.memmap)
+
+    reopened = EmbeddingStore(str(tmp_path))
+    assert list(reopened) == ["a", "b", "c"]
+    assert reopened.dimensions == 2
+    assert reopened.get(["b"]).tolist() == [[0.0, 1.0]]
+    with pytest.raises(ValueError):
+        reopened.add(["d"], [[1.0, 2.0, 3.0]])
+    with pytest.raises(ValueError):
+        reopened.add(["d", "e"], [[1.0, 2.0]])
+
+
+def test_replace_delete_and_compact(tmp_path: Path) -> None:
+    store = EmbeddingStore(str(tmp_path))
+    store.add(["a", "b", "c"], [[1.0], [2.0], [3.0]])
+    store.add(["b"], [[20.0]])
+    store.delete(["a", "missing"])
+    reader = EmbeddingStore(str(tmp_path))
+    old = reader.vectors
+
+    assert sorted(store) == ["b", "c"]
+    assert len(store.vectors) == 4
+    store.compact()
+
+    assert store.vectors.tolist() == [[3.0], [20.0]]
+    assert store.get(["b", "c"]).tolist() == [[20.0], [3.0]]
+    assert sorted(os.listdir(tmp_path)) == [
+        "log-1.jsonl", "store.json", "store.lock", "vectors-1.f32"
+    ]
+    # Readers keep their mapping of the previous generation until refreshed.
+    assert old.tolist() == [[1.0], [2.0], [3.0], [20.0]]
+    reader.refresh()
+    assert reader.generation == 1
+    assert reader.get(["b"]).tolist() == [[20.0]]
+
+
+def test_torn_appends_are_ignored(tmp_path: Path) -> None:
+    store = EmbeddingStore(str(tmp_path))
+    store.add(["a", "b"], [[1.0, 1.0], [2.0, 2.0]])
+    # A crash after writing the rows, or part of a log entry.
+    with open(tmp_path / "vectors-0.f32", "ab") as f:
+        f.write(numpy.ones(3, dtype="<f4").tobytes())
+    with open(tmp_path / "log-0.jsonl", "ab") as f:
+        f.write(b'["c",')
+
+    reopened = EmbeddingStore(str(tmp_path))
+    assert list(reopened) == ["a", "b"]
+    reopened.add(["c"], [[3.0, 3.0]])
+
+    again = EmbeddingStore(str(tmp_path))
+    assert again.vectors.tolist() == [[1.0, 1.0], [2.0, 2.0], [3.0, 3.0]]
+    assert again.get(["c"]).tolist() == [[3.0, 3.0]]
+    assert os.path.getsize(tmp_path / "vectors-0.f32") == 3 * 2 * 4
+
+
+def test_processes_append_and_share(tmp_path: Path) -> None:
+    directory = str(tmp_path)
+    reader = EmbeddingStore(directory, dimensions=4)
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=_append, args=(directory, start))
+        for start in (0, 50, 100)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(30)
+        assert process.exitcode == 0
+
+    reader.refresh()
+    assert len(reader) == 150
+    assert reader.get(["doc 42", "doc 149"]).tolist() == [[42.0] * 4,
+                                                          [149.0] * 4]
+
+
+def test_search_matches_brute_force(tmp_path: Path,
+                                    monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr("replit.ai.modelfarm.store._ROWS_PER_BLOCK", 64)
+    rng = numpy.random.default_rng(0)
+    vectors = rng.normal(size=(300, 16)).astype(numpy.float32)
+    store = EmbeddingStore(str(tmp_path))
+    store.add([str(i) for i in range(300)], vectors)
+    store.delete([str(i) for i in range(0, 300, 2)])
+
+    queries = rng.normal(size=(5, 16)).astype(numpy.float32)
+    for metric in ("cosine", "dot"):
+        scores, ids = store.search(queries, k=5, metric=metric)
+        matrix = vectors[1::2]
+        if metric == "cosine":
+            matrix = matrix / numpy.linalg.norm(matrix, axis=1, keepdims=True)
+            queries = queries / numpy.linalg.norm(
+                queries, axis=1, keepdims=True)
+        expected = queries @ matrix.T
+        for i in range(len(queries)):
+            order = numpy.argsort(-expected[i])[:5]
+            assert ids[i] == [str(2 * j + 1) for j in order]
+            assert scores[i].tolist() == pytest.approx(
+                expected[i, order].tolist(), rel=1e-4)
+
+    scores, ids = EmbeddingStore(str(tmp_path / "small")).search(queries)
+    assert ids == [[]] * 5
+    assert numpy.isneginf(scores).all()
+
+
+@pytest.mark.usefixtures("identity_environ")
+def test_stores_responses(tmp_path: Path, stand_in_client: Modelfarm) -> None:
+    texts = ["alpha", "beta", "gamma"]
+    store = EmbeddingStore(str(tmp_path))
+    store.add(texts, stand_in_client.embeddings.create(input=texts,
+                                                       model=MODEL))
+    query = stand_in_client.embeddings.create(input=["beta"],
+                                              model=MODEL,
+                                              output="numpy")
+
+    _, ids = store.search(query, k=1)
+    assert ids == [["beta"]]
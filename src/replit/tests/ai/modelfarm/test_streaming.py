@@ -0,0 +1,128 @@
+import json
+
+import pytest
+from replit.ai.modelfarm import AsyncModelfarm, Modelfarm
+from replit.ai.modelfarm.exceptions import InvalidResponseException
+from replit.ai.modelfarm.streaming import JSONStreamFramer
+
+from .stand_in_server import StandInServer
+
+OBJECTS = [
+    {
+        "text": "plain"
+    },
+    {
+        "text": "café \U0001f642 日本"
+    },
+    {
+        "text": "braces } { ] [ and \"quotes\" and \\\\ backslashes \\\""
+    },
+    {
+        "nested": [{
+            "a": [1, 2, {
+                "b": None
+            }]
+        }, []]
+    },
+    [1, "two", {
+        "three": 3
+    }],
+]
+
+STREAM = b"\n".join(
+    json.dumps(obj, ensure_ascii=False).encode("utf-8") for obj in OBJECTS)
+
+
+def feed_all(chunks) -> list:
+    framer = JSONStreamFramer()
+    results = [obj for chunk in chunks for obj in framer.feed(chunk)]
+    framer.close()
+    return results
+
+
+def test_framer_whole_stream() -> None:
+    assert feed_all([STREAM]) == OBJECTS
+
+
+@pytest.mark.parametrize("split", range(1, len(STREAM)))
+def test_framer_split_anywhere(split: int) -> None:
+    assert feed_all([STREAM[:split], STREAM[split:]]) == OBJECTS
+
+
+def test_framer_one_byte_at_a_time() -> None:
+    chunks = [STREAM[i:i + 1] for i in range(len(STREAM))]
+    assert feed_all(chunks) == OBJECTS
+
+
+def test_framer_large_frames() -> None:
+    objects = [{"text": "x" * 10000 + "}]\\\"" * 100}] * 3
+    stream = b"".join(json.dumps(obj).encode("utf-8") for obj in objects)
+    chunks = [stream[i:i + 128] for i in range(0, len(stream), 128)]
+    assert feed_all(chunks) == objects
+
+
+@pytest.mark.parametrize("split", range(1, len(STREAM)))
+def test_framer_custom_loads(split: int) -> None:
+    framer = JSONStreamFramer(loads=json.loads)
+    results = framer.feed(STREAM[:split]) + framer.feed(STREAM[split:])
+    framer.close()
+    assert results == OBJECTS
+
+
+def test_framer_yields_objects_as_soon_as_they_close() -> None:
+    framer = JSONStreamFramer()
+    assert framer.feed(b'{"a": 1}{"b"') == [{"a": 1}]
+    assert framer.feed(b': 2}') == [{"b": 2}]
+    assert framer.feed(b'  ') == []
+
+
+def test_framer_rejects_garbage_between_objects() -> None:
+    framer = JSONStreamFramer()
+    with pytest.raises(InvalidResponseException):
+        framer.feed(b'{"a": 1} data: {"b": 2}')
+
+
+@pytest.mark.parametrize("loads", [None, json.loads])
+def test_framer_rejects_truncated_stream(loads) -> None:
+    framer = JSONStreamFramer(loads=loads)
+    framer.feed(b'{"a": 1}{"b": ')
+    with pytest.raises(InvalidResponseException):
+        framer.close()
+
+
+@pytest.mark.usefixtures("identity_environ")
+def test_stream_with_small_reads(stand_in_server: StandInServer) -> None:
+    with Modelfarm(base_url=stand_in_server.url,
+                   stream_chunk_size=7) as client:
+        chunks = list(
+            client.chat.completions.create(
+                messages=[{
+                    "role": "user",
+                    "content": "Hi"
+                }],
+                model="chat-bison",
+                stream=True,
+                max_tokens=50,
+            ))
+
+    assert [chunk.choices[0].delta.content
+            for chunk in chunks] == [f"word{i} " for i in range(50)]
+
+
+@pytest.mark.usefixtures("identity_environ")
+@pytest.mark.asyncio
+async def test_async_stream_with_small_reads(
+        stand_in_server: StandInServer) -> None:
+    async with AsyncModelfarm(base_url=stand_in_server.url,
+                              stream_chunk_size=7) as client:
+        chunks = [
+            chunk async for chunk in await client.completions.create(
+                prompt="1 + 1 = ",
+                model="text-bison",
+                stream=True,
+                max_tokens=50,
+            )
+        ]
+
+    assert [chunk.choices[0].text
+            for chunk in chunks] == [f"word{i} " for i in range(50)]
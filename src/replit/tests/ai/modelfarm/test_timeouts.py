@@ -0,0 +1,211 @@
+import asyncio
+import time
+
+import pytest
+import requests
+from replit.ai.modelfarm import AsyncModelfarm, Modelfarm
+from replit.ai.modelfarm.exceptions import (
+    InvalidResponseException,
+    StreamTimeoutException,
+)
+from replit.ai.modelfarm.rate_limit import RateLimiter
+from replit.ai.modelfarm.retry import RetryPolicy
+from replit.ai.modelfarm.timeouts import Timeout
+
+from .stand_in_server import Fault, StandInServer
+
+MODEL = "chat-bison"
+MESSAGES = [{"role": "user", "content": "Hi"}]
+
+
+def stream(client: Modelfarm, **kwargs) -> int:
+    return len(
+        list(
+            client.chat.completions.create(messages=MESSAGES,
+                                           model=MODEL,
+                                           stream=True,
+                                           max_tokens=5,
+                                           **kwargs)))
+
+
+async def stream_async(client: AsyncModelfarm, **kwargs) -> int:
+    chunks = await client.chat.completions.create(messages=MESSAGES,
+                                                  model=MODEL,
+                                                  stream=True,
+                                                  max_tokens=5,
+                                                  **kwargs)
+    return len([chunk async for chunk in chunks])
+
+
+def test_limit() -> None:
+    call = Timeout(connect=1, first_byte=5, idle=None).start(deadline=2)
+    assert call.connect == 1
+    assert 1.9 < call.first_byte <= 2
+    assert 1.9 < call.idle <= 2
+    assert call.allows(1)
+    assert not call.allows(3)
+
+    call = Timeout(deadline=None).start()
+    assert call.remaining() is None
+    assert call.first_byte == 120
+    assert call.allows(3600)
+    assert not call.expired()
+
+
+def test_expired() -> None:
+    call = Timeout().start(deadline=0)
+    assert call.expired()
+    assert call.remaining() == 0
+    assert call.idle == 0
+    with pytest.raises(StreamTimeoutException) as info:
+        call.request_timeouts()
+    assert info.value.phase == "deadline"
+    with pytest.raises(StreamTimeoutException):
+        call.check()
+    Timeout().start().check()
+
+
+@pytest.mark.usefixtures("identity_environ")
+def test_first_byte_timeout(stand_in_server: StandInServer) -> None:
+    stand_in_server.latency = lambda: 0.5
+    client = Modelfarm(base_url=stand_in_server.url,
+                       timeout=Timeout(first_byte=0.1))
+    with client, pytest.raises(requests.Timeout):
+        client.embeddings.create(input=["a"], model="textembedding-gecko")
+
+
+@pytest.mark.usefixtures("identity_environ")
+def test_idle_timeout(stand_in_server: StandInServer) -> None:
+    stand_in_server.chunk_delay = 0.5
+    client = Modelfarm(base_url=stand_in_server.url, timeout=Timeout(idle=0.1))
+    with client, pytest.raises(StreamTimeoutException) as info:
+        stream(client)
+
+    assert info.value.phase == "idle"
+    assert info.value.chunks == 1
+    assert info.value.bytes_received > 0
+
+
+@pytest.mark.usefixtures("identity_environ")
+def test_stream_deadline(stand_in_server: StandInServer) -> None:
+    stand_in_server.chunk_delay = 0.05
+    with Modelfarm(base_url=stand_in_server.url) as client:
+        assert stream(client) == 5
+        with pytest.raises(StreamTimeoutException) as info:
+            stream(client, deadline=0.12)
+
+    assert info.value.phase == "deadline"
+    assert 1 <= info.value.chunks < 5
+    assert info.value.elapsed < 0.3
+
+
+@pytest.mark.usefixtures("identity_environ")
+def test_deadline_stops_retries(stand_in_server: StandInServer) -> None:
+    stand_in_server.faults.extend([Fault(503)] * 20)
+    policy = RetryPolicy(max_attempts=20, initial_backoff=0.1, budget=None)
+    with Modelfarm(base_url=stand_in_server.url,
+                   retry_policy=policy) as client:
+        start = time.monotonic()
+        with pytest.raises(InvalidResponseException):
+            client.embeddings.create(input=["a"],
+                                     model="textembedding-gecko",
+                                     deadline=0.3)
+
+    assert time.monotonic() - start < 0.3
+    assert len(stand_in_server.requests) < 20
+
+
+@pytest.mark.usefixtures("identity_environ")
+def test_deadline_passed_while_waiting(stand_in_server: StandInServer) -> None:
+    limiter = RateLimiter(requests_per_second=2, request_burst=1)
+    with Modelfarm(base_url=stand_in_server.url,
+                   rate_limiter=limiter) as client:
+        client.embeddings.create(input=["a"], model="textembedding-gecko")
+        with pytest.raises(StreamTimeoutException) as info:
+            client.embeddings.create(input=["a"],
+                                     model="textembedding-gecko",
+                                     deadline=0.1)
+
+    assert info.value.phase == "deadline"
+    assert len(stand_in_server.requests) == 1
+
+
+@pytest.mark.usefixtures("identity_environ")
+def test_deadline_is_not_sent(stand_in_server: StandInServer) -> None:
+    with Modelfarm(base_url=stand_in_server.url) as client:
+        client.embeddings.create(input=["a"],
+                                 model="textembedding-gecko",
+                                 deadline=10)
+        stream(client, deadline=10)
+
+    assert all("deadline" not in r for r in stand_in_server.requests)
+
+
+@pytest.mark.usefixtures("identity_environ")
+@pytest.mark.asyncio
+async def test_async_first_byte_timeout(
+        stand_in_server: StandInServer) -> None:
+    stand_in_server.latency = lambda: 0.5
+    async with AsyncModelfarm(base_url=stand_in_server.url,
+                              timeout=Timeout(first_byte=0.1)) as client:
+        with pytest.raises(asyncio.TimeoutError):
+            await client.embeddings.create(input=["a"],
+                                           model="textembedding-gecko")
+
+
+@pytest.mark.usefixtures("identity_environ")
+@pytest.mark.asyncio
+async def test_async_idle_timeout(stand_in_server: StandInServer) -> None:
+    stand_in_server.chunk_delay = 0.5
+    async with AsyncModelfarm(base_url=stand_in_server.url,
+                              timeout=Timeout(idle=0.1)) as client:
+        with pytest.raises(StreamTimeoutException) as info:
+            await stream_async(client)
+
+    assert info.value.phase == "idle"
+    assert info.value.chunks == 1
+
+
+@pytest.mark.usefixtures("identity_environ")
+@pytest.mark.asyncio
+async def test_async_stream_deadline(stand_in_server: StandInServer) -> None:
+    stand_in_server.chunk_delay = 0.05
+    async with AsyncModelfarm(base_url=stand_in_server.url) as client:
+        assert await stream_async(client) == 5
+        with pytest.raises(StreamTimeoutException) as info:
+            await stream_async(client, deadline=0.12)
+
+    assert info.value.phase == "deadline"
+    assert 1 <= info.value.chunks < 5
+
+
+@pytest.mark.usefixtures("identity_environ")
+@pytest.mark.asyncio
+async def test_async_stream_retried_before_first_chunk(
+        stand_in_server: StandInServer) -> None:
+    stand_in_server.latency = iter([0.5, 0.0]).__next__
+    policy = RetryPolicy(initial_backoff=0.001, budget=None)
+    async with AsyncModelfarm(base_url=stand_in_server.url,
+                              retry_policy=policy,
+                              timeout=Timeout(first_byte=0.2)) as client:
+        assert await stream_async(client) == 5
+
+    assert len(stand_in_server.requests) == 2
+
+
+@pytest.mark.usefixtures("identity_environ")
+@pytest.mark.asyncio
+async def test_async_deadline_passed_while_waiting(
+        stand_in_server: StandInServer) -> None:
+    limiter = RateLimiter(requests_per_second=2, request_burst=1)
+    async with AsyncModelfarm(base_url=stand_in_server.url,
+                              rate_limiter=limiter) as client:
+        await client.embeddings.create(input=["a"],
+                                       model="textembedding-gecko")
+        with pytest.raises(StreamTimeoutException) as info:
+            await client.embeddings.create(input=["a"],
+                                           model="textembedding-gecko",
+                                           deadline=0.1)
+
+    assert info.value.phase == "deadline"
+    assert len(stand_in_server.requests) == 1